@@ -0,0 +1,376 @@
+"""# Artefato de inferência sem PyCaret
+
+Exporta, a partir do pipeline treinado pelo PyCaret, um artefato enxuto para
+previsão: o booster nativo do LightGBM (texto) e uma especificação JSON do
+pré-processamento (imputação, mapeamento das categorias e ordem das features).
+Com ele, `irf.py` faz as previsões sem importar o PyCaret, com o mesmo
+resultado do `predict_model`.
+"""
+
+import json
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# Modelo salvo pelo modelo_irf.py e lido pelo irf.py (sem extensão: o PyCaret acrescenta .pkl)
+CAMINHO_MODELO = r'S:\Procurement\FUP\IRF - Índice de Risco de Fornecedores\Modelo de Machine Learning\Modelos\modelo_treinado_lightgbm'
+VERSAO_ARTEFATO = 1
+CASAS_DECIMAIS_SCORE = 4  # Mesmo arredondamento padrão do predict_model
+SUFIXO_BOOSTER = '_booster.txt'
+SUFIXO_PREPROCESSAMENTO = '_preprocessamento.json'
+# Marca que o booster do artefato foi atualizado depois do .pkl (treinamento incremental)
+SUFIXO_PKL_SUBSTITUIDO = '_pkl_substituido.json'
+CATEGORIA_DESCONHECIDA = '__categoria_desconhecida__'
+
+def caminhos_artefato(caminho_modelo):
+    """
+    Monta os caminhos dos arquivos do artefato a partir do caminho do modelo PyCaret.
+
+    Args:
+        caminho_modelo (str): Caminho do modelo (com ou sem a extensão .pkl)
+
+    Returns:
+        tuple: (caminho do booster, caminho da especificação de pré-processamento)
+    """
+    base = caminho_modelo[:-4] if caminho_modelo.endswith('.pkl') else caminho_modelo
+    return base + SUFIXO_BOOSTER, base + SUFIXO_PREPROCESSAMENTO
+
+def caminho_pkl_substituido(caminho_modelo):
+    """
+    Monta o caminho da marca de que o .pkl do modelo ficou para trás do artefato.
+
+    Args:
+        caminho_modelo (str): Caminho do modelo (com ou sem a extensão .pkl)
+
+    Returns:
+        str: Caminho da marca (JSON ao lado do modelo)
+    """
+    base = caminho_modelo[:-4] if caminho_modelo.endswith('.pkl') else caminho_modelo
+    return base + SUFIXO_PKL_SUBSTITUIDO
+
+def marcar_pkl_substituido(caminho_modelo, resumo):
+    """
+    Registra que o booster do artefato foi atualizado sem o .pkl do PyCaret.
+
+    Com a marca, o .pkl não pode mais ser usado no lugar do artefato (seria um
+    modelo mais antigo). Ela é removida no próximo `exportar_artefato`.
+
+    Args:
+        caminho_modelo (str): Caminho do modelo (com ou sem a extensão .pkl)
+        resumo (dict): Dados da atualização (gravados na marca)
+    """
+    caminho = caminho_pkl_substituido(caminho_modelo)
+    caminho_tmp = f"{caminho}.tmp"
+    with open(caminho_tmp, 'w', encoding='utf-8') as arquivo:
+        json.dump(resumo, arquivo, ensure_ascii=False, indent=2)
+    os.replace(caminho_tmp, caminho)
+
+def artefato_disponivel(caminho_modelo):
+    """
+    Verifica se o artefato de inferência existe para o modelo informado.
+
+    Args:
+        caminho_modelo (str): Caminho do modelo (com ou sem a extensão .pkl)
+
+    Returns:
+        bool: True se os dois arquivos do artefato existem
+    """
+    return all(os.path.exists(caminho) for caminho in caminhos_artefato(caminho_modelo))
+
+def _transformar_sem_estimador(pipeline, df):
+    """
+    Aplica as etapas de pré-processamento do pipeline, sem o estimador final.
+
+    Etapas usadas só no treino (balanceamento, remoção de outliers) são puladas,
+    como o PyCaret faz na previsão.
+
+    Args:
+        pipeline (Pipeline): Pipeline do PyCaret
+        df (pandas.DataFrame): Dados de entrada
+
+    Returns:
+        pandas.DataFrame: Matriz de features, como o estimador recebe
+    """
+    for _, etapa in pipeline.steps[:-1]:
+        if etapa is None or etapa == 'passthrough' or getattr(etapa, '_train_only', False):
+            continue
+        df = etapa.transform(df)
+    return df
+
+def exportar_artefato(pipeline, df_treino, caminho_modelo, target='On Time'):
+    """
+    Exporta o booster LightGBM e a especificação de pré-processamento do pipeline.
+
+    O mapeamento das categorias é obtido passando pelo próprio pipeline uma base
+    de sondagem com todas as categorias conhecidas (e uma desconhecida), o que
+    reproduz exatamente os codificadores usados pelo PyCaret.
+
+    Args:
+        pipeline (Pipeline): Pipeline finalizado do PyCaret (com LightGBM no final)
+        df_treino (pandas.DataFrame): Dados usados no treinamento
+        caminho_modelo (str): Caminho do modelo salvo (com ou sem .pkl)
+        target (str): Nome da coluna alvo
+
+    Returns:
+        tuple: (caminho do booster, caminho da especificação)
+    """
+    estimador = pipeline.steps[-1][1]
+    etapas = dict(pipeline.steps)
+    colunas_entrada = [col for col in pipeline.feature_names_in_ if col != target]
+
+    imputador_num = etapas['numerical_imputer'].transformer if 'numerical_imputer' in etapas else None
+    imputador_cat = etapas['categorical_imputer'].transformer if 'categorical_imputer' in etapas else None
+    numericas = list(etapas['numerical_imputer'].include) if imputador_num is not None else []
+    categoricas = list(etapas['categorical_imputer'].include) if imputador_cat is not None else []
+    imputacao_num = dict(zip(numericas, imputador_num.statistics_.tolist())) if numericas else {}
+    imputacao_cat = dict(zip(categoricas, imputador_cat.statistics_.tolist())) if categoricas else {}
+
+    # Base de sondagem: cada coluna categórica percorre suas categorias conhecidas
+    categorias = {
+        col: [str(valor) for valor in pd.Series(df_treino[col]).dropna().unique()] + [CATEGORIA_DESCONHECIDA]
+        for col in categoricas
+    }
+    tamanho = max([len(valores) for valores in categorias.values()] + [1])
+    sondagem = pd.DataFrame({
+        col: [imputacao_num[col]] * tamanho if col in imputacao_num else
+             [categorias[col][i % len(categorias[col])] for i in range(tamanho)]
+        for col in colunas_entrada
+    })
+    for col in categoricas:
+        sondagem[col] = sondagem[col].astype(object)
+    saida = _transformar_sem_estimador(pipeline, sondagem)
+    ordem_features = list(saida.columns)
+
+    especificacao_cat = {}
+    for col in categoricas:
+        # Colunas de saída derivadas desta categoria (mesmo nome ou one-hot "col_valor")
+        saidas = [f for f in ordem_features if f == col or f.startswith(f'{col}_')]
+        valores = saida[saidas].to_numpy(dtype=float)
+        n = len(categorias[col])
+        especificacao_cat[col] = {
+            'imputacao': str(imputacao_cat[col]),
+            'saidas': saidas,
+            'mapa': {categorias[col][i]: valores[i].tolist() for i in range(n - 1)},
+            'desconhecida': valores[n - 1].tolist(),
+        }
+
+    classes = estimador.classes_.tolist()
+    if 'label_encoding' in etapas:
+        classes = etapas['label_encoding'].transformer.inverse_transform(estimador.classes_).tolist()
+
+    especificacao = {
+        'versao': VERSAO_ARTEFATO,
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'colunas_entrada': colunas_entrada,
+        'numericas': imputacao_num,
+        'categoricas': especificacao_cat,
+        'ordem_features': ordem_features,
+        'classes': classes,
+        'casas_decimais': CASAS_DECIMAIS_SCORE,
+    }
+
+    caminho_booster, caminho_spec = caminhos_artefato(caminho_modelo)
+    estimador.booster_.save_model(caminho_booster)
+    with open(caminho_spec, 'w', encoding='utf-8') as arquivo:
+        json.dump(especificacao, arquivo, ensure_ascii=False, indent=2)
+    # O .pkl e o artefato voltam a representar o mesmo modelo
+    if os.path.exists(caminho_pkl_substituido(caminho_modelo)):
+        os.remove(caminho_pkl_substituido(caminho_modelo))
+    return caminho_booster, caminho_spec
+
+class ModeloInferencia:
+    """
+    Modelo de previsão carregado do artefato enxuto (booster + especificação JSON).
+
+    Reproduz o pré-processamento do pipeline do PyCaret com operações vetorizadas
+    do NumPy e devolve os mesmos `prediction_label` e `prediction_score` do
+    `predict_model`.
+    """
+
+    def __init__(self, caminho_modelo):
+        """
+        Args:
+            caminho_modelo (str): Caminho do modelo PyCaret (com ou sem .pkl)
+        """
+        import lightgbm as lgb
+
+        caminho_booster, caminho_spec = caminhos_artefato(caminho_modelo)
+        with open(caminho_spec, 'r', encoding='utf-8') as arquivo:
+            self.especificacao = json.load(arquivo)
+        self.booster = lgb.Booster(model_file=caminho_booster)
+        self.caminho_modelo = caminho_modelo
+        self.classes = np.array(self.especificacao['classes'])
+        self.ordem_features = self.especificacao['ordem_features']
+        self._posicoes = {nome: i for i, nome in enumerate(self.ordem_features)}
+
+        # Tabelas de codificação: uma linha por categoria conhecida e a última para desconhecidas
+        self._tabelas = {}
+        for col, spec in self.especificacao['categoricas'].items():
+            categorias = list(spec['mapa'].keys())
+            tabela = np.array(list(spec['mapa'].values()) + [spec['desconhecida']], dtype=float)
+            self._tabelas[col] = (pd.Index(categorias), tabela, spec)
+        # Categorias vistas no treinamento (as demais usam a codificação de desconhecida)
+        self.categorias_conhecidas = {col: categorias for col, (categorias, _, _) in self._tabelas.items()}
+
+        # Soma das contribuições das features derivadas de uma mesma coluna de entrada (ex.: one-hot)
+        origem = {saida: col for col, spec in self.especificacao['categoricas'].items() for saida in spec['saidas']}
+        self.colunas_contribuicao = [col for col in self.especificacao['colunas_entrada']
+                                     if col in self.especificacao['numericas'] or col in self.especificacao['categoricas']]
+        posicao_coluna = {col: i for i, col in enumerate(self.colunas_contribuicao)}
+        self._agrupamento = np.zeros((len(self.ordem_features), len(self.colunas_contribuicao)))
+        for i, nome in enumerate(self.ordem_features):
+            self._agrupamento[i, posicao_coluna[origem.get(nome, nome)]] = 1.0
+        self._tabela_folhas = None
+
+    def matriz_features(self, df):
+        """
+        Monta a matriz de features na ordem esperada pelo booster.
+
+        Args:
+            df (pandas.DataFrame): Dados com as colunas de entrada do modelo
+
+        Returns:
+            numpy.ndarray: Matriz (linhas x features) em float64
+        """
+        matriz = np.empty((len(df), len(self.ordem_features)), dtype=float)
+        for col, valor_imputacao in self.especificacao['numericas'].items():
+            valores = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+            matriz[:, self._posicoes[col]] = np.where(np.isnan(valores), valor_imputacao, valores)
+        for col, (categorias, tabela, spec) in self._tabelas.items():
+            serie = df[col]
+            valores = serie.astype(object).where(serie.notna(), spec['imputacao']).astype(str)
+            # Categorias desconhecidas recebem -1, que indexa a última linha da tabela
+            codigos = categorias.get_indexer(valores)
+            colunas = [self._posicoes[saida] for saida in spec['saidas']]
+            matriz[:, colunas] = tabela[codigos]
+        return matriz
+
+    def prever_probabilidade(self, df):
+        """
+        Calcula a probabilidade da classe positiva para cada linha.
+
+        Args:
+            df (pandas.DataFrame): Dados com as colunas de entrada do modelo
+
+        Returns:
+            numpy.ndarray: Probabilidade da segunda classe (ex.: atraso)
+        """
+        return self.booster.predict(self.matriz_features(df))
+
+    def prever_rotulos(self, df):
+        """
+        Calcula `prediction_label` e `prediction_score` sem copiar os dados.
+
+        Args:
+            df (pandas.DataFrame): Dados com as colunas de entrada do modelo
+
+        Returns:
+            tuple: (numpy.ndarray de rótulos, numpy.ndarray de scores), na ordem das linhas de `df`
+        """
+        probabilidade = self.prever_probabilidade(df)
+        # Mesmo critério do LGBMClassifier.predict (argmax entre [1 - p, p])
+        indice_classe = (probabilidade > 1 - probabilidade).astype(int)
+        score = np.where(indice_classe == 1, probabilidade, 1 - probabilidade)
+        return self.classes[indice_classe].astype(int), np.round(score, self.especificacao['casas_decimais'])
+
+    def _montar_tabela_folhas(self):
+        """
+        Pré-calcula a contribuição de cada folha de cada árvore para as colunas de entrada.
+
+        No caminho da raiz até a folha, cada divisão contribui, para a feature
+        dividida, com a diferença entre o valor do nó filho e o do nó pai. A soma
+        do caminho é o valor da folha menos o da raiz, então as contribuições de
+        uma linha somam (com os valores das raízes) o score bruto do booster.
+
+        Returns:
+            tuple: (tabela folhas x `colunas_contribuicao`, posição da primeira folha de cada árvore)
+        """
+        arvores = self.booster.dump_model()['tree_info']
+        tabelas, inicios, total = [], [], 0
+        for arvore in arvores:
+            tabela = np.zeros((max(arvore['num_leaves'], 1), len(self.ordem_features)))
+            pilha = [(arvore['tree_structure'], np.zeros(len(self.ordem_features)))]
+            while pilha:
+                no, caminho = pilha.pop()
+                if 'leaf_value' in no:
+                    tabela[no.get('leaf_index', 0)] = caminho
+                    continue
+                for lado in ('left_child', 'right_child'):
+                    filho = no[lado]
+                    valor_filho = filho['leaf_value'] if 'leaf_value' in filho else filho['internal_value']
+                    caminho_filho = caminho.copy()
+                    caminho_filho[no['split_feature']] += valor_filho - no['internal_value']
+                    pilha.append((filho, caminho_filho))
+            tabelas.append(tabela @ self._agrupamento)
+            inicios.append(total)
+            total += len(tabela)
+        return np.concatenate(tabelas), np.array(inicios, dtype=np.int64)
+
+    def contribuicoes(self, df, exato=False):
+        """
+        Calcula quanto cada coluna de entrada contribuiu para a previsão de cada linha.
+
+        Por padrão, soma as contribuições pré-calculadas das folhas em que cada
+        linha cai (uma passada de `pred_leaf`, custo próximo ao da previsão).
+        Com `exato`, usa os valores SHAP nativos do LightGBM (`pred_contrib`),
+        bem mais lentos em bases grandes.
+
+        Args:
+            df (pandas.DataFrame): Dados com as colunas de entrada do modelo
+            exato (bool): Se True, usa `pred_contrib` (TreeSHAP)
+
+        Returns:
+            numpy.ndarray: Contribuições (linhas x `colunas_contribuicao`), em log-odds da
+                segunda classe (ex.: atraso)
+        """
+        matriz = self.matriz_features(df)
+        if exato:
+            contribuicoes = self.booster.predict(matriz, pred_contrib=True)
+            # A última coluna é o valor esperado do modelo (igual para todas as linhas)
+            return contribuicoes[:, :-1] @ self._agrupamento
+        if self._tabela_folhas is None:
+            self._tabela_folhas = self._montar_tabela_folhas()
+        tabela, inicios = self._tabela_folhas
+        folhas = self.booster.predict(matriz, pred_leaf=True).astype(np.int64, copy=False) + inicios
+        contribuicoes = np.zeros((len(matriz), tabela.shape[1]))
+        for arvore in range(folhas.shape[1]):
+            contribuicoes += tabela[folhas[:, arvore]]
+        return contribuicoes
+
+    def principais_fatores(self, df, rotulos, quantidade=3):
+        """
+        Seleciona as colunas que mais pesaram a favor da classe prevista em cada linha.
+
+        Args:
+            df (pandas.DataFrame): Dados com as colunas de entrada do modelo
+            rotulos (numpy.ndarray): Rótulos previstos (`prever_rotulos`) das linhas de `df`
+            quantidade (int): Quantidade de colunas por linha
+
+        Returns:
+            tuple: (índices em `colunas_contribuicao` e contribuições a favor da classe prevista,
+                os dois com linhas x `quantidade`, em ordem decrescente)
+        """
+        contribuicoes = self.contribuicoes(df)
+        # Contribuição positiva para a segunda classe é contra a primeira
+        sinal = np.where(np.asarray(rotulos) == self.classes.astype(int)[1], 1.0, -1.0)[:, None]
+        a_favor = contribuicoes * sinal
+        quantidade = min(quantidade, a_favor.shape[1])
+        indices = np.argsort(-a_favor, axis=1, kind='stable')[:, :quantidade]
+        return indices, np.take_along_axis(a_favor, indices, axis=1)
+
+    def prever(self, df):
+        """
+        Faz as previsões com a mesma saída do `predict_model` do PyCaret.
+
+        Args:
+            df (pandas.DataFrame): Dados com as colunas de entrada do modelo
+
+        Returns:
+            pandas.DataFrame: Cópia dos dados com `prediction_label` e `prediction_score`
+        """
+        label, score = self.prever_rotulos(df)
+        resultado = df.copy()
+        resultado['prediction_label'] = label
+        resultado['prediction_score'] = score
+        return resultado
@@ -2,15 +2,34 @@ import pandas as pd
 from openpyxl import load_workbook
 from glob import glob
 import os
+import numbers
 import re
+import shutil
+import tempfile
 import xlsxwriter
 from datetime import datetime
+from esquema_otp import COLUNAS_DATA, ler_csv_otp
+from escritor_excel import OPCOES_WORKBOOK, escrever_dataframe
+from pacote_xlsx import substituir_abas
+from ingestao_incremental import (
+    arquivo_alterado, calcular_delta, distribuir_linhas, persistir_delta, planilha_sincronizada,
+    registrar_arquivo, resumir_delta
+)
+from instrumentacao import etapa, execucao, log_message
+from executor_etapas import ExecutorEtapas
 
 # Caminhos fixos
 caminho_origem = r'C:\Users\CSUGAB01\Downloads'
 caminho_destino = r'S:\Procurement\FUP\OTP Mensal\OTP - Base.xlsx'
 nome_aba_destino = 'Base OTP'
 
+# Padrões dos nomes dos arquivos exportados na pasta de origem
+PADRAO_CELONIS = '*CELONIS*.csv'
+PADRAO_EXPORT = '*EXPORT_*.xlsx'
+
+# Modo incremental: compara o export com o último ingerido e só reescreve a planilha se houver mudanças
+MODO_INCREMENTAL = True
+
 # Função para extrair número dos 14 primeiros dígitos do nome do arquivo
 def extrair_numero(nome_arquivo):
     match = re.match(r"(\d{14})", nome_arquivo)
@@ -18,42 +37,6 @@ def extrair_numero(nome_arquivo):
         return int(match.group(1))
     return -1
 
-def log_message(message):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{timestamp}] {message}")
-
-log_message('🚀 Início do processo de atualização de planilha.')
-
-# Busca arquivos de origem com 'CELONIS' no nome
-arquivos_origem = glob(os.path.join(caminho_origem, '*CELONIS*.csv'))
-log_message(f'📁 Quantidade de arquivos de origem CELONIS encontrados: {len(arquivos_origem)}')
-
-maior_numero = -1
-arquivo_origem = None
-for arquivo in arquivos_origem:
-    nome = os.path.basename(arquivo)
-    numero = extrair_numero(nome)
-    if numero > maior_numero:
-        maior_numero = numero
-        arquivo_origem = arquivo
-
-if not arquivo_origem:
-    log_message("❌ Nenhum arquivo de origem CSV encontrado com 'CELONIS' e 14 dígitos no início do nome.")
-    exit(1)
-log_message(f'✅ Arquivo de origem CELONIS selecionado: {arquivo_origem}')
-
-# Lê os dados do CSV usando pandas
-try:
-    df = pd.read_csv(arquivo_origem, encoding='utf-8')
-except Exception as e:
-    log_message(f'❌ Erro ao ler o arquivo CSV de origem: {e}')
-    exit(1)
-log_message(f'📊 {len(df)} linhas copiadas da planilha de origem.')
-
-# Busca arquivos de origem com 'EXPORT_' no nome
-arquivos_export = glob(os.path.join(caminho_origem, '*EXPORT_*.xlsx'))
-log_message(f'📁 Quantidade de arquivos de origem EXPORT_ encontrados: {len(arquivos_export)}')
-
 # Função para extrair número da data dos últimos 15 caracteres
 def extrair_numero_export(nome_arquivo):
     # Formato esperado: EXPORT_20250709_134041.xlsx
@@ -71,196 +54,304 @@ def extrair_numero_export(nome_arquivo):
             return -1
     return -1
 
-maior_numero_export = -1
-arquivo_export = None
-for arquivo in arquivos_export:
-    nome = os.path.basename(arquivo)
-    numero = extrair_numero_export(nome)
-    if numero > maior_numero_export:
-        maior_numero_export = numero
-        arquivo_export = arquivo
-
-if not arquivo_export:
-    log_message("❌ Nenhum arquivo de origem Excel encontrado com 'EXPORT_' e data válida no final do nome.")
-else:
-    log_message(f'✅ Arquivo de origem EXPORT selecionado: {arquivo_export}')
-    
-    # Lê os dados do arquivo Excel EXPORT usando pandas
-    try:
-        df_export = pd.read_excel(arquivo_export)
-    except Exception as e:
-        log_message(f'❌ Erro ao ler o arquivo Excel EXPORT de origem: {e}')
-    else:
-        log_message(f'📊 {len(df_export)} linhas copiadas do arquivo EXPORT.')
-
-# Carrega a planilha de destino para leitura da aba Base Fornecedores
-wb_destino = load_workbook(caminho_destino, data_only=True, read_only=True)
-
-# --- LÓGICA PARA ATUALIZAR 'Base Fornecedores' ---
+# Devolve o arquivo da pasta com o maior número no nome (None se nenhum tiver número válido)
+def arquivo_mais_recente(pasta, padrao, extrair):
+    maior_numero = -1
+    mais_recente = None
+    for arquivo in glob(os.path.join(pasta, padrao)):
+        numero = extrair(os.path.basename(arquivo))
+        if numero > maior_numero:
+            maior_numero = numero
+            mais_recente = arquivo
+    return mais_recente
+
+# Seleciona os arquivos CELONIS e EXPORT mais recentes da pasta de origem
+def selecionar_arquivos(pasta=caminho_origem):
+    # Busca arquivos de origem com 'CELONIS' no nome
+    log_message(f"📁 Quantidade de arquivos de origem CELONIS encontrados: {len(glob(os.path.join(pasta, PADRAO_CELONIS)))}")
+    arquivo_origem = arquivo_mais_recente(pasta, PADRAO_CELONIS, extrair_numero)
+    # Busca arquivos de origem com 'EXPORT_' no nome
+    log_message(f"📁 Quantidade de arquivos de origem EXPORT_ encontrados: {len(glob(os.path.join(pasta, PADRAO_EXPORT)))}")
+    arquivo_export = arquivo_mais_recente(pasta, PADRAO_EXPORT, extrair_numero_export)
+    if not arquivo_export:
+        log_message("❌ Nenhum arquivo de origem Excel encontrado com 'EXPORT_' e data válida no final do nome.")
+    return arquivo_origem, arquivo_export
+
+# --- Dados da aba 'Base Fornecedores' ---
 aba_fornecedores = 'Base Fornecedores'
 coluna_sap = 'SAP-LIFNR'
 coluna_vendor = 'Vendor'
 
-# Lista para armazenar novos fornecedores
-novos_fornecedores = []
-
-# Verifica se a aba existe
-if aba_fornecedores not in wb_destino.sheetnames:
-    log_message(f"⚠️ Aba '{aba_fornecedores}' inexistente na planilha de destino.")
-    valores_sap = set()
-else:
-    ws_forn = wb_destino[aba_fornecedores]
+# Lê o delta do export CELONIS em relação ao último ingerido (EBELN/EBELP)
+def ler_delta(df):
+    try:
+        delta = calcular_delta(df)
+        log_message(f'🔁 Delta do export CELONIS: {resumir_delta(delta)}.')
+        return delta
+    except Exception as e:
+        log_message(f'⚠️ Não foi possível calcular o delta, seguindo com a carga completa: {e}')
+        return None
 
-    # Lê todos os valores existentes na coluna 'SAP-LIFNR' (ignorando cabeçalho)
-    valores_sap = set()
-    for row in ws_forn.iter_rows(min_row=2, min_col=1, max_col=1, values_only=True):
-        if row[0] is not None:
-            valores_sap.add(str(row[0]))
+# Lê os dados do arquivo Excel EXPORT usando pandas (None se houver erro)
+def ler_export(arquivo):
+    try:
+        df_export = pd.read_excel(arquivo)
+    except Exception as e:
+        log_message(f'❌ Erro ao ler o arquivo Excel EXPORT de origem: {e}')
+        return None
+    log_message(f'📊 {len(df_export)} linhas copiadas do arquivo EXPORT.')
+    return df_export
+
+def normalizar_fornecedor(valor):
+    """
+    Normaliza o código do fornecedor para comparar o Vendor do CELONIS com a SAP-LIFNR.
+
+    O Vendor é lido como texto com os zeros à esquerda ('0100124'), enquanto a
+    SAP-LIFNR guarda os códigos numéricos como número (100124, ou 100124.0 pelo
+    openpyxl). Códigos numéricos viram o inteiro sem zeros à esquerda; os demais,
+    o texto sem espaços nas pontas.
+
+    Args:
+        valor: Código do fornecedor (texto ou número)
+
+    Returns:
+        int | str: Código normalizado
+    """
+    if isinstance(valor, numbers.Integral) or (isinstance(valor, float) and valor.is_integer()):
+        return int(valor)
+    texto = str(valor).strip()
+    return int(texto) if texto.isdigit() else texto
+
+# Lê os valores existentes na coluna 'SAP-LIFNR' da aba Base Fornecedores, normalizados (None se a aba não existe)
+def ler_valores_sap(caminho):
+    if not os.path.exists(caminho):
+        return None
+    wb_destino = load_workbook(caminho, data_only=True, read_only=True)
+    try:
+        if aba_fornecedores not in wb_destino.sheetnames:
+            return None
+        valores_sap = set()
+        for row in wb_destino[aba_fornecedores].iter_rows(min_row=2, min_col=1, max_col=1, values_only=True):
+            if row[0] is not None:
+                valores_sap.add(normalizar_fornecedor(row[0]))
+        return valores_sap
+    finally:
+        wb_destino.close()
+
+# Decide quais linhas da aba Base OTP reescrever (None: a aba é reescrita por inteiro)
+def planejar_linhas(delta, df):
+    if delta is None or delta['primeira_carga']:
+        return None
+    if not planilha_sincronizada(caminho_destino, delta['colunas']):
+        log_message('ℹ️ Planilha de destino alterada desde a última ingestão (ou colunas diferentes): a aba Base OTP será reescrita por inteiro.')
+        return None
+    try:
+        plano = distribuir_linhas(delta)
+    except ValueError as e:
+        log_message(f'⚠️ {e}: a aba Base OTP será reescrita por inteiro.')
+        return None
+    if plano is not None:
+        log_message(f"✏️ {len(plano['posicoes'])} de {len(df)} linhas da aba Base OTP serão reescritas.")
+    return plano
+
+# Prepara os dados do EXPORT para a aba RNC Base
+def preparar_rnc(df_export):
+    # Define a data de hoje para usar na aba RNC Base
+    data_hoje = datetime.today().strftime('%d/%m/%Y')
 
-    # Filtra valores únicos da coluna 'Vendor' do DataFrame de origem
-    if coluna_vendor not in df.columns:
-        log_message(f"❌ Coluna '{coluna_vendor}' não encontrada no arquivo de origem!")
-    else:
-        novos_vendors = set(df[coluna_vendor].dropna().astype(str).unique())
-        novos_a_adicionar = novos_vendors - valores_sap
-        log_message(f'🔍 {len(novos_a_adicionar)} novos fornecedores a adicionar.')
-        
-        # Armazena os novos fornecedores para adicionar depois
-        if novos_a_adicionar:
-            novos_fornecedores = sorted(novos_a_adicionar)
-
-wb_destino.close()
-
-# Lê todas as abas existentes para preservar
-wb_existente = load_workbook(caminho_destino, data_only=True, read_only=True)
-abas_existentes = {}
-for sheet_name in wb_existente.sheetnames:
-    if sheet_name not in [nome_aba_destino, 'RNC Base']:  # Não preservar as abas que vamos sobrescrever
-        ws_temp = wb_existente[sheet_name]
-        dados_aba = []
-        for row in ws_temp.iter_rows(values_only=True):
-            dados_aba.append(list(row))
-        abas_existentes[sheet_name] = dados_aba
-wb_existente.close()
-
-# Cria novo arquivo com xlsxwriter para escrita otimizada
-log_message('⚡ Criando novo arquivo com xlsxwriter...')
-workbook = xlsxwriter.Workbook(caminho_destino, {'nan_inf_to_errors': True})
-
-# Cria formato de data
-date_format = workbook.add_format({'num_format': 'dd/mm/yyyy'})
-
-# Define a data de hoje para usar na aba RNC Base
-data_hoje = datetime.today().strftime('%d/%m/%Y')
-
-# Cria aba Base OTP (primeira aba)
-worksheet_otp = workbook.add_worksheet(nome_aba_destino)
-
-# Escreve cabeçalho
-for col, header in enumerate(df.columns):
-    worksheet_otp.write(0, col, header)
-
-# Converte colunas de data de uma vez
-colunas_data = ['BEDAT', 'Due Date (incl. ex works time)', 'GR Document Date', 'Delivery Date']
-for coluna in colunas_data:
-    if coluna in df.columns:
-        df[coluna] = pd.to_datetime(df[coluna], errors='coerce')
-
-# Escreve dados em lote
-for row_idx, row in enumerate(df.itertuples(index=False, name=None), start=1):
-    for col_idx, value in enumerate(row):
-        # Trata valores nulos/NaN
-        if pd.isna(value):
-            worksheet_otp.write(row_idx, col_idx, '')
-        else:
-            # Verifica se é uma coluna de data
-            col_name = df.columns[col_idx]
-            if col_name in colunas_data:
-                # Já convertido para datetime, aplica formato
-                if pd.notna(value):
-                    worksheet_otp.write_datetime(row_idx, col_idx, value, date_format)
-                else:
-                    worksheet_otp.write(row_idx, col_idx, '')
-            else:
-                worksheet_otp.write(row_idx, col_idx, value)
-
-log_message('📋 Dados atualizados na planilha Base OTP.')
-
-# Cria aba RNC Base como segunda aba se houver dados do EXPORT
-if arquivo_export and 'df_export' in locals():
-    aba_rnc = 'RNC Base'
-    worksheet_rnc = workbook.add_worksheet(aba_rnc)
-    
-    # Adiciona a coluna "Última Atualização" ao cabeçalho
-    col_ultima_atualizacao_rnc = len(df_export.columns)
-    worksheet_rnc.write(0, col_ultima_atualizacao_rnc, "Última Atualização")
-    
-    # Escreve a data de hoje apenas na primeira linha da nova coluna
-    worksheet_rnc.write(1, col_ultima_atualizacao_rnc, data_hoje)
-    
-    # Escreve cabeçalho
-    for col, header in enumerate(df_export.columns):
-        worksheet_rnc.write(0, col, header)
-    
     # Converte coluna de data de uma vez
     if 'Notification Date' in df_export.columns:
         df_export['Notification Date'] = pd.to_datetime(df_export['Notification Date'], errors='coerce')
-    
+
     # Adiciona "0" no início da coluna Supplier se começar com número
     if 'Supplier' in df_export.columns:
-        df_export['Supplier'] = df_export['Supplier'].astype(str).apply(
-            lambda x: '0' + x if x and x[0].isdigit() else x
-        )
-    
+        supplier = df_export['Supplier'].astype(str)
+        df_export['Supplier'] = supplier.where(~supplier.str[:1].str.isdigit(), '0' + supplier)
+
     # Substitui valores NaN por string vazia na coluna 'Assembly Descript.'
     if 'Assembly Descript.' in df_export.columns:
         df_export['Assembly Descript.'] = df_export['Assembly Descript.'].fillna('')
-    
-    # Escreve dados em lote
-    for row_idx, row in enumerate(df_export.itertuples(index=False, name=None), start=1):
-        for col_idx, value in enumerate(row):
-            # Trata valores nulos/NaN
-            if pd.isna(value):
-                worksheet_rnc.write(row_idx, col_idx, '')
-            else:
-                # Verifica se é uma coluna de data
-                col_name = df_export.columns[col_idx]
-                if col_name == 'Notification Date':
-                    # Já convertido para datetime, aplica formato
-                    if pd.notna(value):
-                        worksheet_rnc.write_datetime(row_idx, col_idx, value, date_format)
-                    else:
-                        worksheet_rnc.write(row_idx, col_idx, '')
-                else:
-                    worksheet_rnc.write(row_idx, col_idx, value)
-    
-    log_message('📋 Dados atualizados na planilha RNC Base.')
-
-# Recria as abas existentes preservadas
-for nome_aba, dados_aba in abas_existentes.items():
-    worksheet = workbook.add_worksheet(nome_aba)
-    for row_idx, row_data in enumerate(dados_aba):
-        for col_idx, value in enumerate(row_data):
-            if pd.isna(value):
-                worksheet.write(row_idx, col_idx, '')
-            else:
-                worksheet.write(row_idx, col_idx, value)
-
-# Adiciona novos fornecedores na aba Base Fornecedores se existir
-if novos_fornecedores and aba_fornecedores in abas_existentes:
-    # Encontra a aba Base Fornecedores no workbook
-    worksheet_forn = None
-    for sheet in workbook.worksheets():
-        if sheet.name == aba_fornecedores:
-            worksheet_forn = sheet
-            break
-    
-    if worksheet_forn:
-        # Adiciona os novos fornecedores ao final
-        start_row = len(abas_existentes[aba_fornecedores])
-        for i, fornecedor in enumerate(novos_fornecedores):
-            worksheet_forn.write_string(start_row + i, 0, fornecedor)
-
-# Fecha o workbook
-workbook.close()
-log_message(f"🎉 Dados atualizados em: {caminho_destino}")
+
+    # Adiciona a coluna "Última Atualização", com a data de hoje apenas na primeira linha
+    ultima_atualizacao = [None] * len(df_export)
+    if ultima_atualizacao:
+        ultima_atualizacao[0] = data_hoje
+    df_export['Última Atualização'] = ultima_atualizacao
+
+# Grava as abas atualizadas na planilha de destino (True se gravou, None se houve erro).
+# Com `plano`, a aba Base OTP recebe só as linhas do plano; sem ele, é reescrita por inteiro
+def gravar_destino(df, df_export, novos_fornecedores, plano=None):
+    destino_existe = os.path.exists(caminho_destino)
+
+    # Gera as abas atualizadas com xlsxwriter em um arquivo temporário local; as demais
+    # abas da planilha de destino são preservadas sem serem lidas (ver pacote_xlsx.py)
+    log_message('⚡ Criando abas atualizadas com xlsxwriter...')
+    pasta_temporaria = tempfile.mkdtemp(prefix='irf_planilha_')
+    caminho_abas_novas = os.path.join(pasta_temporaria, 'abas_atualizadas.xlsx') if destino_existe else caminho_destino
+    workbook = xlsxwriter.Workbook(caminho_abas_novas, OPCOES_WORKBOOK)
+    df_base = df.iloc[plano['posicoes']] if plano is not None else df
+    abas_atualizadas = [] if plano is not None else [nome_aba_destino]
+
+    with etapa('escrever_abas', linhas_entrada=len(df_base)):
+        # Cria formato de data
+        date_format = workbook.add_format({'num_format': 'dd/mm/yyyy'})
+
+        # Cria aba Base OTP (primeira aba) e escreve os dados por coluna
+        escrever_dataframe(
+            workbook, nome_aba_destino, df_base,
+            colunas_data=[coluna for coluna in COLUNAS_DATA if coluna in df.columns],
+            formato_data=date_format,
+        )
+
+        log_message('📋 Dados atualizados na planilha Base OTP.')
+
+        # Cria aba RNC Base como segunda aba se houver dados do EXPORT
+        if df_export is not None:
+            aba_rnc = 'RNC Base'
+
+            # Escreve os dados por coluna (as linhas precisam sair em ordem no modo constant_memory)
+            escrever_dataframe(
+                workbook, aba_rnc, df_export,
+                colunas_data=['Notification Date'] if 'Notification Date' in df_export.columns else [],
+                formato_data=date_format,
+            )
+
+            abas_atualizadas.append(aba_rnc)
+            log_message('📋 Dados atualizados na planilha RNC Base.')
+
+        # Fecha o workbook
+        workbook.close()
+
+    with etapa('substituir_abas'):
+        # Substitui as abas atualizadas na planilha de destino e acrescenta os novos fornecedores
+        if destino_existe:
+            try:
+                log_message('📦 Substituindo abas atualizadas e preservando as demais...')
+                substituir_abas(
+                    caminho_destino, caminho_abas_novas, abas_atualizadas,
+                    linhas_acrescentar={aba_fornecedores: [[fornecedor] for fornecedor in novos_fornecedores]},
+                    reescrever_linhas={nome_aba_destino: plano} if plano is not None else None,
+                )
+            except Exception as e:
+                log_message(f'❌ Erro ao atualizar a planilha de destino (arquivo mantido sem alterações): {e}')
+                return None
+            finally:
+                shutil.rmtree(pasta_temporaria, ignore_errors=True)
+        else:
+            shutil.rmtree(pasta_temporaria, ignore_errors=True)
+    return True
+
+def executar_atualizacao(arquivo_origem=None, arquivo_export=None):
+    """
+    Executa a atualização da planilha dentro da execução instrumentada (ver `main`).
+    """
+    log_message('🚀 Início do processo de atualização de planilha.')
+
+    if arquivo_origem is None:
+        arquivo_origem, arquivo_export = selecionar_arquivos()
+    if not arquivo_origem:
+        log_message("❌ Nenhum arquivo de origem CSV encontrado com 'CELONIS' e 14 dígitos no início do nome.")
+        return None
+    log_message(f'✅ Arquivo de origem CELONIS selecionado: {arquivo_origem}')
+    if arquivo_export:
+        log_message(f'✅ Arquivo de origem EXPORT selecionado: {arquivo_export}')
+
+    # As três leituras (CSV CELONIS, EXPORT e planilha de destino na rede) não dependem umas das
+    # outras e rodam em paralelo; o delta só depende do CSV. O EXPORT (openpyxl, Python puro)
+    # é lido em outro processo para não disputar o GIL com as demais leituras
+    grafo = ExecutorEtapas('ler_origens')
+    grafo.adicionar('ler_csv_celonis', ler_csv_otp, argumentos=(arquivo_origem,), linhas_saida=len)
+    if MODO_INCREMENTAL:
+        grafo.adicionar('calcular_delta', ler_delta, dependencias=('ler_csv_celonis',),
+                        linhas_saida=lambda delta: delta['total'])
+    if arquivo_export:
+        grafo.adicionar('ler_export_rnc', ler_export, argumentos=(arquivo_export,), em_processo=True, linhas_saida=len)
+    grafo.adicionar('ler_base_fornecedores', ler_valores_sap, argumentos=(caminho_destino,))
+    try:
+        leituras = grafo.executar()
+    except Exception as e:
+        log_message(f'❌ Erro ao ler os arquivos de origem: {e}')
+        return None
+
+    # Dados do CSV com os tipos do esquema (datas já convertidas na leitura)
+    df = leituras['ler_csv_celonis']
+    log_message(f'📊 {len(df)} linhas copiadas da planilha de origem.')
+    delta = leituras.get('calcular_delta')
+    df_export = leituras.get('ler_export_rnc')
+
+    # Verifica se há algo novo a gravar; sem mudanças, a planilha de destino é mantida como está
+    export_alterado = df_export is not None and arquivo_alterado('export', arquivo_export)
+    if delta is not None and delta['total'] == 0 and not export_alterado and os.path.exists(caminho_destino):
+        log_message('✅ Nenhuma alteração desde o último export ingerido. Planilha de destino mantida.')
+        return False
+
+    # --- LÓGICA PARA ATUALIZAR 'Base Fornecedores' ---
+    # Lista para armazenar novos fornecedores
+    novos_fornecedores = []
+    destino_existe = os.path.exists(caminho_destino)
+    valores_sap = leituras['ler_base_fornecedores']
+
+    # Verifica se a aba existe
+    if valores_sap is None:
+        log_message(f"⚠️ Aba '{aba_fornecedores}' inexistente na planilha de destino.")
+    elif coluna_vendor not in df.columns:
+        log_message(f"❌ Coluna '{coluna_vendor}' não encontrada no arquivo de origem!")
+    else:
+        # Filtra valores únicos da coluna 'Vendor' do DataFrame de origem, comparados já normalizados
+        # (códigos numéricos são acrescentados como número, como os já existentes na SAP-LIFNR)
+        novos_vendors = {normalizar_fornecedor(vendor) for vendor in df[coluna_vendor].dropna().unique()}
+        novos_a_adicionar = novos_vendors - valores_sap
+        log_message(f'🔍 {len(novos_a_adicionar)} novos fornecedores a adicionar.')
+
+        # Armazena os novos fornecedores para adicionar depois (números antes dos textos)
+        if novos_a_adicionar:
+            novos_fornecedores = sorted(novos_a_adicionar, key=lambda codigo: (isinstance(codigo, str), str(codigo).zfill(20)))
+
+    # Com o índice da última ingestão e a planilha de destino como ela foi gravada, só as
+    # linhas alteradas, inseridas ou deslocadas da aba Base OTP são reescritas
+    plano = planejar_linhas(delta, df) if destino_existe else None
+    if df_export is not None:
+        preparar_rnc(df_export)
+
+    gravada = gravar_destino(df, df_export, novos_fornecedores, plano)
+    if gravada is None and plano is not None:
+        log_message('⚠️ Não foi possível reescrever só as linhas alteradas; reescrevendo a aba Base OTP inteira.')
+        plano = None
+        gravada = gravar_destino(df, df_export, novos_fornecedores)
+    if gravada is None:
+        return None
+    log_message(f"🎉 Dados atualizados em: {caminho_destino}")
+
+    # Registra o que foi ingerido somente depois que a planilha foi gravada
+    with etapa('persistir_delta'):
+        if delta is not None:
+            persistir_delta(delta, arquivo_origem, plano=plano, caminho_planilha=caminho_destino)
+            log_message(f'💾 Índice da ingestão atualizado ({delta["total"]} linhas alteradas).')
+        if export_alterado:
+            registrar_arquivo('export', arquivo_export)
+    return True
+
+def main(arquivo_origem=None, arquivo_export=None):
+    """
+    Atualiza a planilha de destino com os últimos exports CELONIS e EXPORT.
+
+    Sem arquivos informados, usa os mais recentes de `caminho_origem`. O
+    monitor de pasta (`monitor_pasta.py`) informa os arquivos que detectou.
+
+    Args:
+        arquivo_origem (str): CSV CELONIS a ingerir (se None, busca os arquivos na pasta de origem)
+        arquivo_export (str): Planilha EXPORT (usada só com `arquivo_origem` informado)
+
+    Returns:
+        bool: True se a planilha foi atualizada, False se não havia alterações e
+            None em caso de erro
+    """
+    # Mede cada etapa (tempo, CPU, memória e linhas); o resumo é mostrado ao final do processo
+    with execucao('atualizar_planilha') as registro:
+        atualizada = executar_atualizacao(arquivo_origem, arquivo_export)
+        if atualizada is None:
+            registro.finalizar('erro')
+        return atualizada
+
+if __name__ == "__main__":
+    exit(1 if main() is None else 0)
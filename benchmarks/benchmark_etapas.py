@@ -0,0 +1,432 @@
+"""# Benchmark das etapas do IRF
+
+Mede o tempo (relógio e CPU) e a memória de cada etapa do `irf.py` e dos
+escritores do `atualizar_planilha.py` com bases OTP sintéticas
+(`dados_sinteticos.py`) de tamanhos diferentes, e grava o resultado em JSON
+para comparar commits.
+
+Uso:
+    python benchmarks/benchmark_etapas.py --tamanhos 10000 100000 1000000
+    python benchmarks/benchmark_etapas.py --comparar benchmarks/resultados/<anterior>.json
+
+Memória: `pico_rss_mb` é o pico de memória residente do processo durante a
+etapa (Linux, via /proc). Com `--tracemalloc`, `pico_python_mb` traz também o
+pico das alocações rastreadas pelo tracemalloc (inclui os arrays do NumPy),
+mas as etapas ficam várias vezes mais lentas: só compare tempos de execuções
+com a mesma opção.
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+PASTA_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+PASTA_PROJETO = os.path.dirname(PASTA_BENCHMARKS)
+sys.path.insert(0, PASTA_PROJETO)
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+import cache_base
+import cache_previsoes
+import espelho_local
+import irf
+from dados_sinteticos import criar_modelo_sintetico, gerar_base_otp
+from escritor_excel import OPCOES_WORKBOOK, escrever_dataframe
+from esquema_otp import COLUNAS_DATA
+from instrumentacao import log_message, pico_rss_mb, reiniciar_pico_rss
+from pacote_xlsx import substituir_abas
+
+PASTA_RESULTADOS = os.path.join(PASTA_BENCHMARKS, 'resultados')
+TAMANHOS_PADRAO = [10_000, 100_000, 1_000_000, 5_000_000]
+# Acima disso a leitura do Excel (openpyxl) levaria muito tempo; a leitura é medida pelo snapshot
+LIMITE_LEITURA_EXCEL = 100_000
+# Limite de linhas de uma aba do Excel (sem o cabeçalho)
+LIMITE_LINHAS_EXCEL = 1_048_575
+# Piora de tempo, em relação à referência, considerada regressão
+TOLERANCIA_REGRESSAO = 0.20
+
+# Os arquivos do benchmark já são locais; o espelho só acrescentaria uma cópia à medida
+espelho_local.USAR_ESPELHO = False
+
+def _linhas(resultado):
+    """
+    Conta as linhas da saída de uma etapa.
+
+    Args:
+        resultado: Saída da etapa (DataFrame, tupla de DataFrames ou outro objeto)
+
+    Returns:
+        int: Linhas da saída (None quando não se aplica)
+    """
+    if isinstance(resultado, tuple):
+        return sum(_linhas(parte) or 0 for parte in resultado)
+    if isinstance(resultado, pd.DataFrame):
+        return len(resultado)
+    return None
+
+def _silencioso(funcao, *args, **kwargs):
+    """
+    Executa uma função escondendo as mensagens impressas.
+
+    Args:
+        funcao (callable): Função a executar
+
+    Returns:
+        object: Retorno da função
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        return funcao(*args, **kwargs)
+
+def medir_etapa(nome, linhas, preparar, executar, repeticoes=1, rastrear_memoria=False, verboso=False):
+    """
+    Executa uma etapa e mede tempo, CPU e memória.
+
+    Args:
+        nome (str): Nome da etapa
+        linhas (int): Tamanho da base sintética
+        preparar (callable): Monta os argumentos da etapa (fora da medição)
+        executar (callable): Executa a etapa com os argumentos de `preparar`
+        repeticoes (int): Quantidade de execuções (fica a de menor tempo)
+        rastrear_memoria (bool): Se True, mede o pico do tracemalloc
+        verboso (bool): Se False, esconde as mensagens impressas pela etapa
+
+    Returns:
+        dict: Medidas da etapa
+    """
+    melhor = None
+    for _ in range(repeticoes):
+        argumentos = preparar()
+        gc.collect()
+        reiniciar_pico_rss()
+        if rastrear_memoria:
+            tracemalloc.start()
+        saida = contextlib.nullcontext() if verboso else contextlib.redirect_stdout(io.StringIO())
+        inicio, inicio_cpu = time.perf_counter(), time.process_time()
+        with saida:
+            resultado = executar(*argumentos)
+        segundos, cpu = time.perf_counter() - inicio, time.process_time() - inicio_cpu
+        pico_python = None
+        if rastrear_memoria:
+            pico_python = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+            tracemalloc.stop()
+        medida = {
+            'etapa': nome,
+            'linhas': linhas,
+            'segundos': round(segundos, 4),
+            'cpu_segundos': round(cpu, 4),
+            'pico_rss_mb': None if pico_rss_mb() is None else round(pico_rss_mb(), 1),
+            'pico_python_mb': None if pico_python is None else round(pico_python, 1),
+            'linhas_saida': _linhas(resultado),
+        }
+        if melhor is None or medida['segundos'] < melhor['segundos']:
+            melhor = medida
+        del argumentos, resultado
+    log_message(f"⏱️ {nome} ({linhas} linhas): {melhor['segundos']:.3f}s, "
+                f"CPU {melhor['cpu_segundos']:.3f}s, pico RSS {melhor['pico_rss_mb']} MB")
+    return melhor
+
+def _preparar_snapshot(df, pasta):
+    """
+    Grava o snapshot Parquet da base como se ela tivesse sido lida do Excel.
+
+    Cria um arquivo de origem de referência, para que `carregar_base_otp` use o
+    snapshot (caminho de todo dia) sem precisar gravar um Excel grande.
+
+    Args:
+        df (pandas.DataFrame): Base sintética
+        pasta (str): Pasta temporária do benchmark
+
+    Returns:
+        str: Caminho do arquivo de origem
+    """
+    caminho_origem = os.path.join(pasta, 'OTP - Base.xlsx')
+    with open(caminho_origem, 'wb') as arquivo:
+        arquivo.write(b'benchmark')
+    estado = os.stat(caminho_origem)
+    caminho_parquet, caminho_meta = cache_base._caminhos_snapshot(caminho_origem, cache_base.ABA_BASE_OTP, cache_base.PASTA_CACHE)
+    os.makedirs(cache_base.PASTA_CACHE, exist_ok=True)
+    cache_base._gravar_snapshot(cache_base.preparar_para_parquet(df.copy()), caminho_parquet)
+    cache_base._gravar_metadados(caminho_meta, {
+        'origem': os.path.abspath(caminho_origem),
+        'aba': cache_base.ABA_BASE_OTP,
+        'tamanho': estado.st_size,
+        'mtime_ns': estado.st_mtime_ns,
+        'hash': cache_base.calcular_hash_arquivo(caminho_origem),
+        'linhas': len(df),
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+    })
+    return caminho_origem
+
+def _remover_snapshot(caminho_origem):
+    """
+    Apaga o snapshot criado para o benchmark na pasta de cache do projeto.
+
+    Args:
+        caminho_origem (str): Caminho do arquivo de origem do snapshot
+    """
+    for caminho in cache_base._caminhos_snapshot(caminho_origem, cache_base.ABA_BASE_OTP, cache_base.PASTA_CACHE):
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+def _gravar_excel(df, caminho, nome_aba):
+    """
+    Grava a base em uma aba xlsx com o escritor do `atualizar_planilha.py`.
+
+    Args:
+        df (pandas.DataFrame): Dados
+        caminho (str): Arquivo xlsx de destino
+        nome_aba (str): Nome da aba
+
+    Returns:
+        pandas.DataFrame: Os próprios dados (para a contagem de linhas)
+    """
+    workbook = xlsxwriter.Workbook(caminho, OPCOES_WORKBOOK)
+    formato_data = workbook.add_format({'num_format': 'dd/mm/yyyy'})
+    escrever_dataframe(workbook, nome_aba, df, [coluna for coluna in COLUNAS_DATA if coluna in df.columns], formato_data)
+    workbook.close()
+    return df
+
+def _criar_destino(caminho, fornecedores):
+    """
+    Cria uma planilha de destino com as abas preservadas pelo `atualizar_planilha.py`.
+
+    Args:
+        caminho (str): Arquivo xlsx de destino
+        fornecedores (list): Códigos já cadastrados na aba "Base Fornecedores"
+    """
+    workbook = xlsxwriter.Workbook(caminho)
+    workbook.add_worksheet(cache_base.ABA_BASE_OTP).write(0, 0, 'EBELN')
+    aba = workbook.add_worksheet('Base Fornecedores')
+    aba.write(0, 0, 'SAP-LIFNR')
+    for linha, fornecedor in enumerate(fornecedores, start=1):
+        aba.write(linha, 0, fornecedor)
+    workbook.close()
+
+def executar_tamanho(linhas, pasta, repeticoes=1, rastrear_memoria=False, verboso=False, semente=0):
+    """
+    Executa todas as etapas para uma base sintética do tamanho informado.
+
+    Args:
+        linhas (int): Tamanho da base
+        pasta (str): Pasta temporária do benchmark
+        repeticoes (int): Execuções de cada etapa
+        rastrear_memoria (bool): Se True, mede o pico do tracemalloc
+        verboso (bool): Se True, mostra as mensagens das etapas
+        semente (int): Semente da base sintética
+
+    Returns:
+        list: Medidas de cada etapa
+    """
+    log_message(f"🧪 Gerando base sintética com {linhas} linhas...")
+    base = gerar_base_otp(linhas, semente=semente)
+    pasta_tamanho = os.path.join(pasta, str(linhas))
+    os.makedirs(pasta_tamanho, exist_ok=True)
+
+    def medir(nome, preparar, executar):
+        medidas.append(medir_etapa(nome, linhas, preparar, executar, repeticoes, rastrear_memoria, verboso))
+        return medidas[-1]
+
+    medidas = []
+    origem = _preparar_snapshot(base, pasta_tamanho)
+    try:
+        medir('carregar_dados', lambda: ({'dados': origem},), irf.carregar_dados)
+        df_aberto, df_entregue = _silencioso(irf.carregar_dados, {'dados': origem})
+    finally:
+        _remover_snapshot(origem)
+
+    if linhas <= LIMITE_LEITURA_EXCEL:
+        # Leitura completa do Excel (snapshot inexistente ou desatualizado)
+        origem_excel = os.path.join(pasta_tamanho, 'excel', 'OTP - Base.xlsx')
+        os.makedirs(os.path.dirname(origem_excel), exist_ok=True)
+        _gravar_excel(base, origem_excel, cache_base.ABA_BASE_OTP)
+
+        def _preparar_leitura():
+            _remover_snapshot(origem_excel)
+            return ({'dados': origem_excel},)
+        try:
+            medir('carregar_dados_excel', _preparar_leitura, irf.carregar_dados)
+        finally:
+            _remover_snapshot(origem_excel)
+
+    medir('indice_carga', lambda: (irf.montar_referencia_carga(df_aberto, df_entregue),),
+          lambda referencia: irf.obter_indice(referencia, caminho=None))
+    indice = irf.obter_indice(irf.montar_referencia_carga(df_aberto, df_entregue), caminho=None)
+    medir('processar_dados', lambda: (df_aberto.copy(),),
+          lambda df: irf.processar_dados(df, usar_cache=False, indice=indice))
+    medir('calcular_carga_fornecedor', lambda: (df_entregue,),
+          lambda df: irf.calcular_carga_fornecedor(df, salvar_csv=False))
+
+    processado = _silencioso(irf.processar_dados, df_aberto.copy(), usar_cache=False, indice=indice)
+    caminho_modelo = os.path.join(pasta_tamanho, 'modelo', 'modelo_benchmark')
+    _silencioso(criar_modelo_sintetico, df_entregue, caminho_modelo)
+    modelo = _silencioso(irf.carregar_modelo, caminho_modelo)
+    medir('validar_dados', lambda: (df_aberto,), lambda df: irf.validar_dados(df, modelo))
+    # Sem o cache de previsões: as etapas medem o modelo, e o cache do projeto não recebe as POs sintéticas
+    medir('fazer_previsoes', lambda: (processado.copy(),), lambda df: irf.fazer_previsoes(modelo, df, usar_cache=False))
+    medir('fazer_previsoes_explicadas', lambda: (processado.copy(),),
+          lambda df: irf.fazer_previsoes(modelo, df, usar_cache=False, explicar=True))
+    previsoes = _silencioso(irf.fazer_previsoes, modelo, processado.copy(), usar_cache=False)
+
+    # Caminho do cache de previsões com todas as linhas reaproveitadas, em um cache temporário
+    arquivo_cache = cache_previsoes.ARQUIVO_CACHE
+    cache_previsoes.ARQUIVO_CACHE = os.path.join(pasta_tamanho, 'previsoes', 'cache_previsoes.parquet')
+    try:
+        _silencioso(irf.fazer_previsoes, modelo, processado.copy())
+        medir('fazer_previsoes_cache', lambda: (processado.copy(),), lambda df: irf.fazer_previsoes(modelo, df))
+    finally:
+        cache_previsoes.ARQUIVO_CACHE = arquivo_cache
+    medir('criar_matriz_fornecedores', lambda: (previsoes,), irf.criar_matriz_fornecedores)
+
+    if len(previsoes) <= LIMITE_LINHAS_EXCEL:
+        pasta_historico = os.path.join(pasta_tamanho, 'historico')
+        os.makedirs(pasta_historico, exist_ok=True)
+        medir('salvar_resultados', lambda: (previsoes,), lambda df: irf.salvar_resultados(df, pasta_historico, registrar_historico=False))
+    else:
+        log_message(f"⏭️ salvar_resultados ignorado: {len(previsoes)} linhas passam do limite do Excel")
+
+    if linhas <= LIMITE_LINHAS_EXCEL:
+        # Escritores do atualizar_planilha.py: aba "Base OTP" e substituição das abas no destino
+        caminho_abas = os.path.join(pasta_tamanho, 'abas_atualizadas.xlsx')
+        medir('escrever_base_otp', lambda: (base, caminho_abas, cache_base.ABA_BASE_OTP), _gravar_excel)
+        caminho_destino = os.path.join(pasta_tamanho, 'destino.xlsx')
+        fornecedores = sorted(base['Vendor'].astype(str).unique())
+        novos = fornecedores[len(fornecedores) // 2:]
+
+        def _preparar_destino():
+            _criar_destino(caminho_destino, fornecedores[:len(fornecedores) // 2])
+            return (caminho_destino, caminho_abas, [cache_base.ABA_BASE_OTP])
+        medir('substituir_abas', _preparar_destino,
+              lambda destino, abas, nomes: substituir_abas(destino, abas, nomes, {'Base Fornecedores': [[f] for f in novos]}))
+    else:
+        log_message(f"⏭️ Escritores do atualizar_planilha.py ignorados: {linhas} linhas passam do limite do Excel")
+
+    shutil.rmtree(pasta_tamanho, ignore_errors=True)
+    return medidas
+
+def _commit_atual():
+    """
+    Identifica o commit do projeto (com '+' quando há alterações não commitadas).
+
+    Returns:
+        str: Hash curto do commit ou None fora de um repositório git
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PASTA_PROJETO,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        alterado = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=PASTA_PROJETO,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        return f"{commit}+" if alterado else commit
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _ambiente():
+    """
+    Descreve a máquina e as versões das bibliotecas usadas na medição.
+
+    Returns:
+        dict: Informações do ambiente
+    """
+    import lightgbm
+    import pyarrow
+    return {
+        'commit': _commit_atual(),
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'plataforma': platform.platform(),
+        'processador': platform.processor() or platform.machine(),
+        'nucleos': os.cpu_count(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'pyarrow': pyarrow.__version__,
+        'lightgbm': lightgbm.__version__,
+    }
+
+def comparar(atual, referencia, tolerancia=TOLERANCIA_REGRESSAO):
+    """
+    Compara duas execuções do benchmark etapa a etapa.
+
+    Args:
+        atual (dict): Resultado atual
+        referencia (dict): Resultado de referência (ex.: commit anterior)
+        tolerancia (float): Piora relativa de tempo considerada regressão
+
+    Returns:
+        list: Etapas com regressão, como (etapa, linhas, razão entre os tempos)
+    """
+    if atual.get('tracemalloc') != referencia.get('tracemalloc'):
+        log_message("⚠️ As execuções diferem no uso do tracemalloc; os tempos não são comparáveis")
+    if atual['ambiente'].get('nucleos') != referencia['ambiente'].get('nucleos'):
+        log_message("⚠️ A referência foi medida em uma máquina com outra quantidade de núcleos")
+    anteriores = {(m['etapa'], m['linhas']): m for m in referencia['medidas']}
+    regressoes = []
+    print(f"{'etapa':<28}{'linhas':>10}{'ref (s)':>11}{'atual (s)':>11}{'razão':>8}{'RSS ref':>10}{'RSS atual':>11}")
+    for medida in atual['medidas']:
+        anterior = anteriores.get((medida['etapa'], medida['linhas']))
+        if anterior is None:
+            continue
+        razao = medida['segundos'] / max(anterior['segundos'], 1e-9)
+        marca = ''
+        if razao > 1 + tolerancia:
+            regressoes.append((medida['etapa'], medida['linhas'], razao))
+            marca = '  ⚠️'
+        print(f"{medida['etapa']:<28}{medida['linhas']:>10}{anterior['segundos']:>11.3f}{medida['segundos']:>11.3f}"
+              f"{razao:>8.2f}{str(anterior['pico_rss_mb']):>10}{str(medida['pico_rss_mb']):>11}{marca}")
+    return regressoes
+
+def main():
+    """
+    Executa o benchmark pela linha de comando.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark das etapas do IRF com dados sintéticos')
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS_PADRAO, help='Linhas das bases sintéticas')
+    parser.add_argument('--repeticoes', type=int, default=1, help='Execuções de cada etapa (fica a mais rápida)')
+    parser.add_argument('--saida', help='Arquivo JSON do resultado (padrão: benchmarks/resultados/<data>_<commit>.json)')
+    parser.add_argument('--comparar', help='Resultado de referência para comparação')
+    parser.add_argument('--tracemalloc', action='store_true', help='Mede também o pico do tracemalloc (bem mais lento)')
+    parser.add_argument('--verboso', action='store_true', help='Mostra as mensagens de cada etapa')
+    parser.add_argument('--semente', type=int, default=0, help='Semente das bases sintéticas')
+    args = parser.parse_args()
+
+    resultado = {'ambiente': _ambiente(), 'tracemalloc': args.tracemalloc, 'medidas': []}
+    pasta = tempfile.mkdtemp(prefix='irf_benchmark_')
+    try:
+        for linhas in args.tamanhos:
+            resultado['medidas'].extend(executar_tamanho(
+                linhas, pasta, args.repeticoes, args.tracemalloc, args.verboso, args.semente,
+            ))
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    caminho = args.saida
+    if caminho is None:
+        os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+        nome = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{resultado['ambiente']['commit'] or 'sem-commit'}.json"
+        caminho = os.path.join(PASTA_RESULTADOS, nome)
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+    log_message(f"💾 Resultado salvo em: {caminho}")
+
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as arquivo:
+            referencia = json.load(arquivo)
+        regressoes = comparar(resultado, referencia)
+        if regressoes:
+            log_message(f"⚠️ {len(regressoes)} etapa(s) mais de {TOLERANCIA_REGRESSAO:.0%} mais lentas que a referência")
+            sys.exit(1)
+        log_message("✅ Nenhuma regressão de tempo em relação à referência")
+
+if __name__ == "__main__":
+    main()
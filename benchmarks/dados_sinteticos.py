@@ -0,0 +1,170 @@
+"""# Dados sintéticos da base OTP para benchmarks
+
+Gera bases no formato da aba "Base OTP" (colunas e tipos de `esquema_otp.py`)
+com distribuições parecidas com as reais: poucos fornecedores concentram a
+maior parte das POs, cada PO tem de 1 a 5 itens, prazos de entrega variados,
+tolerância em dias úteis e um histórico de entregas em que a pontualidade
+depende do fornecedor. Também cria um artefato de inferência (booster LightGBM
+e especificação de pré-processamento) para medir as previsões sem o modelo da
+rede.
+"""
+
+import json
+import os
+import sys
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artefato_inferencia import VERSAO_ARTEFATO, CASAS_DECIMAIS_SCORE, caminhos_artefato
+from esquema_otp import aplicar_esquema
+from features_irf import FEATURES_MODELO, calcular_features
+
+# Período coberto pelas datas de emissão (BEDAT), em dias até a data de referência
+DIAS_HISTORICO = 730
+# Fração das linhas ainda em aberto (sem entrega)
+FRACAO_EM_ABERTO = 0.25
+PRIMEIRA_PO = 4500000000
+
+def _quantidade_fornecedores(linhas):
+    """
+    Define quantos fornecedores existem em uma base com o número de linhas informado.
+
+    Args:
+        linhas (int): Linhas da base
+
+    Returns:
+        int: Quantidade de fornecedores
+    """
+    return int(np.clip(np.sqrt(linhas) * 4, 50, 20_000))
+
+def gerar_base_otp(linhas, semente=0, data_referencia=None):
+    """
+    Gera uma base OTP sintética com o esquema da aba "Base OTP".
+
+    Args:
+        linhas (int): Quantidade de linhas (itens de PO)
+        semente (int): Semente do gerador aleatório
+        data_referencia (pandas.Timestamp): "Hoje" da base (padrão: data atual)
+
+    Returns:
+        pandas.DataFrame: Base com os tipos de `esquema_otp.py`
+    """
+    rng = np.random.default_rng(semente)
+    hoje = pd.Timestamp(data_referencia or datetime.today()).normalize()
+
+    # POs com 1 a 5 itens (10, 20, ...)
+    itens_por_po = rng.integers(1, 6, size=linhas // 2 + 1)
+    po = np.repeat(np.arange(len(itens_por_po)), itens_por_po)[:linhas]
+    inicio_po = np.r_[0, np.flatnonzero(np.diff(po)) + 1]
+    item = (np.arange(linhas) - np.repeat(inicio_po, np.diff(np.r_[inicio_po, linhas]))) + 1
+
+    # Fornecedores com distribuição de Zipf (poucos concentram a maior parte das POs)
+    n_fornecedores = _quantidade_fornecedores(linhas)
+    pesos = 1 / np.arange(1, n_fornecedores + 1) ** 1.1
+    fornecedor_po = rng.choice(n_fornecedores, size=len(itens_por_po), p=pesos / pesos.sum())
+    fornecedor = fornecedor_po[po]
+    codigos_fornecedor = np.array([f'{100000 + i:010d}' for i in range(n_fornecedores)], dtype=object)
+    pontualidade = rng.beta(6, 2, size=n_fornecedores)
+
+    n_grupos = 300
+    grupo = rng.integers(0, n_grupos, size=linhas)
+    codigos_grupo = np.array([f'MG{i:04d}' for i in range(n_grupos)], dtype=object)
+
+    # Datas: emissão espalhada no histórico, prazo de 5 a ~180 dias
+    bedat_po = hoje - pd.to_timedelta(rng.integers(0, DIAS_HISTORICO, size=len(itens_por_po)), unit='D')
+    bedat = bedat_po[po]
+    prazo = np.clip(rng.lognormal(3.3, 0.6, size=linhas), 5, 180).astype(int)
+    due = bedat + pd.to_timedelta(prazo, unit='D')
+    tolerancia = rng.integers(0, 11, size=linhas)
+
+    # Entregas: atraso depende da pontualidade do fornecedor; POs recentes tendem a estar em aberto
+    atraso = np.where(rng.random(linhas) < pontualidade[fornecedor],
+                      -rng.integers(0, 10, size=linhas), rng.integers(1, 45, size=linhas))
+    entrega = due + pd.to_timedelta(atraso, unit='D')
+    chance_aberto = FRACAO_EM_ABERTO * 2 * np.clip((bedat - (hoje - pd.Timedelta(days=DIAS_HISTORICO))).days / DIAS_HISTORICO, 0, 1)
+    em_aberto = (rng.random(linhas) < chance_aberto) | (entrega > hoje)
+    entrega = pd.Series(entrega).where(~em_aberto)
+
+    valor = np.round(rng.lognormal(7, 1.5, size=linhas), 2)
+    valor_doc = np.where(rng.random(linhas) < 0.01, 0.0, valor)
+
+    df = pd.DataFrame({
+        'EBELN': PRIMEIRA_PO + po,
+        'EBELP': item * 10,
+        'Vendor': pd.Categorical.from_codes(fornecedor, codigos_fornecedor),
+        'Vendor Name': pd.Categorical.from_codes(fornecedor, np.array([f'Fornecedor {i}' for i in range(n_fornecedores)])),
+        'MATKL': pd.Categorical.from_codes(grupo, codigos_grupo),
+        'Material Text (AST or Short Text)': pd.Categorical.from_codes(grupo, np.array([f'Item do grupo {i}' for i in range(n_grupos)])),
+        'BEDAT': bedat,
+        'Due Date (incl. ex works time)': due,
+        'GR Document Date': entrega,
+        'Delivery Date': entrega,
+        'Delivery Tolerance (Work Days)': tolerancia,
+        'NetOrderValue': valor,
+        'Net Order Value in Doc. Curr.': valor_doc,
+        'On Time': np.where(em_aberto, np.nan, (atraso <= 0).astype(float)),
+    })
+    df['Vendor Name'] = df['Vendor Name'].astype(str)
+    df['Material Text (AST or Short Text)'] = df['Material Text (AST or Short Text)'].astype(str)
+    return aplicar_esquema(df)
+
+def criar_modelo_sintetico(df_entregue, caminho_modelo, rodadas=100, semente=0):
+    """
+    Treina um LightGBM nos pedidos entregues e grava um artefato de inferência.
+
+    As categorias são codificadas pela taxa de atraso (como o TargetEncoder do
+    pipeline do PyCaret), no mesmo formato lido por `ModeloInferencia`.
+
+    Args:
+        df_entregue (pandas.DataFrame): Pedidos entregues da base sintética
+        caminho_modelo (str): Caminho do modelo (o artefato é gravado ao lado)
+        rodadas (int): Rodadas de boosting
+        semente (int): Semente do LightGBM
+
+    Returns:
+        str: Caminho do modelo, para `irf.carregar_modelo`
+    """
+    import lightgbm as lgb
+
+    df = calcular_features(aplicar_esquema(df_entregue.copy()), usar_cache=False)
+    alvo = (df['On Time'] == 0).astype(int).to_numpy()
+    media = float(alvo.mean())
+
+    categoricas, numericas = {}, {}
+    matriz = np.empty((len(df), len(FEATURES_MODELO)))
+    for i, coluna in enumerate(FEATURES_MODELO):
+        if isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            taxa = pd.Series(alvo).groupby(df[coluna].astype(str).to_numpy()).mean()
+            categoricas[coluna] = {
+                'imputacao': str(df[coluna].mode().iloc[0]),
+                'saidas': [coluna],
+                'mapa': {categoria: [float(valor)] for categoria, valor in taxa.items()},
+                'desconhecida': [media],
+            }
+            matriz[:, i] = taxa.reindex(df[coluna].astype(str)).to_numpy()
+        else:
+            valores = pd.to_numeric(df[coluna], errors='coerce').to_numpy(dtype=float)
+            numericas[coluna] = float(np.nanmean(valores))
+            matriz[:, i] = np.where(np.isnan(valores), numericas[coluna], valores)
+
+    parametros = {'objective': 'binary', 'num_leaves': 31, 'learning_rate': 0.1, 'seed': semente, 'verbosity': -1}
+    booster = lgb.train(parametros, lgb.Dataset(matriz, label=alvo), num_boost_round=rodadas)
+
+    caminho_booster, caminho_spec = caminhos_artefato(caminho_modelo)
+    os.makedirs(os.path.dirname(caminho_booster) or '.', exist_ok=True)
+    booster.save_model(caminho_booster)
+    with open(caminho_spec, 'w', encoding='utf-8') as arquivo:
+        json.dump({
+            'versao': VERSAO_ARTEFATO,
+            'gerado_em': datetime.now().isoformat(timespec='seconds'),
+            'colunas_entrada': FEATURES_MODELO,
+            'numericas': numericas,
+            'categoricas': categoricas,
+            'ordem_features': FEATURES_MODELO,
+            'classes': [0, 1],
+            'casas_decimais': CASAS_DECIMAIS_SCORE,
+        }, arquivo, ensure_ascii=False)
+    return caminho_modelo
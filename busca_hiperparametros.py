@@ -0,0 +1,341 @@
+"""# Busca paralela de hiperparâmetros do LightGBM
+
+Alternativa ao `tune_model` do PyCaret para o treinamento do IRF. As
+configurações sorteadas são avaliadas em validação cruzada, com as combinações
+(configuração, fold) distribuídas entre todos os núcleos por um pool de
+processos, e podadas por *successive halving*: todas começam com poucas
+rodadas de boosting e só a melhor fração de cada etapa segue com mais rodadas.
+
+A busca respeita um limite de tempo e de tentativas, e cada avaliação é gravada
+em um histórico JSONL; uma busca interrompida continua de onde parou, sem
+repetir avaliações já feitas.
+
+O pré-processamento de cada fold (imputação, codificação e balanceamento do
+pipeline do PyCaret) não depende dos hiperparâmetros, então é feito uma única
+vez antes da busca e compartilhado com os processos via arquivos `.npy`.
+"""
+
+import hashlib
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+import numpy as np
+from instrumentacao import log_message
+
+VERSAO_ESPACO = 1
+# Fração das configurações que avança para a próxima etapa (1 / ETA)
+ETA = 3
+RODADAS_MINIMAS = 50
+RODADAS_MAXIMAS = 1000
+PACIENCIA_PARADA = 50  # Rodadas sem melhora na validação para parar cedo
+PASTA_HISTORICO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+ARQUIVO_HISTORICO = os.path.join(PASTA_HISTORICO, 'historico_busca_lightgbm.jsonl')
+
+# Valores discretos do espaço de busca (semelhantes à grade do PyCaret para o LightGBM)
+_NUM_LEAVES = [2, 4, 6, 8, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100, 150, 200, 256]
+_MIN_CHILD_SAMPLES = [1, 5, 10, 15, 20, 25, 30, 40, 50, 60, 70, 80, 90, 100]
+
+# Folds carregados em cada processo do pool (definidos em _iniciar_processo)
+_FOLDS = None
+
+def sortear_configuracoes(quantidade, semente):
+    """
+    Sorteia configurações de hiperparâmetros do LightGBM.
+
+    O sorteio é determinístico: com a mesma semente, a configuração de cada
+    tentativa é sempre a mesma, o que permite retomar uma busca.
+
+    Args:
+        quantidade (int): Quantidade de configurações
+        semente (int): Semente do sorteio
+
+    Returns:
+        list: Dicionários de hiperparâmetros (nomes do LGBMClassifier)
+    """
+    rng = np.random.default_rng(semente)
+    configuracoes = []
+    for _ in range(quantidade):
+        configuracoes.append({
+            'num_leaves': int(rng.choice(_NUM_LEAVES)),
+            'learning_rate': float(10 ** rng.uniform(-3, math.log10(0.5))),
+            'min_child_samples': int(rng.choice(_MIN_CHILD_SAMPLES)),
+            'reg_alpha': float(10 ** rng.uniform(-10, 1)),
+            'reg_lambda': float(10 ** rng.uniform(-10, 1)),
+            'colsample_bytree': float(rng.uniform(0.4, 1.0)),
+            'subsample': float(rng.uniform(0.4, 1.0)),
+            'subsample_freq': int(rng.integers(0, 8)),
+            'min_split_gain': float(rng.uniform(0.0, 1.0)),
+        })
+    return configuracoes
+
+def etapas_rodadas(rodadas_minimas=RODADAS_MINIMAS, rodadas_maximas=RODADAS_MAXIMAS, eta=ETA):
+    """
+    Calcula a quantidade de rodadas de boosting de cada etapa do successive halving.
+
+    Args:
+        rodadas_minimas (int): Rodadas da primeira etapa
+        rodadas_maximas (int): Rodadas da última etapa
+        eta (int): Fator de crescimento entre etapas
+
+    Returns:
+        list: Rodadas de cada etapa, em ordem crescente
+    """
+    etapas = []
+    rodadas = rodadas_minimas
+    while rodadas < rodadas_maximas:
+        etapas.append(int(rodadas))
+        rodadas *= eta
+    etapas.append(int(rodadas_maximas))
+    return etapas
+
+def preparar_folds_pycaret(pasta):
+    """
+    Aplica o pré-processamento do experimento PyCaret atual a cada fold da validação cruzada.
+
+    Usa o mesmo gerador de folds do `setup`. O pipeline de pré-processamento
+    (inclusive o balanceamento) é ajustado só com a parte de treino de cada fold.
+
+    Args:
+        pasta (str): Pasta onde as matrizes de cada fold são gravadas (.npy)
+
+    Returns:
+        int: Quantidade de folds preparados
+    """
+    from pycaret.classification import get_config
+    from sklearn.base import clone
+
+    pipeline = get_config('pipeline')
+    X = get_config('X_train')
+    y = get_config('y_train')
+    for k, (treino, validacao) in enumerate(get_config('fold_generator').split(X, y)):
+        pipeline_fold = clone(pipeline)
+        X_treino, y_treino = pipeline_fold.fit_transform(X.iloc[treino], y.iloc[treino])
+        X_validacao, y_validacao = pipeline_fold.transform(X.iloc[validacao], y.iloc[validacao])
+        for nome, valores in (('X_treino', X_treino), ('y_treino', y_treino),
+                              ('X_validacao', X_validacao), ('y_validacao', y_validacao)):
+            np.save(os.path.join(pasta, f"{nome}_{k}.npy"), np.asarray(valores, dtype=np.float64))
+    return k + 1
+
+def _assinatura_dados(pasta, quantidade_folds, semente):
+    """
+    Identifica os dados da busca, para que o histórico só seja reaproveitado com os mesmos dados.
+
+    Args:
+        pasta (str): Pasta com as matrizes dos folds
+        quantidade_folds (int): Quantidade de folds
+        semente (int): Semente do sorteio das configurações
+
+    Returns:
+        str: Hash dos dados, da semente e da versão do espaço de busca
+    """
+    sha = hashlib.sha256(f"v{VERSAO_ESPACO}|{semente}|{quantidade_folds}".encode('utf-8'))
+    for k in range(quantidade_folds):
+        for nome in ('X_treino', 'y_treino', 'X_validacao', 'y_validacao'):
+            sha.update(np.load(os.path.join(pasta, f"{nome}_{k}.npy"), mmap_mode='r').tobytes())
+    return sha.hexdigest()[:24]
+
+def _iniciar_processo(pasta, quantidade_folds):
+    """
+    Carrega os folds (mapeados em memória) em cada processo do pool.
+
+    Args:
+        pasta (str): Pasta com as matrizes dos folds
+        quantidade_folds (int): Quantidade de folds
+    """
+    global _FOLDS
+    _FOLDS = [
+        tuple(np.load(os.path.join(pasta, f"{nome}_{k}.npy"), mmap_mode='r')
+              for nome in ('X_treino', 'y_treino', 'X_validacao', 'y_validacao'))
+        for k in range(quantidade_folds)
+    ]
+
+def _avaliar(configuracao, rodadas, fold, semente):
+    """
+    Treina e avalia uma configuração em um fold (executado nos processos do pool).
+
+    Args:
+        configuracao (dict): Hiperparâmetros do LGBMClassifier
+        rodadas (int): Máximo de rodadas de boosting
+        fold (int): Índice do fold
+        semente (int): Semente do LightGBM
+
+    Returns:
+        dict: MCC na validação, melhor iteração e tempo gasto
+    """
+    import lightgbm as lgb
+    from sklearn.metrics import matthews_corrcoef
+
+    inicio = time.perf_counter()
+    X_treino, y_treino, X_validacao, y_validacao = _FOLDS[fold]
+    modelo = lgb.LGBMClassifier(
+        n_estimators=rodadas, random_state=semente, n_jobs=1, verbose=-1, **configuracao
+    )
+    modelo.fit(
+        X_treino, y_treino, eval_set=[(X_validacao, y_validacao)],
+        callbacks=[lgb.early_stopping(PACIENCIA_PARADA, verbose=False)],
+    )
+    previsao = modelo.predict(X_validacao)
+    return {
+        'mcc': float(matthews_corrcoef(y_validacao, previsao)),
+        'melhor_iteracao': int(modelo.best_iteration_ or rodadas),
+        'segundos': round(time.perf_counter() - inicio, 3),
+    }
+
+def _ler_historico(caminho, assinatura):
+    """
+    Lê as avaliações já feitas para os mesmos dados.
+
+    Args:
+        caminho (str): Caminho do histórico JSONL
+        assinatura (str): Assinatura dos dados da busca
+
+    Returns:
+        dict: Avaliações por (tentativa, rodadas, fold)
+    """
+    avaliacoes = {}
+    if not caminho or not os.path.exists(caminho):
+        return avaliacoes
+    with open(caminho, 'r', encoding='utf-8') as arquivo:
+        for linha in arquivo:
+            try:
+                registro = json.loads(linha)
+            except ValueError:
+                continue  # Linha incompleta de uma busca interrompida
+            if registro.get('assinatura') == assinatura:
+                avaliacoes[(registro['tentativa'], registro['rodadas'], registro['fold'])] = registro
+    return avaliacoes
+
+def _resumo(avaliacoes, tentativa, rodadas, quantidade_folds):
+    """
+    Resume as avaliações de uma tentativa em uma etapa, se todos os folds foram avaliados.
+
+    Args:
+        avaliacoes (dict): Avaliações por (tentativa, rodadas, fold)
+        tentativa (int): Índice da configuração
+        rodadas (int): Rodadas da etapa
+        quantidade_folds (int): Quantidade de folds
+
+    Returns:
+        dict: MCC médio e mediana da melhor iteração, ou None se faltar algum fold
+    """
+    registros = [avaliacoes.get((tentativa, rodadas, k)) for k in range(quantidade_folds)]
+    if any(registro is None for registro in registros):
+        return None
+    return {
+        'mcc': float(np.mean([registro['mcc'] for registro in registros])),
+        'melhor_iteracao': int(np.median([registro['melhor_iteracao'] for registro in registros])),
+    }
+
+def buscar_hiperparametros(tentativas=200, tempo_limite=None, processos=None, semente=109,
+                           caminho_historico=ARQUIVO_HISTORICO, eta=ETA,
+                           rodadas_minimas=RODADAS_MINIMAS, rodadas_maximas=RODADAS_MAXIMAS):
+    """
+    Busca os melhores hiperparâmetros do LightGBM para o experimento PyCaret atual.
+
+    Deve ser chamada depois do `setup`. Otimiza o MCC médio da validação cruzada.
+
+    Args:
+        tentativas (int): Quantidade de configurações sorteadas
+        tempo_limite (float): Tempo máximo da busca, em segundos (None para sem limite)
+        processos (int): Processos do pool (None para todos os núcleos)
+        semente (int): Semente do sorteio e do LightGBM
+        caminho_historico (str): Histórico JSONL das avaliações (None para não gravar)
+        eta (int): Fator do successive halving
+        rodadas_minimas (int): Rodadas de boosting da primeira etapa
+        rodadas_maximas (int): Rodadas de boosting da última etapa
+
+    Returns:
+        dict: Melhores hiperparâmetros (com `n_estimators`), MCC e etapa atingida,
+            ou None se nenhuma configuração foi avaliada
+    """
+    inicio = time.monotonic()
+    prazo = inicio + tempo_limite if tempo_limite else None
+    configuracoes = sortear_configuracoes(tentativas, semente)
+    etapas = etapas_rodadas(rodadas_minimas, rodadas_maximas, eta)
+    pasta = tempfile.mkdtemp(prefix='busca_lgbm_')
+    pilha = ExitStack()
+    melhor = None
+    try:
+        log_message("🧮 Preparando os folds da validação cruzada...")
+        quantidade_folds = preparar_folds_pycaret(pasta)
+        assinatura = _assinatura_dados(pasta, quantidade_folds, semente)
+        avaliacoes = _ler_historico(caminho_historico, assinatura)
+        if avaliacoes:
+            log_message(f"♻️ Retomando busca: {len(avaliacoes)} avaliações reaproveitadas do histórico")
+        if caminho_historico:
+            os.makedirs(os.path.dirname(caminho_historico) or '.', exist_ok=True)
+            historico = pilha.enter_context(open(caminho_historico, 'a', encoding='utf-8'))
+        else:
+            historico = None
+
+        processos = processos or os.cpu_count() or 1
+        log_message(f"🔧 Busca paralela: {tentativas} configurações, {quantidade_folds} folds, "
+                    f"etapas de {etapas} rodadas, {processos} processos")
+        candidatas = list(range(tentativas))
+        esgotado = False
+        with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_processo,
+                                 initargs=(pasta, quantidade_folds)) as pool:
+            for rodadas in etapas:
+                pendentes = {}
+                for tentativa in candidatas:
+                    for k in range(quantidade_folds):
+                        if (tentativa, rodadas, k) not in avaliacoes:
+                            futuro = pool.submit(_avaliar, configuracoes[tentativa], rodadas, k, semente)
+                            pendentes[futuro] = (tentativa, k)
+                while pendentes:
+                    restante = None if prazo is None else max(prazo - time.monotonic(), 0)
+                    prontos, _ = wait(pendentes, timeout=restante, return_when=FIRST_COMPLETED)
+                    if not prontos:
+                        esgotado = True
+                        break
+                    for futuro in prontos:
+                        tentativa, k = pendentes.pop(futuro)
+                        registro = {
+                            'assinatura': assinatura, 'tentativa': tentativa, 'rodadas': rodadas, 'fold': k,
+                            'parametros': configuracoes[tentativa], **futuro.result(),
+                            'registrado_em': datetime.now().isoformat(timespec='seconds'),
+                        }
+                        avaliacoes[(tentativa, rodadas, k)] = registro
+                        if historico:
+                            historico.write(json.dumps(registro, ensure_ascii=False) + '\n')
+                            historico.flush()
+                if esgotado:
+                    for futuro in pendentes:
+                        futuro.cancel()
+
+                # Ranking da etapa: só tentativas com todos os folds avaliados
+                ranking = []
+                for tentativa in candidatas:
+                    resumo = _resumo(avaliacoes, tentativa, rodadas, quantidade_folds)
+                    if resumo is not None:
+                        ranking.append((resumo['mcc'], tentativa, resumo))
+                ranking.sort(key=lambda item: item[0], reverse=True)
+                if ranking:
+                    mcc, tentativa, resumo = ranking[0]
+                    melhor = {
+                        'parametros': {**configuracoes[tentativa], 'n_estimators': resumo['melhor_iteracao']},
+                        'mcc': mcc,
+                        'tentativa': tentativa,
+                        'rodadas': rodadas,
+                    }
+                    log_message(f"📊 Etapa de {rodadas} rodadas: {len(ranking)} configurações avaliadas, "
+                                f"melhor MCC {mcc:.4f} (tentativa {tentativa})")
+                if esgotado:
+                    log_message("⏱️ Limite de tempo atingido, encerrando a busca")
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    break
+                candidatas = [tentativa for _, tentativa, _ in ranking[:max(1, len(ranking) // eta)]]
+    finally:
+        pilha.close()
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    if melhor is not None:
+        log_message(f"✅ Busca concluída em {time.monotonic() - inicio:.0f}s: MCC {melhor['mcc']:.4f} "
+                    f"com {melhor['parametros']}")
+    return melhor
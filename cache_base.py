@@ -0,0 +1,242 @@
+"""# Cache colunar da base OTP
+
+Mantém um snapshot em Parquet da aba "Base OTP" do arquivo `OTP - Base.xlsx`,
+para que `irf.py` e `modelo_irf.py` não precisem reprocessar o Excel da rede a
+cada execução. O snapshot é validado pelo tamanho, data de modificação e hash
+do conteúdo do arquivo de origem.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+import pandas as pd
+from esquema_otp import aplicar_esquema, ler_parquet_otp
+from instrumentacao import log_message
+
+# Pasta local onde os snapshots são armazenados
+PASTA_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+ABA_BASE_OTP = 'Base OTP'
+# Linhas por grupo do Parquet: a leitura em blocos decodifica um grupo de cada vez
+LINHAS_POR_GRUPO = 100_000
+
+def calcular_hash_arquivo(caminho, tamanho_bloco=1024 * 1024):
+    """
+    Calcula o hash SHA-256 do conteúdo de um arquivo, lendo em blocos.
+
+    Args:
+        caminho (str): Caminho do arquivo
+        tamanho_bloco (int): Tamanho de cada bloco lido, em bytes
+
+    Returns:
+        str: Hash hexadecimal do conteúdo
+    """
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(tamanho_bloco), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+def _caminhos_snapshot(caminho_origem, aba, pasta_cache):
+    """
+    Monta os caminhos do snapshot Parquet e do arquivo de metadados.
+
+    Args:
+        caminho_origem (str): Caminho do arquivo Excel de origem
+        aba (str): Nome da aba
+        pasta_cache (str): Pasta onde ficam os snapshots
+
+    Returns:
+        tuple: (caminho do Parquet, caminho do JSON de metadados)
+    """
+    chave = hashlib.sha1(f"{os.path.abspath(caminho_origem)}|{aba}".encode('utf-8')).hexdigest()[:12]
+    nome_base = os.path.splitext(os.path.basename(caminho_origem))[0]
+    prefixo = os.path.join(pasta_cache, f"{nome_base} - {aba} - {chave}")
+    return f"{prefixo}.parquet", f"{prefixo}.json"
+
+def _ler_metadados(caminho_meta):
+    """
+    Lê os metadados de um snapshot, se existirem.
+
+    Args:
+        caminho_meta (str): Caminho do JSON de metadados
+
+    Returns:
+        dict: Metadados do snapshot ou None se não existirem ou estiverem corrompidos
+    """
+    if not os.path.exists(caminho_meta):
+        return None
+    try:
+        with open(caminho_meta, 'r', encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+def _gravar_metadados(caminho_meta, metadados):
+    """
+    Grava os metadados de um snapshot de forma atômica.
+
+    Args:
+        caminho_meta (str): Caminho do JSON de metadados
+        metadados (dict): Metadados a gravar
+    """
+    caminho_tmp = caminho_meta + '.tmp'
+    with open(caminho_tmp, 'w', encoding='utf-8') as arquivo:
+        json.dump(metadados, arquivo, ensure_ascii=False, indent=2)
+    os.replace(caminho_tmp, caminho_meta)
+
+def preparar_para_parquet(df):
+    """
+    Ajusta colunas de texto com tipos misturados, que o Parquet não aceita.
+
+    Valores não nulos dessas colunas são convertidos para texto; os nulos são mantidos.
+
+    Args:
+        df (pandas.DataFrame): DataFrame lido do Excel
+
+    Returns:
+        pandas.DataFrame: DataFrame pronto para ser gravado em Parquet
+    """
+    for coluna in df.columns[df.dtypes == object]:
+        tipo = pd.api.types.infer_dtype(df[coluna], skipna=True)
+        if tipo not in ('string', 'empty'):
+            df[coluna] = df[coluna].where(df[coluna].isna(), df[coluna].astype(str))
+    return df
+
+def _gravar_snapshot(df, caminho_parquet):
+    """
+    Grava o snapshot em Parquet de forma atômica.
+
+    Args:
+        df (pandas.DataFrame): DataFrame a ser gravado
+        caminho_parquet (str): Caminho final do snapshot
+    """
+    caminho_tmp = caminho_parquet + '.tmp'
+    df.to_parquet(caminho_tmp, engine='pyarrow', index=False, row_group_size=LINHAS_POR_GRUPO)
+    os.replace(caminho_tmp, caminho_parquet)
+
+def _reconstruir_snapshot(caminho_origem, aba, caminho_parquet, caminho_meta, estado, hash_atual):
+    """
+    Relê a aba do Excel, aplica o esquema e grava o snapshot com seus metadados.
+
+    Args:
+        caminho_origem (str): Caminho do arquivo Excel de origem
+        aba (str): Nome da aba
+        caminho_parquet (str): Caminho do snapshot
+        caminho_meta (str): Caminho do JSON de metadados
+        estado (os.stat_result): Estado do arquivo de origem
+        hash_atual (str): Hash do conteúdo do arquivo de origem
+
+    Returns:
+        tuple: (DataFrame lido, True se o snapshot foi gravado)
+    """
+    log_message(f"📊 Arquivo de origem alterado, relendo o Excel (aba '{aba}')...")
+    df = aplicar_esquema(pd.read_excel(caminho_origem, sheet_name=aba))
+
+    try:
+        df = preparar_para_parquet(df)
+        _gravar_snapshot(df, caminho_parquet)
+        _gravar_metadados(caminho_meta, {
+            'origem': os.path.abspath(caminho_origem),
+            'aba': aba,
+            'tamanho': estado.st_size,
+            'mtime_ns': estado.st_mtime_ns,
+            'hash': hash_atual,
+            'linhas': len(df),
+            'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        })
+        log_message(f"💾 Snapshot atualizado: {caminho_parquet}")
+        return df, True
+    except Exception as e:
+        log_message(f"⚠️ Não foi possível gravar o snapshot da base: {e}")
+        return df, False
+
+def _snapshot_atual(caminho_origem, aba, pasta_cache):
+    """
+    Verifica se o snapshot corresponde ao arquivo de origem.
+
+    A validação é feita em duas etapas: se tamanho e data de modificação coincidem
+    com os do snapshot, ele é usado direto; caso contrário, o hash do conteúdo é
+    recalculado, e o snapshot só é descartado se o conteúdo realmente mudou.
+
+    Args:
+        caminho_origem (str): Caminho do arquivo Excel de origem
+        aba (str): Nome da aba
+        pasta_cache (str): Pasta onde ficam os snapshots
+
+    Returns:
+        tuple: (caminho do Parquet, caminho dos metadados, estado da origem,
+            hash da origem ou None, True se o snapshot é válido)
+    """
+    os.makedirs(pasta_cache, exist_ok=True)
+    caminho_parquet, caminho_meta = _caminhos_snapshot(caminho_origem, aba, pasta_cache)
+    estado = os.stat(caminho_origem)
+    metadados = _ler_metadados(caminho_meta)
+    snapshot_existe = metadados is not None and os.path.exists(caminho_parquet)
+
+    if snapshot_existe and metadados['tamanho'] == estado.st_size and metadados['mtime_ns'] == estado.st_mtime_ns:
+        log_message(f"⚡ Snapshot válido encontrado, lendo do cache: {caminho_parquet}")
+        return caminho_parquet, caminho_meta, estado, None, True
+
+    hash_atual = calcular_hash_arquivo(caminho_origem)
+    if snapshot_existe and metadados['hash'] == hash_atual:
+        log_message("⚡ Arquivo de origem com o mesmo conteúdo, reaproveitando o snapshot")
+        metadados.update({'tamanho': estado.st_size, 'mtime_ns': estado.st_mtime_ns})
+        _gravar_metadados(caminho_meta, metadados)
+        return caminho_parquet, caminho_meta, estado, hash_atual, True
+    return caminho_parquet, caminho_meta, estado, hash_atual, False
+
+def carregar_base_otp(caminho_origem, aba=ABA_BASE_OTP, pasta_cache=PASTA_CACHE, colunas=None):
+    """
+    Carrega a aba da base OTP a partir do snapshot Parquet, reprocessando o Excel
+    apenas quando o arquivo de origem mudou.
+
+    A validação é feita em duas etapas: se tamanho e data de modificação coincidem
+    com os do snapshot, ele é usado direto; caso contrário, o hash do conteúdo é
+    recalculado, e o Excel só é relido se o conteúdo realmente mudou.
+
+    O snapshot é gravado já com os tipos do esquema (ver esquema_otp.py).
+
+    Args:
+        caminho_origem (str): Caminho do arquivo Excel de origem
+        aba (str): Nome da aba a ser carregada
+        pasta_cache (str): Pasta onde ficam os snapshots
+        colunas (list): Colunas a serem retornadas (None para todas)
+
+    Returns:
+        pandas.DataFrame: Dados da aba
+    """
+    caminho_parquet, caminho_meta, estado, hash_atual, valido = _snapshot_atual(caminho_origem, aba, pasta_cache)
+    if valido:
+        return ler_parquet_otp(caminho_parquet, colunas)
+
+    df, _ = _reconstruir_snapshot(caminho_origem, aba, caminho_parquet, caminho_meta, estado, hash_atual)
+    if colunas:
+        return df[list(colunas)]
+    return df
+
+def obter_snapshot_otp(caminho_origem, aba=ABA_BASE_OTP, pasta_cache=PASTA_CACHE):
+    """
+    Garante que o snapshot Parquet da aba está atualizado e retorna o seu caminho.
+
+    Usado pela leitura em blocos (`ler_parquet_otp(..., linhas_por_bloco=...)`):
+    quando o Excel mudou, ele ainda é lido por inteiro uma vez para gerar o
+    snapshot, mas a memória é liberada antes do processamento.
+
+    Args:
+        caminho_origem (str): Caminho do arquivo Excel de origem
+        aba (str): Nome da aba
+        pasta_cache (str): Pasta onde ficam os snapshots
+
+    Returns:
+        str: Caminho do snapshot Parquet
+
+    Raises:
+        OSError: Se o snapshot não puder ser gravado
+    """
+    caminho_parquet, caminho_meta, estado, hash_atual, valido = _snapshot_atual(caminho_origem, aba, pasta_cache)
+    if not valido:
+        _, gravado = _reconstruir_snapshot(caminho_origem, aba, caminho_parquet, caminho_meta, estado, hash_atual)
+        if not gravado:
+            raise OSError(f"Não foi possível gravar o snapshot da base em {caminho_parquet}")
+    return caminho_parquet
@@ -0,0 +1,167 @@
+"""# Cache das previsões por PO/item
+
+Guarda, para cada PO/item (EBELN, EBELP) previsto na última execução, o hash
+das variáveis de entrada do modelo e a previsão obtida. Na execução seguinte,
+só as linhas novas ou com variáveis diferentes passam pelo modelo; as demais
+reaproveitam o `prediction_label` e o `prediction_score` anteriores. O cache
+inteiro é descartado quando o modelo (booster ou pré-processamento) muda.
+
+Funciona com o artefato de inferência (`ModeloInferencia`); com o pipeline do
+PyCaret todas as linhas são previstas, como antes.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from artefato_inferencia import caminhos_artefato
+from instrumentacao import log_message
+
+PASTA_PREVISOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'previsoes')
+ARQUIVO_CACHE = os.path.join(PASTA_PREVISOES, 'cache_previsoes.parquet')
+CHAVES_PO = ['EBELN', 'EBELP']
+COLUNAS_PREVISAO = ['prediction_label', 'prediction_score']
+
+def versao_modelo(modelo):
+    """
+    Calcula a impressão digital do modelo a partir dos arquivos do artefato.
+
+    Args:
+        modelo (ModeloInferencia): Modelo carregado
+
+    Returns:
+        str: Hash do booster e da especificação de pré-processamento
+    """
+    sha = hashlib.sha256()
+    for caminho in caminhos_artefato(modelo.caminho_modelo):
+        with open(caminho, 'rb') as arquivo:
+            for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+                sha.update(bloco)
+    return sha.hexdigest()[:24]
+
+def hash_features(df, colunas):
+    """
+    Calcula um hash por linha das variáveis de entrada do modelo.
+
+    Categorias são comparadas pelo texto, então o hash não depende das
+    categorias presentes no DataFrame.
+
+    Args:
+        df (pandas.DataFrame): Dados com as colunas de entrada
+        colunas (list): Colunas de entrada do modelo
+
+    Returns:
+        numpy.ndarray: Hash (uint64) de cada linha
+    """
+    entrada = pd.DataFrame({
+        coluna: df[coluna].astype(object).where(df[coluna].notna(), None).astype(str)
+        if isinstance(df[coluna].dtype, pd.CategoricalDtype) else pd.to_numeric(df[coluna], errors='coerce').astype(float)
+        for coluna in colunas
+    })
+    return pd.util.hash_pandas_object(entrada, index=False).to_numpy()
+
+def _ler_cache(caminho, versao):
+    """
+    Lê o cache de previsões, se for do mesmo modelo.
+
+    Args:
+        caminho (str): Caminho do cache
+        versao (str): Impressão digital do modelo atual
+
+    Returns:
+        pandas.DataFrame: Cache indexado por EBELN/EBELP (None se inexistente ou de outro modelo)
+    """
+    caminho_meta = f"{caminho}.json"
+    if not (os.path.exists(caminho) and os.path.exists(caminho_meta)):
+        return None
+    try:
+        with open(caminho_meta, 'r', encoding='utf-8') as arquivo:
+            metadados = json.load(arquivo)
+        if metadados.get('versao_modelo') != versao:
+            log_message("ℹ️ Modelo alterado desde a última execução, o cache de previsões foi descartado")
+            return None
+        return pd.read_parquet(caminho).set_index(CHAVES_PO)
+    except Exception as e:
+        log_message(f"⚠️ Cache de previsões ilegível, prevendo todas as linhas: {e}")
+        return None
+
+def _gravar_cache(cache, caminho, versao):
+    """
+    Grava o cache de previsões e seus metadados de forma atômica.
+
+    Args:
+        cache (pandas.DataFrame): EBELN, EBELP, hash e previsões
+        caminho (str): Caminho do cache
+        versao (str): Impressão digital do modelo
+    """
+    try:
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        caminho_tmp = f"{caminho}.tmp"
+        cache.to_parquet(caminho_tmp, index=False)
+        os.replace(caminho_tmp, caminho)
+        caminho_meta_tmp = f"{caminho}.json.tmp"
+        with open(caminho_meta_tmp, 'w', encoding='utf-8') as arquivo:
+            json.dump({
+                'versao_modelo': versao,
+                'linhas': len(cache),
+                'atualizado_em': datetime.now().isoformat(timespec='seconds'),
+            }, arquivo, ensure_ascii=False, indent=2)
+        os.replace(caminho_meta_tmp, f"{caminho}.json")
+    except Exception as e:
+        # O cache é só uma otimização: falhas de gravação não interrompem as previsões
+        log_message(f"⚠️ Não foi possível gravar o cache de previsões: {e}")
+
+def prever_rotulos_com_cache(modelo, df, caminho=None):
+    """
+    Calcula as previsões reaproveitando as da execução anterior quando as variáveis não mudaram.
+
+    O resultado é o mesmo de `modelo.prever_rotulos(df)`: só as linhas novas ou
+    alteradas passam pelo modelo. O cache é regravado com as linhas de `df`
+    (POs que saíram da carteira deixam o cache).
+
+    Args:
+        modelo (ModeloInferencia): Modelo carregado do artefato de inferência
+        df (pandas.DataFrame): Linhas a prever, com EBELN, EBELP e as variáveis do modelo
+        caminho (str): Caminho do cache (padrão: `ARQUIVO_CACHE`, lido a cada chamada)
+
+    Returns:
+        tuple: (numpy.ndarray de rótulos, numpy.ndarray de scores), na ordem das linhas de `df`
+    """
+    if not set(CHAVES_PO).issubset(df.columns) or df.empty:
+        return modelo.prever_rotulos(df)
+
+    caminho = caminho or ARQUIVO_CACHE
+    versao = versao_modelo(modelo)
+    hashes = hash_features(df, modelo.especificacao['colunas_entrada'])
+    cache = _ler_cache(caminho, versao)
+
+    label = np.zeros(len(df), dtype=np.int64)
+    score = np.zeros(len(df), dtype=float)
+    reaproveitar = np.zeros(len(df), dtype=bool)
+    if cache is not None and not cache.index.has_duplicates:
+        posicoes = cache.index.get_indexer(pd.MultiIndex.from_frame(df[CHAVES_PO]))
+        encontrados = posicoes >= 0
+        hash_anterior = np.zeros(len(df), dtype=np.uint64)
+        hash_anterior[encontrados] = cache['hash_features'].to_numpy()[posicoes[encontrados]]
+        reaproveitar = encontrados & (hash_anterior == hashes)
+        label[reaproveitar] = cache['prediction_label'].to_numpy()[posicoes[reaproveitar]]
+        score[reaproveitar] = cache['prediction_score'].to_numpy()[posicoes[reaproveitar]]
+
+    prever = ~reaproveitar
+    if prever.any():
+        label[prever], score[prever] = modelo.prever_rotulos(df[prever])
+
+    taxa = reaproveitar.mean()
+    log_message(f"⚡ Cache de previsões: {int(reaproveitar.sum())} de {len(df)} linhas reaproveitadas "
+                f"({taxa:.1%}), {int(prever.sum())} previstas pelo modelo")
+
+    _gravar_cache(pd.DataFrame({
+        'EBELN': df['EBELN'].to_numpy(),
+        'EBELP': df['EBELP'].to_numpy(),
+        'hash_features': hashes,
+        'prediction_label': label,
+        'prediction_score': score,
+    }).drop_duplicates(subset=CHAVES_PO, keep='last'), caminho, versao)
+    return label, score
@@ -0,0 +1,279 @@
+"""# Calendário de dias úteis
+
+Calendário de dias úteis (segunda a sexta, sem feriados) usado no cálculo de
+"Dias Para Entrega" e da tolerância de entrega dos pedidos.
+
+Para um intervalo de anos, o calendário guarda, para cada dia, quantos dias
+úteis existem desde o início do intervalo. Com isso, a contagem de dias úteis
+entre duas datas e o deslocamento de uma data por N dias úteis são feitos para
+todas as linhas de uma vez, só com indexação de arrays NumPy. Os calendários
+já montados ficam em memória.
+
+Os feriados considerados são os nacionais de data fixa (`FERIADOS_FIXOS`), os
+móveis calculados a partir da Páscoa (`FERIADOS_MOVEIS`) e as datas extras
+de `FERIADOS_ADICIONAIS` (ex.: feriados municipais ou paradas da fábrica).
+
+Uso:
+    dias = contar_dias_uteis(df['BEDAT'], df['Due Date (incl. ex works time)'])
+    limite = deslocar_dias_uteis(df['Due Date (incl. ex works time)'], df['Delivery Tolerance (Work Days)'])
+"""
+
+import hashlib
+from datetime import date, timedelta
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+# Feriados nacionais de data fixa: (mês, dia) -> primeiro ano em que vale (None para todos)
+FERIADOS_FIXOS = {
+    (1, 1): None,     # Confraternização Universal
+    (4, 21): None,    # Tiradentes
+    (5, 1): None,     # Dia do Trabalho
+    (9, 7): None,     # Independência
+    (10, 12): None,   # Nossa Senhora Aparecida
+    (11, 2): None,    # Finados
+    (11, 15): None,   # Proclamação da República
+    (11, 20): 2024,   # Dia Nacional de Zumbi e da Consciência Negra (Lei 14.759/2023)
+    (12, 25): None,   # Natal
+}
+# Feriados móveis: nome -> dias em relação ao domingo de Páscoa
+FERIADOS_MOVEIS = {
+    'Carnaval (segunda-feira)': -48,
+    'Carnaval (terça-feira)': -47,
+    'Sexta-feira Santa': -2,
+    'Corpus Christi': 60,
+}
+# Datas extras sem expediente ('AAAA-MM-DD')
+FERIADOS_ADICIONAIS = []
+# Dias da semana úteis, de segunda a domingo (formato do `weekmask` do NumPy)
+SEMANA_UTIL = '1111100'
+
+def pascoa(ano):
+    """
+    Calcula o domingo de Páscoa de um ano (algoritmo de Meeus/Jones/Butcher).
+
+    Args:
+        ano (int): Ano
+
+    Returns:
+        datetime.date: Domingo de Páscoa
+    """
+    a = ano % 19
+    b, c = divmod(ano, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mes, dia = divmod(h + l - 7 * m + 114, 31)
+    return date(ano, mes, dia + 1)
+
+def listar_feriados(ano_inicio, ano_fim):
+    """
+    Lista os feriados configurados entre dois anos (inclusive).
+
+    Args:
+        ano_inicio (int): Primeiro ano
+        ano_fim (int): Último ano
+
+    Returns:
+        numpy.ndarray: Datas dos feriados (datetime64[D]), ordenadas e sem repetição
+    """
+    feriados = []
+    for ano in range(ano_inicio, ano_fim + 1):
+        feriados.extend(date(ano, mes, dia) for (mes, dia), desde in FERIADOS_FIXOS.items()
+                        if desde is None or ano >= desde)
+        domingo_pascoa = pascoa(ano)
+        feriados.extend(domingo_pascoa + timedelta(days=dias) for dias in FERIADOS_MOVEIS.values())
+    feriados = np.array(feriados, dtype='datetime64[D]')
+    adicionais = np.array(FERIADOS_ADICIONAIS, dtype='datetime64[D]')
+    return np.unique(np.concatenate([feriados, adicionais]))
+
+def assinatura_feriados():
+    """
+    Identifica a configuração atual de feriados e dias úteis da semana.
+
+    Usada nas chaves de cache de valores calculados com o calendário, para que
+    uma mudança nos feriados não reaproveite valores antigos.
+
+    Returns:
+        str: Hash curto da configuração
+    """
+    configuracao = repr((sorted(FERIADOS_FIXOS.items()), sorted(FERIADOS_MOVEIS.items()),
+                         sorted(FERIADOS_ADICIONAIS), SEMANA_UTIL))
+    return hashlib.sha1(configuracao.encode('utf-8')).hexdigest()[:12]
+
+def _para_dias(datas):
+    """
+    Converte datas (Series, array ou lista) para um array datetime64[D].
+    """
+    valores = datas.to_numpy() if isinstance(datas, (pd.Series, pd.Index)) else np.asarray(datas)
+    if valores.dtype.kind != 'M':
+        valores = np.asarray(pd.to_datetime(valores))
+    return valores.astype('datetime64[D]', copy=False)
+
+class CalendarioUteis:
+    """
+    Dias úteis de um intervalo de datas, pré-calculados para consultas vetorizadas.
+
+    `acumulado[i]` é a quantidade de dias úteis em [inicio, inicio + i), então a
+    contagem entre duas datas é a diferença de duas posições, e o N-ésimo dia
+    útil a partir de uma data é uma posição de `dias_uteis`.
+    """
+
+    def __init__(self, inicio, fim, feriados=(), semana_util=SEMANA_UTIL):
+        """
+        Args:
+            inicio (str | numpy.datetime64): Primeiro dia do calendário
+            fim (str | numpy.datetime64): Último dia do calendário
+            feriados (array-like): Datas que não são dias úteis
+            semana_util (str): Dias úteis da semana, de segunda a domingo (ex.: '1111100')
+        """
+        self.inicio = np.datetime64(inicio, 'D')
+        self.fim = np.datetime64(fim, 'D')
+        dias = np.arange(self.inicio, self.fim + 1)
+        util = np.is_busday(dias, weekmask=semana_util, holidays=np.asarray(feriados, dtype='datetime64[D]'))
+        self.total_dias = len(dias)
+        self.acumulado = np.concatenate([[0], np.cumsum(util, dtype=np.int64)])
+        self.dias_uteis = dias[util]
+
+    @classmethod
+    def para_anos(cls, ano_inicio, ano_fim):
+        """
+        Devolve o calendário com os feriados configurados para um intervalo de anos.
+
+        Args:
+            ano_inicio (int): Primeiro ano
+            ano_fim (int): Último ano
+
+        Returns:
+            CalendarioUteis: Calendário (reaproveitado da memória se já montado)
+        """
+        return _calendario_anos(ano_inicio, ano_fim, assinatura_feriados())
+
+    def _posicoes(self, dias, limite):
+        """
+        Calcula a posição de cada data no calendário.
+
+        Args:
+            dias (numpy.ndarray): Datas (datetime64[D])
+            limite (int): Maior posição aceita
+
+        Returns:
+            tuple: (posições int64, máscara das datas válidas e dentro do calendário)
+        """
+        # NaT vira o menor int64 e cai fora do intervalo
+        posicoes = (dias - self.inicio).astype(np.int64)
+        validos = (posicoes >= 0) & (posicoes <= limite)
+        return np.where(validos, posicoes, 0), validos
+
+    def contar(self, inicio, fim):
+        """
+        Conta os dias úteis em [inicio, fim), como o `np.busday_count`.
+
+        Se fim for anterior a inicio, a contagem é negativa e, como no NumPy,
+        conta os dias úteis em (fim, inicio].
+
+        Args:
+            inicio (array-like): Datas iniciais
+            fim (array-like): Datas finais
+
+        Returns:
+            numpy.ndarray: Dias úteis (float64; NaN quando alguma data está vazia ou fora do calendário)
+        """
+        posicoes_inicio, validos_inicio = self._posicoes(_para_dias(inicio), self.total_dias - 1)
+        posicoes_fim, validos_fim = self._posicoes(_para_dias(fim), self.total_dias - 1)
+        invertido = (posicoes_fim < posicoes_inicio).astype(np.int64)
+        dias = (self.acumulado[posicoes_fim + invertido] - self.acumulado[posicoes_inicio + invertido]).astype(float)
+        dias[~(validos_inicio & validos_fim)] = np.nan
+        return dias
+
+    def deslocar(self, datas, dias):
+        """
+        Desloca as datas em N dias úteis, como o `np.busday_offset` com roll='forward'.
+
+        Uma data que não é dia útil é levada primeiro ao próximo dia útil.
+
+        Args:
+            datas (array-like): Datas de partida
+            dias (array-like): Dias úteis a deslocar (podem ser negativos)
+
+        Returns:
+            numpy.ndarray: Datas deslocadas (datetime64[D]; NaT quando a data ou os dias
+                estão vazios ou o resultado sai do calendário)
+        """
+        posicoes, validos = self._posicoes(_para_dias(datas), self.total_dias - 1)
+        dias = np.asarray(dias, dtype=float)
+        validos &= ~np.isnan(dias)
+        # acumulado[p] é o índice, em dias_uteis, do primeiro dia útil a partir da data
+        indices = self.acumulado[posicoes] + np.where(validos, dias, 0).astype(np.int64)
+        validos &= (indices >= 0) & (indices < len(self.dias_uteis))
+        resultado = self.dias_uteis[np.where(validos, indices, 0)] if len(self.dias_uteis) else \
+            np.zeros(len(posicoes), dtype='datetime64[D]')
+        resultado[~validos] = np.datetime64('NaT')
+        return resultado
+
+@lru_cache(maxsize=8)
+def _calendario_anos(ano_inicio, ano_fim, assinatura):
+    """
+    Monta (uma vez por intervalo e configuração de feriados) o calendário de um intervalo de anos.
+    """
+    return CalendarioUteis(f'{ano_inicio}-01-01', f'{ano_fim}-12-31', listar_feriados(ano_inicio, ano_fim))
+
+def _anos(*conjuntos):
+    """
+    Devolve o menor e o maior ano das datas informadas (None se não houver datas).
+    """
+    # Menor e maior data sem converter o array inteiro (NaT é o menor int64)
+    menores, maiores = [], []
+    for dias in conjuntos:
+        valores = dias.view(np.int64)
+        maior = valores.max(initial=np.iinfo(np.int64).min)
+        if maior == np.iinfo(np.int64).min:
+            continue
+        maiores.append(maior)
+        menores.append(np.where(np.isnat(dias), maior, valores).min())
+    if not maiores:
+        return None
+    limites = np.array([min(menores), max(maiores)]).astype('datetime64[D]').astype('datetime64[Y]')
+    return tuple(int(ano) + 1970 for ano in limites.astype(np.int64))
+
+def contar_dias_uteis(inicio, fim):
+    """
+    Conta os dias úteis em [inicio, fim) para cada par de datas.
+
+    Args:
+        inicio (array-like): Datas iniciais (ex.: BEDAT)
+        fim (array-like): Datas finais (ex.: due date)
+
+    Returns:
+        numpy.ndarray: Dias úteis (float64; NaN quando alguma das datas está vazia)
+    """
+    inicio, fim = _para_dias(inicio), _para_dias(fim)
+    anos = _anos(inicio, fim)
+    if anos is None:
+        return np.full(len(inicio), np.nan)
+    return CalendarioUteis.para_anos(*anos).contar(inicio, fim)
+
+def deslocar_dias_uteis(datas, dias):
+    """
+    Desloca cada data em N dias úteis (datas que não são dia útil vão antes ao próximo dia útil).
+
+    Args:
+        datas (array-like): Datas de partida (ex.: due date)
+        dias (array-like): Dias úteis a deslocar (ex.: tolerância de entrega)
+
+    Returns:
+        numpy.ndarray: Datas deslocadas (datetime64[D]; NaT quando a data ou os dias estão vazios)
+    """
+    datas = _para_dias(datas)
+    dias = np.asarray(dias, dtype=float)
+    anos = _anos(datas)
+    if anos is None:
+        return np.full(len(datas), np.datetime64('NaT'), dtype='datetime64[D]')
+    # Margem para deslocamentos longos (cerca de 250 dias úteis por ano)
+    maior_deslocamento = np.nanmax(np.abs(dias)) if not np.isnan(dias).all() else 0
+    margem = int(maior_deslocamento // 200) + 1
+    return CalendarioUteis.para_anos(anos[0] - margem, anos[1] + margem).deslocar(datas, dias)
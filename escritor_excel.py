@@ -0,0 +1,189 @@
+"""# Escrita colunar de DataFrames em planilhas xlsxwriter
+
+Escreve DataFrames em abas do xlsxwriter decidindo o tipo de cada coluna uma
+única vez, convertendo datas e valores nulos por coluna e em blocos de linhas.
+Foi pensado para workbooks abertos com `constant_memory`, em que as linhas
+precisam ser escritas em ordem e a memória fica limitada ao bloco atual.
+"""
+
+import os
+import shutil
+import pandas as pd
+import xlsxwriter
+
+# Data base das datas seriais do Excel
+EPOCA_EXCEL = pd.Timestamp('1899-12-30')
+UM_DIA = pd.Timedelta(days=1)
+# Quantidade de linhas convertidas de cada vez
+TAMANHO_BLOCO = 50_000
+OPCOES_WORKBOOK = {'constant_memory': True, 'nan_inf_to_errors': True, 'strings_to_urls': False}
+FORMATO_DATA = 'dd/mm/yyyy'
+
+def _converter_coluna(serie, eh_data):
+    """
+    Converte uma coluna inteira para uma lista de valores Python prontos para escrita.
+
+    Datas viram números seriais do Excel e valores nulos viram None.
+
+    Args:
+        serie (pandas.Series): Coluna do DataFrame
+        eh_data (bool): Se a coluna deve ser escrita como data
+
+    Returns:
+        list: Valores da coluna, com None no lugar dos nulos
+    """
+    if eh_data:
+        serie = pd.to_datetime(serie, errors='coerce')
+        if getattr(serie.dt, 'tz', None) is not None:
+            serie = serie.dt.tz_localize(None)
+        serie = (serie - EPOCA_EXCEL) / UM_DIA
+    elif isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype(object)
+    nulos = serie.isna()
+    if nulos.any():
+        serie = serie.astype(object).where(~nulos, None)
+    return serie.tolist()
+
+class EscritorAba:
+    """
+    Escreve um ou mais DataFrames, em sequência, em uma aba do xlsxwriter.
+
+    O cabeçalho é escrito na criação e cada chamada de `escrever` acrescenta
+    as linhas logo abaixo das anteriores, o que permite escrever por partes.
+    """
+
+    def __init__(self, worksheet, colunas, colunas_data=(), formato_data=None, linha_inicial=0):
+        """
+        Args:
+            worksheet (xlsxwriter.worksheet.Worksheet): Aba de destino
+            colunas (list): Nomes das colunas, na ordem em que serão escritas
+            colunas_data (iterable): Colunas que devem ser escritas como data
+            formato_data (xlsxwriter.format.Format): Formato aplicado às datas
+            linha_inicial (int): Linha do cabeçalho
+        """
+        self.worksheet = worksheet
+        self.colunas = list(colunas)
+        self.colunas_data = set(colunas_data)
+        self.formato_data = formato_data
+        self.worksheet.write_row(linha_inicial, 0, [str(coluna) for coluna in self.colunas])
+        self.proxima_linha = linha_inicial + 1
+        self._funcoes = None
+
+    def _definir_funcoes(self, df):
+        """
+        Escolhe, uma vez por coluna, a função de escrita e o formato usados.
+
+        Args:
+            df (pandas.DataFrame): Primeiro bloco de dados a ser escrito
+        """
+        self._eh_data = []
+        self._funcoes = []
+        for coluna in self.colunas:
+            serie = df[coluna]
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                # Categorias são escritas de acordo com o tipo dos seus valores
+                serie = pd.Series(serie.cat.categories)
+            if coluna in self.colunas_data or pd.api.types.is_datetime64_any_dtype(serie):
+                self._eh_data.append(True)
+                self._funcoes.append((self.worksheet.write_number, self.formato_data))
+            elif pd.api.types.is_bool_dtype(serie):
+                self._eh_data.append(False)
+                self._funcoes.append((self.worksheet.write_boolean, None))
+            elif pd.api.types.is_numeric_dtype(serie):
+                self._eh_data.append(False)
+                self._funcoes.append((self.worksheet.write_number, None))
+            elif pd.api.types.infer_dtype(serie, skipna=True) in ('string', 'empty'):
+                self._eh_data.append(False)
+                self._funcoes.append((self.worksheet.write_string, None))
+            else:
+                # Colunas com tipos misturados usam a escrita genérica do xlsxwriter
+                self._eh_data.append(False)
+                self._funcoes.append((self.worksheet.write, None))
+
+    def escrever(self, df):
+        """
+        Acrescenta as linhas de um DataFrame à aba, em blocos.
+
+        Args:
+            df (pandas.DataFrame): Dados a serem escritos (com as mesmas colunas do cabeçalho)
+
+        Returns:
+            int: Quantidade de linhas escritas
+        """
+        if df.empty:
+            return 0
+        if self._funcoes is None:
+            self._definir_funcoes(df)
+
+        for inicio in range(0, len(df), TAMANHO_BLOCO):
+            bloco = df.iloc[inicio:inicio + TAMANHO_BLOCO]
+            valores = [
+                _converter_coluna(bloco[coluna], eh_data)
+                for coluna, eh_data in zip(self.colunas, self._eh_data)
+            ]
+            linha = self.proxima_linha
+            for valores_linha in zip(*valores):
+                for col, ((funcao, formato), valor) in enumerate(zip(self._funcoes, valores_linha)):
+                    if valor is not None:
+                        funcao(linha, col, valor, formato)
+                linha += 1
+            self.proxima_linha = linha
+        return len(df)
+
+def escrever_dataframe(workbook, nome_aba, df, colunas_data=(), formato_data=None):
+    """
+    Cria uma aba no workbook e escreve o DataFrame inteiro, com cabeçalho.
+
+    Args:
+        workbook (xlsxwriter.Workbook): Workbook de destino
+        nome_aba (str): Nome da nova aba
+        df (pandas.DataFrame): Dados a serem escritos
+        colunas_data (iterable): Colunas que devem ser escritas como data
+        formato_data (xlsxwriter.format.Format): Formato aplicado às datas
+
+    Returns:
+        xlsxwriter.worksheet.Worksheet: Aba criada
+    """
+    worksheet = workbook.add_worksheet(nome_aba)
+    escritor = EscritorAba(worksheet, df.columns, colunas_data, formato_data)
+    escritor.escrever(df)
+    return worksheet
+
+def gravar_planilha(caminho, abas, formato_data=FORMATO_DATA):
+    """
+    Grava um arquivo xlsx novo, com uma aba por DataFrame, em modo `constant_memory`.
+
+    Colunas de data (datetime) são detectadas pelo tipo e escritas com `formato_data`.
+
+    Args:
+        caminho (str): Arquivo xlsx de destino (de preferência em disco local)
+        abas (dict): Nome da aba -> DataFrame, na ordem das abas
+        formato_data (str): Formato de número do Excel aplicado às datas
+    """
+    workbook = xlsxwriter.Workbook(caminho, OPCOES_WORKBOOK)
+    try:
+        formato = workbook.add_format({'num_format': formato_data})
+        for nome_aba, df in abas.items():
+            escrever_dataframe(workbook, nome_aba, df, formato_data=formato)
+    finally:
+        workbook.close()
+
+def publicar_arquivo(caminho_local, caminho_destino):
+    """
+    Copia um arquivo pronto para o destino (ex.: pasta da rede) de forma atômica.
+
+    A cópia é feita para um arquivo temporário na pasta de destino e só então
+    renomeada, então o destino nunca fica com um arquivo pela metade.
+
+    Args:
+        caminho_local (str): Arquivo já gravado por completo
+        caminho_destino (str): Caminho final do arquivo
+    """
+    caminho_tmp = f"{caminho_destino}.tmp"
+    try:
+        shutil.copyfile(caminho_local, caminho_tmp)
+        os.replace(caminho_tmp, caminho_destino)
+    except BaseException:
+        if os.path.exists(caminho_tmp):
+            os.remove(caminho_tmp)
+        raise
@@ -0,0 +1,217 @@
+"""# Espelho local dos arquivos de entrada da rede
+
+Mantém, em uma pasta local, uma cópia dos arquivos lidos da rede (`S:\\...`):
+a base `OTP - Base.xlsx` e o modelo (pickle do PyCaret ou artefato de
+inferência). A cada leitura o arquivo da rede é só consultado (tamanho e data
+de modificação); ele é copiado apenas quando mudou, e o hash do conteúdo
+evita uma nova cópia quando só a data mudou. As leituras repetidas são feitas
+na velocidade do disco local.
+
+A pasta do espelho é `cache/espelho/`, ou a indicada na variável de ambiente
+`IRF_PASTA_ESPELHO`. Com `IRF_ESPELHO=0` os arquivos são lidos direto da rede.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime
+from artefato_inferencia import artefato_disponivel, caminhos_artefato
+from instrumentacao import log_message
+
+PASTA_ESPELHO = os.environ.get('IRF_PASTA_ESPELHO') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'espelho')
+USAR_ESPELHO = os.environ.get('IRF_ESPELHO', '1') != '0'
+TAMANHO_BLOCO = 4 * 1024 * 1024
+
+def caminho_espelho(caminho_rede, pasta=None):
+    """
+    Monta o caminho da cópia local de um arquivo da rede.
+
+    Arquivos da mesma pasta da rede ficam na mesma pasta do espelho, então
+    arquivos "irmãos" (ex.: o .pkl e o artefato do modelo) continuam lado a lado.
+
+    Args:
+        caminho_rede (str): Caminho do arquivo na rede
+        pasta (str): Pasta do espelho (padrão: `PASTA_ESPELHO`)
+
+    Returns:
+        str: Caminho da cópia local
+    """
+    pasta = pasta or PASTA_ESPELHO
+    pasta_rede = os.path.dirname(os.path.abspath(caminho_rede))
+    chave = hashlib.sha1(pasta_rede.encode('utf-8')).hexdigest()[:12]
+    nome_pasta = os.path.basename(pasta_rede.rstrip('\\/')) or 'raiz'
+    return os.path.join(pasta, f"{nome_pasta} - {chave}", os.path.basename(caminho_rede))
+
+def _ler_metadados(caminho_meta):
+    """
+    Lê os metadados de uma cópia local, se existirem.
+    """
+    try:
+        with open(caminho_meta, 'r', encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+def _gravar_metadados(caminho_meta, metadados):
+    """
+    Grava os metadados de uma cópia local de forma atômica.
+    """
+    caminho_tmp = f"{caminho_meta}.tmp"
+    with open(caminho_tmp, 'w', encoding='utf-8') as arquivo:
+        json.dump(metadados, arquivo, ensure_ascii=False, indent=2)
+    os.replace(caminho_tmp, caminho_meta)
+
+def _copiar_com_hash(origem, pasta_destino):
+    """
+    Copia um arquivo para um temporário na pasta de destino, calculando o hash no caminho.
+
+    Args:
+        origem (str): Arquivo de origem
+        pasta_destino (str): Pasta do arquivo temporário
+
+    Returns:
+        tuple: (caminho do temporário, hash SHA-256 do conteúdo)
+    """
+    sha = hashlib.sha256()
+    descritor, caminho_tmp = tempfile.mkstemp(prefix='.copia_', suffix='.tmp', dir=pasta_destino)
+    try:
+        with open(origem, 'rb') as entrada, os.fdopen(descritor, 'wb') as saida:
+            for bloco in iter(lambda: entrada.read(TAMANHO_BLOCO), b''):
+                sha.update(bloco)
+                saida.write(bloco)
+    except BaseException:
+        os.remove(caminho_tmp)
+        raise
+    return caminho_tmp, sha.hexdigest()
+
+def _dentro_do_espelho(caminho, pasta):
+    """
+    Verifica se o caminho já é de uma cópia no espelho.
+
+    No Windows, caminhos em unidades diferentes (ex.: `S:\\` e o espelho em
+    `C:\\`) nunca estão um dentro do outro; o `commonpath` nem os aceita.
+    """
+    caminho, pasta = os.path.abspath(caminho), os.path.abspath(pasta)
+    if os.path.splitdrive(caminho)[0].lower() != os.path.splitdrive(pasta)[0].lower():
+        return False
+    try:
+        return os.path.commonpath([caminho, pasta]) == pasta
+    except ValueError:
+        return False
+
+def atualizar_copia(caminho_rede, pasta=None):
+    """
+    Garante que a cópia local do arquivo corresponde ao arquivo da rede.
+
+    Se tamanho e data de modificação coincidem com os da última cópia (e a
+    cópia existe com o tamanho certo), nada é lido da rede. Caso contrário, o
+    arquivo é lido uma vez, copiando e calculando o hash ao mesmo tempo; a
+    cópia só substitui a anterior se o conteúdo mudou.
+
+    Args:
+        caminho_rede (str): Caminho do arquivo na rede
+        pasta (str): Pasta do espelho (padrão: `PASTA_ESPELHO`)
+
+    Returns:
+        str: Caminho da cópia local
+
+    Raises:
+        OSError: Se o arquivo da rede não puder ser lido ou a cópia não puder ser gravada
+    """
+    caminho_local = caminho_espelho(caminho_rede, pasta)
+    caminho_meta = f"{caminho_local}.json"
+    estado = os.stat(caminho_rede)
+    metadados = _ler_metadados(caminho_meta)
+    copia_existe = metadados is not None and os.path.exists(caminho_local) \
+        and os.path.getsize(caminho_local) == metadados.get('tamanho')
+
+    if copia_existe and metadados['tamanho'] == estado.st_size and metadados['mtime_ns'] == estado.st_mtime_ns:
+        return caminho_local
+
+    os.makedirs(os.path.dirname(caminho_local), exist_ok=True)
+    caminho_tmp, hash_atual = _copiar_com_hash(caminho_rede, os.path.dirname(caminho_local))
+    if copia_existe and metadados['hash'] == hash_atual:
+        os.remove(caminho_tmp)
+        log_message(f"⚡ Arquivo da rede com o mesmo conteúdo, reaproveitando a cópia local: {caminho_local}")
+    else:
+        os.replace(caminho_tmp, caminho_local)
+        log_message(f"📥 Cópia local atualizada ({estado.st_size / 1024 ** 2:.1f} MB): {caminho_rede} -> {caminho_local}")
+    # A cópia fica com a data do arquivo da rede (o snapshot da base compara tamanho e data)
+    os.utime(caminho_local, ns=(estado.st_atime_ns, estado.st_mtime_ns))
+    _gravar_metadados(caminho_meta, {
+        'origem': os.path.abspath(caminho_rede),
+        'tamanho': estado.st_size,
+        'mtime_ns': estado.st_mtime_ns,
+        'hash': hash_atual,
+        'copiado_em': datetime.now().isoformat(timespec='seconds'),
+    })
+    return caminho_local
+
+def _remover_copia(caminho_rede, pasta):
+    """
+    Remove a cópia local (e os metadados) de um arquivo que deixou de ser lido.
+    """
+    caminho_local = caminho_espelho(caminho_rede, pasta)
+    for caminho in (caminho_local, f"{caminho_local}.json"):
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+def espelhar(caminho_rede, pasta=None, usar_espelho=None):
+    """
+    Devolve o caminho local de um arquivo da rede, atualizando a cópia se necessário.
+
+    Se o espelho estiver desligado, o caminho já for de uma cópia local ou a
+    cópia falhar (ex.: disco cheio), devolve o próprio caminho da rede.
+
+    Args:
+        caminho_rede (str): Caminho do arquivo na rede
+        pasta (str): Pasta do espelho (padrão: `PASTA_ESPELHO`)
+        usar_espelho (bool): Se False, devolve o caminho da rede (padrão: `USAR_ESPELHO`)
+
+    Returns:
+        str: Caminho a ser lido
+    """
+    pasta = pasta or PASTA_ESPELHO
+    usar_espelho = USAR_ESPELHO if usar_espelho is None else usar_espelho
+    if not usar_espelho or _dentro_do_espelho(caminho_rede, pasta):
+        return caminho_rede
+    try:
+        return atualizar_copia(caminho_rede, pasta)
+    except OSError as e:
+        log_message(f"⚠️ Não foi possível usar a cópia local, lendo da rede: {caminho_rede} ({e})")
+        return caminho_rede
+
+def espelhar_modelo(caminho_modelo, pasta=None, usar_espelho=None):
+    """
+    Espelha os arquivos do modelo que serão lidos e devolve o caminho local do modelo.
+
+    Com o artefato de inferência disponível, só o booster e a especificação
+    são copiados (o pickle do PyCaret não é lido); sem ele, o pickle é copiado
+    e uma cópia antiga do artefato é removida, para que o modelo local seja
+    carregado do mesmo jeito que o da rede.
+
+    Args:
+        caminho_modelo (str): Caminho do modelo na rede (.pkl)
+        pasta (str): Pasta do espelho (padrão: `PASTA_ESPELHO`)
+        usar_espelho (bool): Se False, devolve o caminho da rede (padrão: `USAR_ESPELHO`)
+
+    Returns:
+        str: Caminho do modelo a ser carregado (local ou, em caso de falha, da rede)
+    """
+    pasta = pasta or PASTA_ESPELHO
+    usar_espelho = USAR_ESPELHO if usar_espelho is None else usar_espelho
+    if not usar_espelho or _dentro_do_espelho(caminho_modelo, pasta):
+        return caminho_modelo
+    caminho_pkl = caminho_modelo if caminho_modelo.endswith('.pkl') else f"{caminho_modelo}.pkl"
+    arquivos = list(caminhos_artefato(caminho_modelo)) if artefato_disponivel(caminho_modelo) else [caminho_pkl]
+    try:
+        for arquivo in arquivos:
+            atualizar_copia(arquivo, pasta)
+        if arquivos == [caminho_pkl]:
+            for arquivo in caminhos_artefato(caminho_modelo):
+                _remover_copia(arquivo, pasta)
+    except OSError as e:
+        log_message(f"⚠️ Não foi possível usar a cópia local do modelo, lendo da rede: {caminho_modelo} ({e})")
+        return caminho_modelo
+    return caminho_espelho(caminho_modelo, pasta)
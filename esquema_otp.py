@@ -0,0 +1,197 @@
+"""# Esquema de colunas da base OTP
+
+Declara o tipo de cada coluna conhecida da base OTP (export CELONIS e aba
+"Base OTP") e concentra a leitura tipada desses dados, para que os três scripts
+leiam os mesmos tipos uma única vez: chaves inteiras, fornecedor e grupo de
+material como categoria, valores numéricos compactos e datas já convertidas.
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+# Tipos lógicos de cada coluna conhecida
+ESQUEMA_OTP = {
+    'EBELN': 'inteiro64',  # Número do PO (10 dígitos no SAP, não cabe em int32)
+    'EBELP': 'inteiro32',
+    'Vendor': 'categoria',
+    'Vendor Name': 'texto',
+    'MATKL': 'categoria',
+    'Material Text (AST or Short Text)': 'texto',
+    'BEDAT': 'data',
+    'Due Date (incl. ex works time)': 'data',
+    'GR Document Date': 'data',
+    'Delivery Date': 'data',
+    'Delivery Tolerance (Work Days)': 'real32',
+    'NetOrderValue': 'real64',  # Valores monetários ficam em float64 para não perder os centavos
+    'Net Order Value in Doc. Curr.': 'real64',
+    'On Time': 'real32',
+}
+
+COLUNAS_DATA = [coluna for coluna, tipo in ESQUEMA_OTP.items() if tipo == 'data']
+
+# Tipos usados na leitura via pyarrow (datas são lidas como texto e convertidas depois)
+_TIPOS_ARROW = {
+    'inteiro64': pa.int64(),
+    'inteiro32': pa.int32(),
+    'categoria': pa.dictionary(pa.int32(), pa.string()),
+    'texto': pa.string(),
+    'data': pa.string(),
+    'real32': pa.float32(),
+    'real64': pa.float64(),
+}
+
+def _para_texto(serie):
+    """
+    Converte uma coluna para texto, sem o '.0' de números lidos como float.
+
+    Args:
+        serie (pandas.Series): Coluna a converter
+
+    Returns:
+        pandas.Series: Coluna com valores em texto (nulos mantidos)
+    """
+    if pd.api.types.is_float_dtype(serie) and (serie.dropna() % 1 == 0).all():
+        serie = serie.astype('Int64')
+    nulos = serie.isna()
+    return serie.astype(str).where(~nulos, None)
+
+def aplicar_esquema(df):
+    """
+    Converte as colunas conhecidas do DataFrame para os tipos do esquema.
+
+    Colunas que já estão no tipo certo não são convertidas de novo, então a
+    função pode ser chamada em qualquer etapa sem custo relevante.
+
+    Args:
+        df (pandas.DataFrame): DataFrame com colunas da base OTP
+
+    Returns:
+        pandas.DataFrame: O mesmo DataFrame, com as colunas tipadas
+    """
+    for coluna, tipo in ESQUEMA_OTP.items():
+        if coluna not in df.columns:
+            continue
+        serie = df[coluna]
+        if tipo == 'data':
+            if not pd.api.types.is_datetime64_any_dtype(serie):
+                df[coluna] = pd.to_datetime(serie, errors='coerce')
+        elif tipo == 'categoria':
+            if not isinstance(serie.dtype, pd.CategoricalDtype):
+                df[coluna] = _para_texto(serie).astype('category')
+        elif tipo == 'texto':
+            if pd.api.types.is_numeric_dtype(serie):
+                df[coluna] = _para_texto(serie)
+        elif tipo in ('inteiro64', 'inteiro32'):
+            dtype = np.int64 if tipo == 'inteiro64' else np.int32
+            if serie.dtype != dtype:
+                serie = pd.to_numeric(serie, errors='coerce')
+                if serie.isna().any():
+                    df[coluna] = serie.astype('Int64' if tipo == 'inteiro64' else 'Int32')
+                else:
+                    df[coluna] = serie.astype(dtype)
+        elif tipo in ('real32', 'real64'):
+            dtype = np.float32 if tipo == 'real32' else np.float64
+            if serie.dtype != dtype:
+                df[coluna] = pd.to_numeric(serie, errors='coerce').astype(dtype)
+    return df
+
+def _tabela_para_dataframe(tabela):
+    """
+    Converte uma tabela Arrow em DataFrame e aplica o esquema (datas e categorias).
+
+    Args:
+        tabela (pyarrow.Table): Tabela lida do CSV ou do Parquet
+
+    Returns:
+        pandas.DataFrame: DataFrame tipado
+    """
+    return aplicar_esquema(tabela.to_pandas())
+
+def _reagrupar_lotes(lotes, linhas_por_bloco):
+    """
+    Reagrupa lotes Arrow de tamanho variável em tabelas com um número fixo de linhas.
+
+    Args:
+        lotes (iterable): Lotes (pyarrow.RecordBatch) lidos do arquivo
+        linhas_por_bloco (int): Quantidade de linhas de cada tabela
+
+    Yields:
+        pyarrow.Table: Tabela com até `linhas_por_bloco` linhas
+    """
+    pendentes = []
+    quantidade = 0
+    for lote in lotes:
+        pendentes.append(lote)
+        quantidade += lote.num_rows
+        while quantidade >= linhas_por_bloco:
+            tabela = pa.Table.from_batches(pendentes)
+            yield tabela.slice(0, linhas_por_bloco)
+            resto = tabela.slice(linhas_por_bloco)
+            pendentes = resto.to_batches()
+            quantidade = resto.num_rows
+    if quantidade:
+        yield pa.Table.from_batches(pendentes)
+
+def _opcoes_csv(colunas):
+    """
+    Monta as opções de conversão do leitor CSV do pyarrow a partir do esquema.
+
+    Args:
+        colunas (list): Colunas a serem lidas (None para todas)
+
+    Returns:
+        pyarrow.csv.ConvertOptions: Opções de conversão
+    """
+    return pa_csv.ConvertOptions(
+        column_types={coluna: _TIPOS_ARROW[tipo] for coluna, tipo in ESQUEMA_OTP.items()},
+        include_columns=list(colunas) if colunas else None,
+        strings_can_be_null=True,
+    )
+
+def ler_csv_otp(caminho, colunas=None, linhas_por_bloco=None):
+    """
+    Lê o export CELONIS com o pyarrow, já com os tipos do esquema.
+
+    Args:
+        caminho (str): Caminho do arquivo CSV
+        colunas (list): Colunas a serem lidas (None para todas)
+        linhas_por_bloco (int): Se informado, lê em blocos e retorna um gerador
+
+    Returns:
+        pandas.DataFrame ou gerador de pandas.DataFrame: Dados tipados
+    """
+    opcoes_leitura = pa_csv.ReadOptions(encoding='utf8')
+    if linhas_por_bloco is None:
+        tabela = pa_csv.read_csv(caminho, read_options=opcoes_leitura, convert_options=_opcoes_csv(colunas))
+        return _tabela_para_dataframe(tabela)
+
+    def _blocos():
+        leitor = pa_csv.open_csv(caminho, read_options=opcoes_leitura, convert_options=_opcoes_csv(colunas))
+        for tabela in _reagrupar_lotes(leitor, linhas_por_bloco):
+            yield _tabela_para_dataframe(tabela)
+    return _blocos()
+
+def ler_parquet_otp(caminho, colunas=None, linhas_por_bloco=None):
+    """
+    Lê um snapshot Parquet da base OTP, opcionalmente em blocos.
+
+    Args:
+        caminho (str): Caminho do arquivo Parquet
+        colunas (list): Colunas a serem lidas (None para todas)
+        linhas_por_bloco (int): Se informado, lê em blocos e retorna um gerador
+
+    Returns:
+        pandas.DataFrame ou gerador de pandas.DataFrame: Dados tipados
+    """
+    colunas = list(colunas) if colunas else None
+    if linhas_por_bloco is None:
+        return _tabela_para_dataframe(pq.read_table(caminho, columns=colunas))
+
+    def _blocos():
+        arquivo = pq.ParquetFile(caminho)
+        for lote in arquivo.iter_batches(batch_size=linhas_por_bloco, columns=colunas):
+            yield _tabela_para_dataframe(pa.Table.from_batches([lote]))
+    return _blocos()
@@ -0,0 +1,217 @@
+"""# Execução de etapas com dependências em paralelo
+
+Executa um grafo de etapas (DAG) em que cada etapa declara de quais outras
+depende: as etapas independentes rodam ao mesmo tempo em um pool de threads
+(leituras da rede, parsing com o GIL liberado) ou, se marcadas, em um pool de
+processos (parsing em Python puro, como o `pd.read_excel`). Ao final, o
+caminho crítico (a sequência de etapas que definiu a duração total) é
+mostrado no log.
+
+Cada etapa é medida pelo módulo `instrumentacao` como uma etapa concorrente,
+dentro da etapa que engloba a execução do grafo.
+
+Uso:
+    grafo = ExecutorEtapas('fluxo')
+    grafo.adicionar('dados', carregar_dados, argumentos=(caminhos,))
+    grafo.adicionar('modelo', carregar_modelo, argumentos=(caminho_modelo,))
+    grafo.adicionar('previsoes', fazer_previsoes, dependencias=('modelo', 'dados'))
+    resultados = grafo.executar()
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from instrumentacao import caminho_etapa_atual, etapa, log_message
+
+# Quantidade máxima de etapas executadas ao mesmo tempo
+MAX_PARALELAS = 4
+
+class EtapaGrafo:
+    """
+    Etapa registrada no `ExecutorEtapas`, com as medidas da sua execução.
+    """
+
+    def __init__(self, nome, funcao, dependencias, argumentos, em_processo, linhas_saida, pular_se_nulo):
+        self.nome = nome
+        self.funcao = funcao
+        self.dependencias = tuple(dependencias)
+        self.argumentos = tuple(argumentos)
+        self.em_processo = em_processo
+        self.linhas_saida = linhas_saida
+        self.pular_se_nulo = pular_se_nulo
+        self.inicio = None
+        self.fim = None
+        self.pulada = False
+
+    @property
+    def segundos(self):
+        """
+        Duração da etapa (0 se não foi executada).
+        """
+        return 0.0 if self.inicio is None or self.fim is None else self.fim - self.inicio
+
+class ExecutorEtapas:
+    """
+    Grafo de etapas com dependências, executado com as independentes em paralelo.
+
+    O resultado de cada etapa é passado para as etapas que dependem dela, na
+    ordem das dependências e depois dos argumentos fixos. Como nas funções do
+    `irf.py`, que devolvem None em caso de erro, uma etapa com alguma
+    dependência None não é executada e também resulta em None.
+    """
+
+    def __init__(self, nome, max_paralelas=MAX_PARALELAS):
+        """
+        Args:
+            nome (str): Nome do grafo (etapa da instrumentação que engloba as etapas)
+            max_paralelas (int): Quantidade máxima de etapas executadas ao mesmo tempo
+        """
+        self.nome = nome
+        self.max_paralelas = max_paralelas
+        self.etapas = {}
+
+    def adicionar(self, nome, funcao, dependencias=(), argumentos=(), em_processo=False,
+                  linhas_saida=None, pular_se_nulo=True):
+        """
+        Registra uma etapa.
+
+        Args:
+            nome (str): Nome da etapa (único no grafo)
+            funcao (callable): Função da etapa; recebe os resultados das dependências e os argumentos
+            dependencias (tuple): Nomes das etapas das quais esta depende (já registradas)
+            argumentos (tuple): Argumentos fixos, passados depois dos resultados das dependências
+            em_processo (bool): Se True, roda em um processo separado (função e argumentos
+                precisam ser serializáveis e importáveis)
+            linhas_saida (callable): Função que recebe o resultado e devolve as linhas de saída
+            pular_se_nulo (bool): Se True, a etapa não roda quando alguma dependência resultou em None
+
+        Returns:
+            ExecutorEtapas: O próprio grafo, para encadear chamadas
+        """
+        if nome in self.etapas:
+            raise ValueError(f"Etapa '{nome}' registrada mais de uma vez")
+        desconhecidas = [dependencia for dependencia in dependencias if dependencia not in self.etapas]
+        if desconhecidas:
+            raise ValueError(f"Etapa '{nome}' depende de etapas não registradas: {desconhecidas}")
+        self.etapas[nome] = EtapaGrafo(nome, funcao, dependencias, argumentos, em_processo, linhas_saida, pular_se_nulo)
+        return self
+
+    def _executar_etapa(self, etapa_grafo, entradas, pai, pool_processos):
+        """
+        Executa uma etapa na thread atual, medindo-a como etapa concorrente.
+
+        Etapas marcadas com `em_processo` são enviadas ao pool de processos e
+        esperadas nesta thread.
+        """
+        etapa_grafo.inicio = time.perf_counter()
+        try:
+            with etapa(etapa_grafo.nome, pai=pai, concorrente=True) as medida:
+                if etapa_grafo.em_processo:
+                    resultado = pool_processos.submit(etapa_grafo.funcao, *entradas, *etapa_grafo.argumentos).result()
+                else:
+                    resultado = etapa_grafo.funcao(*entradas, *etapa_grafo.argumentos)
+                if etapa_grafo.linhas_saida is not None and resultado is not None:
+                    medida.linhas_saida = etapa_grafo.linhas_saida(resultado)
+            return resultado
+        finally:
+            etapa_grafo.fim = time.perf_counter()
+
+    def executar(self):
+        """
+        Executa o grafo, com as etapas independentes ao mesmo tempo.
+
+        Se uma etapa lança uma exceção, nenhuma etapa nova é iniciada, as que
+        estão em andamento terminam e a exceção é relançada.
+
+        Returns:
+            dict: Resultado de cada etapa, pelo nome
+        """
+        resultados = {}
+        pendentes = dict(self.etapas)
+        em_andamento = {}
+        erro = None
+        with etapa(self.nome) as medida_grafo:
+            pai = caminho_etapa_atual()
+            pool_processos = ProcessPoolExecutor(max_workers=self.max_paralelas) \
+                if any(etapa_grafo.em_processo for etapa_grafo in self.etapas.values()) else None
+            inicio = time.perf_counter()
+            try:
+                with ThreadPoolExecutor(max_workers=self.max_paralelas, thread_name_prefix=self.nome) as pool:
+                    while pendentes or em_andamento:
+                        # Inicia todas as etapas cujas dependências já terminaram
+                        for nome, etapa_grafo in list(pendentes.items()):
+                            if erro is not None:
+                                break
+                            if any(dependencia not in resultados for dependencia in etapa_grafo.dependencias):
+                                continue
+                            del pendentes[nome]
+                            entradas = [resultados[dependencia] for dependencia in etapa_grafo.dependencias]
+                            if etapa_grafo.pular_se_nulo and any(entrada is None for entrada in entradas):
+                                etapa_grafo.pulada = True
+                                resultados[nome] = None
+                                continue
+                            futuro = pool.submit(self._executar_etapa, etapa_grafo, entradas, pai, pool_processos)
+                            em_andamento[futuro] = nome
+                        if not em_andamento:
+                            if pendentes and erro is None:
+                                # Etapas puladas liberam as dependentes na próxima volta
+                                continue
+                            break
+                        concluidos, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+                        for futuro in concluidos:
+                            nome = em_andamento.pop(futuro)
+                            try:
+                                resultados[nome] = futuro.result()
+                            except BaseException as e:
+                                if erro is None:
+                                    erro = e
+            finally:
+                if pool_processos is not None:
+                    pool_processos.shutdown(cancel_futures=True)
+            total = time.perf_counter() - inicio
+            medida_grafo.detalhes['caminho_critico'] = self.caminho_critico()
+            self._registrar_caminho_critico(total)
+        if erro is not None:
+            raise erro
+        return resultados
+
+    def caminho_critico(self):
+        """
+        Calcula a sequência de etapas dependentes de maior duração somada.
+
+        Returns:
+            list: Nomes das etapas do caminho crítico, na ordem de execução
+        """
+        acumulado = {}
+        anterior = {}
+        # As etapas são registradas depois das suas dependências, então a ordem de registro é topológica
+        for nome, etapa_grafo in self.etapas.items():
+            maior = max(etapa_grafo.dependencias, key=lambda dependencia: acumulado[dependencia], default=None)
+            anterior[nome] = maior
+            acumulado[nome] = etapa_grafo.segundos + (acumulado[maior] if maior is not None else 0.0)
+        if not acumulado:
+            return []
+        nome = max(acumulado, key=acumulado.get)
+        caminho = []
+        while nome is not None:
+            caminho.append(nome)
+            nome = anterior[nome]
+        return caminho[::-1]
+
+    def _registrar_caminho_critico(self, total):
+        """
+        Mostra no log o caminho crítico e o tempo economizado pelo paralelismo.
+
+        Args:
+            total (float): Duração total da execução do grafo, em segundos
+        """
+        caminho = self.caminho_critico()
+        if not caminho:
+            return
+        segundos_caminho = sum(self.etapas[nome].segundos for nome in caminho)
+        segundos_soma = sum(etapa_grafo.segundos for etapa_grafo in self.etapas.values())
+        descricao = ' → '.join(f"{nome} ({self.etapas[nome].segundos:.2f}s)" for nome in caminho)
+        log_message(f"🧭 Caminho crítico de '{self.nome}': {descricao} = {segundos_caminho:.2f}s "
+                    f"(total {total:.2f}s; em sequência seriam {segundos_soma:.2f}s)")
+        puladas = [nome for nome, etapa_grafo in self.etapas.items() if etapa_grafo.pulada]
+        if puladas:
+            log_message(f"⏭️ Etapas não executadas por falha de uma dependência: {', '.join(puladas)}")
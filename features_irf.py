@@ -0,0 +1,236 @@
+"""# Variáveis do modelo IRF (treinamento e previsão)
+
+Implementação única das variáveis calculadas usadas pelo modelo, compartilhada
+por `modelo_irf.py` (treinamento) e `irf.py` (previsão):
+
+- "Dias Para Entrega": dias úteis entre a emissão da PO (BEDAT) e o due date,
+  sem fins de semana e feriados (ver `calendario_uteis.py`)
+- "carga_fornecedor": pedidos do mesmo fornecedor em aberto na data de emissão
+  da PO (sem contar o próprio pedido)
+
+A definição das variáveis é versionada em `FEATURE_SPEC_VERSAO`. As colunas
+calculadas são guardadas em disco (Parquet), identificadas pela impressão
+digital dos dados de entrada e pela versão, e reaproveitadas quando os mesmos
+dados são processados de novo.
+"""
+
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+from calendario_uteis import assinatura_feriados, contar_dias_uteis
+from indice_carga import IndiceCargaFornecedor
+from instrumentacao import log_message
+
+# Aumentar sempre que a forma de calcular alguma variável mudar
+# (v2: "Dias Para Entrega" desconta os feriados do calendário de dias úteis)
+FEATURE_SPEC_VERSAO = 2
+PASTA_FEATURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'features')
+# Quantidade máxima de arquivos mantidos no cache de variáveis
+MAX_ARQUIVOS_CACHE = 20
+
+COLUNA_BEDAT = 'BEDAT'
+COLUNA_DUE = 'Due Date (incl. ex works time)'
+COLUNA_FORNECEDOR = 'Vendor'
+COLUNAS_BASE = [COLUNA_FORNECEDOR, COLUNA_BEDAT, COLUNA_DUE]
+COLUNAS_FEATURES = ['Dias Para Entrega', 'carga_fornecedor']
+# Variáveis de entrada do modelo, na ordem usada no treinamento
+FEATURES_MODELO = ['MATKL', 'Vendor', 'NetOrderValue', 'Dias Para Entrega', 'carga_fornecedor']
+
+# Cache em memória, útil para processos de longa duração (ex.: servico_previsao.py)
+_CACHE_MEMORIA = {}
+
+def _inteiro_se_possivel(valores):
+    """
+    Converte um array float para inteiro quando não há valores nulos.
+
+    Args:
+        valores (numpy.ndarray): Valores calculados
+
+    Returns:
+        numpy.ndarray: Valores em int64, ou float64 com NaN se houver nulos
+    """
+    if np.isnan(valores).any():
+        return valores
+    return valores.astype(np.int64)
+
+def calcular_dias_para_entrega(df):
+    """
+    Calcula os dias úteis entre a emissão da PO e o due date.
+
+    Args:
+        df (pandas.DataFrame): DataFrame com as colunas BEDAT e Due Date
+
+    Returns:
+        numpy.ndarray: Dias úteis (NaN quando alguma das datas está vazia)
+    """
+    return _inteiro_se_possivel(contar_dias_uteis(df[COLUNA_BEDAT], df[COLUNA_DUE]))
+
+def calcular_carga_fornecedor(df, df_referencia=None, indice=None):
+    """
+    Calcula, para cada PO, quantos pedidos do mesmo fornecedor estavam em aberto
+    na data de emissão (BEDAT), sem contar o próprio pedido.
+
+    Um pedido da referência está em aberto na data d quando foi emitido até d e
+    o due date não é anterior a d. A contagem usa o índice de intervalos de
+    `indice_carga.py`.
+
+    Args:
+        df (pandas.DataFrame): POs para as quais a carga será calculada
+        df_referencia (pandas.DataFrame): Pedidos usados na contagem (devem incluir as
+            POs de `df`). Se None, usa o próprio `df`
+        indice (IndiceCargaFornecedor): Índice já construído dos pedidos de referência
+            (tem precedência sobre `df_referencia`)
+
+    Returns:
+        numpy.ndarray: Carga do fornecedor (NaN quando a PO não tem BEDAT)
+    """
+    if indice is None:
+        indice = IndiceCargaFornecedor.construir(df if df_referencia is None else df_referencia)
+    # O próprio pedido está no índice; o limite em zero cobre POs ausentes do índice
+    carga = np.maximum(indice.contar(df[COLUNA_FORNECEDOR], df[COLUNA_BEDAT]) - 1, 0)
+    return _inteiro_se_possivel(carga)
+
+def impressao_digital(df, df_referencia=None, indice=None):
+    """
+    Calcula a impressão digital dos dados usados no cálculo das variáveis.
+
+    Args:
+        df (pandas.DataFrame): POs para as quais as variáveis serão calculadas
+        df_referencia (pandas.DataFrame): Pedidos usados na contagem da carga
+        indice (IndiceCargaFornecedor): Índice da carga (substitui `df_referencia`)
+
+    Returns:
+        str: Hash que identifica os dados e a versão das variáveis
+    """
+    sha = hashlib.sha256(f"v{FEATURE_SPEC_VERSAO}|{assinatura_feriados()}|{len(df)}".encode('utf-8'))
+    conjuntos = [df]
+    if indice is not None:
+        sha.update(f"|indice:{indice.digital}".encode('utf-8'))
+    else:
+        conjuntos.append(df_referencia)
+    for dados in conjuntos:
+        if dados is None:
+            sha.update(b'|sem_referencia')
+            continue
+        base = dados[COLUNAS_BASE].copy()
+        base[COLUNA_FORNECEDOR] = base[COLUNA_FORNECEDOR].astype(str)
+        sha.update(pd.util.hash_pandas_object(base, index=False).to_numpy().tobytes())
+    return sha.hexdigest()[:24]
+
+def _caminho_cache(digital, pasta_cache):
+    """
+    Monta o caminho do arquivo de cache das variáveis.
+
+    Args:
+        digital (str): Impressão digital dos dados
+        pasta_cache (str): Pasta do cache de variáveis
+
+    Returns:
+        str: Caminho do arquivo Parquet
+    """
+    return os.path.join(pasta_cache, f"features_v{FEATURE_SPEC_VERSAO}_{digital}.parquet")
+
+def _limpar_cache(pasta_cache):
+    """
+    Remove os arquivos mais antigos do cache quando passam do limite.
+
+    Args:
+        pasta_cache (str): Pasta do cache de variáveis
+    """
+    arquivos = [
+        os.path.join(pasta_cache, nome) for nome in os.listdir(pasta_cache)
+        if nome.startswith('features_') and nome.endswith('.parquet')
+    ]
+    arquivos.sort(key=os.path.getmtime, reverse=True)
+    for caminho in arquivos[MAX_ARQUIVOS_CACHE:]:
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+def _ler_cache(caminho, n):
+    """
+    Lê as variáveis de um arquivo de cache, se existir e estiver íntegro.
+
+    Args:
+        caminho (str): Caminho do arquivo Parquet
+        n (int): Quantidade de linhas esperada
+
+    Returns:
+        pandas.DataFrame: Variáveis calculadas ou None
+    """
+    if not os.path.exists(caminho):
+        return None
+    try:
+        features = pd.read_parquet(caminho)
+    except Exception as e:
+        log_message(f"⚠️ Cache de variáveis ilegível, recalculando: {e}")
+        return None
+    if len(features) != n or list(features.columns) != COLUNAS_FEATURES:
+        return None
+    os.utime(caminho)  # Marca como usado recentemente
+    return features
+
+def _gravar_cache(caminho, features, pasta_cache):
+    """
+    Grava as variáveis calculadas no cache, de forma atômica.
+
+    Args:
+        caminho (str): Caminho do arquivo Parquet
+        features (pandas.DataFrame): Variáveis calculadas
+        pasta_cache (str): Pasta do cache de variáveis
+    """
+    try:
+        os.makedirs(pasta_cache, exist_ok=True)
+        caminho_tmp = f"{caminho}.tmp"
+        features.to_parquet(caminho_tmp, index=False)
+        os.replace(caminho_tmp, caminho)
+        _limpar_cache(pasta_cache)
+    except Exception as e:
+        # O cache é só uma otimização: falhas de gravação não interrompem o fluxo
+        log_message(f"⚠️ Não foi possível gravar o cache de variáveis: {e}")
+
+def calcular_features(df, df_referencia=None, pasta_cache=PASTA_FEATURES, usar_cache=True, indice=None):
+    """
+    Calcula (ou reaproveita do cache) as variáveis do modelo e as acrescenta ao DataFrame.
+
+    Args:
+        df (pandas.DataFrame): POs com as colunas Vendor, BEDAT e Due Date
+        df_referencia (pandas.DataFrame): Pedidos usados na contagem da carga do
+            fornecedor (devem incluir as POs de `df`). Se None, usa o próprio `df`
+        pasta_cache (str): Pasta do cache de variáveis
+        usar_cache (bool): Se False, sempre recalcula e não grava o cache
+        indice (IndiceCargaFornecedor): Índice já construído da carga do fornecedor
+            (tem precedência sobre `df_referencia`)
+
+    Returns:
+        pandas.DataFrame: O mesmo DataFrame com as colunas de `COLUNAS_FEATURES`
+    """
+    features = None
+    if usar_cache:
+        digital = impressao_digital(df, df_referencia, indice)
+        caminho = _caminho_cache(digital, pasta_cache)
+        features = _CACHE_MEMORIA.get(digital)
+        if features is None:
+            features = _ler_cache(caminho, len(df))
+            if features is not None:
+                log_message(f"⚡ Variáveis reaproveitadas do cache (v{FEATURE_SPEC_VERSAO}): {caminho}")
+
+    if features is None:
+        log_message(f"📐 Calculando variáveis do modelo (v{FEATURE_SPEC_VERSAO}) para {len(df)} registros...")
+        features = pd.DataFrame({
+            'Dias Para Entrega': calcular_dias_para_entrega(df),
+            'carga_fornecedor': calcular_carga_fornecedor(df, df_referencia, indice),
+        })
+        if usar_cache:
+            _gravar_cache(caminho, features, pasta_cache)
+
+    if usar_cache:
+        # Mantém só a entrada mais recente em memória
+        _CACHE_MEMORIA.clear()
+        _CACHE_MEMORIA[digital] = features
+
+    for coluna in COLUNAS_FEATURES:
+        df[coluna] = features[coluna].to_numpy()
+    return df
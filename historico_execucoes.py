@@ -0,0 +1,369 @@
+"""# Histórico colunar das execuções do IRF
+
+Além do Excel de cada execução, as previsões são acrescentadas a um histórico
+em Parquet particionado pelo mês da execução (`mes=AAAA-MM/`), com um arquivo
+por execução. Partições com muitos arquivos (e as de meses já encerrados) são
+compactadas em um único arquivo ordenado por PO/item, o que mantém as
+consultas rápidas.
+
+As funções de consulta respondem perguntas entre execuções sem abrir os
+arquivos Excel do histórico:
+
+- `serie_po`: previsão e precisão de uma PO/item em cada execução
+- `mudancas_previsao`: execuções em que a previsão de uma PO/item mudou
+- `serie_fornecedor`: participação de atrasos previstos de um fornecedor por execução
+"""
+
+import os
+import re
+import uuid
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from instrumentacao import log_message
+
+PASTA_REPOSITORIO = r'S:\Procurement\FUP\IRF - Índice de Risco de Fornecedores\Modelo de Machine Learning\Histórico Colunar'
+# Arquivos em uma partição do mês corrente que disparam a compactação
+MAX_ARQUIVOS_PARTICAO = 40
+NOME_COMPACTADO = 'compactado.parquet'
+
+# Colunas das previsões (já renomeadas pelo irf.py) -> colunas do histórico
+MAPA_COLUNAS = {
+    'PO': 'po',
+    'Item': 'item',
+    'Vendor': 'vendor',
+    'Fornecedor': 'fornecedor',
+    'Material Group': 'material_group',
+    'Valor Net': 'valor_net',
+    'Data de Emissão da PO': 'data_emissao',
+    'Stat. Del. Date': 'stat_del_date',
+    'Dias Para Entrega': 'dias_para_entrega',
+    'Carga do Fornecedor': 'carga_fornecedor',
+    'Previsão': 'previsao',
+    'Precisão': 'precisao',
+}
+
+# Esquema fixo do histórico (colunas ausentes nas previsões ficam nulas)
+ESQUEMA_HISTORICO = pa.schema([
+    ('execucao', pa.string()),
+    ('momento_execucao', pa.timestamp('s')),
+    ('po', pa.int64()),
+    ('item', pa.int32()),
+    ('vendor', pa.string()),
+    ('fornecedor', pa.string()),
+    ('material_group', pa.string()),
+    ('valor_net', pa.float64()),
+    ('data_emissao', pa.timestamp('s')),
+    ('stat_del_date', pa.timestamp('s')),
+    ('dias_para_entrega', pa.float64()),
+    ('carga_fornecedor', pa.float64()),
+    ('previsao', pa.string()),
+    ('precisao', pa.float64()),
+])
+_PARTICIONAMENTO = ds.partitioning(pa.schema([('mes', pa.string())]), flavor='hive')
+
+def _para_tabela(previsoes, momento, execucao):
+    """
+    Converte as previsões de uma execução para o esquema do histórico.
+
+    Args:
+        previsoes (pandas.DataFrame): Previsões (colunas renomeadas pelo irf.py)
+        momento (datetime): Data e hora da execução
+        execucao (str): Identificador da execução
+
+    Returns:
+        pyarrow.Table: Linhas da execução
+    """
+    colunas = {}
+    for origem, destino in MAPA_COLUNAS.items():
+        tipo = ESQUEMA_HISTORICO.field(destino).type
+        if origem not in previsoes.columns:
+            colunas[destino] = pa.nulls(len(previsoes), tipo)
+            continue
+        serie = previsoes[origem]
+        if pa.types.is_string(tipo):
+            valores = serie.astype(object).where(serie.notna(), None)
+            colunas[destino] = pa.array([None if v is None else str(v) for v in valores], tipo)
+        elif pa.types.is_timestamp(tipo):
+            colunas[destino] = pa.array(pd.to_datetime(serie, errors='coerce').astype('datetime64[s]'), tipo)
+        else:
+            colunas[destino] = pa.array(pd.to_numeric(serie, errors='coerce'), tipo, from_pandas=True)
+    colunas['execucao'] = pa.array([execucao] * len(previsoes), pa.string())
+    colunas['momento_execucao'] = pa.array(np.full(len(previsoes), np.datetime64(momento.replace(tzinfo=None), 's')), pa.timestamp('s'))
+    return pa.table([colunas[campo.name] for campo in ESQUEMA_HISTORICO], schema=ESQUEMA_HISTORICO)
+
+def _pasta_particao(pasta, momento):
+    """
+    Monta a pasta da partição (mês) de uma execução.
+    """
+    return os.path.join(pasta, f"mes={momento.strftime('%Y-%m')}")
+
+class RegistroExecucao:
+    """
+    Grava as previsões de uma execução no histórico colunar, por partes.
+
+    Cada chamada de `acrescentar` vira um grupo de linhas do arquivo Parquet
+    da execução, que só aparece na partição em `concluir` (renomeação atômica).
+    Permite registrar execuções processadas em blocos sem juntar as previsões.
+    """
+
+    def __init__(self, momento=None, pasta=PASTA_REPOSITORIO):
+        """
+        Args:
+            momento (datetime): Data e hora da execução (padrão: agora)
+            pasta (str): Pasta do histórico
+        """
+        self.momento = momento or datetime.now()
+        self.pasta = pasta
+        self.execucao = f"{self.momento.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        self.caminho = os.path.join(_pasta_particao(pasta, self.momento), f"execucao_{self.execucao}.parquet")
+        self.linhas = 0
+        self._escritor = None
+
+    def acrescentar(self, previsoes):
+        """
+        Acrescenta um bloco de previsões à execução.
+
+        Args:
+            previsoes (pandas.DataFrame): Previsões (colunas renomeadas pelo irf.py)
+        """
+        if self._escritor is None:
+            os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+            self._escritor = pq.ParquetWriter(f"{self.caminho}.tmp", ESQUEMA_HISTORICO, compression='zstd')
+        self._escritor.write_table(_para_tabela(previsoes, self.momento, self.execucao))
+        self.linhas += len(previsoes)
+
+    def concluir(self, compactar=True):
+        """
+        Publica o arquivo da execução na partição e compacta o histórico se necessário.
+
+        Args:
+            compactar (bool): Se True, compacta as partições que precisam
+
+        Returns:
+            str: Identificador da execução
+        """
+        if self._escritor is None:
+            self.acrescentar(pd.DataFrame())
+        self._escritor.close()
+        os.replace(f"{self.caminho}.tmp", self.caminho)
+        log_message(f"🗂️ Execução {self.execucao} registrada no histórico colunar ({self.linhas} linhas)")
+
+        # Compactação periódica: partições encerradas ou com arquivos demais
+        if compactar:
+            compactar_historico(self.pasta, apenas_necessarias=True)
+        return self.execucao
+
+    def descartar(self):
+        """
+        Abandona o registro, removendo o arquivo parcial.
+        """
+        if self._escritor is not None:
+            self._escritor.close()
+            self._escritor = None
+        if os.path.exists(f"{self.caminho}.tmp"):
+            os.remove(f"{self.caminho}.tmp")
+
+def registrar_execucao(previsoes, momento=None, pasta=PASTA_REPOSITORIO):
+    """
+    Acrescenta as previsões de uma execução ao histórico colunar.
+
+    Args:
+        previsoes (pandas.DataFrame): Previsões da execução (colunas renomeadas pelo irf.py)
+        momento (datetime): Data e hora da execução (padrão: agora)
+        pasta (str): Pasta do histórico
+
+    Returns:
+        str: Identificador da execução
+    """
+    registro = RegistroExecucao(momento, pasta)
+    try:
+        registro.acrescentar(previsoes)
+        return registro.concluir()
+    except BaseException:
+        registro.descartar()
+        raise
+
+def _arquivos_particao(pasta_particao):
+    """
+    Lista os arquivos Parquet de uma partição.
+    """
+    return sorted(
+        os.path.join(pasta_particao, nome) for nome in os.listdir(pasta_particao)
+        if nome.endswith('.parquet')
+    )
+
+def compactar_historico(pasta=PASTA_REPOSITORIO, apenas_necessarias=False):
+    """
+    Junta os arquivos de cada partição em um único arquivo ordenado por PO/item.
+
+    Args:
+        pasta (str): Pasta do histórico
+        apenas_necessarias (bool): Se True, compacta só as partições de meses
+            encerrados com mais de um arquivo e as que passaram de `MAX_ARQUIVOS_PARTICAO`
+
+    Returns:
+        int: Quantidade de partições compactadas
+    """
+    if not os.path.isdir(pasta):
+        return 0
+    mes_atual = f"mes={datetime.now().strftime('%Y-%m')}"
+    compactadas = 0
+    for nome in sorted(os.listdir(pasta)):
+        pasta_particao = os.path.join(pasta, nome)
+        if not (nome.startswith('mes=') and os.path.isdir(pasta_particao)):
+            continue
+        arquivos = _arquivos_particao(pasta_particao)
+        if len(arquivos) <= 1:
+            continue
+        if apenas_necessarias and nome == mes_atual and len(arquivos) <= MAX_ARQUIVOS_PARTICAO:
+            continue
+        tabela = pa.concat_tables([pq.read_table(arquivo, schema=ESQUEMA_HISTORICO) for arquivo in arquivos])
+        tabela = tabela.sort_by([('po', 'ascending'), ('item', 'ascending'), ('momento_execucao', 'ascending')])
+        # Grava o compactado antes de apagar os arquivos de origem (uma falha não perde execuções)
+        caminho_tmp = os.path.join(pasta_particao, f"{NOME_COMPACTADO}.novo")
+        pq.write_table(tabela, caminho_tmp, compression='zstd', row_group_size=250_000)
+        os.replace(caminho_tmp, os.path.join(pasta_particao, NOME_COMPACTADO))
+        for arquivo in arquivos:
+            if os.path.basename(arquivo) != NOME_COMPACTADO:
+                os.remove(arquivo)
+        compactadas += 1
+        log_message(f"🗜️ Partição {nome} compactada ({len(arquivos)} arquivos, {tabela.num_rows} linhas)")
+    return compactadas
+
+def carregar_historico(colunas=None, filtro=None, inicio=None, fim=None, pasta=PASTA_REPOSITORIO):
+    """
+    Lê linhas do histórico, lendo só as partições e colunas necessárias.
+
+    Args:
+        colunas (list): Colunas a retornar (None para todas)
+        filtro (pyarrow.compute.Expression): Filtro adicional (ex.: `ds.field('po') == 4500000001`)
+        inicio (str|datetime): Primeira data de execução considerada
+        fim (str|datetime): Última data de execução considerada (inclusive)
+        pasta (str): Pasta do histórico
+
+    Returns:
+        pandas.DataFrame: Linhas do histórico ordenadas pelo momento da execução
+    """
+    if not os.path.isdir(pasta):
+        return pd.DataFrame(columns=colunas or ESQUEMA_HISTORICO.names)
+    dataset = ds.dataset(pasta, format='parquet', schema=ESQUEMA_HISTORICO.append(pa.field('mes', pa.string())),
+                         partitioning=_PARTICIONAMENTO)
+    expressao = filtro
+    if inicio is not None:
+        inicio = pd.Timestamp(inicio)
+        condicao = (ds.field('mes') >= inicio.strftime('%Y-%m')) & (ds.field('momento_execucao') >= pa.scalar(inicio.to_pydatetime(), pa.timestamp('s')))
+        expressao = condicao if expressao is None else expressao & condicao
+    if fim is not None:
+        fim = pd.Timestamp(fim)
+        limite = fim + pd.Timedelta(days=1) if fim == fim.normalize() else fim
+        condicao = (ds.field('mes') <= fim.strftime('%Y-%m')) & (ds.field('momento_execucao') < pa.scalar(limite.to_pydatetime(), pa.timestamp('s')))
+        expressao = condicao if expressao is None else expressao & condicao
+    nomes = None
+    if colunas is not None:
+        nomes = list(dict.fromkeys(list(colunas) + ['momento_execucao']))
+    df = dataset.to_table(columns=nomes, filter=expressao).to_pandas()
+    df = df.sort_values('momento_execucao', kind='stable').reset_index(drop=True)
+    return df[list(colunas)] if colunas is not None else df.drop(columns=['mes'], errors='ignore')
+
+def serie_po(po, item=None, pasta=PASTA_REPOSITORIO, **kwargs):
+    """
+    Previsão e precisão de uma PO (ou PO/item) em cada execução.
+
+    Args:
+        po (int): Número da PO (EBELN)
+        item (int): Item da PO (EBELP); None para todos os itens
+        pasta (str): Pasta do histórico
+        **kwargs: `inicio`/`fim` de `carregar_historico`
+
+    Returns:
+        pandas.DataFrame: Uma linha por execução e item
+    """
+    filtro = ds.field('po') == int(po)
+    if item is not None:
+        filtro = filtro & (ds.field('item') == int(item))
+    return carregar_historico(
+        ['momento_execucao', 'execucao', 'po', 'item', 'previsao', 'precisao', 'carga_fornecedor', 'stat_del_date'],
+        filtro, pasta=pasta, **kwargs,
+    )
+
+def mudancas_previsao(po, item, pasta=PASTA_REPOSITORIO, **kwargs):
+    """
+    Execuções em que a previsão de uma PO/item mudou (ex.: de "No Prazo" para "Atraso").
+
+    Args:
+        po (int): Número da PO (EBELN)
+        item (int): Item da PO (EBELP)
+        pasta (str): Pasta do histórico
+        **kwargs: `inicio`/`fim` de `carregar_historico`
+
+    Returns:
+        pandas.DataFrame: Execuções com a previsão anterior e a nova
+    """
+    serie = serie_po(po, item, pasta=pasta, **kwargs)
+    serie['previsao_anterior'] = serie['previsao'].shift()
+    mudou = serie['previsao_anterior'].notna() & (serie['previsao'] != serie['previsao_anterior'])
+    return serie.loc[mudou, ['momento_execucao', 'execucao', 'previsao_anterior', 'previsao', 'precisao']].reset_index(drop=True)
+
+def serie_fornecedor(vendor, pasta=PASTA_REPOSITORIO, **kwargs):
+    """
+    Evolução das previsões de um fornecedor por execução.
+
+    Args:
+        vendor (str): Código do fornecedor (Vendor)
+        pasta (str): Pasta do histórico
+        **kwargs: `inicio`/`fim` de `carregar_historico`
+
+    Returns:
+        pandas.DataFrame: Por execução: linhas em aberto, linhas previstas com
+            atraso, participação de atrasos, valor net em atraso e carga média
+    """
+    df = carregar_historico(
+        ['momento_execucao', 'execucao', 'previsao', 'valor_net', 'carga_fornecedor'],
+        ds.field('vendor') == str(vendor), pasta=pasta, **kwargs,
+    )
+    df['atraso'] = df['previsao'] == 'Atraso'
+    df['valor_atraso'] = df['valor_net'].where(df['atraso'], 0.0)
+    resumo = df.groupby(['momento_execucao', 'execucao'], sort=True).agg(
+        linhas=('atraso', 'size'),
+        linhas_atraso=('atraso', 'sum'),
+        valor_net_atraso=('valor_atraso', 'sum'),
+        carga_media=('carga_fornecedor', 'mean'),
+    ).reset_index()
+    resumo['participacao_atraso'] = resumo['linhas_atraso'] / resumo['linhas']
+    return resumo
+
+def importar_planilhas(pasta_planilhas, pasta=PASTA_REPOSITORIO):
+    """
+    Importa para o histórico colunar os arquivos "IRF - dd-mm-aaaa HH-MM.xlsx" já existentes.
+
+    Uso único, para preencher o histórico com as execuções anteriores a ele.
+    Execuções já importadas (mesmo momento) são ignoradas.
+
+    Args:
+        pasta_planilhas (str): Pasta "Histórico de Execuções"
+        pasta (str): Pasta do histórico colunar
+
+    Returns:
+        int: Quantidade de execuções importadas
+    """
+    padrao = re.compile(r'^IRF - (\d{2}-\d{2}-\d{4} \d{2}-\d{2})\.xlsx$')
+    existentes = set()
+    if os.path.isdir(pasta):
+        existentes = set(carregar_historico(['momento_execucao'], pasta=pasta)['momento_execucao'].unique())
+    importadas = 0
+    for nome in sorted(os.listdir(pasta_planilhas)):
+        encontrado = padrao.match(nome)
+        if not encontrado:
+            continue
+        momento = datetime.strptime(encontrado.group(1), '%d-%m-%Y %H-%M')
+        if pd.Timestamp(momento) in existentes:
+            continue
+        previsoes = pd.read_excel(os.path.join(pasta_planilhas, nome), sheet_name='Pedidos em Aberto')
+        registrar_execucao(previsoes, momento, pasta)
+        importadas += 1
+    compactar_historico(pasta, apenas_necessarias=True)
+    return importadas
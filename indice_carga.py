@@ -0,0 +1,323 @@
+"""# Índice de intervalos da carga do fornecedor
+
+Guarda, por fornecedor, as datas de abertura (BEDAT) e de fechamento (due date)
+dos pedidos em arrays ordenados. Com uma busca binária (`searchsorted`) o
+índice responde quantos pedidos de um fornecedor estavam em aberto em qualquer
+data, para um par (fornecedor, data) ou para arrays de pares, sem refazer a
+varredura de eventos. O índice pode ser gravado em disco e reaproveitado:
+`obter_indice` lê a cópia gravada quando a impressão digital dos pedidos de
+entrada é a mesma da última construção, e só reconstrói quando ela muda.
+
+Um pedido está em aberto na data d quando foi emitido até d e o due date não é
+anterior a d.
+"""
+
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+from instrumentacao import log_message
+
+VERSAO_INDICE = 2
+PASTA_INDICE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+ARQUIVO_INDICE = os.path.join(PASTA_INDICE, 'indice_carga_fornecedor.npz')
+
+COLUNA_BEDAT = 'BEDAT'
+COLUNA_DUE = 'Due Date (incl. ex works time)'
+COLUNA_FORNECEDOR = 'Vendor'
+COLUNAS_INDICE = [COLUNA_FORNECEDOR, COLUNA_BEDAT, COLUNA_DUE]
+
+# Deslocamento que torna o número de dias não negativo dentro da chave (fornecedor, dia)
+_DESLOCAMENTO_DIA = 1 << 31
+
+def _dias(datas):
+    """
+    Converte datas para o número de dias desde 1970-01-01.
+
+    Args:
+        datas: Datas (Series, array ou lista)
+
+    Returns:
+        tuple: (dias em int64, máscara de datas válidas)
+    """
+    valores = pd.to_datetime(pd.Series(datas) if np.ndim(datas) else pd.Series([datas])).to_numpy(dtype='datetime64[D]')
+    validas = ~np.isnat(valores)
+    return valores.astype(np.int64), validas
+
+def _chaves(codigos, dias):
+    """
+    Combina código do fornecedor e dia em uma única chave ordenável.
+
+    Args:
+        codigos (numpy.ndarray): Códigos dos fornecedores
+        dias (numpy.ndarray): Dias desde 1970-01-01
+
+    Returns:
+        numpy.ndarray: Chaves int64 (fornecedor nos bits altos, dia nos baixos)
+    """
+    return (codigos.astype(np.int64) << 32) | (dias + _DESLOCAMENTO_DIA)
+
+def _colunas_indice(df):
+    """
+    Converte as colunas do índice para os arrays usados na construção.
+
+    Args:
+        df (pandas.DataFrame): Pedidos com as colunas Vendor, BEDAT e Due Date
+
+    Returns:
+        tuple: (códigos dos fornecedores, fornecedores em ordem, (dias, válidas) da
+            abertura, (dias, válidas) do fechamento)
+    """
+    codigos, fornecedores = _fatorar_fornecedores(df[COLUNA_FORNECEDOR])
+    return codigos, fornecedores, _dias(df[COLUNA_BEDAT]), _dias(df[COLUNA_DUE])
+
+def _fatorar_fornecedores(serie):
+    """
+    Codifica os fornecedores como texto, em ordem alfabética.
+
+    Colunas categóricas (como a Vendor lida pelo `esquema_otp`) são codificadas
+    pelas categorias, sem converter as linhas uma a uma para texto.
+
+    Args:
+        serie (pandas.Series): Coluna Vendor
+
+    Returns:
+        tuple: (códigos por linha, fornecedores em ordem alfabética)
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype) and not serie.isna().any():
+        codigos, categorias = pd.factorize(serie)
+        textos = np.asarray(categorias.astype(str), dtype=object)
+        if len(set(textos)) == len(textos):
+            ordem = np.argsort(textos, kind='stable')
+            posicao = np.empty(len(ordem), dtype=np.int64)
+            posicao[ordem] = np.arange(len(ordem))
+            return posicao[codigos], textos[ordem]
+    codigos, fornecedores = pd.factorize(serie.astype(str), sort=True)
+    return codigos, np.asarray(fornecedores, dtype=object)
+
+def impressao_pedidos(colunas):
+    """
+    Calcula a impressão digital dos pedidos usados na construção do índice.
+
+    Args:
+        colunas (tuple): Colunas do índice convertidas por `_colunas_indice`
+
+    Returns:
+        str: Hash dos fornecedores, das datas e da versão do índice
+    """
+    codigos, fornecedores, (dias_abertura, _), (dias_fechamento, _) = colunas
+    sha = hashlib.sha256(f"v{VERSAO_INDICE}|{len(codigos)}".encode('utf-8'))
+    sha.update('\x1f'.join(fornecedores.tolist()).encode('utf-8'))
+    for valores in (codigos, dias_abertura, dias_fechamento):
+        sha.update(np.ascontiguousarray(valores).tobytes())
+    return sha.hexdigest()[:24]
+
+class IndiceCargaFornecedor:
+    """
+    Índice de intervalos (abertura, fechamento) dos pedidos de cada fornecedor.
+
+    As chaves de abertura e de fechamento de todos os fornecedores ficam em dois
+    arrays ordenados por (fornecedor, dia), então cada consulta custa duas
+    buscas binárias.
+    """
+
+    def __init__(self, fornecedores, chaves_abertura, chaves_fechamento, impressao_entrada=None):
+        """
+        Args:
+            fornecedores (numpy.ndarray): Fornecedores (texto), na ordem dos códigos
+            chaves_abertura (numpy.ndarray): Chaves ordenadas das aberturas
+            chaves_fechamento (numpy.ndarray): Chaves ordenadas dos fechamentos
+            impressao_entrada (str): Impressão digital dos pedidos de origem
+                (`impressao_pedidos`), se conhecida
+        """
+        self.impressao_entrada = impressao_entrada
+        self.fornecedores = np.asarray(fornecedores, dtype=object)
+        self.chaves_abertura = np.asarray(chaves_abertura, dtype=np.int64)
+        self.chaves_fechamento = np.asarray(chaves_fechamento, dtype=np.int64)
+        self._codigos = pd.Index(self.fornecedores)
+        # Início de cada fornecedor nos arrays de chaves
+        limites = np.arange(len(self.fornecedores), dtype=np.int64) << 32
+        self._inicio_abertura = np.searchsorted(self.chaves_abertura, limites)
+        self._inicio_fechamento = np.searchsorted(self.chaves_fechamento, limites)
+
+    @classmethod
+    def construir(cls, df, colunas=None, impressao_entrada=None):
+        """
+        Constrói o índice a partir dos pedidos.
+
+        Pedidos sem BEDAT não entram no índice; pedidos sem due date ficam em
+        aberto indefinidamente.
+
+        Args:
+            df (pandas.DataFrame): Pedidos com as colunas Vendor, BEDAT e Due Date
+            colunas (tuple): Colunas de `df` já convertidas por `_colunas_indice`, se disponíveis
+            impressao_entrada (str): Impressão digital de `df`, guardada junto ao índice
+
+        Returns:
+            IndiceCargaFornecedor: Índice construído
+        """
+        codigos, fornecedores, (dias_abertura, com_abertura), (dias_fechamento, com_fechamento) = \
+            colunas if colunas is not None else _colunas_indice(df)
+        com_fechamento = com_fechamento & com_abertura
+        chaves_abertura = np.sort(_chaves(codigos[com_abertura], dias_abertura[com_abertura]))
+        chaves_fechamento = np.sort(_chaves(codigos[com_fechamento], dias_fechamento[com_fechamento]))
+        return cls(fornecedores, chaves_abertura, chaves_fechamento, impressao_entrada)
+
+    def __len__(self):
+        return len(self.chaves_abertura)
+
+    @property
+    def digital(self):
+        """
+        str: Hash do conteúdo do índice (identifica os pedidos indexados).
+        """
+        sha = hashlib.sha256(f"v{VERSAO_INDICE}".encode('utf-8'))
+        sha.update('\x1f'.join(self.fornecedores.tolist()).encode('utf-8'))
+        sha.update(self.chaves_abertura.tobytes())
+        sha.update(self.chaves_fechamento.tobytes())
+        return sha.hexdigest()[:24]
+
+    def contar(self, fornecedores, datas):
+        """
+        Conta os pedidos em aberto para arrays de pares (fornecedor, data).
+
+        Args:
+            fornecedores: Fornecedores consultados (Series, array ou lista)
+            datas: Datas consultadas, do mesmo tamanho
+
+        Returns:
+            numpy.ndarray: Pedidos em aberto (float, NaN quando a data está vazia;
+                0 para fornecedores fora do índice)
+        """
+        fornecedores = pd.Series(fornecedores).astype(str).to_numpy()
+        dias, validas = _dias(datas)
+        codigos = self._codigos.get_indexer(fornecedores)
+        conhecidos = validas & (codigos >= 0)
+
+        contagem = np.where(validas, 0.0, np.nan)
+        if conhecidos.any():
+            codigos = codigos[conhecidos]
+            chaves = _chaves(codigos, dias[conhecidos])
+            # Consultas ordenadas deixam as buscas binárias bem mais rápidas em lotes grandes
+            ordem = np.argsort(chaves, kind='stable')
+            chaves_ordenadas = chaves[ordem]
+            resultado = np.empty(len(chaves), dtype=np.int64)
+            resultado[ordem] = (
+                np.searchsorted(self.chaves_abertura, chaves_ordenadas, side='right')
+                - np.searchsorted(self.chaves_fechamento, chaves_ordenadas, side='left')
+            )
+            contagem[conhecidos] = resultado - self._inicio_abertura[codigos] + self._inicio_fechamento[codigos]
+        return contagem
+
+    def carga_em(self, fornecedor, data):
+        """
+        Conta os pedidos em aberto de um fornecedor em uma data.
+
+        Args:
+            fornecedor (str): Fornecedor
+            data: Data da consulta
+
+        Returns:
+            int: Pedidos em aberto (0 se o fornecedor não estiver no índice)
+        """
+        return int(self.contar([fornecedor], [data])[0])
+
+    def com_pedidos(self, df):
+        """
+        Cria um novo índice com os pedidos informados acrescentados.
+
+        Útil para simulações ("e se") e para lotes de pedidos que ainda não
+        estão na base, sem reconstruir o índice do zero.
+
+        Args:
+            df (pandas.DataFrame): Pedidos a acrescentar (Vendor, BEDAT e Due Date)
+
+        Returns:
+            IndiceCargaFornecedor: Novo índice
+        """
+        novos = IndiceCargaFornecedor.construir(df)
+        fornecedores = pd.Index(self.fornecedores).union(pd.Index(novos.fornecedores), sort=True)
+
+        def _recodificar(indice, chaves):
+            codigos = (chaves >> 32).astype(np.int64)
+            dias = (chaves & 0xFFFFFFFF) - _DESLOCAMENTO_DIA
+            return _chaves(fornecedores.get_indexer(indice.fornecedores[codigos]), dias)
+
+        chaves_abertura = np.sort(np.concatenate([
+            _recodificar(self, self.chaves_abertura), _recodificar(novos, novos.chaves_abertura),
+        ]))
+        chaves_fechamento = np.sort(np.concatenate([
+            _recodificar(self, self.chaves_fechamento), _recodificar(novos, novos.chaves_fechamento),
+        ]))
+        return IndiceCargaFornecedor(np.asarray(fornecedores, dtype=object), chaves_abertura, chaves_fechamento)
+
+    def salvar(self, caminho=ARQUIVO_INDICE):
+        """
+        Grava o índice em disco (formato .npz), de forma atômica.
+
+        Args:
+            caminho (str): Caminho do arquivo
+        """
+        os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+        caminho_tmp = f"{caminho}.tmp.npz"
+        np.savez(
+            caminho_tmp,
+            versao=np.array(VERSAO_INDICE),
+            fornecedores=self.fornecedores.astype(str),
+            chaves_abertura=self.chaves_abertura,
+            chaves_fechamento=self.chaves_fechamento,
+            impressao_entrada=np.array(self.impressao_entrada or ''),
+        )
+        os.replace(caminho_tmp, caminho)
+
+    @classmethod
+    def carregar(cls, caminho=ARQUIVO_INDICE):
+        """
+        Lê um índice gravado com `salvar`.
+
+        Args:
+            caminho (str): Caminho do arquivo
+
+        Returns:
+            IndiceCargaFornecedor: Índice lido ou None se não existir ou for de outra versão
+        """
+        if not os.path.exists(caminho):
+            return None
+        with np.load(caminho, allow_pickle=False) as dados:
+            if int(dados['versao']) != VERSAO_INDICE:
+                return None
+            return cls(dados['fornecedores'].astype(object), dados['chaves_abertura'], dados['chaves_fechamento'],
+                       str(dados['impressao_entrada']) or None)
+
+def obter_indice(df, caminho=ARQUIVO_INDICE):
+    """
+    Lê o índice gravado em disco se ele foi construído com os mesmos pedidos;
+    caso contrário, constrói o índice e atualiza a cópia gravada.
+
+    Args:
+        df (pandas.DataFrame): Pedidos com as colunas Vendor, BEDAT e Due Date
+        caminho (str): Caminho do índice gravado (None para não ler nem gravar)
+
+    Returns:
+        IndiceCargaFornecedor: Índice dos pedidos
+    """
+    if caminho is None:
+        return IndiceCargaFornecedor.construir(df)
+    colunas = _colunas_indice(df)
+    impressao = impressao_pedidos(colunas)
+    try:
+        gravado = IndiceCargaFornecedor.carregar(caminho)
+    except Exception as e:
+        log_message(f"⚠️ Índice da carga gravado ilegível, reconstruindo: {caminho} ({e})")
+        gravado = None
+    if gravado is not None and gravado.impressao_entrada == impressao:
+        log_message(f"⚡ Índice da carga reaproveitado do disco ({len(gravado)} pedidos): {caminho}")
+        return gravado
+
+    indice = IndiceCargaFornecedor.construir(df, colunas, impressao)
+    try:
+        indice.salvar(caminho)
+    except OSError as e:
+        # A cópia em disco é só um atalho para a próxima execução: falhas não interrompem o fluxo
+        log_message(f"⚠️ Não foi possível gravar o índice da carga: {caminho} ({e})")
+    return indice
@@ -0,0 +1,366 @@
+"""# Ingestão incremental do export CELONIS
+
+Compara o export CELONIS mais recente com o último export ingerido, pela chave
+de PO/item (EBELN/EBELP), e separa as linhas inseridas, atualizadas, encerradas
+(GR Document Date recém-preenchida) e removidas.
+
+O repositório das linhas é a própria aba "Base OTP" da planilha de destino.
+Um índice local guarda, para cada linha ingerida, a chave, o hash do conteúdo
+e a linha da aba em que ela está. Com ele, `distribuir_linhas` decide quais
+linhas da aba precisam ser reescritas: as alteradas ficam na mesma linha, as
+inseridas ocupam as linhas das removidas (ou vão para o final) e as do final
+que sobrariam além da nova última linha são movidas para as vagas restantes.
+O `atualizar_planilha.py` reescreve só essas linhas (`pacote_xlsx.py`), então
+o trabalho por célula acompanha o volume de mudanças, não o tamanho da base.
+
+O estado guarda o hash dos arquivos de entrada já ingeridos e o tamanho, a
+data de modificação e as colunas da planilha gravada: se ela mudou fora do
+script, a aba é reescrita por inteiro.
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from cache_base import PASTA_CACHE, calcular_hash_arquivo, preparar_para_parquet
+from instrumentacao import log_message
+
+PASTA_INGESTAO = os.path.join(PASTA_CACHE, 'ingestao')
+CHAVES_PO = ['EBELN', 'EBELP']
+COLUNA_OCORRENCIA = '_ocorrencia'
+COLUNA_GR = 'GR Document Date'
+# Linha da aba "Base OTP" em que cada linha do índice está (a linha 1 é o cabeçalho)
+COLUNA_LINHA_PLANILHA = '_linha_planilha'
+
+def _caminhos_repositorio(pasta):
+    """
+    Monta os caminhos dos arquivos do repositório incremental.
+
+    Args:
+        pasta (str): Pasta do repositório
+
+    Returns:
+        dict: Caminhos do índice e do estado
+    """
+    return {
+        'indice': os.path.join(pasta, 'indice.parquet'),
+        'estado': os.path.join(pasta, 'estado.json'),
+    }
+
+def _gravar_parquet(df, caminho):
+    """
+    Grava um DataFrame em Parquet de forma atômica.
+
+    Args:
+        df (pandas.DataFrame): DataFrame a ser gravado
+        caminho (str): Caminho final do arquivo
+    """
+    caminho_tmp = caminho + '.tmp'
+    preparar_para_parquet(df).to_parquet(caminho_tmp, engine='pyarrow', index=False)
+    os.replace(caminho_tmp, caminho)
+
+def _ler_estado(pasta):
+    """
+    Lê o estado do repositório (arquivos já ingeridos).
+
+    Args:
+        pasta (str): Pasta do repositório
+
+    Returns:
+        dict: Estado do repositório (vazio se ainda não existir)
+    """
+    caminho = _caminhos_repositorio(pasta)['estado']
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, 'r', encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+def _gravar_estado(pasta, estado):
+    """
+    Grava o estado do repositório de forma atômica.
+
+    Args:
+        pasta (str): Pasta do repositório
+        estado (dict): Estado a ser gravado
+    """
+    caminho = _caminhos_repositorio(pasta)['estado']
+    caminho_tmp = caminho + '.tmp'
+    with open(caminho_tmp, 'w', encoding='utf-8') as arquivo:
+        json.dump(estado, arquivo, ensure_ascii=False, indent=2)
+    os.replace(caminho_tmp, caminho)
+
+def _chaves_com_ocorrencia(df):
+    """
+    Monta a chave de cada linha: EBELN, EBELP e a ocorrência da chave no arquivo,
+    para que linhas repetidas de um mesmo PO/item não se sobrescrevam.
+
+    Args:
+        df (pandas.DataFrame): DataFrame do export
+
+    Returns:
+        pandas.DataFrame: DataFrame apenas com as colunas de chave
+    """
+    chaves = df[CHAVES_PO].reset_index(drop=True)
+    chaves[COLUNA_OCORRENCIA] = chaves.groupby(CHAVES_PO, sort=False).cumcount()
+    return chaves
+
+def calcular_delta(df_novo, pasta=PASTA_INGESTAO):
+    """
+    Compara o export novo com o último export ingerido, sem gravar nada.
+
+    Cada linha é representada por um hash do seu conteúdo, e a comparação é feita
+    apenas sobre o índice (chaves + hash) do repositório.
+
+    Args:
+        df_novo (pandas.DataFrame): Dados do export CELONIS mais recente
+        pasta (str): Pasta do repositório incremental
+
+    Returns:
+        dict: Delta calculado, com o índice do export novo, as posições (em `df_novo`)
+              das linhas inseridas e das alteradas (atualizadas ou encerradas), a
+              linha da aba de cada linha já ingerida e as contagens de cada operação
+    """
+    colunas_faltando = [col for col in CHAVES_PO if col not in df_novo.columns]
+    if colunas_faltando:
+        raise ValueError(f"Colunas de chave não encontradas no export: {colunas_faltando}")
+
+    indice_novo = _chaves_com_ocorrencia(df_novo)
+    indice_novo['_hash'] = pd.util.hash_pandas_object(df_novo, index=False).to_numpy()
+    if COLUNA_GR in df_novo.columns:
+        indice_novo['_gr_preenchido'] = df_novo[COLUNA_GR].notna().to_numpy()
+    else:
+        indice_novo['_gr_preenchido'] = False
+
+    caminho_indice = _caminhos_repositorio(pasta)['indice']
+    chaves = CHAVES_PO + [COLUNA_OCORRENCIA]
+    delta = {
+        'indice': indice_novo,
+        'colunas': [str(coluna) for coluna in df_novo.columns],
+        'linhas_export': len(indice_novo),
+    }
+
+    if not os.path.exists(caminho_indice):
+        delta.update({
+            'primeira_carga': True,
+            'linhas_inseridas': np.arange(len(indice_novo)),
+            'linhas_alteradas': np.array([], dtype=np.int64),
+            'linhas_planilha': None,
+            'linhas_planilha_anteriores': 0,
+            'inseridos': len(indice_novo),
+            'atualizados': 0,
+            'encerrados': 0,
+            'removidos': 0,
+            'total': len(indice_novo),
+        })
+        return delta
+
+    indice_anterior = pd.read_parquet(caminho_indice, engine='pyarrow')
+    comparacao = indice_novo.assign(_linha=np.arange(len(indice_novo))).merge(
+        indice_anterior, on=chaves, how='outer', suffixes=('', '_anterior'), indicator=True
+    )
+    em_ambos = (comparacao['_merge'] == 'both').to_numpy()
+    alterados = em_ambos & (comparacao['_hash'] != comparacao['_hash_anterior']).to_numpy()
+    encerrados = alterados & (
+        comparacao['_gr_preenchido'].fillna(False).astype(bool)
+        & ~comparacao['_gr_preenchido_anterior'].fillna(False).astype(bool)
+    ).to_numpy()
+    atualizados = alterados & ~encerrados
+    inseridos = (comparacao['_merge'] == 'left_only').to_numpy()
+    removidos = (comparacao['_merge'] == 'right_only').to_numpy()
+
+    def _linhas(mascara):
+        return comparacao.loc[mascara, '_linha'].to_numpy(dtype=np.int64)
+
+    # Linha da aba de cada linha do export novo já ingerida (-1 nas inseridas); índices
+    # gravados antes da numeração das linhas não permitem reescrever só parte da aba
+    linhas_planilha = None
+    if COLUNA_LINHA_PLANILHA in indice_anterior.columns:
+        linhas_planilha = np.full(len(indice_novo), -1, dtype=np.int64)
+        linhas_planilha[_linhas(em_ambos)] = comparacao.loc[em_ambos, COLUNA_LINHA_PLANILHA].to_numpy(dtype=np.int64)
+
+    delta.update({
+        'primeira_carga': False,
+        'linhas_inseridas': _linhas(inseridos),
+        'linhas_alteradas': _linhas(alterados),
+        'linhas_planilha': linhas_planilha,
+        'linhas_planilha_anteriores': len(indice_anterior),
+        'inseridos': int(inseridos.sum()),
+        'atualizados': int(atualizados.sum()),
+        'encerrados': int(encerrados.sum()),
+        'removidos': int(removidos.sum()),
+    })
+    delta['total'] = delta['inseridos'] + delta['atualizados'] + delta['encerrados'] + delta['removidos']
+    return delta
+
+def distribuir_linhas(delta):
+    """
+    Decide em que linha da aba cada linha do export novo fica e quais precisam ser escritas.
+
+    As linhas sem mudança continuam onde estão. As alteradas são reescritas na
+    mesma linha. As inseridas e as que ficariam além da nova última linha (a aba
+    encolhe quando há mais remoções do que inserções) ocupam as linhas que
+    ficaram vagas, em ordem, e o que sobra vai para o final da aba.
+
+    Args:
+        delta (dict): Delta retornado por `calcular_delta`
+
+    Returns:
+        dict: Plano com as posições (em `df_novo`) das linhas a escrever, em ordem de
+              linha da aba (`posicoes`), a linha de destino de cada uma (`destinos`),
+              a última linha da aba antes e depois (`ultima_linha_anterior`,
+              `ultima_linha`) e a linha de cada linha do export (`linhas_planilha`);
+              None se o índice anterior não tiver as linhas da aba
+
+    Raises:
+        ValueError: Se o índice anterior tiver linhas da aba repetidas ou fora da aba
+    """
+    if delta['primeira_carga'] or delta['linhas_planilha'] is None:
+        return None
+    linhas = delta['linhas_planilha'].copy()
+    ultima_anterior = delta['linhas_planilha_anteriores'] + 1
+    ultima = delta['linhas_export'] + 1
+
+    reescrever = np.zeros(len(linhas), dtype=bool)
+    reescrever[delta['linhas_alteradas']] = True
+    mantidas = (linhas >= 2) & (linhas <= ultima)
+    vagas = np.setdiff1d(np.arange(2, ultima + 1), linhas[mantidas])
+    mover = np.flatnonzero(~mantidas)
+    if len(vagas) != len(mover) or linhas.max(initial=0) > ultima_anterior:
+        raise ValueError("Índice da ingestão com linhas da aba inconsistentes")
+    linhas[mover] = vagas
+    reescrever[mover] = True
+
+    posicoes = np.flatnonzero(reescrever)
+    posicoes = posicoes[np.argsort(linhas[posicoes], kind='stable')]
+    return {
+        'posicoes': posicoes,
+        'destinos': linhas[posicoes],
+        'ultima_linha': ultima,
+        'ultima_linha_anterior': ultima_anterior,
+        'linhas_planilha': linhas,
+    }
+
+def planilha_sincronizada(caminho, colunas, pasta=PASTA_INGESTAO):
+    """
+    Verifica se a planilha de destino é a mesma gravada na última ingestão.
+
+    Args:
+        caminho (str): Planilha de destino
+        colunas (list): Colunas do export atual
+        pasta (str): Pasta do repositório incremental
+
+    Returns:
+        bool: True se tamanho, data de modificação e colunas coincidem com os registrados
+    """
+    registro = _ler_estado(pasta).get('planilha')
+    if not registro or not os.path.exists(caminho):
+        return False
+    estado = os.stat(caminho)
+    return (registro.get('tamanho') == estado.st_size and registro.get('mtime_ns') == estado.st_mtime_ns
+            and registro.get('colunas') == list(colunas))
+
+def persistir_delta(delta, arquivo_origem=None, pasta=PASTA_INGESTAO, plano=None, caminho_planilha=None):
+    """
+    Grava o índice (chaves, hashes e linhas da aba) do export do delta, que passa
+    a ser a referência da próxima comparação.
+
+    Deve ser chamado somente depois que a planilha de destino foi atualizada,
+    para que uma falha na escrita não marque o export como já ingerido.
+
+    Args:
+        delta (dict): Delta retornado por `calcular_delta`
+        arquivo_origem (str): Caminho do export que originou o delta (opcional)
+        pasta (str): Pasta do repositório incremental
+        plano (dict): Plano de `distribuir_linhas` usado na escrita; None se a aba
+            foi escrita por inteiro, na ordem do export
+        caminho_planilha (str): Planilha de destino gravada, registrada no estado (opcional)
+    """
+    os.makedirs(pasta, exist_ok=True)
+    indice = delta['indice'].copy()
+    indice[COLUNA_LINHA_PLANILHA] = plano['linhas_planilha'] if plano else np.arange(len(indice)) + 2
+    _gravar_parquet(indice, _caminhos_repositorio(pasta)['indice'])
+    _remover_repositorio_antigo(pasta)
+
+    if caminho_planilha:
+        estado = _ler_estado(pasta)
+        arquivo = os.stat(caminho_planilha)
+        estado['planilha'] = {
+            'arquivo': os.path.basename(caminho_planilha),
+            'tamanho': arquivo.st_size,
+            'mtime_ns': arquivo.st_mtime_ns,
+            'colunas': delta['colunas'],
+        }
+        _gravar_estado(pasta, estado)
+    if arquivo_origem:
+        registrar_arquivo('celonis', arquivo_origem, pasta)
+
+def _remover_repositorio_antigo(pasta):
+    """
+    Remove a base e os deltas de linhas gravados por versões anteriores (não são mais lidos).
+
+    Args:
+        pasta (str): Pasta do repositório incremental
+    """
+    caminho_base = os.path.join(pasta, 'base.parquet')
+    pasta_deltas = os.path.join(pasta, 'deltas')
+    if not os.path.exists(caminho_base) and not os.path.isdir(pasta_deltas):
+        return
+    if os.path.exists(caminho_base):
+        os.remove(caminho_base)
+    shutil.rmtree(pasta_deltas, ignore_errors=True)
+    log_message(f"🧹 Base e deltas de linhas antigos removidos de {pasta}")
+
+def arquivo_alterado(chave, caminho, pasta=PASTA_INGESTAO):
+    """
+    Verifica se um arquivo de entrada mudou desde a última ingestão registrada.
+
+    Args:
+        chave (str): Identificador do tipo de arquivo (ex.: 'export')
+        caminho (str): Caminho do arquivo
+        pasta (str): Pasta do repositório incremental
+
+    Returns:
+        bool: True se o arquivo é novo ou teve o conteúdo alterado
+    """
+    registro = _ler_estado(pasta).get(chave)
+    if not registro:
+        return True
+    return registro.get('hash') != calcular_hash_arquivo(caminho)
+
+def registrar_arquivo(chave, caminho, pasta=PASTA_INGESTAO):
+    """
+    Registra um arquivo de entrada como ingerido.
+
+    Args:
+        chave (str): Identificador do tipo de arquivo (ex.: 'export')
+        caminho (str): Caminho do arquivo
+        pasta (str): Pasta do repositório incremental
+    """
+    os.makedirs(pasta, exist_ok=True)
+    estado = _ler_estado(pasta)
+    estado[chave] = {
+        'arquivo': os.path.basename(caminho),
+        'hash': calcular_hash_arquivo(caminho),
+        'ingerido_em': datetime.now().isoformat(timespec='seconds'),
+    }
+    _gravar_estado(pasta, estado)
+
+def resumir_delta(delta):
+    """
+    Monta a mensagem de resumo do tamanho do delta.
+
+    Args:
+        delta (dict): Delta retornado por `calcular_delta`
+
+    Returns:
+        str: Mensagem com as contagens de cada operação
+    """
+    if delta['primeira_carga']:
+        return f"primeira carga com {delta['inseridos']} linhas"
+    return (
+        f"{delta['inseridos']} inseridas, {delta['atualizados']} atualizadas, "
+        f"{delta['encerrados']} encerradas, {delta['removidos']} removidas "
+        f"(de {delta['linhas_export']} linhas no export)"
+    )
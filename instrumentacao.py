@@ -0,0 +1,418 @@
+"""# Instrumentação das execuções
+
+Mede cada etapa dos scripts (`irf.py`, `modelo_irf.py` e
+`atualizar_planilha.py`) com o gerenciador de contexto `etapa`: tempo de
+relógio, tempo de CPU, pico de memória residente (RSS) e, opcionalmente, pico
+das alocações do tracemalloc, além das linhas de entrada e de saída.
+
+Cada execução grava suas etapas (e as mensagens do `log_message`) como linhas
+JSON em `cache/instrumentacao/<script>/<data-hora>.jsonl` e, ao final,
+mostra uma tabela com o resumo das etapas.
+
+Uso:
+    with execucao('irf'):
+        with etapa('carregar_dados') as medida:
+            df = carregar(...)
+            medida.linhas_saida = len(df)
+
+Etapas executadas em paralelo (ver `executor_etapas.py`) têm a pilha de
+etapas da própria thread, o tempo de CPU da thread e não medem o pico de
+memória, que é do processo inteiro e fica na etapa que as engloba.
+"""
+
+import atexit
+import json
+import os
+import socket
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+PASTA_INSTRUMENTACAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'instrumentacao')
+# Quantidade máxima de arquivos de execução mantidos por script
+MAX_EXECUCOES = 200
+# Com IRF_TRACEMALLOC=1 as etapas medem também o pico do tracemalloc (deixa a execução mais lenta)
+RASTREAR_ALOCACOES = os.environ.get('IRF_TRACEMALLOC') == '1'
+
+# Execução ativa e pilhas de etapas abertas (uma por thread)
+_EXECUCAO = None
+_LOCAL = threading.local()
+
+def _pilha():
+    """
+    Pilha de etapas abertas na thread atual.
+    """
+    if not hasattr(_LOCAL, 'pilha'):
+        _LOCAL.pilha = []
+    return _LOCAL.pilha
+
+def log_message(message):
+    """
+    Mostra uma mensagem com data e hora e a registra na execução ativa.
+
+    Args:
+        message (str): Mensagem
+    """
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] {message}")
+    if _EXECUCAO is not None:
+        _EXECUCAO.emitir({
+            'tipo': 'mensagem',
+            'momento': datetime.now().isoformat(timespec='milliseconds'),
+            'etapa': _pilha()[-1].nome if _pilha() else None,
+            'mensagem': message,
+        })
+
+def reiniciar_pico_rss():
+    """
+    Zera o pico de memória residente do processo (Linux); sem efeito em outros sistemas.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as arquivo:
+            arquivo.write('5')
+    except OSError:
+        pass
+
+def pico_rss_mb():
+    """
+    Lê o pico de memória residente do processo desde o último reinício.
+
+    No Windows usa o pico do working set (não pode ser zerado, então vale para o
+    processo inteiro).
+
+    Returns:
+        float: Pico em MB (None se não for possível medir)
+    """
+    try:
+        with open('/proc/self/status', 'r') as arquivo:
+            for linha in arquivo:
+                if linha.startswith('VmHWM:'):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        memoria = psutil.Process().memory_info()
+        return getattr(memoria, 'peak_wset', memoria.rss) / 1024 ** 2
+    except Exception:
+        return None
+
+def _maximo(a, b):
+    """
+    Maior entre dois valores que podem ser None.
+    """
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b)
+
+class Etapa:
+    """
+    Medidas de uma etapa em andamento (ver `etapa`).
+
+    As etapas podem ser aninhadas; o pico de memória de uma etapa inclui o
+    das etapas internas.
+    """
+
+    def __init__(self, nome, linhas_entrada=None, pai=None, concorrente=False, **detalhes):
+        """
+        Args:
+            nome (str): Nome da etapa
+            linhas_entrada (int): Linhas recebidas pela etapa
+            pai (str): Caminho da etapa externa, para etapas abertas em outra thread
+            concorrente (bool): Se True, a etapa roda junto com outras (CPU da thread, sem pico de memória)
+            **detalhes: Informações extras gravadas junto com a etapa
+        """
+        pilha = _pilha()
+        self.nome = nome
+        self.linhas_entrada = linhas_entrada
+        self.linhas_saida = None
+        self.detalhes = detalhes
+        self.pai = pilha[-1].caminho if pilha else pai
+        # Etapas internas de uma etapa concorrente também são concorrentes
+        self.concorrente = concorrente or bool(pilha and pilha[-1].concorrente)
+        self.caminho = f"{self.pai}/{nome}" if self.pai else nome
+        self.pico_rss_mb = None
+        self.pico_python_mb = None
+        self.segundos = None
+        self.cpu_segundos = None
+
+    def _acumular_picos(self):
+        """
+        Incorpora os picos medidos desde o último reinício (antes de uma etapa interna zerá-los).
+        """
+        self.pico_rss_mb = _maximo(self.pico_rss_mb, pico_rss_mb())
+        if tracemalloc.is_tracing():
+            self.pico_python_mb = _maximo(self.pico_python_mb, tracemalloc.get_traced_memory()[1] / 1024 ** 2)
+
+    def _tempo_cpu(self):
+        """
+        Tempo de CPU do processo, ou só da thread atual nas etapas concorrentes.
+        """
+        return time.thread_time() if self.concorrente else time.process_time()
+
+    def __enter__(self):
+        pilha = _pilha()
+        if not self.concorrente:
+            if pilha:
+                pilha[-1]._acumular_picos()
+            reiniciar_pico_rss()
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+        pilha.append(self)
+        self.inicio = datetime.now()
+        self._relogio = time.perf_counter()
+        self._cpu = self._tempo_cpu()
+        return self
+
+    def __exit__(self, tipo_erro, erro, _rastreio):
+        self.segundos = time.perf_counter() - self._relogio
+        self.cpu_segundos = self._tempo_cpu() - self._cpu
+        if not self.concorrente:
+            self._acumular_picos()
+        pilha = _pilha()
+        pilha.pop()
+        if pilha and not self.concorrente:
+            # O pico da etapa externa inclui o desta etapa
+            externa = pilha[-1]
+            externa.pico_rss_mb = _maximo(externa.pico_rss_mb, self.pico_rss_mb)
+            externa.pico_python_mb = _maximo(externa.pico_python_mb, self.pico_python_mb)
+
+        # SystemExit com código 0 (ex.: "nada a fazer") não é erro
+        sucesso = tipo_erro is None or (tipo_erro is SystemExit and erro.code in (0, None))
+        registro = {
+            'tipo': 'etapa',
+            'etapa': self.nome,
+            'caminho': self.caminho,
+            'pai': self.pai,
+            'inicio': self.inicio.isoformat(timespec='milliseconds'),
+            'segundos': round(self.segundos, 4),
+            'cpu_segundos': round(self.cpu_segundos, 4),
+            'pico_rss_mb': None if self.pico_rss_mb is None else round(self.pico_rss_mb, 1),
+            'pico_python_mb': None if self.pico_python_mb is None else round(self.pico_python_mb, 1),
+            'linhas_entrada': self.linhas_entrada,
+            'linhas_saida': self.linhas_saida,
+            'status': 'ok' if sucesso else 'erro',
+        }
+        if not sucesso:
+            registro['erro'] = f"{tipo_erro.__name__}: {erro}"
+        if self.detalhes:
+            registro['detalhes'] = self.detalhes
+        if _EXECUCAO is not None:
+            _EXECUCAO.registrar_etapa(registro)
+        return False
+
+def etapa(nome, linhas_entrada=None, **detalhes):
+    """
+    Mede uma etapa (gerenciador de contexto).
+
+    Sem uma execução ativa (ver `execucao`), as medidas são feitas mas não são gravadas.
+
+    Args:
+        nome (str): Nome da etapa
+        linhas_entrada (int): Linhas recebidas pela etapa
+        **detalhes: Informações extras gravadas junto com a etapa
+            (`pai` e `concorrente` são usados pelas etapas paralelas, ver `Etapa`)
+
+    Returns:
+        Etapa: Medidas da etapa; atribua `linhas_saida` dentro do bloco
+    """
+    return Etapa(nome, linhas_entrada, **detalhes)
+
+def caminho_etapa_atual():
+    """
+    Caminho da etapa aberta na thread atual.
+
+    Returns:
+        str: Caminho (ex.: 'fluxo/carregar_dados') ou None fora de uma etapa
+    """
+    pilha = _pilha()
+    return pilha[-1].caminho if pilha else None
+
+class Execucao:
+    """
+    Execução de um script: grava as etapas e as mensagens em um arquivo JSON lines.
+    """
+
+    def __init__(self, script, pasta=PASTA_INSTRUMENTACAO, rastrear_alocacoes=RASTREAR_ALOCACOES):
+        """
+        Args:
+            script (str): Nome do script (ex.: 'irf')
+            pasta (str): Pasta dos arquivos de instrumentação
+            rastrear_alocacoes (bool): Se True, liga o tracemalloc durante a execução
+        """
+        self.script = script
+        self.id = uuid.uuid4().hex[:12]
+        self.inicio = datetime.now()
+        self.pasta = os.path.join(pasta, script)
+        self.caminho = os.path.join(self.pasta, f"{self.inicio.strftime('%Y%m%d-%H%M%S')}_{self.id}.jsonl")
+        self.rastrear_alocacoes = rastrear_alocacoes
+        self.etapas = []
+        self._arquivo = None
+        # Etapas paralelas gravam de threads diferentes
+        self._trava = threading.Lock()
+        self._finalizada = False
+
+    def emitir(self, registro):
+        """
+        Grava um registro (uma linha JSON) no arquivo da execução.
+
+        Args:
+            registro (dict): Registro a gravar
+        """
+        if self._arquivo is None:
+            return
+        linha = json.dumps({'execucao': self.id, **registro}, ensure_ascii=False, default=str) + '\n'
+        with self._trava:
+            try:
+                self._arquivo.write(linha)
+                self._arquivo.flush()
+            except (OSError, ValueError, AttributeError):
+                pass
+
+    def registrar_etapa(self, registro):
+        """
+        Guarda e grava as medidas de uma etapa concluída.
+
+        Args:
+            registro (dict): Medidas da etapa
+        """
+        self.etapas.append(registro)
+        self.emitir(registro)
+
+    def iniciar(self):
+        """
+        Abre o arquivo da execução e a torna a execução ativa.
+
+        Returns:
+            Execucao: A própria execução
+        """
+        global _EXECUCAO
+        try:
+            os.makedirs(self.pasta, exist_ok=True)
+            self._arquivo = open(self.caminho, 'w', encoding='utf-8')
+        except OSError:
+            # A instrumentação não pode impedir a execução do script
+            self._arquivo = None
+        if self.rastrear_alocacoes and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _EXECUCAO = self
+        self._relogio = time.perf_counter()
+        self._cpu = time.process_time()
+        self.emitir({
+            'tipo': 'inicio',
+            'script': self.script,
+            'inicio': self.inicio.isoformat(timespec='seconds'),
+            'maquina': socket.gethostname(),
+            'pid': os.getpid(),
+            'tracemalloc': tracemalloc.is_tracing(),
+        })
+        atexit.register(self.finalizar)
+        return self
+
+    def finalizar(self, status='ok'):
+        """
+        Grava o total da execução, mostra o resumo das etapas e fecha o arquivo.
+
+        Args:
+            status (str): Situação final da execução ('ok' ou 'erro')
+        """
+        global _EXECUCAO
+        if self._finalizada:
+            return
+        self._finalizada = True
+        # Em processos de longa duração (ex.: monitor_pasta.py) várias execuções passam pelo mesmo processo
+        atexit.unregister(self.finalizar)
+        segundos = time.perf_counter() - self._relogio
+        cpu_segundos = time.process_time() - self._cpu
+        if _EXECUCAO is self:
+            _EXECUCAO = None
+        imprimir_resumo(self.etapas, segundos)
+        self.emitir({
+            'tipo': 'fim',
+            'status': status,
+            'segundos': round(segundos, 4),
+            'cpu_segundos': round(cpu_segundos, 4),
+            'pico_rss_mb': None if pico_rss_mb() is None else round(pico_rss_mb(), 1),
+        })
+        if self.rastrear_alocacoes and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+            log_message(f"📝 Instrumentação da execução gravada em: {self.caminho}")
+            _limpar_execucoes(self.pasta)
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, tipo_erro, erro, _rastreio):
+        sucesso = tipo_erro is None or (tipo_erro is SystemExit and erro.code in (0, None))
+        self.finalizar('ok' if sucesso else 'erro')
+        return False
+
+def execucao(script, **kwargs):
+    """
+    Cria a execução de um script (gerenciador de contexto).
+
+    Para scripts sem função principal, use `execucao(...).iniciar()`; a
+    execução é finalizada automaticamente quando o processo termina.
+
+    Args:
+        script (str): Nome do script
+        **kwargs: Parâmetros de `Execucao`
+
+    Returns:
+        Execucao: Execução (ainda não iniciada)
+    """
+    return Execucao(script, **kwargs)
+
+def _limpar_execucoes(pasta):
+    """
+    Remove os arquivos de execução mais antigos quando passam do limite.
+
+    Args:
+        pasta (str): Pasta dos arquivos de um script
+    """
+    try:
+        arquivos = sorted(nome for nome in os.listdir(pasta) if nome.endswith('.jsonl'))
+        for nome in arquivos[:-MAX_EXECUCOES]:
+            os.remove(os.path.join(pasta, nome))
+    except OSError:
+        pass
+
+def _formatar(valor, formato):
+    """
+    Formata um número para a tabela de resumo ('-' quando não há valor).
+    """
+    return '-' if valor is None else format(valor, formato)
+
+def imprimir_resumo(etapas, total_segundos):
+    """
+    Mostra a tabela com o tempo, a CPU, a memória e as linhas de cada etapa.
+
+    Args:
+        etapas (list): Registros das etapas concluídas
+        total_segundos (float): Duração total da execução
+    """
+    if not etapas:
+        return
+    # Etapas na ordem de início, com as internas recuadas abaixo da externa
+    ordenadas = sorted(etapas, key=lambda registro: (registro['inicio'], registro['caminho'].count('/')))
+    largura = max(len(registro['caminho']) for registro in ordenadas) + 2
+    print()
+    print(f"{'Etapa':<{largura}}{'Tempo (s)':>11}{'%':>7}{'CPU (s)':>10}{'Pico RSS (MB)':>15}{'Linhas entrada':>16}{'Linhas saída':>14}")
+    print('-' * (largura + 73))
+    for registro in ordenadas:
+        nivel = registro['caminho'].count('/')
+        nome = '  ' * nivel + registro['etapa'] + ('' if registro['status'] == 'ok' else ' (erro)')
+        percentual = 100 * registro['segundos'] / total_segundos if total_segundos > 0 else None
+        print(f"{nome:<{largura}}{registro['segundos']:>11.2f}{_formatar(percentual, '.1f'):>7}"
+              f"{registro['cpu_segundos']:>10.2f}{_formatar(registro['pico_rss_mb'], '.1f'):>15}"
+              f"{_formatar(registro['linhas_entrada'], 'd'):>16}{_formatar(registro['linhas_saida'], 'd'):>14}")
+    print('-' * (largura + 73))
+    print(f"{'Total':<{largura}}{total_segundos:>11.2f}")
+    print()
@@ -1,24 +1,74 @@
 """ # Importar as bibliotecas necessárias """
 
-# Importa o módulo de classificação do PyCaret
-from re import A
-from pycaret.classification import load_model, predict_model, blend_models
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from zoneinfo import ZoneInfo  # disponível a partir do Python 3.9
 import os
+import shutil
+import tempfile
 import warnings
+from cache_base import carregar_base_otp, preparar_para_parquet
+from escritor_excel import gravar_planilha, publicar_arquivo
+from esquema_otp import aplicar_esquema
+from artefato_inferencia import CAMINHO_MODELO, ModeloInferencia, artefato_disponivel, caminho_pkl_substituido, caminhos_artefato
+from indice_carga import obter_indice
+from calendario_uteis import deslocar_dias_uteis
+from features_irf import COLUNAS_BASE, calcular_features, calcular_carga_fornecedor as calcular_carga_fornecedor_pedidos
+from instrumentacao import etapa, execucao, log_message
+from executor_etapas import ExecutorEtapas
+from cache_previsoes import CHAVES_PO, prever_rotulos_com_cache
+from espelho_local import espelhar, espelhar_modelo
+import historico_execucoes
+import matriz_fornecedores
+import validacao_dados
 warnings.filterwarnings('ignore')
 
-def log_message(message):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{timestamp}] {message}")
-
 """# Configuração de caminhos"""
 
 # Caminhos dos arquivos da rede
 ARQUIVO_REDE = r'S:\Procurement\FUP\OTP Mensal\OTP - Base.xlsx'
-MODELO_BLEND = r'S:\Procurement\FUP\IRF - Índice de Risco de Fornecedores\Modelo de Machine Learning\Modelos\modelo_treinado_lightgbm.pkl'
+# Mesmo modelo que o modelo_irf.py salva (artefato_inferencia.CAMINHO_MODELO)
+MODELO_BLEND = f'{CAMINHO_MODELO}.pkl'
+PASTA_HISTORICO = r'S:\Procurement\FUP\IRF - Índice de Risco de Fornecedores\Modelo de Machine Learning\Histórico de Execuções'
+
+# Reaproveita as previsões de PO/itens cujas variáveis não mudaram desde a última execução (cache_previsoes.py)
+USAR_CACHE_PREVISOES = True
+# Publica também uma cópia dos resultados em Parquet ao lado do Excel
+SALVAR_PARQUET_RESULTADOS = False
+# Acrescenta cada execução ao histórico colunar (historico_execucoes.py)
+REGISTRAR_HISTORICO = True
+# Valida os pedidos em aberto antes da previsão; os com problemas vão para "IRF - <data> - Quarentena.xlsx"
+VALIDAR_DADOS = True
+# Cria a matriz de risco por fornecedor e grupo de material (aba "Fornecedores" e Parquet)
+CRIAR_MATRIZ_FORNECEDORES = True
+# Explica cada previsão com as variáveis que mais pesaram (coluna "Principais Fatores"; só com o artefato de inferência)
+EXPLICAR_PREVISOES = False
+FATORES_POR_PREVISAO = 3
+
+# Nomes das colunas nos resultados
+RENOMEAR_COLUNAS = {
+    "prediction_label": "Previsão",
+    "prediction_score": "Precisão",
+    "carga_fornecedor": "Carga do Fornecedor",
+    "EBELN": "PO",
+    "EBELP": "Item",
+    "BEDAT": "Data de Emissão da PO",
+    "Due Date (incl. ex works time)": "Stat. Del. Date",
+    "Material Text (AST or Short Text)": "Descrição do Item",
+    "Vendor Name": "Fornecedor",
+    "MATKL": "Material Group",
+    "NetOrderValue": "Valor Net",
+}
+# Explicação dos pedidos que não passam pelo modelo
+FATOR_PRAZO_VENCIDO = 'Due date + tolerância vencidos'
+# Processa a base em blocos, com memória limitada pelo tamanho do bloco (previsao_em_blocos.py)
+MODO_BLOCOS = False
+LINHAS_POR_BLOCO = 100_000
+# Processos que fazem as previsões dos blocos em paralelo (None: um por CPU, menos um; 1: sem paralelismo)
+PROCESSOS_PREVISAO = None
+# Etapas independentes executadas ao mesmo tempo (executor_etapas.py; 1: em sequência)
+ETAPAS_PARALELAS = 4
 
 def verificar_caminhos():
     """
@@ -48,6 +98,40 @@ def verificar_caminhos():
 
 """# Lê o arquivo excel com os pedidos em aberto"""
 
+def separar_pedidos(df):
+    """
+    Separa os pedidos entregues e os em aberto da base OTP, com a limpeza inicial.
+
+    Funciona tanto com a base inteira quanto com um bloco dela.
+
+    Args:
+        df (pandas.DataFrame): Linhas da base OTP
+
+    Returns:
+        tuple: (pedidos em aberto, pedidos entregues)
+    """
+    # Armazena os dados em que a coluna 'Delivery Date' está preenchida em um novo DataFrame chamado df
+    if 'Delivery Date' in df.columns:
+        df_entregue = df[df['Delivery Date'].notna()].copy()
+    else:
+        df_entregue = pd.DataFrame()  # Cria um DataFrame vazio caso a coluna não exista
+    df_pedidos_em_aberto = df
+    # Remove linhas que contêm dados na coluna 'GR Document Date'
+    if 'GR Document Date' in df_pedidos_em_aberto.columns:
+        df_pedidos_em_aberto = df_pedidos_em_aberto[df_pedidos_em_aberto['GR Document Date'].isna()]
+    # Remove as colunas 'GR Document Date', 'Delivery Date' e 'Última Atualização' se existirem
+    colunas_para_remover = ['GR Document Date', 'Delivery Date', 'Última Atualização']
+    colunas_existentes = [col for col in colunas_para_remover if col in df_pedidos_em_aberto.columns]
+    if colunas_existentes:
+        df_pedidos_em_aberto = df_pedidos_em_aberto.drop(columns=colunas_existentes)
+    # Remove as linhas onde o valor é 0 na coluna 'Net Order Value in Doc. Curr.'
+    if 'Net Order Value in Doc. Curr.' in df_pedidos_em_aberto.columns:
+        df_pedidos_em_aberto = df_pedidos_em_aberto[df_pedidos_em_aberto['Net Order Value in Doc. Curr.'] != 0]
+    # Remove a coluna 'On Time' se existir
+    if 'On Time' in df_pedidos_em_aberto.columns:
+        df_pedidos_em_aberto = df_pedidos_em_aberto.drop(columns=['On Time'])
+    return df_pedidos_em_aberto, df_entregue
+
 def carregar_dados(caminhos):
     """
     Carrega os dados do arquivo Excel da rede e faz limpeza inicial.
@@ -60,32 +144,13 @@ def carregar_dados(caminhos):
     """
     try:
         log_message(f"📊 Carregando dados do arquivo: {caminhos['dados']}")
-        df_pedidos_em_aberto = pd.read_excel(caminhos['dados'])
+        # Lê da cópia local do arquivo da rede (copiado só quando mudou)
+        df_pedidos_em_aberto = carregar_base_otp(espelhar(caminhos['dados']))
         # Checagem extra para garantir que é DataFrame
         if not isinstance(df_pedidos_em_aberto, pd.DataFrame):
             log_message("❌ Erro: O arquivo carregado não é um DataFrame.")
             return None
-        # Armazena os dados em que a coluna 'Delivery Date' está preenchida em um novo DataFrame chamado df
-        if 'Delivery Date' in df_pedidos_em_aberto.columns:
-            df_entregue = df_pedidos_em_aberto[df_pedidos_em_aberto['Delivery Date'].notna()].copy()
-        else:
-            df_entregue = pd.DataFrame()  # Cria um DataFrame vazio caso a coluna não exista
-        # Remove linhas que contêm dados na coluna 'GR Document Date'
-        if 'GR Document Date' in df_pedidos_em_aberto.columns:
-            df_pedidos_em_aberto = df_pedidos_em_aberto[df_pedidos_em_aberto['GR Document Date'].isna()]
-        # Remove as colunas 'GR Document Date', 'Delivery Date' e 'Última Atualização' se existirem
-        colunas_para_remover = ['GR Document Date', 'Delivery Date', 'Última Atualização']
-        colunas_existentes = [col for col in colunas_para_remover if col in df_pedidos_em_aberto.columns]
-        if colunas_existentes:
-            df_pedidos_em_aberto = df_pedidos_em_aberto.drop(columns=colunas_existentes)
-        # Remove as linhas onde o valor é 0 na coluna 'Net Order Value in Doc. Curr.'
-        if 'Net Order Value in Doc. Curr.' in df_pedidos_em_aberto.columns:
-            linhas_antes = len(df_pedidos_em_aberto)
-            df_pedidos_em_aberto = df_pedidos_em_aberto[df_pedidos_em_aberto['Net Order Value in Doc. Curr.'] != 0]
-            linhas_depois = len(df_pedidos_em_aberto)
-        # Remove a coluna 'On Time' se existir
-        if 'On Time' in df_pedidos_em_aberto.columns:
-            df_pedidos_em_aberto = df_pedidos_em_aberto.drop(columns=['On Time'])
+        df_pedidos_em_aberto, df_entregue = separar_pedidos(df_pedidos_em_aberto)
         log_message(f"✅ Dados carregados com sucesso! {len(df_pedidos_em_aberto)} registros encontrados")
         return df_pedidos_em_aberto, df_entregue
     except Exception as e:
@@ -104,46 +169,17 @@ def calcular_carga_fornecedor(df, salvar_csv=True, caminho_csv=r'S:\Procurement\
     Retorna:
         pd.DataFrame: DataFrame com a coluna 'carga_fornecedor' calculada
     """
-    import pandas as pd
-
     try:
         log_message("🔄 Calculando carga de fornecedor...")
         # Mantém apenas as colunas necessárias para o cálculo
         colunas_necessarias = ['Vendor', 'BEDAT', 'Due Date (incl. ex works time)']
         df = df[colunas_necessarias].copy()
-        
-        df['BEDAT'] = pd.to_datetime(df['BEDAT'])
-        df['Due Date (incl. ex works time)'] = pd.to_datetime(df['Due Date (incl. ex works time)'])
-
-        df = df.sort_values(['Vendor', 'BEDAT']).reset_index(drop=True)
-
-        df_start = df[['Vendor', 'BEDAT']].copy()
-        df_start = df_start.rename(columns={'BEDAT':'date'})
-        df_start['start'] = 1
-        df_start['end'] = 0
 
-        df_end = df[['Vendor', 'Due Date (incl. ex works time)']].copy()
-        df_end = df_end.rename(columns={'Due Date (incl. ex works time)':'date'})
-        df_end['start'] = 0
-        df_end['end'] = 1
-
-        df_events = pd.concat([df_start, df_end])
-        df_events = df_events.sort_values(['Vendor', 'date']).reset_index(drop=True)
-
-        df_events['open_pedidos'] = (
-            df_events.groupby('Vendor')['start'].cumsum() - df_events.groupby('Vendor')['end'].cumsum()
-        )
-
-        df_open = df_events[['Vendor', 'date', 'open_pedidos']].drop_duplicates(subset=('Vendor', 'date'))
-
-        df = pd.merge(df, df_open, left_on=['Vendor', 'BEDAT'], right_on=['Vendor', 'date'], how='left')
-
-        df['carga_fornecedor'] = df['open_pedidos'] - 1
-
-        df = df.drop(columns=['date', 'open_pedidos'])
+        # Carga na data de emissão de cada pedido (mesmo cálculo usado pelo modelo)
+        df['carga_fornecedor'] = calcular_carga_fornecedor_pedidos(df)
 
         # carga média dos pedidos por fornecedor
-        df_final = df.groupby('Vendor')['carga_fornecedor'].mean().reset_index()
+        df_final = df.groupby('Vendor', observed=True)['carga_fornecedor'].mean().reset_index()
 
         df_final['carga_fornecedor'] = df_final['carga_fornecedor'].round(0).astype(int)
 
@@ -161,66 +197,165 @@ def calcular_carga_fornecedor(df, salvar_csv=True, caminho_csv=r'S:\Procurement\
 
 """# Previsão de Atrasos de Pedidos em Aberto"""
 
-def processar_dados(df_pedidos_em_aberto):
+def validar_dados(df_pedidos_em_aberto, modelo=None, registrar_log=True):
     """
-    Processa e prepara os dados para análise de machine learning.
-    
+    Aplica as regras de validação aos pedidos em aberto (ver `validacao_dados`).
+
+    Os fornecedores e grupos de material são conferidos com as categorias do
+    artefato de inferência; com o pipeline do PyCaret, essas regras não são avaliadas.
+
     Args:
-        df_pedidos_em_aberto (pandas.DataFrame): DataFrame com os dados brutos
-        
+        df_pedidos_em_aberto (pandas.DataFrame): Pedidos em aberto
+        modelo (object): Modelo carregado (opcional)
+        registrar_log (bool): Se True, mostra o resumo da validação no log
+
     Returns:
-        pandas.DataFrame: DataFrame processado com variáveis calculadas ou None se houver erro
+        tuple: (pedidos que seguem para a previsão, `validacao_dados.ResultadoValidacao`)
+            ou None se faltar alguma coluna obrigatória
     """
     if df_pedidos_em_aberto is None:
         return None
-    
-    # Transforma o tipo para categoria
-    df_pedidos_em_aberto['MATKL'] = df_pedidos_em_aberto['MATKL'].astype('category')
-    df_pedidos_em_aberto['Vendor'] = df_pedidos_em_aberto['Vendor'].astype('category')
+    categorias = modelo.categorias_conhecidas if isinstance(modelo, ModeloInferencia) else None
+    try:
+        validos, resultado = validacao_dados.validar_pedidos(df_pedidos_em_aberto, categorias)
+    except ValueError as e:
+        log_message(f"❌ {e}")
+        return None
+    if registrar_log:
+        resultado.registrar_log()
+    return validos, resultado
 
-    # Converter as colunas de data
-    df_pedidos_em_aberto["BEDAT"] = pd.to_datetime(df_pedidos_em_aberto["BEDAT"], errors="coerce")  # Data de emissão
-    df_pedidos_em_aberto["Due Date (incl. ex works time)"] = pd.to_datetime(df_pedidos_em_aberto["Due Date (incl. ex works time)"], errors="coerce")  # Entrega prevista
+def montar_referencia_carga(df_pedidos_em_aberto, df_entregue):
+    """
+    Junta os pedidos em aberto e os entregues para a contagem da carga do fornecedor.
 
-    hoje = datetime.today()
+    Args:
+        df_pedidos_em_aberto (pandas.DataFrame): Pedidos em aberto
+        df_entregue (pandas.DataFrame): Pedidos já entregues
 
-    # Variáveis de tempo
-    df_pedidos_em_aberto["Dias Para Entrega"] = (df_pedidos_em_aberto["Due Date (incl. ex works time)"] - df_pedidos_em_aberto["BEDAT"]).dt.days
+    Returns:
+        pandas.DataFrame: Pedidos (sem repetição de PO/item) com Vendor, BEDAT e Due Date
+    """
+    partes = [df[COLUNAS_BASE + ['EBELN', 'EBELP']] for df in (df_pedidos_em_aberto, df_entregue) if df is not None and not df.empty]
+    referencia = pd.concat(partes, ignore_index=True)
+    return referencia.drop_duplicates(subset=['EBELN', 'EBELP'], keep='first').reset_index(drop=True)
 
-    # Conta a quantidade de pedidos em aberto por fornecedor
-    pedidos_abertos_por_fornecedor = df_pedidos_em_aberto['Vendor'].value_counts()
+def processar_dados(df_pedidos_em_aberto, df_referencia=None, usar_cache=True, indice=None):
+    """
+    Processa e prepara os dados para análise de machine learning.
 
-    # Mapeia para o dataframe principal
-    df_pedidos_em_aberto['carga_fornecedor'] = df_pedidos_em_aberto['Vendor'].map(pedidos_abertos_por_fornecedor).fillna(0).astype(int)
+    As variáveis do modelo são calculadas pelo módulo `features_irf`, o mesmo
+    usado no treinamento.
+
+    Args:
+        df_pedidos_em_aberto (pandas.DataFrame): DataFrame com os dados brutos
+        df_referencia (pandas.DataFrame): Pedidos usados na contagem da carga do fornecedor
+            (ver `montar_referencia_carga`). Se None, usa os próprios pedidos em aberto
+        usar_cache (bool): Se False, não lê nem grava o cache de variáveis
+        indice (IndiceCargaFornecedor): Índice da carga do fornecedor já construído
+            (tem precedência sobre `df_referencia`)
+
+    Returns:
+        pandas.DataFrame: DataFrame processado com variáveis calculadas ou None se houver erro
+    """
+    if df_pedidos_em_aberto is None:
+        return None
+    
+    # Garante os tipos do esquema: MATKL/Vendor como categoria e datas convertidas
+    # (dados vindos de carregar_dados já chegam tipados e não são convertidos de novo)
+    df_pedidos_em_aberto = aplicar_esquema(df_pedidos_em_aberto)
+
+    # Dias úteis para a entrega e carga do fornecedor na emissão da PO
+    df_pedidos_em_aberto = calcular_features(df_pedidos_em_aberto, df_referencia, usar_cache=usar_cache, indice=indice)
     
     return df_pedidos_em_aberto
 
 def carregar_modelo(caminho_modelo):
     """
     Carrega o modelo de machine learning treinado da rede.
+
+    Usa o artefato de inferência (booster LightGBM + pré-processamento em JSON)
+    quando ele existe ao lado do modelo, sem importar o PyCaret. Caso contrário,
+    carrega o pipeline completo pelo PyCaret, a não ser que o .pkl esteja
+    marcado como substituído pelo treinamento incremental (modelo mais antigo).
     
     Args:
-        caminhos (dict): Dicionário com os caminhos dos arquivos
+        caminho_modelo (str): Caminho do modelo (.pkl)
         
     Returns:
         object: Modelo carregado ou None se houver erro
     """
     try:
         log_message(f"🤖 Carregando modelo blend da rede {caminho_modelo}...")
-        modelo = load_model(caminho_modelo.replace('.pkl', ''))
+        pkl_substituido = os.path.exists(caminho_pkl_substituido(caminho_modelo))
+        # Os arquivos do modelo são lidos da cópia local (copiados só quando mudaram)
+        caminho_modelo = espelhar_modelo(caminho_modelo)
+        if artefato_disponivel(caminho_modelo):
+            modelo = ModeloInferencia(caminho_modelo)
+        elif pkl_substituido:
+            # O treinamento incremental atualizou só o artefato: o .pkl é um modelo mais antigo
+            log_message("❌ Artefato de inferência não encontrado e o .pkl foi substituído pelo treinamento incremental; "
+                        "rode o modelo_irf.py com MODO_TREINO = 'completo'")
+            return None
+        else:
+            # Sem o artefato, ficam desligados o cache de previsões, a explicação das previsões
+            # e a validação das categorias, e o modelo é o do último .pkl salvo
+            caminho_booster, caminho_spec = caminhos_artefato(caminho_modelo)
+            log_message("⚠️ ATENÇÃO: ARTEFATO DE INFERÊNCIA NÃO ENCONTRADO: carregando o pipeline pelo PyCaret (mais lento; "
+                        "sem cache de previsões, explicações e validação de categorias)")
+            log_message(f"   Esperado: {caminho_booster} e {caminho_spec}. Rode o modelo_irf.py para gerá-lo.")
+            from pycaret.classification import load_model
+            modelo = load_model(caminho_modelo.replace('.pkl', ''))
         log_message(f"✅ Modelo blend carregado com sucesso! {caminho_modelo}")
         return modelo
     except Exception as e:
         log_message(f"❌ Erro ao carregar modelo blend: {e}")
         return None
 
-def fazer_previsoes(modelo, df_pedidos_em_aberto):
+def descrever_fatores(colunas, indices, contribuicoes):
+    """
+    Monta o texto dos principais fatores de cada previsão.
+
+    Ex.: "Dias Para Entrega (+0.85); Vendor (+0.41)". Só entram as variáveis que
+    pesaram a favor da previsão (contribuição positiva, em log-odds).
+
+    Args:
+        colunas (list): Colunas de entrada do modelo (`ModeloInferencia.colunas_contribuicao`)
+        indices (numpy.ndarray): Índices das colunas de cada linha (`principais_fatores`)
+        contribuicoes (numpy.ndarray): Contribuições a favor da previsão, na mesma forma de `indices`
+
+    Returns:
+        numpy.ndarray: Texto de cada linha (object)
+    """
+    nomes = np.array([RENOMEAR_COLUNAS.get(coluna, coluna) for coluna in colunas], dtype=object)
+    # Valores em centésimos: cada valor distinto é formatado uma única vez
+    centesimos = np.rint(contribuicoes * 100).astype(np.int64)
+    distintos, posicoes = np.unique(centesimos, return_inverse=True)
+    valores = np.array([f" ({valor / 100:+.2f})" for valor in distintos], dtype=object)[posicoes.reshape(centesimos.shape)]
+    texto = np.full(len(indices), '', dtype=object)
+    for j in range(indices.shape[1]):
+        separador = np.where(texto != '', '; ', '')
+        # Contribuições que arredondam para +0.00 não explicam nada
+        texto = np.where(centesimos[:, j] > 0, texto + separador + nomes[indices[:, j]] + valores[:, j], texto)
+    return texto
+
+def fazer_previsoes(modelo, df_pedidos_em_aberto, usar_cache=True, explicar=None):
     """
     Faz previsões de atraso usando o modelo de machine learning.
+
+    O modelo só recebe os pedidos ainda dentro do prazo (due date + tolerância);
+    os demais já são atraso. Rótulos e scores são gravados em colunas do próprio
+    DataFrame, sem cópias intermediárias e mantendo a ordem e o índice das linhas.
+
+    Com `explicar`, a coluna "Principais Fatores" traz as variáveis que mais
+    pesaram em cada previsão, calculadas pelo próprio booster em uma única
+    passada (ver `ModeloInferencia.principais_fatores`).
     
     Args:
         modelo (object): Modelo de machine learning carregado
-        df_pedidos_em_aberto (pandas.DataFrame): DataFrame com dados processados
+        df_pedidos_em_aberto (pandas.DataFrame): DataFrame com dados processados (é alterado)
+        usar_cache (bool): Se False, não usa o cache de previsões (ex.: previsão de um bloco da base)
+        explicar (bool): Se True, acrescenta a coluna "Principais Fatores" (padrão: `EXPLICAR_PREVISOES`)
         
     Returns:
         pandas.DataFrame: DataFrame com previsões e confiabilidade ou None se houver erro
@@ -231,73 +366,60 @@ def fazer_previsoes(modelo, df_pedidos_em_aberto):
     try:
         log_message("🔮 Fazendo previsões...")
 
-        # Calcula a data limite para cada pedido, somando a tolerância (em dias) ao due date
-        df_pedidos_em_aberto['due_date_mais_tolerancia'] = df_pedidos_em_aberto['Due Date (incl. ex works time)'] + pd.to_timedelta(df_pedidos_em_aberto['Delivery Tolerance (Work Days)'] + 5, unit='D')
-
-        # Máscara para pedidos em que a data de hoje está antes de due date + tolerância
         # Verifica se as colunas necessárias existem
         if 'Due Date (incl. ex works time)' not in df_pedidos_em_aberto.columns or 'Delivery Tolerance (Work Days)' not in df_pedidos_em_aberto.columns:
             log_message("❌ Colunas necessárias para validação de datas não encontradas.")
             return None
-
-        hoje = datetime.today()
-
-        # Calcula a data de due date + tolerância para cada linha
-        df_pedidos_em_aberto['due_date_mais_tolerancia'] = df_pedidos_em_aberto['Due Date (incl. ex works time)'] + pd.to_timedelta(df_pedidos_em_aberto['Delivery Tolerance (Work Days)'] + 5, unit='D')
-
-        # Máscara para pedidos em que a data de hoje está antes de due date + tolerância
-        mask_predicao = hoje < df_pedidos_em_aberto['due_date_mais_tolerancia']
-        mask_atraso = ~mask_predicao
-
-        # Previsão normal para os que atendem ao critério
-        df_predicao = df_pedidos_em_aberto[mask_predicao].copy()
-        if not df_predicao.empty:
-            previsoes_predicao = predict_model(modelo, data=df_predicao, verbose=False)
-        else:
-            previsoes_predicao = pd.DataFrame()
-
-        # Para os que não atendem ao critério, define como atraso (prediction_label=1, prediction_score=1)
-        df_atraso = df_pedidos_em_aberto[mask_atraso].copy()
-        if not df_atraso.empty:
-            df_atraso['prediction_label'] = 1
-            df_atraso['prediction_score'] = 1.0
-            # Garante que as colunas estejam presentes para o merge depois
-            if not previsoes_predicao.empty:
-                for col in previsoes_predicao.columns:
-                    if col not in df_atraso.columns:
-                        df_atraso[col] = None
-        else:
-            df_atraso = pd.DataFrame()
-
-        # Junta os dois dataframes
-        if not previsoes_predicao.empty and not df_atraso.empty:
-            previsoes = pd.concat([previsoes_predicao, df_atraso], ignore_index=True)
-        elif not previsoes_predicao.empty:
-            previsoes = previsoes_predicao
-        elif not df_atraso.empty:
-            previsoes = df_atraso
-        else:
+        if df_pedidos_em_aberto.empty:
             log_message("❌ Nenhum pedido disponível para previsão.")
             return None
 
-        # Remove a coluna auxiliar
-        if 'due_date_mais_tolerancia' in previsoes.columns:
-            previsoes.drop(columns=['due_date_mais_tolerancia'], inplace=True)
+        hoje = np.datetime64(datetime.today())
+
+        # Data limite de cada pedido: due date + tolerância (em dias úteis, pelo calendário
+        # com feriados) + 5 dias corridos
+        due_date_mais_tolerancia = deslocar_dias_uteis(
+            df_pedidos_em_aberto['Due Date (incl. ex works time)'],
+            df_pedidos_em_aberto['Delivery Tolerance (Work Days)'],
+        ) + np.timedelta64(5, 'D')
+
+        # Só passam pelo modelo os pedidos em que a data de hoje está antes de due date + tolerância;
+        # os demais ficam como atraso (prediction_label=1, prediction_score=1)
+        mask_predicao = hoje < due_date_mais_tolerancia
+        label = np.ones(len(df_pedidos_em_aberto), dtype=np.int64)
+        score = np.ones(len(df_pedidos_em_aberto), dtype=float)
+        fatores = None
+        if EXPLICAR_PREVISOES if explicar is None else explicar:
+            if isinstance(modelo, ModeloInferencia):
+                fatores = np.full(len(df_pedidos_em_aberto), FATOR_PRAZO_VENCIDO, dtype=object)
+            else:
+                log_message("⚠️ Explicação das previsões disponível só com o artefato de inferência; seguindo sem ela.")
+        if mask_predicao.any():
+            if isinstance(modelo, ModeloInferencia):
+                # Só as colunas que o modelo (e o cache, pelas chaves da PO) usam
+                colunas = [col for col in modelo.especificacao['colunas_entrada'] + CHAVES_PO if col in df_pedidos_em_aberto.columns]
+                df_predicao = df_pedidos_em_aberto.loc[mask_predicao, colunas]
+                if USAR_CACHE_PREVISOES and usar_cache:
+                    label[mask_predicao], score[mask_predicao] = prever_rotulos_com_cache(modelo, df_predicao)
+                else:
+                    label[mask_predicao], score[mask_predicao] = modelo.prever_rotulos(df_predicao)
+                if fatores is not None:
+                    indices, contribuicoes = modelo.principais_fatores(df_predicao, label[mask_predicao], FATORES_POR_PREVISAO)
+                    fatores[mask_predicao] = descrever_fatores(modelo.colunas_contribuicao, indices, contribuicoes)
+            else:
+                from pycaret.classification import predict_model
+                previsoes_predicao = predict_model(modelo, data=df_pedidos_em_aberto.loc[mask_predicao], verbose=False)
+                label[mask_predicao] = previsoes_predicao['prediction_label'].to_numpy()
+                score[mask_predicao] = previsoes_predicao['prediction_score'].to_numpy()
+
+        previsoes = df_pedidos_em_aberto
+        previsoes['prediction_label'] = label
+        previsoes['prediction_score'] = score
+        if fatores is not None:
+            previsoes['Principais Fatores'] = fatores
         
         # Renomeia as colunas
-        previsoes.rename(columns={
-            "prediction_label": "Previsão",
-            "prediction_score": "Precisão",
-            "carga_fornecedor": "Carga do Fornecedor",
-            "EBELN": "PO",
-            "EBELP": "Item",
-            "BEDAT": "Data de Emissão da PO",
-            "Due Date (incl. ex works time)": "Stat. Del. Date",
-            "Material Text (AST or Short Text)": "Descrição do Item",
-            "Vendor Name": "Fornecedor",
-            "MATKL": "Material Group",
-            "NetOrderValue": "Valor Net",
-        }, inplace=True)
+        previsoes.rename(columns=RENOMEAR_COLUNAS, inplace=True)
 
         # Altera os valores de 0 e 1
         previsoes["Previsão"] = previsoes["Previsão"].replace({0: "No Prazo", 1: "Atraso"})
@@ -308,37 +430,139 @@ def fazer_previsoes(modelo, df_pedidos_em_aberto):
         log_message(f"❌ Erro ao fazer previsões: {e}")
         return None
 
+"""# Matriz de fornecedores"""
+
+def criar_matriz_fornecedores(previsoes):
+    """
+    Agrega as previsões por fornecedor e grupo de material (matriz de risco).
+
+    Args:
+        previsoes (pandas.DataFrame): DataFrame com previsões detalhadas
+
+    Returns:
+        pandas.DataFrame: Somas e contagens por Vendor/Material Group (ver `matriz_fornecedores.py`)
+            ou None se houver erro
+    """
+    if previsoes is None:
+        return None
+    try:
+        log_message("📊 Criando matriz de fornecedores...")
+        return matriz_fornecedores.agregar_previsoes(previsoes)
+    except Exception as e:
+        # A matriz é um resumo: sem ela, as previsões são salvas normalmente
+        log_message(f"⚠️ Não foi possível criar a matriz de fornecedores: {e}")
+        return None
+
 """# Download do arquivo"""
 
-def salvar_resultados(previsoes):
+def salvar_quarentena(validacao, pasta_local, pasta_historico, nome_arquivo):
+    """
+    Publica as linhas em quarentena e o resumo por regra ao lado dos resultados.
+
+    Uma falha aqui não invalida os resultados, que já foram publicados.
+
+    Args:
+        validacao (validacao_dados.ResultadoValidacao): Resultado da validação (None: nada a salvar)
+        pasta_local (str): Pasta temporária local onde o arquivo é montado
+        pasta_historico (str): Pasta onde o arquivo é publicado
+        nome_arquivo (str): Nome dos resultados (ex.: "IRF - 17-10-2026 08-00")
+    """
+    if validacao is None or not validacao.linhas_quarentena:
+        return
+    caminho_quarentena = os.path.join(pasta_historico, f'{nome_arquivo} - Quarentena.xlsx')
+    caminho_local = os.path.join(pasta_local, f'{nome_arquivo} - Quarentena.xlsx')
+    try:
+        gravar_planilha(caminho_local, validacao.abas())
+        publicar_arquivo(caminho_local, caminho_quarentena)
+        log_message(f"💾 Quarentena salva ({validacao.linhas_quarentena} linhas): {caminho_quarentena}")
+    except Exception as e:
+        log_message(f"⚠️ Não foi possível salvar a quarentena: {e}")
+
+def salvar_resultados(previsoes, pasta_historico=PASTA_HISTORICO, salvar_parquet=SALVAR_PARQUET_RESULTADOS,
+                      registrar_historico=REGISTRAR_HISTORICO, agregados_fornecedores=None, validacao=None):
     """
     Salva os resultados em arquivo Excel na pasta de histórico da rede.
+
+    O arquivo é montado em uma pasta temporária local, com o xlsxwriter em modo
+    `constant_memory` (memória constante mesmo com milhões de linhas), e só
+    depois publicado na pasta de histórico com uma renomeação atômica.
+
+    Com a agregação por fornecedor, o arquivo ganha a aba "Fornecedores" e a
+    matriz é publicada também em Parquet (`IRF - <data> - Fornecedores.parquet`).
+    Com linhas em quarentena na validação, publica também `IRF - <data> - Quarentena.xlsx`
+    (abas "Quarentena" e "Resumo").
     
     Args:
         previsoes (pandas.DataFrame): DataFrame com previsões detalhadas
+        pasta_historico (str): Pasta onde o arquivo é salvo
+        salvar_parquet (bool): Se True, publica também uma cópia em Parquet
+        registrar_historico (bool): Se True, acrescenta a execução ao histórico colunar
+        agregados_fornecedores (pandas.DataFrame): Agregação de `criar_matriz_fornecedores` (None: sem matriz)
+        validacao (validacao_dados.ResultadoValidacao): Resultado da validação dos dados (None: sem quarentena)
         
     Returns:
         bool: True se salvou com sucesso, False caso contrário
     """    
+    pasta_local = tempfile.mkdtemp(prefix='irf_resultados_')
     try:
         # Data e hora no fuso de Brasília (GMT-3)
-        agora = datetime.now(ZoneInfo("America/Sao_Paulo")).strftime('%d-%m-%Y %H-%M')
+        momento = datetime.now(ZoneInfo("America/Sao_Paulo"))
+        agora = momento.strftime('%d-%m-%Y %H-%M')
+        nome_arquivo = f'IRF - {agora}'
+
+        caminho_arquivo = os.path.join(pasta_historico, f'{nome_arquivo}.xlsx')
+        log_message(f"💾 Salvando resultados: {caminho_arquivo}")
+
+        abas = {'Pedidos em Aberto': previsoes}
+        matriz = None
+        if agregados_fornecedores is not None:
+            matriz = matriz_fornecedores.criar_matriz(agregados_fornecedores)
+            abas[matriz_fornecedores.ABA_FORNECEDORES] = matriz
+
+        # Monta o Excel localmente e publica o arquivo completo na pasta de histórico
+        caminho_local = os.path.join(pasta_local, f'{nome_arquivo}.xlsx')
+        gravar_planilha(caminho_local, abas)
+        publicar_arquivo(caminho_local, caminho_arquivo)
+
+        if salvar_parquet:
+            caminho_parquet = os.path.join(pasta_historico, f'{nome_arquivo}.parquet')
+            caminho_local_parquet = os.path.join(pasta_local, f'{nome_arquivo}.parquet')
+            preparar_para_parquet(previsoes.copy()).to_parquet(caminho_local_parquet, index=False)
+            publicar_arquivo(caminho_local_parquet, caminho_parquet)
+            log_message(f"💾 Cópia em Parquet salva: {caminho_parquet}")
+
+        if matriz is not None:
+            caminho_matriz = os.path.join(pasta_historico, f'{nome_arquivo} - Fornecedores.parquet')
+            caminho_local_matriz = os.path.join(pasta_local, f'{nome_arquivo} - Fornecedores.parquet')
+            matriz.to_parquet(caminho_local_matriz, index=False)
+            publicar_arquivo(caminho_local_matriz, caminho_matriz)
+            log_message(f"💾 Matriz de fornecedores salva: {caminho_matriz}")
+
+        salvar_quarentena(validacao, pasta_local, pasta_historico, nome_arquivo)
 
-        # Salva na pasta atual
-        caminho_arquivo = f'S:\\Procurement\\FUP\\IRF - Índice de Risco de Fornecedores\\Modelo de Machine Learning\\Histórico de Execuções\\IRF - {agora}.xlsx'
-        log_message(f"💾 Salvando resultados localmente: {caminho_arquivo}")
+        log_message("✅ Arquivo salvo com sucesso!")
 
-        # Exporta para Excel com múltiplas abas
-        with pd.ExcelWriter(caminho_arquivo, engine='openpyxl') as writer:
-            previsoes.to_excel(writer, sheet_name='Pedidos em Aberto', index=False)
+        if matriz is not None:
+            try:
+                # Base de comparação da próxima execução, só depois de publicada
+                matriz_fornecedores.guardar_agregados(agregados_fornecedores)
+            except OSError as e:
+                log_message(f"⚠️ Não foi possível guardar a matriz de fornecedores em cache: {e}")
 
-        log_message("✅ Arquivo salvo com sucesso!")
+        if registrar_historico:
+            try:
+                historico_execucoes.registrar_execucao(previsoes, momento)
+            except Exception as e:
+                # O Excel já foi salvo: uma falha no histórico colunar não invalida a execução
+                log_message(f"⚠️ Não foi possível registrar a execução no histórico colunar: {e}")
 
         log_message(f"📁 Caminho do arquivo salvo: {caminho_arquivo}")
         return True
     except Exception as e:
         log_message(f"❌ Erro ao salvar arquivo: {e}")
         return False
+    finally:
+        shutil.rmtree(pasta_local, ignore_errors=True)
 
 """# Função principal"""
 
@@ -348,55 +572,87 @@ def main():
     
     Fluxo:
     1. Verifica arquivos na rede
-    2. Carrega e processa dados
-    3. Carrega modelo de ML
+    2. Carrega dados e modelo de ML
+    3. Valida (quarentena) e processa dados
     4. Faz previsões
     5. Cria matriz de fornecedores
     6. Salva resultados
+
+    As etapas 2 a 4 que não dependem umas das outras (ex.: dados e modelo)
+    rodam em paralelo (`executor_etapas`). Cada etapa é medida (tempo, CPU,
+    memória e linhas) pelo módulo `instrumentacao`.
+
+    Returns:
+        bool: True se os resultados foram salvos
+    """
+    with execucao('irf'):
+        return executar_fluxo()
+
+def executar_fluxo():
+    """
+    Executa as etapas do IRF dentro da execução instrumentada (ver `main`).
     """
     log_message("🚀 IRF - Índice de Risco de Fornecedor (Versão Rede)")
     log_message("=" * 60)
     
     # Verifica caminhos disponíveis na rede
-    caminhos = verificar_caminhos()
+    with etapa('verificar_caminhos'):
+        caminhos = verificar_caminhos()
     if caminhos is None:
         log_message("\n❌ Não foi possível encontrar todos os arquivos necessários na rede")
         log_message("   Verifique se você tem acesso aos seguintes caminhos:")
         log_message(f"   - {ARQUIVO_REDE}")
         log_message(f"   - {MODELO_BLEND}")
-        return
-    
-    # Carrega dados (corrigido para evitar erro de desempacotamento)
-    resultado = carregar_dados(caminhos)
-    if resultado is None:
-        return
-    df_pedidos_em_aberto, df_entregue = resultado
-    
-    # Processa dados
-    df_pedidos_em_aberto = processar_dados(df_pedidos_em_aberto)
-    if df_pedidos_em_aberto is None:
-        return
-    
-    # Carrega modelo de ML
-    modelo_blend = carregar_modelo(caminhos['modelo_blend'])
-    if modelo_blend is None:
-        return
-    
-    # Carrega funcao de calcular_carga_fornecedor
-    df_carga = calcular_carga_fornecedor(df_entregue)
-    if df_carga is None:
-        return
+        return False
     
-    # Faz previsões
-    previsoes = fazer_previsoes(modelo_blend, df_pedidos_em_aberto)
+    if MODO_BLOCOS:
+        from previsao_em_blocos import executar_fluxo_em_blocos
+        return executar_fluxo_em_blocos(caminhos, LINHAS_POR_BLOCO, PROCESSOS_PREVISAO)
+
+    # Etapas até as previsões: a leitura da base e o carregamento do modelo (ambos na rede)
+    # não dependem um do outro e rodam em paralelo, assim como a carga média por fornecedor
+    grafo = ExecutorEtapas('preparar_previsoes', max_paralelas=ETAPAS_PARALELAS)
+    grafo.adicionar('carregar_dados', carregar_dados, argumentos=(caminhos,),
+                    linhas_saida=lambda dados: len(dados[0]) + len(dados[1]))
+    grafo.adicionar('carregar_modelo', carregar_modelo, argumentos=(caminhos['modelo_blend'],))
+    # A carga do fornecedor considera os pedidos em aberto e os entregues, pelo índice de
+    # intervalos gravado em cache para consultas avulsas
+    grafo.adicionar('indice_carga', lambda dados: obter_indice(montar_referencia_carga(*dados)),
+                    dependencias=('carregar_dados',), linhas_saida=len)
+    if VALIDAR_DADOS:
+        # As categorias conhecidas vêm do modelo; a validação filtra os pedidos uma única vez
+        grafo.adicionar('validar_dados', lambda dados, modelo: validar_dados(dados[0], modelo),
+                        dependencias=('carregar_dados', 'carregar_modelo'), linhas_saida=lambda validados: len(validados[0]))
+        grafo.adicionar('processar_dados', lambda validados, indice: processar_dados(validados[0], indice=indice),
+                        dependencias=('validar_dados', 'indice_carga'), linhas_saida=len)
+    else:
+        grafo.adicionar('processar_dados', lambda dados, indice: processar_dados(dados[0], indice=indice),
+                        dependencias=('carregar_dados', 'indice_carga'), linhas_saida=len)
+    grafo.adicionar('calcular_carga_fornecedor', lambda dados: calcular_carga_fornecedor(dados[1]),
+                    dependencias=('carregar_dados',), linhas_saida=len)
+    grafo.adicionar('fazer_previsoes', lambda modelo, df, _carga: fazer_previsoes(modelo, df),
+                    dependencias=('carregar_modelo', 'processar_dados', 'calcular_carga_fornecedor'), linhas_saida=len)
+    resultados = grafo.executar()
+    previsoes = resultados['fazer_previsoes']
     if previsoes is None:
-        return
+        return False
+    validacao = resultados['validar_dados'][1] if VALIDAR_DADOS else None
+
+    # Cria a matriz de fornecedores
+    agregados = None
+    if CRIAR_MATRIZ_FORNECEDORES:
+        with etapa('criar_matriz_fornecedores', linhas_entrada=len(previsoes)) as medida:
+            agregados = criar_matriz_fornecedores(previsoes)
+            medida.linhas_saida = None if agregados is None else len(agregados)
     
     # Salva resultados
-    if salvar_resultados(previsoes):
+    with etapa('salvar_resultados', linhas_entrada=len(previsoes)):
+        salvo = salvar_resultados(previsoes, agregados_fornecedores=agregados, validacao=validacao)
+    if salvo:
         log_message("🎉 Processamento concluído com sucesso!")
     else:
         log_message("❌ Erro ao salvar resultados")
+    return bool(salvo)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
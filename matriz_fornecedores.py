@@ -0,0 +1,180 @@
+"""# Matriz de risco por fornecedor e grupo de material
+
+Agrega as previsões de cada pedido por fornecedor (Vendor) e grupo de material
+(MATKL), no lugar das tabelas dinâmicas montadas no Excel a partir do arquivo
+`IRF - *.xlsx`:
+
+- Pedidos em Aberto: quantidade de POs/itens em aberto
+- Previsão de Atraso: quantidade prevista como atraso e o percentual
+- Valor em Risco: soma de `Valor Net` × probabilidade de atraso do pedido
+- Carga Média: média da carga do fornecedor nos pedidos
+
+As agregações guardam somas e contagens (que podem ser somadas), então as
+parciais de cada bloco do modo em blocos são combinadas sem reler as
+previsões. A agregação de cada execução publicada fica em `cache/matriz/` e
+a matriz da execução seguinte mostra a variação do percentual de atraso em
+relação a ela.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from instrumentacao import log_message
+
+PASTA_MATRIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'matriz')
+ABA_FORNECEDORES = 'Fornecedores'
+# Colunas das previsões (já renomeadas pelo irf.py) usadas na matriz
+CHAVES_MATRIZ = ['Vendor', 'Material Group']
+COLUNA_NOME = 'Fornecedor'
+COLUNA_PREVISAO = 'Previsão'
+COLUNA_PRECISAO = 'Precisão'
+COLUNA_VALOR = 'Valor Net'
+COLUNA_CARGA = 'Carga do Fornecedor'
+ROTULO_ATRASO = 'Atraso'
+# Somas e contagens guardadas por fornecedor/grupo de material
+COLUNAS_SOMAS = ['pedidos', 'atrasos', 'valor_net', 'valor_em_risco', 'soma_carga', 'pedidos_com_carga']
+
+def _numerico(df, coluna):
+    """
+    Devolve a coluna como array float (zeros se a coluna não existe).
+    """
+    if coluna not in df.columns:
+        return np.zeros(len(df))
+    return pd.to_numeric(df[coluna], errors='coerce').to_numpy(dtype=float)
+
+def agregar_previsoes(previsoes):
+    """
+    Calcula as somas e contagens por fornecedor e grupo de material.
+
+    A probabilidade de atraso de cada pedido é a precisão, quando a previsão é
+    atraso, e 1 - precisão, quando é no prazo (a precisão é a probabilidade da
+    classe prevista).
+
+    Args:
+        previsoes (pandas.DataFrame): Previsões (colunas renomeadas pelo irf.py)
+
+    Returns:
+        pandas.DataFrame: Uma linha por Vendor/Material Group com o nome do fornecedor e as `COLUNAS_SOMAS`
+    """
+    atraso = (previsoes[COLUNA_PREVISAO] == ROTULO_ATRASO).to_numpy()
+    precisao = np.nan_to_num(_numerico(previsoes, COLUNA_PRECISAO), nan=1.0)
+    valor = np.nan_to_num(_numerico(previsoes, COLUNA_VALOR))
+    carga = _numerico(previsoes, COLUNA_CARGA)
+    com_carga = ~np.isnan(carga)
+
+    valores = pd.DataFrame({
+        **{chave: previsoes[chave].astype(str).to_numpy() for chave in CHAVES_MATRIZ},
+        COLUNA_NOME: previsoes[COLUNA_NOME].to_numpy() if COLUNA_NOME in previsoes.columns else '',
+        'pedidos': np.ones(len(previsoes), dtype=np.int64),
+        'atrasos': atraso.astype(np.int64),
+        'valor_net': valor,
+        'valor_em_risco': valor * np.where(atraso, precisao, 1 - precisao),
+        'soma_carga': np.where(com_carga, carga, 0.0),
+        'pedidos_com_carga': com_carga.astype(np.int64),
+    })
+    return _somar(valores)
+
+def _somar(valores):
+    """
+    Soma as `COLUNAS_SOMAS` por fornecedor e grupo de material (o nome é o primeiro encontrado).
+    """
+    grupos = valores.groupby(CHAVES_MATRIZ, sort=False, observed=True)
+    agregados = grupos[COLUNAS_SOMAS].sum()
+    agregados.insert(0, COLUNA_NOME, grupos[COLUNA_NOME].first())
+    return agregados.reset_index()
+
+def combinar_agregados(parciais):
+    """
+    Combina agregações parciais (ex.: de cada bloco de previsões).
+
+    Args:
+        parciais (list): DataFrames retornados por `agregar_previsoes`
+
+    Returns:
+        pandas.DataFrame: Agregação do conjunto (None se a lista está vazia)
+    """
+    parciais = [parcial for parcial in parciais if parcial is not None]
+    if not parciais:
+        return None
+    if len(parciais) == 1:
+        return parciais[0]
+    return _somar(pd.concat(parciais, ignore_index=True))
+
+def montar_matriz(agregados, anterior=None):
+    """
+    Monta a tabela da aba "Fornecedores" a partir das somas e contagens.
+
+    Args:
+        agregados (pandas.DataFrame): Agregação da execução atual
+        anterior (pandas.DataFrame): Agregação da execução anterior, para a variação do percentual de atraso
+
+    Returns:
+        pandas.DataFrame: Matriz ordenada pelo valor em risco (maior primeiro)
+    """
+    pedidos = agregados['pedidos'].to_numpy()
+    matriz = pd.DataFrame({
+        'Vendor': agregados['Vendor'],
+        COLUNA_NOME: agregados[COLUNA_NOME],
+        'Material Group': agregados['Material Group'],
+        'Pedidos em Aberto': pedidos,
+        'Previsão de Atraso': agregados['atrasos'].to_numpy(),
+        '% Atraso': np.round(agregados['atrasos'].to_numpy() / pedidos, 4),
+        'Valor Net': np.round(agregados['valor_net'].to_numpy(), 2),
+        'Valor em Risco': np.round(agregados['valor_em_risco'].to_numpy(), 2),
+        'Carga Média': np.round(agregados['soma_carga'].to_numpy() / np.maximum(agregados['pedidos_com_carga'].to_numpy(), 1), 2),
+    })
+    if anterior is not None and len(anterior):
+        percentual_anterior = anterior.set_index(CHAVES_MATRIZ)
+        percentual_anterior = percentual_anterior['atrasos'] / percentual_anterior['pedidos']
+        chaves = pd.MultiIndex.from_frame(agregados[CHAVES_MATRIZ])
+        # Fornecedor/grupo sem pedidos na execução anterior fica sem variação
+        variacao = matriz['% Atraso'].to_numpy() - percentual_anterior.reindex(chaves).to_numpy()
+        matriz['Variação % Atraso'] = np.round(variacao, 4)
+    return matriz.sort_values(['Valor em Risco', 'Pedidos em Aberto'], ascending=False, kind='stable').reset_index(drop=True)
+
+def carregar_anterior(pasta=PASTA_MATRIZ):
+    """
+    Lê a agregação da última execução (None se não existe ou não pode ser lida).
+
+    Args:
+        pasta (str): Pasta da matriz em cache
+
+    Returns:
+        pandas.DataFrame: Agregação da execução anterior
+    """
+    try:
+        return pd.read_parquet(os.path.join(pasta, 'ultima.parquet'))
+    except Exception:
+        return None
+
+def guardar_agregados(agregados, pasta=PASTA_MATRIZ):
+    """
+    Guarda a agregação desta execução para a comparação da próxima (gravação atômica).
+
+    Args:
+        agregados (pandas.DataFrame): Agregação da execução
+        pasta (str): Pasta da matriz em cache
+    """
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, 'ultima.parquet')
+    caminho_tmp = f"{caminho}.tmp"
+    agregados.to_parquet(caminho_tmp, index=False)
+    os.replace(caminho_tmp, caminho)
+
+def criar_matriz(agregados, pasta=PASTA_MATRIZ):
+    """
+    Monta a matriz da execução, com a variação em relação à execução anterior.
+
+    A agregação desta execução só deve ser guardada (`guardar_agregados`)
+    depois que os resultados forem publicados.
+
+    Args:
+        agregados (pandas.DataFrame): Agregação da execução atual
+        pasta (str): Pasta da matriz em cache
+
+    Returns:
+        pandas.DataFrame: Matriz de risco por fornecedor e grupo de material
+    """
+    matriz = montar_matriz(agregados, carregar_anterior(pasta))
+    log_message(f"📊 Matriz de fornecedores: {len(matriz)} combinações de fornecedor e grupo de material")
+    return matriz
@@ -8,120 +8,96 @@ from pycaret.classification import *
 from datetime import datetime
 import numpy as np
 import matplotlib.pyplot as plt
+from cache_base import carregar_base_otp
+from espelho_local import espelhar
+from esquema_otp import aplicar_esquema
+from artefato_inferencia import CAMINHO_MODELO, artefato_disponivel, exportar_artefato
+from features_irf import calcular_features
+from busca_hiperparametros import buscar_hiperparametros
+from indice_carga import IndiceCargaFornecedor
+from irf import montar_referencia_carga, separar_pedidos
+import treino_incremental
+from instrumentacao import etapa, execucao, log_message
 
 ARQUIVO_REDE = r'S:\Procurement\FUP\OTP Mensal\OTP - Base.xlsx'
 
-def log_message(message):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{timestamp}] {message}")
+# Modo de tunagem: 'paralelo' (busca_hiperparametros.py) ou 'pycaret' (tune_model com 5 iterações)
+MODO_TUNAGEM = 'paralelo'
+TUNAGEM_TENTATIVAS = 300
+TUNAGEM_TEMPO_LIMITE = 20 * 60  # segundos
+
+# Modo de treinamento: 'incremental' (treino_incremental.py, se houver modelo e matriz em cache) ou 'completo'
+MODO_TREINO = 'incremental'
+# Colunas de controle (chaves e data de entrega) que não entram no modelo
+COLUNAS_CONTROLE = ['EBELN', 'EBELP', 'Delivery Date']
+# Colunas usadas só para separar os pedidos em aberto, como no irf.py (ver irf.separar_pedidos)
+COLUNAS_SEPARACAO = ['GR Document Date', 'Net Order Value in Doc. Curr.']
 
 def carregar_e_filtrar_dados(arquivo_rede):
     """
     Carrega e filtra os dados do arquivo Excel.
+
+    A carga do fornecedor é contada sobre os mesmos pedidos usados pelo `irf.py`
+    (em aberto e todos os entregues, ver `irf.montar_referencia_carga`); só as
+    linhas de treinamento ficam restritas às entregas do último ano.
     
     Args:
         arquivo_rede (str): Caminho do arquivo Excel
         
     Returns:
-        pandas.DataFrame: DataFrame filtrado com as colunas necessárias
+        tuple: (DataFrame filtrado com as colunas necessárias, índice da carga do fornecedor)
     """    
-    # Ler o arquivo excel
+    # Colunas necessárias para o treinamento
+    colunas_manter = ['BEDAT', 'Due Date (incl. ex works time)', 'MATKL', 'Vendor', 'NetOrderValue', 'On Time']
+
+    # Ler o arquivo excel (apenas as colunas usadas, já tipadas)
     log_message(f"📁 Carregando arquivo: {arquivo_rede}")
-    df = pd.read_excel(arquivo_rede)
+    # Lê da cópia local do arquivo da rede (copiado só quando mudou)
+    df = carregar_base_otp(espelhar(arquivo_rede), colunas=colunas_manter + COLUNAS_CONTROLE + COLUNAS_SEPARACAO)
     log_message(f"✅ Arquivo carregado com {len(df)} registros iniciais")
 
-    # Filtra apenas os dados que possuem Delivery Date
-    if 'Delivery Date' in df.columns:
-        df = df[df['Delivery Date'].notna()].copy()
-    else:
-        log_message("⚠️ Coluna 'Delivery Date' não encontrada no DataFrame")
+    # Filtra apenas os dados que possuem Delivery Date (os entregues) e monta a referência
+    # da carga do fornecedor como o irf.py, antes do filtro de 1 ano
+    df_pedidos_em_aberto, df = separar_pedidos(df)
+    indice = IndiceCargaFornecedor.construir(montar_referencia_carga(df_pedidos_em_aberto, df))
     
     # # Filtra os registros cuja 'Delivery Date' seja de até 1 ano atrás em relação à data atual
     data_limite = datetime.today() - pd.DateOffset(years=1)
     # df['Delivery Date'] = pd.to_datetime(df['Delivery Date'], errors='coerce')
     df = df[df['Delivery Date'] >= data_limite].copy()
     
-    # Manter apenas as colunas necessárias
-    colunas_manter = ['BEDAT', 'Due Date (incl. ex works time)', 'MATKL', 'Vendor', 'NetOrderValue', 'On Time']
-    df = df[colunas_manter].copy()
+    # Manter apenas as colunas necessárias (e as de controle do treinamento incremental)
+    df = df[COLUNAS_CONTROLE + colunas_manter].copy()
     
     log_message(f"✅ DataFrame filtrado com {len(df)} registros e {len(df.columns)} colunas")
     log_message(f"📊 Colunas mantidas: {list(df.columns)}")
     
-    return df
+    return df, indice
 
-def converter_datas_e_criar_variaveis_temporais(df):
+def converter_datas_e_criar_variaveis_temporais(df, indice=None):
     """
-    Converte colunas de data e cria variáveis temporais.
+    Converte colunas de data e cria as variáveis do modelo.
+
+    As variáveis ("Dias Para Entrega" e "carga_fornecedor") vêm do módulo
+    `features_irf`, o mesmo usado pelo `irf.py` nas previsões.
     
     Args:
         df (pandas.DataFrame): DataFrame com os dados
+        indice (IndiceCargaFornecedor): Índice da carga do fornecedor (ver `carregar_e_filtrar_dados`;
+            None para usar o próprio df)
         
     Returns:
-        pandas.DataFrame: DataFrame com datas convertidas e variáveis temporais
+        pandas.DataFrame: DataFrame com datas convertidas e variáveis calculadas
     """    
-    # Converter as colunas de data
-    df["BEDAT"] = pd.to_datetime(df["BEDAT"], errors="coerce")  # Data de emissão
-    df["Due Date (incl. ex works time)"] = pd.to_datetime(df["Due Date (incl. ex works time)"], errors="coerce")  # Entrega prevista
-
-    # Dias para a entrega (em dias úteis)
-    df["Dias Para Entrega"] = [
-        np.busday_count(bedat.date(), due_date.date()) if pd.notnull(bedat) and pd.notnull(due_date) else np.nan
-        for bedat, due_date in zip(df["BEDAT"], df["Due Date (incl. ex works time)"])
-    ]
+    # Garante os tipos do esquema (datas e categorias já vêm convertidas da leitura)
+    df = aplicar_esquema(df)
+
+    # Dias para a entrega (em dias úteis) e carga do fornecedor na emissão da PO
+    df = calcular_features(df, indice=indice)
     
     # Inverte a coluna On Time
     df['On Time'] = df['On Time'].replace({1: 0, 0: 1})
     
-    # Converter para categoria
-    df['MATKL'] = df['MATKL'].astype('category')
-    df['Vendor'] = df['Vendor'].astype('category')
-    
-    return df
-
-def calcular_carga_fornecedor(df):
-    """
-    Calcula a carga do fornecedor para todos os registros.
-    
-    Args:
-        df (pandas.DataFrame): DataFrame com os dados
-        
-    Returns:
-        pandas.DataFrame: DataFrame com a coluna carga_fornecedor calculada
-    """
-    log_message("📈 Iniciando cálculo da carga do fornecedor...")
-    
-    # Inicializar nova coluna
-    df['carga_fornecedor'] = 0
-    
-    df = df.sort_values(['Vendor', 'BEDAT']).reset_index(drop=True)
-
-    df_start = df[['Vendor', 'BEDAT']].copy()
-    df_start = df_start.rename(columns={'BEDAT':'date'})
-    df_start['start'] = 1
-    df_start['end'] = 0
-
-    df_end = df[['Vendor', 'Due Date (incl. ex works time)']].copy()
-    df_end = df_end.rename(columns={'Due Date (incl. ex works time)':'date'})
-    df_end['start'] = 0
-    df_end['end'] = 1
-
-    df_events = pd.concat([df_start, df_end])
-    df_events = df_events.sort_values(['Vendor', 'date']).reset_index(drop=True)
-
-    df_events['open_pedidos'] = (
-        df_events.groupby('Vendor')['start'].cumsum() - df_events.groupby('Vendor')['end'].cumsum()
-    )
-
-    df_open = df_events[['Vendor', 'date', 'open_pedidos']].drop_duplicates(subset=['Vendor', 'date'])
-
-    df = pd.merge(df, df_open, left_on=['Vendor', 'BEDAT'], right_on=['Vendor', 'date'], how='left')
-
-    df['carga_fornecedor'] = df['open_pedidos'] - 1
-
-    df = df.drop(columns=['date', 'open_pedidos'])
-    
-    log_message("✅ Cálculo da carga do fornecedor concluído")
     return df
 
 def treinar_e_salvar_modelo(df, caminho_salvamento):
@@ -138,60 +114,126 @@ def treinar_e_salvar_modelo(df, caminho_salvamento):
     """
     log_message("🤖 Iniciando treinamento do modelo...")
     
-    # Remove as colunas BEDAT e Due Date
+    # Remove as colunas BEDAT e Due Date (e as colunas de controle, se vierem)
     df = df.drop('BEDAT', axis=1)
     df = df.drop('Due Date (incl. ex works time)', axis=1)
+    df = df.drop(columns=[coluna for coluna in COLUNAS_CONTROLE if coluna in df.columns])
     
     # Configura o experimento que será iniciado
     log_message("⚙️ Configurando experimento PyCaret...")
-    s = setup(df, target='On Time', session_id=109, fix_imbalance=True)
+    with etapa('setup_pycaret', linhas_entrada=len(df)):
+        s = setup(df, target='On Time', session_id=109, fix_imbalance=True)
 
     # Treina o modelo LightGBM
     log_message("Treinando modelo LightGBM...")
-    modelo_lgbm = create_model('lightgbm', verbose=False)
+    with etapa('create_model'):
+        modelo_lgbm = create_model('lightgbm', verbose=False)
 
     # Tunando o modelo
     log_message("🔧 Tunando modelo LightGBM...")
-    modelo_lgbm_tunado = tune_model(modelo_lgbm, optimize='MCC', n_iter=5, verbose=False)
-
-    # Plota a importância das variáveis para o modelo
-    plot_model(modelo_lgbm_tunado, plot='feature', save=True)
-
-    # Plota a matriz de confusão para o modelo
-    plot_model(modelo_lgbm_tunado, plot='confusion_matrix', save=True)
+    with etapa('tunagem', modo=MODO_TUNAGEM):
+        melhor_busca = None
+        if MODO_TUNAGEM == 'paralelo':
+            melhor_busca = buscar_hiperparametros(tentativas=TUNAGEM_TENTATIVAS, tempo_limite=TUNAGEM_TEMPO_LIMITE, semente=109)
+        if melhor_busca is not None:
+            modelo_lgbm_tunado = create_model('lightgbm', verbose=False, **melhor_busca['parametros'])
+        else:
+            modelo_lgbm_tunado = tune_model(modelo_lgbm, optimize='MCC', n_iter=5, verbose=False)
+
+    with etapa('graficos'):
+        # Plota a importância das variáveis para o modelo
+        plot_model(modelo_lgbm_tunado, plot='feature', save=True)
+
+        # Plota a matriz de confusão para o modelo
+        plot_model(modelo_lgbm_tunado, plot='confusion_matrix', save=True)
 
     # Finaliza o modelo tunado
     log_message("🔧 Finalizando modelo tunado...")
-    modelo_lgbm_final = finalize_model(modelo_lgbm_tunado)
+    with etapa('finalize_model'):
+        modelo_lgbm_final = finalize_model(modelo_lgbm_tunado)
 
     # Salvando o modelo
     log_message(f"💾 Salvando modelo em: {caminho_salvamento}")
-    save_model(modelo_lgbm_final, caminho_salvamento)
+    with etapa('salvar_modelo'):
+        save_model(modelo_lgbm_final, caminho_salvamento)
+
+        # Exporta o artefato enxuto usado pelo irf.py para prever sem o PyCaret
+        caminho_booster, caminho_spec = exportar_artefato(modelo_lgbm_final, df, caminho_salvamento)
+    log_message(f"💾 Artefato de inferência salvo em: {caminho_booster} e {caminho_spec}")
 
     log_message("✅ Modelo treinado e salvo com sucesso!")
     return modelo_lgbm_final
 
+def treinar_incremental(df, indice):
+    """
+    Atualiza o modelo só com as POs entregues que ainda não foram aprendidas.
+
+    Args:
+        df (pandas.DataFrame): Dados filtrados da janela de treinamento
+        indice (IndiceCargaFornecedor): Índice da carga do fornecedor (ver `carregar_e_filtrar_dados`)
+
+    Returns:
+        bool: True se o modo incremental foi usado (mesmo sem mudanças no modelo),
+            False se é preciso fazer o treinamento completo
+    """
+    matriz = treino_incremental.carregar_matriz()
+    if matriz is None or not artefato_disponivel(CAMINHO_MODELO):
+        log_message("ℹ️ Sem modelo ou matriz de treinamento em cache, fazendo o treinamento completo")
+        return False
+
+    df = aplicar_esquema(df)
+    df_novos = treino_incremental.selecionar_novos(df, matriz)
+    df_novos = converter_datas_e_criar_variaveis_temporais(df_novos, indice=indice)
+    resumo = treino_incremental.atualizar_modelo_incremental(df_novos, df[COLUNAS_CONTROLE], CAMINHO_MODELO)
+    if resumo is not None:
+        log_message(f"✅ Modelo atualizado ({resumo['modo']}) com {resumo['linhas_novas']} linhas novas")
+    return True
+
 def main():
     """
     Função principal que executa todo o pipeline de treinamento do modelo.
+
+    Cada etapa é medida (tempo, CPU, memória e linhas) pelo módulo `instrumentacao`.
+    """
+    with execucao('modelo_irf'):
+        executar_treinamento()
+
+def executar_treinamento():
+    """
+    Executa as etapas do treinamento dentro da execução instrumentada (ver `main`).
     """
     log_message("🚀 Iniciando pipeline de treinamento do modelo IRF...")
     log_message("=" * 60)
     
     # Carregar e filtrar dados
-    df = carregar_e_filtrar_dados(ARQUIVO_REDE)
-    
-    # Converter datas e criar variáveis temporais
-    df = converter_datas_e_criar_variaveis_temporais(df)
-    
-    # Calcular carga do fornecedor
-    df = calcular_carga_fornecedor(df)
+    with etapa('carregar_e_filtrar_dados') as medida:
+        df, indice = carregar_e_filtrar_dados(ARQUIVO_REDE)
+        medida.linhas_saida = len(df)
+
+    # Treinamento incremental: só as POs entregues que o modelo ainda não aprendeu
+    if MODO_TREINO == 'incremental':
+        with etapa('treino_incremental', linhas_entrada=len(df)):
+            incremental = treinar_incremental(df, indice)
+        if incremental:
+            log_message("=" * 60)
+            return
+    
+    # Converter datas e criar as variáveis do modelo (inclui a carga do fornecedor)
+    with etapa('criar_variaveis', linhas_entrada=len(df)) as medida:
+        df = converter_datas_e_criar_variaveis_temporais(df, indice=indice)
+        medida.linhas_saida = len(df)
 
     # Salvar o dataframe com a carga do fornecedor
-    df.to_excel(r'S:\Procurement\FUP\IRF - Índice de Risco de Fornecedores\Modelo de Machine Learning\dados_treinamento.xlsx', index=False)
+    with etapa('salvar_dados_treinamento', linhas_entrada=len(df)):
+        df.to_excel(r'S:\Procurement\FUP\IRF - Índice de Risco de Fornecedores\Modelo de Machine Learning\dados_treinamento.xlsx', index=False)
     
     # Treinar e salvar modelo
-    modelo_final = treinar_e_salvar_modelo(df, r'S:\Procurement\FUP\IRF - Índice de Risco de Fornecedores\Modelo de Machine Learning\Modelos\modelo_treinado_lgbm')
+    with etapa('treinar_e_salvar_modelo', linhas_entrada=len(df)):
+        modelo_final = treinar_e_salvar_modelo(df, CAMINHO_MODELO)
+
+    # Registra as linhas aprendidas para os próximos treinamentos incrementais
+    with etapa('registrar_matriz_treino', linhas_entrada=len(df)):
+        treino_incremental.registrar_treino_completo(df, CAMINHO_MODELO)
     
     log_message("=" * 60)
 
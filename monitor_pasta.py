@@ -0,0 +1,276 @@
+"""# Monitor da pasta de exports (atualização automática)
+
+Observa a pasta onde os exports do CELONIS (`*CELONIS*.csv`) e de RNC
+(`*EXPORT_*.xlsx`) são baixados e, quando chega um export novo, executa a
+atualização da planilha (`atualizar_planilha.py`) e em seguida a previsão
+(`irf.py`), sem esperar alguém rodar o `run_previsao.bat`.
+
+- A pasta é verificada a cada `INTERVALO_VERIFICACAO` segundos (polling, que
+  funciona igual em pastas locais e de rede no Windows)
+- Como no `atualizar_planilha.py`, valem os arquivos mais recentes pelo número
+  no nome. Um arquivo só é processado depois de ficar `TEMPO_ESTABILIDADE`
+  segundos sem mudar de tamanho ou data e de poder ser aberto (o download terminou)
+- Os exports já processados são reconhecidos pelo hash do conteúdo, gravado em
+  `cache/monitor/processados.json`: o mesmo export baixado de novo não dispara
+  outra execução
+- Se a atualização ou a previsão falhar, os mesmos arquivos são tentados de
+  novo depois de `INTERVALO_NOVA_TENTATIVA` segundos
+
+Uso:
+    python monitor_pasta.py [pasta]
+
+A pasta padrão é a `caminho_origem` do `atualizar_planilha.py`, ou a indicada
+na variável de ambiente `IRF_PASTA_MONITORADA`.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+import atualizar_planilha
+import irf
+from cache_base import calcular_hash_arquivo
+from instrumentacao import log_message
+
+PASTA_MONITORADA = os.environ.get('IRF_PASTA_MONITORADA') or atualizar_planilha.caminho_origem
+PASTA_MONITOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'monitor')
+# Intervalo (em segundos) entre as verificações da pasta
+INTERVALO_VERIFICACAO = 15
+# Tempo (em segundos) que um arquivo precisa ficar sem mudar para ser considerado completo
+TEMPO_ESTABILIDADE = 10
+# Tempo (em segundos) até tentar de novo arquivos cujo processamento falhou
+INTERVALO_NOVA_TENTATIVA = 600
+# Quantidade máxima de exports guardados no registro de processados
+MAX_PROCESSADOS = 500
+
+class MonitorPasta:
+    """
+    Detecta exports novos na pasta e dispara a atualização da planilha e a previsão.
+    """
+
+    def __init__(self, pasta=PASTA_MONITORADA, pasta_estado=PASTA_MONITOR,
+                 tempo_estabilidade=TEMPO_ESTABILIDADE, intervalo_nova_tentativa=INTERVALO_NOVA_TENTATIVA):
+        """
+        Args:
+            pasta (str): Pasta observada
+            pasta_estado (str): Pasta do registro de exports processados
+            tempo_estabilidade (float): Segundos sem mudança para um arquivo ser considerado completo
+            intervalo_nova_tentativa (float): Segundos até tentar de novo um processamento que falhou
+        """
+        self.pasta = pasta
+        self.caminho_processados = os.path.join(pasta_estado, 'processados.json')
+        self.tempo_estabilidade = tempo_estabilidade
+        self.intervalo_nova_tentativa = intervalo_nova_tentativa
+        # caminho -> (assinatura, momento em que a assinatura foi vista pela primeira vez)
+        self._observados = {}
+        # (caminho, assinatura) -> hash do conteúdo, para não ler o arquivo a cada verificação
+        self._hashes = {}
+        # hashes dos arquivos -> momento da última falha
+        self._falhas = {}
+
+    @staticmethod
+    def _assinatura(caminho):
+        """
+        Devolve tamanho e data de modificação do arquivo (None se não existe).
+        """
+        try:
+            info = os.stat(caminho)
+        except OSError:
+            return None
+        return info.st_size, info.st_mtime_ns
+
+    @staticmethod
+    def _pode_abrir(caminho):
+        """
+        Verifica se o arquivo pode ser aberto para leitura (no Windows, não está sendo gravado).
+        """
+        try:
+            with open(caminho, 'rb') as arquivo:
+                arquivo.read(1)
+            return True
+        except OSError:
+            return False
+
+    def arquivo_pronto(self, caminho, agora):
+        """
+        Verifica se o arquivo terminou de ser gravado.
+
+        O arquivo está pronto quando tamanho e data não mudam há pelo menos
+        `tempo_estabilidade` segundos e ele pode ser aberto.
+
+        Args:
+            caminho (str): Caminho do arquivo
+            agora (float): Momento da verificação (`time.monotonic()`)
+
+        Returns:
+            bool: True se o arquivo pode ser processado
+        """
+        assinatura = self._assinatura(caminho)
+        if assinatura is None:
+            self._observados.pop(caminho, None)
+            return False
+        anterior = self._observados.get(caminho)
+        if anterior is None or anterior[0] != assinatura:
+            self._observados[caminho] = (assinatura, agora)
+            return False
+        return agora - anterior[1] >= self.tempo_estabilidade and self._pode_abrir(caminho)
+
+    def _hash(self, caminho):
+        """
+        Calcula o hash do conteúdo do arquivo (reaproveitado enquanto o arquivo não muda).
+        """
+        chave = (caminho, self._assinatura(caminho))
+        if chave not in self._hashes:
+            self._hashes[chave] = calcular_hash_arquivo(caminho)
+        return self._hashes[chave]
+
+    def _ler_processados(self):
+        """
+        Lê o registro dos exports já processados ({hash: dados do arquivo}).
+        """
+        try:
+            with open(self.caminho_processados, 'r', encoding='utf-8') as arquivo:
+                return json.load(arquivo)
+        except (OSError, ValueError):
+            return {}
+
+    def _registrar_processados(self, hashes):
+        """
+        Acrescenta os arquivos ao registro dos exports processados (gravação atômica).
+
+        Args:
+            hashes (dict): Hash do conteúdo de cada arquivo processado, pelo caminho
+        """
+        processados = self._ler_processados()
+        momento = datetime.now().isoformat(timespec='seconds')
+        for caminho, hash_arquivo in hashes.items():
+            processados[hash_arquivo] = {'arquivo': os.path.basename(caminho), 'processado_em': momento}
+        if len(processados) > MAX_PROCESSADOS:
+            recentes = sorted(processados.items(), key=lambda item: item[1]['processado_em'])[-MAX_PROCESSADOS:]
+            processados = dict(recentes)
+        os.makedirs(os.path.dirname(self.caminho_processados), exist_ok=True)
+        caminho_tmp = f"{self.caminho_processados}.tmp"
+        with open(caminho_tmp, 'w', encoding='utf-8') as arquivo:
+            json.dump(processados, arquivo, ensure_ascii=False, indent=2)
+        os.replace(caminho_tmp, self.caminho_processados)
+
+    def arquivos_pendentes(self, agora):
+        """
+        Procura exports novos e prontos para processar.
+
+        Args:
+            agora (float): Momento da verificação (`time.monotonic()`)
+
+        Returns:
+            tuple: (CSV CELONIS, EXPORT ou None, hashes pelo caminho), ou None se não há o que processar
+        """
+        arquivo_origem = atualizar_planilha.arquivo_mais_recente(
+            self.pasta, atualizar_planilha.PADRAO_CELONIS, atualizar_planilha.extrair_numero)
+        if not arquivo_origem:
+            return None
+        arquivo_export = atualizar_planilha.arquivo_mais_recente(
+            self.pasta, atualizar_planilha.PADRAO_EXPORT, atualizar_planilha.extrair_numero_export)
+        arquivos = [arquivo for arquivo in (arquivo_origem, arquivo_export) if arquivo]
+        # Verifica todos (e não só até o primeiro não pronto) para a estabilidade ser contada desde já
+        prontos = [self.arquivo_pronto(arquivo, agora) for arquivo in arquivos]
+        if not all(prontos):
+            return None
+
+        try:
+            hashes = {arquivo: self._hash(arquivo) for arquivo in arquivos}
+        except OSError as e:
+            log_message(f"⚠️ Não foi possível ler os exports, tentando na próxima verificação: {e}")
+            return None
+        processados = self._ler_processados()
+        if all(hash_arquivo in processados for hash_arquivo in hashes.values()):
+            return None
+        chave = tuple(sorted(hashes.values()))
+        if chave in self._falhas and agora - self._falhas[chave] < self.intervalo_nova_tentativa:
+            return None
+        return arquivo_origem, arquivo_export, hashes
+
+    def processar(self, arquivo_origem, arquivo_export, hashes):
+        """
+        Atualiza a planilha com os exports e, se ela mudou, executa a previsão.
+
+        Args:
+            arquivo_origem (str): CSV CELONIS
+            arquivo_export (str): Planilha EXPORT (None se não houver)
+            hashes (dict): Hash do conteúdo de cada arquivo, pelo caminho
+
+        Returns:
+            bool: True se o processamento terminou sem erros
+        """
+        log_message(f"📥 Export novo detectado: {os.path.basename(arquivo_origem)}"
+                    + (f" + {os.path.basename(arquivo_export)}" if arquivo_export else ""))
+        chave = tuple(sorted(hashes.values()))
+        try:
+            atualizada = atualizar_planilha.main(arquivo_origem, arquivo_export)
+            if atualizada is None:
+                raise RuntimeError("falha na atualização da planilha")
+            if atualizada:
+                if not irf.main():
+                    raise RuntimeError("falha na previsão")
+            else:
+                log_message("✅ Planilha sem alterações; previsão não executada.")
+        except Exception as e:
+            self._falhas[chave] = time.monotonic()
+            log_message(f"❌ Erro ao processar os exports ({e}); nova tentativa em {self.intervalo_nova_tentativa / 60:.0f} min")
+            return False
+        self._falhas.pop(chave, None)
+        self._registrar_processados(hashes)
+        log_message(f"✅ Exports processados. Aguardando novos arquivos em: {self.pasta}")
+        return True
+
+    def verificar(self):
+        """
+        Faz uma verificação da pasta e processa os exports novos, se houver.
+
+        Returns:
+            bool: True se algum export foi processado
+        """
+        pendentes = self.arquivos_pendentes(time.monotonic())
+        if pendentes is None:
+            return False
+        return self.processar(*pendentes)
+
+    def executar(self, parar=None, intervalo=INTERVALO_VERIFICACAO):
+        """
+        Verifica a pasta periodicamente até ser interrompido.
+
+        Args:
+            parar (threading.Event): Evento que encerra o laço (None: só com Ctrl+C)
+            intervalo (float): Segundos entre as verificações
+        """
+        parar = parar or threading.Event()
+        while True:
+            try:
+                self.verificar()
+            except Exception as e:
+                log_message(f"❌ Erro ao verificar a pasta: {e}")
+            if parar.wait(intervalo):
+                break
+
+def main(pasta=PASTA_MONITORADA):
+    """
+    Inicia o monitor da pasta de exports e o mantém até ser interrompido (Ctrl+C).
+
+    Args:
+        pasta (str): Pasta observada
+    """
+    log_message("🚀 IRF - Monitor da pasta de exports")
+    log_message("=" * 60)
+    if not os.path.isdir(pasta):
+        log_message(f"❌ Pasta não encontrada: {pasta}")
+        return
+    log_message(f"👀 Observando {pasta} a cada {INTERVALO_VERIFICACAO}s "
+                f"({atualizar_planilha.PADRAO_CELONIS}, {atualizar_planilha.PADRAO_EXPORT})")
+    try:
+        MonitorPasta(pasta).executar()
+    except KeyboardInterrupt:
+        log_message("⏹️ Encerrando monitor...")
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else PASTA_MONITORADA)
@@ -0,0 +1,10 @@
+@echo off
+echo Ativando ambiente virtual...
+call .venv\Scripts\activate.bat
+
+echo Monitorando a pasta de exports (Ctrl+C para encerrar)...
+python monitor_pasta.py
+
+echo.
+echo Monitor encerrado. Pressione qualquer tecla para sair...
+pause >nul
@@ -0,0 +1,570 @@
+"""# Manipulação do pacote xlsx (partes do zip)
+
+Substitui abas inteiras de um arquivo xlsx existente trabalhando direto nas
+partes do pacote zip, sem interpretar as demais abas. Assim as abas que não
+são geradas pelos scripts mantêm formatação, fórmulas e validações, e não
+precisam ser lidas nem reescritas célula a célula. Uma aba também pode ter só
+algumas linhas reescritas: as demais são copiadas como bytes, sem passar
+pelo xlsxwriter.
+
+As abas novas são geradas antes pelo xlsxwriter (em `constant_memory`, com
+strings inline) em um arquivo temporário; daqui são copiadas as partes dessas
+abas, com os índices de estilo remapeados para o styles.xml do arquivo antigo.
+"""
+
+import io
+import os
+import posixpath
+import re
+import tempfile
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_PKG_REL = 'http://schemas.openxmlformats.org/package/2006/relationships'
+TIPO_WORKSHEET = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet'
+TIPO_CALC_CHAIN = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/calcChain'
+CONTENT_TYPE_WORKSHEET = 'application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml'
+TAMANHO_BLOCO = 1024 * 1024
+
+RE_ESTILO = re.compile(rb' (s|style)="(\d+)"')
+# Bloco numFmts do styles.xml, vazio (<numFmts count="0"/>) ou com conteúdo
+RE_NUM_FMTS = re.compile(r'<numFmts\b([^>]*?)(?:/>|>(.*?)</numFmts>)', re.S)
+RE_ABA_SELECIONADA = re.compile(rb' tabSelected="1"')
+RE_LINHA = re.compile(rb'<row r="(\d+)"[^>]*>.*?</row>', re.S)
+RE_DIMENSAO = re.compile(rb'(<dimension ref="[A-Z]+\d+:[A-Z]+)\d+"')
+
+def _ler_texto(zin, nome):
+    """Lê uma parte XML do pacote como texto."""
+    return zin.read(nome).decode('utf-8')
+
+def _resolver_alvo(parte_origem, alvo):
+    """
+    Resolve o caminho de uma parte a partir do Target de um relacionamento.
+
+    Args:
+        parte_origem (str): Parte dona do relacionamento (ex.: 'xl/workbook.xml')
+        alvo (str): Valor do atributo Target
+
+    Returns:
+        str: Caminho da parte dentro do zip
+    """
+    if alvo.startswith('/'):
+        return alvo.lstrip('/')
+    return posixpath.normpath(posixpath.join(posixpath.dirname(parte_origem), alvo))
+
+def _caminho_rels(parte):
+    """
+    Monta o caminho do arquivo de relacionamentos de uma parte.
+
+    Args:
+        parte (str): Caminho da parte (ex.: 'xl/worksheets/sheet1.xml')
+
+    Returns:
+        str: Caminho do .rels correspondente
+    """
+    return posixpath.join(posixpath.dirname(parte), '_rels', posixpath.basename(parte) + '.rels')
+
+def _parte_workbook(zin):
+    """
+    Encontra a parte principal do workbook pelo _rels/.rels do pacote.
+
+    Args:
+        zin (zipfile.ZipFile): Pacote aberto para leitura
+
+    Returns:
+        str: Caminho da parte do workbook
+    """
+    raiz = ET.fromstring(zin.read('_rels/.rels'))
+    for rel in raiz.iter(f'{{{NS_PKG_REL}}}Relationship'):
+        if rel.get('Type', '').endswith('/officeDocument'):
+            return _resolver_alvo('', rel.get('Target'))
+    raise ValueError("Pacote xlsx sem parte principal de workbook")
+
+def mapear_abas(zin):
+    """
+    Mapeia o nome de cada aba para a parte do zip que contém a aba.
+
+    Args:
+        zin (zipfile.ZipFile): Pacote aberto para leitura
+
+    Returns:
+        dict: {nome da aba: caminho da parte}, na ordem do workbook
+    """
+    parte_wb = _parte_workbook(zin)
+    rels = ET.fromstring(zin.read(_caminho_rels(parte_wb)))
+    alvos = {
+        rel.get('Id'): _resolver_alvo(parte_wb, rel.get('Target'))
+        for rel in rels.iter(f'{{{NS_PKG_REL}}}Relationship')
+    }
+    workbook = ET.fromstring(zin.read(parte_wb))
+    return {
+        aba.get('name'): alvos[aba.get(f'{{{NS_REL}}}id')]
+        for aba in workbook.iter(f'{{{NS_MAIN}}}sheet')
+    }
+
+def _atualizar_contagem(tag_abertura, quantidade):
+    """Atualiza (ou cria) o atributo count de uma tag de abertura."""
+    if re.search(r'\bcount="\d+"', tag_abertura):
+        return re.sub(r'\bcount="\d+"', f'count="{quantidade}"', tag_abertura)
+    return tag_abertura.replace('>', f' count="{quantidade}">', 1)
+
+def _formatos_novos(estilos_novos):
+    """
+    Lê os formatos numéricos usados pelas abas novas (cellXfs do xlsxwriter).
+
+    Args:
+        estilos_novos (str): Conteúdo do styles.xml do arquivo temporário
+
+    Returns:
+        dict: {índice do xf: (numFmtId, formatCode ou None para formatos nativos)}
+    """
+    raiz = ET.fromstring(estilos_novos)
+    codigos = {
+        fmt.get('numFmtId'): fmt.get('formatCode')
+        for fmt in raiz.iter(f'{{{NS_MAIN}}}numFmt')
+    }
+    cell_xfs = raiz.find(f'{{{NS_MAIN}}}cellXfs')
+    formatos = {}
+    for indice, xf in enumerate(cell_xfs.findall(f'{{{NS_MAIN}}}xf')):
+        if indice == 0:
+            continue
+        if any(xf.get(attr, '0') != '0' for attr in ('fontId', 'fillId', 'borderId')):
+            raise ValueError("Somente formatos numéricos são suportados nas abas substituídas")
+        num_fmt_id = xf.get('numFmtId', '0')
+        formatos[indice] = (num_fmt_id, codigos.get(num_fmt_id))
+    return formatos
+
+def _mesclar_estilos(estilos_antigos, estilos_novos):
+    """
+    Garante que os formatos das abas novas existam no styles.xml do arquivo antigo.
+
+    Args:
+        estilos_antigos (str): Conteúdo do styles.xml do arquivo de destino
+        estilos_novos (str): Conteúdo do styles.xml do arquivo temporário
+
+    Returns:
+        tuple: (styles.xml atualizado, {índice novo: índice no arquivo antigo})
+    """
+    mapa = {}
+    for indice_novo, (num_fmt_id, codigo) in _formatos_novos(estilos_novos).items():
+        if codigo is not None:
+            # Formato personalizado: procura pelo mesmo código ou cria um numFmt novo.
+            # Os formatos existentes são lidos pelo ElementTree, que aceita qualquer
+            # forma das tags (inclusive um <numFmts count="0"/> vazio); o styles.xml
+            # só é alterado por trechos, para não reescrever prefixos de namespace
+            existentes = [
+                (fmt.get('numFmtId'), fmt.get('formatCode'))
+                for fmt in ET.fromstring(estilos_antigos).iter(f'{{{NS_MAIN}}}numFmt')
+            ]
+            num_fmt_id = next((id_fmt for id_fmt, codigo_fmt in existentes if codigo_fmt == codigo), None)
+            if num_fmt_id is None:
+                num_fmt_id = str(max([int(id_fmt) for id_fmt, _ in existentes] + [163]) + 1)
+                novo_fmt = f'<numFmt numFmtId="{num_fmt_id}" formatCode="{escape(codigo, {chr(34): "&quot;"})}"/>'
+                bloco = RE_NUM_FMTS.search(estilos_antigos)
+                if bloco:
+                    abertura = _atualizar_contagem(f'<numFmts{bloco.group(1).rstrip()}>', len(existentes) + 1)
+                    estilos_antigos = (
+                        estilos_antigos[:bloco.start()]
+                        + abertura + (bloco.group(2) or '') + novo_fmt + '</numFmts>'
+                        + estilos_antigos[bloco.end():]
+                    )
+                else:
+                    abertura_ss = re.search(r'<styleSheet\b[^>]*>', estilos_antigos)
+                    if abertura_ss is None:
+                        raise ValueError("styles.xml sem elemento styleSheet reconhecível")
+                    estilos_antigos = (
+                        estilos_antigos[:abertura_ss.end()]
+                        + f'<numFmts count="1">{novo_fmt}</numFmts>'
+                        + estilos_antigos[abertura_ss.end():]
+                    )
+
+        xf_novo = (
+            f'<xf numFmtId="{num_fmt_id}" fontId="0" fillId="0" borderId="0" xfId="0" '
+            f'applyNumberFormat="1"/>'
+        )
+        bloco_xfs = re.search(r'(<cellXfs\b[^>]*>)(.*?)</cellXfs>', estilos_antigos, re.S)
+        if bloco_xfs is None:
+            raise ValueError("styles.xml sem cellXfs reconhecível")
+        xfs = re.findall(r'<xf\b(?:[^>]*/>|.*?</xf>)', bloco_xfs.group(2), re.S)
+        if xf_novo in xfs:
+            mapa[indice_novo] = xfs.index(xf_novo)
+        else:
+            mapa[indice_novo] = len(xfs)
+            estilos_antigos = estilos_antigos.replace(
+                bloco_xfs.group(0),
+                _atualizar_contagem(bloco_xfs.group(1), len(xfs) + 1) + bloco_xfs.group(2) + xf_novo + '</cellXfs>', 1
+            )
+    return estilos_antigos, mapa
+
+def _copiar_aba_remapeando(zin, parte, destino, mapa):
+    """
+    Copia a parte de uma aba em blocos, trocando os índices de estilo e removendo
+    a marcação de aba selecionada.
+
+    Args:
+        zin (zipfile.ZipFile): Pacote temporário com as abas novas
+        parte (str): Caminho da parte da aba no pacote temporário
+        destino (file): Arquivo de destino (aberto em modo binário)
+        mapa (dict): {índice de estilo novo: índice no arquivo antigo}
+    """
+    def trocar(match):
+        indice = int(match.group(2))
+        return b' %s="%d"' % (match.group(1), mapa.get(indice, indice))
+
+    pendente = b''
+    with zin.open(parte) as origem:
+        for bloco in iter(lambda: origem.read(TAMANHO_BLOCO), b''):
+            pendente += bloco
+            # Processa só até o último '>' para não cortar um atributo ao meio
+            corte = pendente.rfind(b'>') + 1
+            trecho, pendente = pendente[:corte], pendente[corte:]
+            trecho = RE_ABA_SELECIONADA.sub(b'', trecho)
+            destino.write(RE_ESTILO.sub(trocar, trecho))
+    destino.write(pendente)
+
+def _acrescentar_linhas(xml_aba, linhas):
+    """
+    Acrescenta linhas ao final de uma aba: números como valores numéricos e os
+    demais valores como strings inline.
+
+    Args:
+        xml_aba (str): Conteúdo XML da aba
+        linhas (list): Lista de linhas, cada uma uma lista de valores
+
+    Returns:
+        str: XML da aba com as linhas acrescentadas
+    """
+    numeros = [int(n) for n in re.findall(r'<row\b[^>]*?\br="(\d+)"', xml_aba)]
+    ultima = max(numeros) if numeros else 0
+
+    novas = []
+    for deslocamento, valores in enumerate(linhas, start=1):
+        numero = ultima + deslocamento
+        celulas = []
+        for col, valor in enumerate(valores):
+            if valor is None:
+                continue
+            if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                celulas.append(f'<c r="{_letra_coluna(col)}{numero}"><v>{valor!r}</v></c>')
+                continue
+            texto = escape(str(valor))
+            preserva = ' xml:space="preserve"' if texto != texto.strip() else ''
+            celulas.append(
+                f'<c r="{_letra_coluna(col)}{numero}" t="inlineStr"><is><t{preserva}>{texto}</t></is></c>'
+            )
+        novas.append(f'<row r="{numero}">{"".join(celulas)}</row>')
+    bloco = ''.join(novas)
+
+    if '</sheetData>' in xml_aba:
+        xml_aba = xml_aba.replace('</sheetData>', bloco + '</sheetData>', 1)
+    elif re.search(r'<sheetData\s*/>', xml_aba):
+        xml_aba = re.sub(r'<sheetData\s*/>', f'<sheetData>{bloco}</sheetData>', xml_aba, count=1)
+    else:
+        raise ValueError("Aba sem sheetData reconhecível")
+
+    # Atualiza a dimensão declarada da aba
+    dimensao = re.search(r'<dimension ref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"', xml_aba)
+    if dimensao and linhas:
+        col_ini, lin_ini, col_fim, lin_fim = dimensao.groups()
+        col_fim = col_fim or col_ini
+        lin_fim = max(int(lin_fim or lin_ini), ultima + len(linhas))
+        xml_aba = xml_aba.replace(
+            dimensao.group(0), f'<dimension ref="{col_ini}{lin_ini}:{col_fim}{lin_fim}"', 1
+        )
+    return xml_aba
+
+def _linhas_geradas(znovas, parte, destinos, mapa):
+    """
+    Lê as linhas de dados de uma aba gerada e as renumera para as linhas de destino.
+
+    A linha 2 da aba gerada (a 1 é o cabeçalho) vai para `destinos[0]`, a 3 para
+    `destinos[1]` e assim por diante; os índices de estilo são remapeados.
+
+    Args:
+        znovas (zipfile.ZipFile): Pacote temporário com a aba gerada
+        parte (str): Caminho da parte da aba no pacote temporário
+        destinos (array): Linha de destino de cada linha de dados, em ordem
+        mapa (dict): {índice de estilo novo: índice no arquivo antigo}
+
+    Returns:
+        dict: {linha de destino: XML da linha (bytes)}
+
+    Raises:
+        ValueError: Se a aba gerada não tiver exatamente uma linha por destino
+    """
+    def trocar_estilo(match):
+        indice = int(match.group(2))
+        return b' %s="%d"' % (match.group(1), mapa.get(indice, indice))
+
+    linhas = {}
+    for match in RE_LINHA.finditer(znovas.read(parte)):
+        numero = int(match.group(1))
+        if numero < 2:
+            continue
+        destino = int(destinos[numero - 2])
+        # Troca o número da linha e as referências das células (ex.: r="C7" -> r="C1234")
+        linha = re.sub(rb'(<c r="[A-Z]+)%d"' % numero, rb'\g<1>%d"' % destino, match.group(0))
+        linha = linha.replace(b'<row r="%d"' % numero, b'<row r="%d"' % destino, 1)
+        linhas[destino] = RE_ESTILO.sub(trocar_estilo, linha)
+    if len(linhas) != len(destinos):
+        raise ValueError("A aba gerada não tem uma linha para cada linha a reescrever")
+    return linhas
+
+class _FluxoXml:
+    """
+    Percorre uma parte XML em blocos, copiando ou descartando trechos até marcadores.
+    """
+
+    def __init__(self, origem):
+        self.origem = origem
+        self.buffer = b''
+        self.fim = False
+
+    def ate(self, marcador, destino=None):
+        """
+        Avança até o início de `marcador`, copiando para `destino` (ou descartando) o que vem antes.
+
+        Raises:
+            ValueError: Se o marcador não for encontrado
+        """
+        while True:
+            posicao = self.buffer.find(marcador)
+            if posicao >= 0:
+                if destino is not None:
+                    destino.write(self.buffer[:posicao])
+                self.buffer = self.buffer[posicao:]
+                return
+            if self.fim:
+                raise ValueError(f"Trecho {marcador!r} não encontrado na aba")
+            # Mantém o final do buffer, que pode conter o começo do marcador
+            corte = max(0, len(self.buffer) - len(marcador) + 1)
+            if destino is not None:
+                destino.write(self.buffer[:corte])
+            self.buffer = self.buffer[corte:]
+            bloco = self.origem.read(TAMANHO_BLOCO)
+            self.fim = not bloco
+            self.buffer += bloco
+
+    def pular(self, marcador):
+        """Descarta tudo até o fim de `marcador`, inclusive."""
+        self.ate(marcador)
+        self.buffer = self.buffer[len(marcador):]
+
+    def copiar_resto(self, destino):
+        """Copia o restante da parte para `destino`."""
+        destino.write(self.buffer)
+        self.buffer = b''
+        for bloco in iter(lambda: self.origem.read(TAMANHO_BLOCO), b''):
+            destino.write(bloco)
+
+def _reescrever_linhas(origem, destino, linhas_novas, ultima_linha, ultima_linha_anterior):
+    """
+    Copia uma aba trocando só as linhas informadas, sem interpretar as demais.
+
+    As linhas até `ultima_linha_anterior` que estão em `linhas_novas` são
+    substituídas; as posteriores a `ultima_linha` são descartadas (a aba
+    encolheu); as de `linhas_novas` depois da última linha anterior são
+    acrescentadas no final. A dimensão declarada da aba é atualizada.
+
+    Args:
+        origem (file): Parte da aba no pacote de destino (aberta para leitura)
+        destino (file): Parte da aba no pacote novo (aberta para escrita)
+        linhas_novas (dict): {número da linha: XML da linha (bytes)}
+        ultima_linha (int): Última linha da aba depois da troca
+        ultima_linha_anterior (int): Última linha da aba antes da troca
+    """
+    fluxo = _FluxoXml(origem)
+    cabecalho = io.BytesIO()
+    fluxo.ate(b'<sheetData', cabecalho)
+    destino.write(RE_DIMENSAO.sub(rb'\g<1>%d"' % ultima_linha, cabecalho.getvalue(), count=1))
+
+    for numero in sorted(linhas_novas):
+        if numero > ultima_linha_anterior:
+            break
+        fluxo.ate(b'<row r="%d"' % numero, destino)
+        fluxo.pular(b'</row>')
+        destino.write(linhas_novas[numero])
+    if ultima_linha < ultima_linha_anterior:
+        fluxo.ate(b'<row r="%d"' % (ultima_linha + 1), destino)
+        fluxo.ate(b'</sheetData>')
+    else:
+        fluxo.ate(b'</sheetData>', destino)
+    for numero in sorted(linhas_novas):
+        if numero > ultima_linha_anterior:
+            destino.write(linhas_novas[numero])
+    fluxo.copiar_resto(destino)
+
+def _letra_coluna(indice):
+    """Converte o índice de coluna (base 0) na letra da coluna do Excel."""
+    letras = ''
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+def _remover_calc_chain(content_types, rels_workbook):
+    """
+    Remove as referências ao calcChain.xml, que o Excel reconstrói ao abrir.
+
+    Args:
+        content_types (str): Conteúdo do [Content_Types].xml
+        rels_workbook (str): Conteúdo dos relacionamentos do workbook
+
+    Returns:
+        tuple: (content_types, rels_workbook) atualizados
+    """
+    content_types = re.sub(r'<Override\b[^>]*PartName="/xl/calcChain\.xml"[^>]*/>', '', content_types)
+    rels_workbook = re.sub(rf'<Relationship\b[^>]*Type="{re.escape(TIPO_CALC_CHAIN)}"[^>]*/>', '', rels_workbook)
+    return content_types, rels_workbook
+
+def _registrar_aba_nova(nome_aba, workbook_xml, rels_workbook, content_types, partes_existentes):
+    """
+    Registra uma aba que ainda não existe no pacote de destino.
+
+    Args:
+        nome_aba (str): Nome da aba
+        workbook_xml (str): Conteúdo do workbook.xml
+        rels_workbook (str): Conteúdo dos relacionamentos do workbook
+        content_types (str): Conteúdo do [Content_Types].xml
+        partes_existentes (set): Partes já presentes no pacote
+
+    Returns:
+        tuple: (workbook_xml, rels_workbook, content_types, caminho da nova parte)
+    """
+    numero = 1
+    while f'xl/worksheets/sheet{numero}.xml' in partes_existentes:
+        numero += 1
+    parte = f'xl/worksheets/sheet{numero}.xml'
+
+    ids_rel = [int(n) for n in re.findall(r'\bId="rId(\d+)"', rels_workbook)]
+    id_rel = f'rId{max(ids_rel + [0]) + 1}'
+    ids_aba = [int(n) for n in re.findall(r'<sheet\b[^>]*\bsheetId="(\d+)"', workbook_xml)]
+    prefixo = re.search(rf'xmlns:(\w+)="{re.escape(NS_REL)}"', workbook_xml)
+    if prefixo is None or '</sheets>' not in workbook_xml:
+        raise ValueError("workbook.xml em formato não reconhecido")
+
+    workbook_xml = workbook_xml.replace(
+        '</sheets>',
+        f'<sheet name="{escape(nome_aba, {chr(34): "&quot;"})}" sheetId="{max(ids_aba + [0]) + 1}" '
+        f'{prefixo.group(1)}:id="{id_rel}"/></sheets>', 1
+    )
+    rels_workbook = rels_workbook.replace(
+        '</Relationships>',
+        f'<Relationship Id="{id_rel}" Type="{TIPO_WORKSHEET}" Target="worksheets/sheet{numero}.xml"/></Relationships>', 1
+    )
+    content_types = content_types.replace(
+        '</Types>',
+        f'<Override PartName="/{parte}" ContentType="{CONTENT_TYPE_WORKSHEET}"/></Types>', 1
+    )
+    return workbook_xml, rels_workbook, content_types, parte
+
+def substituir_abas(caminho_pacote, caminho_abas_novas, abas, linhas_acrescentar=None, reescrever_linhas=None):
+    """
+    Substitui abas de um xlsx existente pelas abas geradas em outro arquivo,
+    copiando todas as demais partes do pacote sem interpretá-las.
+
+    O resultado é montado em um arquivo temporário na mesma pasta e só então
+    colocado no lugar do original, de forma atômica.
+
+    Args:
+        caminho_pacote (str): Arquivo xlsx de destino, que será atualizado
+        caminho_abas_novas (str): Arquivo xlsx (gerado pelo xlsxwriter) com as abas novas
+        abas (list): Nomes das abas a substituir (ou criar, se não existirem no destino)
+        linhas_acrescentar (dict): {nome da aba: lista de linhas} a acrescentar ao final
+                                   de abas preservadas (opcional)
+        reescrever_linhas (dict): {nome da aba: plano} das abas em que só algumas linhas
+            são reescritas (opcional). A aba de mesmo nome em `caminho_abas_novas` traz,
+            abaixo do cabeçalho, as linhas novas na ordem de `plano['destinos']`; o plano
+            informa ainda `ultima_linha` e `ultima_linha_anterior`
+            (ver `ingestao_incremental.distribuir_linhas`)
+    """
+    linhas_acrescentar = linhas_acrescentar or {}
+    reescrever_linhas = reescrever_linhas or {}
+
+    with zipfile.ZipFile(caminho_pacote) as zin, zipfile.ZipFile(caminho_abas_novas) as znovas:
+        abas_destino = mapear_abas(zin)
+        abas_origem = mapear_abas(znovas)
+        parte_wb = _parte_workbook(zin)
+        caminho_rels_wb = _caminho_rels(parte_wb)
+        partes_existentes = set(zin.namelist())
+
+        workbook_xml = _ler_texto(zin, parte_wb)
+        rels_workbook = _ler_texto(zin, caminho_rels_wb)
+        content_types = _ler_texto(zin, '[Content_Types].xml')
+        content_types, rels_workbook = _remover_calc_chain(content_types, rels_workbook)
+
+        # Define a parte de destino de cada aba substituída
+        partes_substituidas = {}
+        abas_criadas = []
+        for aba in abas:
+            if aba not in abas_origem:
+                raise ValueError(f"Aba '{aba}' não encontrada no arquivo de abas novas")
+            if aba in abas_destino:
+                partes_substituidas[abas_destino[aba]] = abas_origem[aba]
+            else:
+                workbook_xml, rels_workbook, content_types, parte = _registrar_aba_nova(
+                    aba, workbook_xml, rels_workbook, content_types, partes_existentes
+                )
+                partes_existentes.add(parte)
+                partes_substituidas[parte] = abas_origem[aba]
+                abas_criadas.append(parte)
+
+        partes_acrescentar = {}
+        for aba, linhas in linhas_acrescentar.items():
+            if aba in abas_destino and linhas:
+                partes_acrescentar[abas_destino[aba]] = linhas
+
+        estilos, mapa_estilos = _mesclar_estilos(
+            _ler_texto(zin, 'xl/styles.xml'), _ler_texto(znovas, 'xl/styles.xml')
+        )
+        partes_reescrever = {}
+        for aba, plano in reescrever_linhas.items():
+            if aba not in abas_destino or aba not in abas_origem:
+                raise ValueError(f"Aba '{aba}' não encontrada para reescrever linhas")
+            linhas_novas = _linhas_geradas(znovas, abas_origem[aba], plano['destinos'], mapa_estilos)
+            partes_reescrever[abas_destino[aba]] = (linhas_novas, plano['ultima_linha'], plano['ultima_linha_anterior'])
+        # Os relacionamentos das abas antigas (tabelas, desenhos) não valem para as abas novas
+        ignorar = {'xl/calcChain.xml'} | {_caminho_rels(parte) for parte in partes_substituidas}
+        textos = {
+            parte_wb: workbook_xml,
+            caminho_rels_wb: rels_workbook,
+            '[Content_Types].xml': content_types,
+            'xl/styles.xml': estilos,
+        }
+
+        descritor, caminho_tmp = tempfile.mkstemp(
+            suffix='.xlsx.tmp', dir=os.path.dirname(os.path.abspath(caminho_pacote))
+        )
+        os.close(descritor)
+        try:
+            with zipfile.ZipFile(caminho_tmp, 'w', zipfile.ZIP_DEFLATED) as zout:
+                for info in zin.infolist():
+                    nome = info.filename
+                    if nome in ignorar:
+                        continue
+                    if nome in textos:
+                        zout.writestr(nome, textos[nome])
+                    elif nome in partes_substituidas:
+                        with zout.open(nome, 'w', force_zip64=True) as destino:
+                            _copiar_aba_remapeando(znovas, partes_substituidas[nome], destino, mapa_estilos)
+                    elif nome in partes_reescrever:
+                        with zin.open(info) as origem, zout.open(nome, 'w', force_zip64=True) as destino:
+                            _reescrever_linhas(origem, destino, *partes_reescrever[nome])
+                    elif nome in partes_acrescentar:
+                        zout.writestr(nome, _acrescentar_linhas(_ler_texto(zin, nome), partes_acrescentar[nome]))
+                    else:
+                        with zin.open(info) as origem, zout.open(nome, 'w', force_zip64=True) as destino:
+                            for bloco in iter(lambda: origem.read(TAMANHO_BLOCO), b''):
+                                destino.write(bloco)
+                for parte in abas_criadas:
+                    with zout.open(parte, 'w', force_zip64=True) as destino:
+                        _copiar_aba_remapeando(znovas, partes_substituidas[parte], destino, mapa_estilos)
+            os.replace(caminho_tmp, caminho_pacote)
+        except Exception:
+            if os.path.exists(caminho_tmp):
+                os.remove(caminho_tmp)
+            raise
@@ -0,0 +1,398 @@
+"""# Previsão da base OTP em blocos, com memória limitada
+
+Modo alternativo do `irf.py` (`MODO_BLOCOS = True`) para bases grandes: em vez
+de carregar, processar, prever e salvar a base inteira em um único DataFrame,
+a base é lida do snapshot Parquet em blocos de linhas.
+
+1. Primeira passada: lê só as colunas de fornecedor, datas e chaves da PO e
+   monta os agregados por fornecedor (índice da carga do fornecedor e a carga
+   média salva em CSV), que dependem da base inteira.
+2. Segunda passada: cada bloco de pedidos em aberto passa por
+   `validar_dados`, `processar_dados` e `fazer_previsoes` (em paralelo, em um
+   pool de processos) e é escrito assim que fica pronto no Excel, no Parquet
+   opcional e no histórico colunar. A quarentena dos blocos é juntada e
+   publicada ao final.
+
+As colunas largas (a base com todas as colunas, as variáveis e as previsões)
+ficam limitadas ao bloco. A primeira passada, porém, não é limitada ao bloco:
+a carga do fornecedor depende de todos os pedidos, e a deduplicação por PO/item
+é feita sobre a base inteira, então as colunas de fornecedor (categoria), BEDAT,
+due date, EBELN e EBELP de todas as linhas ficam em memória até o índice da
+carga ser montado (cerca de 30 bytes por linha, mais a cópia dos pedidos
+entregues e a concatenação). Depois disso fica só o índice (16 bytes por
+pedido). Assim, o pico de memória cresce com a quantidade de linhas da base,
+mas em poucas colunas estreitas, bem abaixo do fluxo completo. As previsões
+são as mesmas do fluxo completo, na mesma ordem.
+"""
+
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
+import irf
+import historico_execucoes
+import matriz_fornecedores
+import validacao_dados
+from cache_base import obter_snapshot_otp, preparar_para_parquet
+from espelho_local import espelhar, espelhar_modelo
+from escritor_excel import OPCOES_WORKBOOK, FORMATO_DATA, EscritorAba, escrever_dataframe, publicar_arquivo
+from esquema_otp import ler_parquet_otp
+from features_irf import COLUNAS_BASE
+from indice_carga import obter_indice
+from instrumentacao import etapa, log_message
+
+ABA_RESULTADOS = 'Pedidos em Aberto'
+# Colunas usadas para separar os pedidos em aberto dos entregues (ver irf.separar_pedidos)
+COLUNAS_SEPARACAO = ['GR Document Date', 'Delivery Date', 'Net Order Value in Doc. Curr.']
+
+# Estado de cada processo do pool (ver _iniciar_processo)
+_MODELO = None
+_INDICE = None
+_VALIDAR = False
+
+def processos_padrao():
+    """
+    Define quantos processos fazem as previsões: um por CPU, deixando uma livre.
+
+    Returns:
+        int: Quantidade de processos (1 significa sem paralelismo)
+    """
+    return max(1, (os.cpu_count() or 1) - 1)
+
+def montar_agregados(caminho_snapshot, linhas_por_bloco):
+    """
+    Primeira passada: junta, bloco a bloco, os pedidos usados nos agregados por fornecedor.
+
+    Só as colunas de fornecedor, datas e chaves da PO são lidas, mas as de
+    todas as linhas são mantidas: a memória cresce com o tamanho da base
+    (cerca de 30 bytes por linha em cada DataFrame devolvido), ainda bem
+    abaixo da base completa.
+
+    Args:
+        caminho_snapshot (str): Snapshot Parquet da base OTP
+        linhas_por_bloco (int): Linhas lidas de cada vez
+
+    Returns:
+        tuple: (referência da carga do fornecedor, pedidos entregues, quantidade de pedidos em aberto)
+    """
+    existentes = set(pq.ParquetFile(caminho_snapshot).schema_arrow.names)
+    colunas = [col for col in COLUNAS_BASE + ['EBELN', 'EBELP'] + COLUNAS_SEPARACAO if col in existentes]
+    partes_aberto, partes_entregue = [], []
+    for bloco in ler_parquet_otp(caminho_snapshot, colunas, linhas_por_bloco=linhas_por_bloco):
+        aberto, entregue = irf.separar_pedidos(bloco)
+        partes_aberto.append(aberto[COLUNAS_BASE + ['EBELN', 'EBELP']])
+        if not entregue.empty:
+            partes_entregue.append(entregue[COLUNAS_BASE + ['EBELN', 'EBELP']])
+    df_aberto = pd.concat(partes_aberto, ignore_index=True) if partes_aberto else pd.DataFrame()
+    df_entregue = pd.concat(partes_entregue, ignore_index=True) if partes_entregue else pd.DataFrame()
+    return irf.montar_referencia_carga(df_aberto, df_entregue), df_entregue, len(df_aberto)
+
+def _iniciar_processo(modelo, indice, validar=False):
+    """
+    Prepara o processo que vai prever os blocos: modelo e índice da carga do fornecedor.
+
+    Args:
+        modelo (object ou str): Modelo carregado, ou o caminho dele (processos do pool)
+        indice (IndiceCargaFornecedor): Índice da carga do fornecedor
+        validar (bool): Se True, valida cada bloco antes das variáveis
+    """
+    global _MODELO, _INDICE, _VALIDAR
+    _MODELO = irf.carregar_modelo(modelo) if isinstance(modelo, str) else modelo
+    _INDICE = indice
+    _VALIDAR = validar
+
+def _prever_bloco(bloco):
+    """
+    Calcula as variáveis e as previsões de um bloco de pedidos em aberto.
+
+    O cache de variáveis e o de previsões valem para a base inteira e não são
+    usados aqui: os índices dos blocos não se repetem entre execuções.
+
+    Args:
+        bloco (pandas.DataFrame): Pedidos em aberto do bloco
+
+    Returns:
+        tuple: (previsões do bloco ou None se a validação retirou todas as linhas,
+            `ResultadoValidacao` do bloco ou None sem validação), ou None se houver erro
+    """
+    if _MODELO is None:
+        return None
+    resultado = None
+    if _VALIDAR:
+        # O resumo é mostrado uma vez, com os resultados de todos os blocos
+        validados = irf.validar_dados(bloco, _MODELO, registrar_log=False)
+        if validados is None:
+            return None
+        bloco, resultado = validados
+        if bloco.empty:
+            return None, resultado
+    processado = irf.processar_dados(bloco, usar_cache=False, indice=_INDICE)
+    if processado is None:
+        return None
+    previsoes = irf.fazer_previsoes(_MODELO, processado, usar_cache=False)
+    return None if previsoes is None else (previsoes, resultado)
+
+def prever_blocos(caminho_snapshot, linhas_por_bloco, modelo, caminho_modelo, indice, processos=1, validacao=None):
+    """
+    Segunda passada: lê os pedidos em aberto em blocos e devolve as previsões de cada um.
+
+    Com mais de um processo, os blocos são previstos em paralelo e no máximo
+    dois blocos por processo ficam na fila; as previsões saem na ordem da base.
+    Com `validacao`, cada bloco é validado antes e o resultado de cada um é
+    acrescentado a ela à medida que as previsões saem.
+
+    Args:
+        caminho_snapshot (str): Snapshot Parquet da base OTP
+        linhas_por_bloco (int): Linhas lidas de cada vez
+        modelo (object): Modelo já carregado (usado sem paralelismo)
+        caminho_modelo (str): Caminho do modelo (carregado por cada processo do pool)
+        indice (IndiceCargaFornecedor): Índice da carga do fornecedor
+        processos (int): Quantidade de processos
+        validacao (validacao_dados.ResultadoValidacao): Acumula a validação dos blocos (None: sem validação)
+
+    Yields:
+        pandas.DataFrame: Previsões de um bloco
+
+    Raises:
+        RuntimeError: Se as previsões de algum bloco falharem
+    """
+    def _blocos_em_aberto():
+        for bloco in ler_parquet_otp(caminho_snapshot, linhas_por_bloco=linhas_por_bloco):
+            aberto, _ = irf.separar_pedidos(bloco)
+            if not aberto.empty:
+                yield aberto
+
+    def _resultados():
+        if processos <= 1:
+            _iniciar_processo(modelo, indice, validacao is not None)
+            for bloco in _blocos_em_aberto():
+                yield _prever_bloco(bloco)
+            return
+        with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_processo,
+                                 initargs=(caminho_modelo, indice, validacao is not None)) as executor:
+            pendentes = deque()
+            for bloco in _blocos_em_aberto():
+                pendentes.append(executor.submit(_prever_bloco, bloco))
+                if len(pendentes) >= 2 * processos:
+                    yield pendentes.popleft().result()
+            while pendentes:
+                yield pendentes.popleft().result()
+
+    resultados = _resultados()
+    try:
+        for resultado_bloco in resultados:
+            if resultado_bloco is None:
+                raise RuntimeError("Erro ao prever um bloco da base")
+            previsoes, resultado = resultado_bloco
+            if resultado is not None:
+                validacao.acrescentar(resultado)
+            # Bloco com todas as linhas retiradas na validação
+            if previsoes is not None:
+                yield previsoes
+    finally:
+        resultados.close()
+
+def salvar_resultados_em_blocos(blocos, pasta_historico=irf.PASTA_HISTORICO, salvar_parquet=irf.SALVAR_PARQUET_RESULTADOS,
+                                registrar_historico=irf.REGISTRAR_HISTORICO, criar_matriz=irf.CRIAR_MATRIZ_FORNECEDORES,
+                                validacao=None):
+    """
+    Escreve as previsões, bloco a bloco, no Excel de resultados (e no Parquet e histórico).
+
+    Mesmo resultado de `irf.salvar_resultados`: o Excel é montado em uma pasta
+    temporária local com o xlsxwriter em `constant_memory` e publicado na pasta
+    de histórico só quando está completo; o histórico colunar só recebe a
+    execução depois da publicação. A agregação por fornecedor é atualizada a
+    cada bloco e a aba "Fornecedores" é escrita depois da última. A quarentena
+    (completa depois do último bloco) é publicada como no fluxo completo.
+
+    Args:
+        blocos (iterable): Previsões de cada bloco (ver `prever_blocos`)
+        pasta_historico (str): Pasta onde o arquivo é salvo
+        salvar_parquet (bool): Se True, publica também uma cópia em Parquet
+        registrar_historico (bool): Se True, acrescenta a execução ao histórico colunar
+        criar_matriz (bool): Se True, cria a matriz de fornecedores (aba e Parquet)
+        validacao (validacao_dados.ResultadoValidacao): Validação acumulada pelos blocos (None: sem quarentena)
+
+    Returns:
+        int: Linhas salvas (None se houver erro)
+    """
+    pasta_local = tempfile.mkdtemp(prefix='irf_resultados_')
+    workbook = None
+    escritor_parquet = None
+    registro = None
+    try:
+        # Data e hora no fuso de Brasília (GMT-3)
+        momento = datetime.now(ZoneInfo("America/Sao_Paulo"))
+        nome_arquivo = f"IRF - {momento.strftime('%d-%m-%Y %H-%M')}"
+        caminho_arquivo = os.path.join(pasta_historico, f'{nome_arquivo}.xlsx')
+        caminho_local = os.path.join(pasta_local, f'{nome_arquivo}.xlsx')
+        caminho_local_parquet = os.path.join(pasta_local, f'{nome_arquivo}.parquet')
+        log_message(f"💾 Salvando resultados em blocos: {caminho_arquivo}")
+
+        workbook = xlsxwriter.Workbook(caminho_local, OPCOES_WORKBOOK)
+        formato = workbook.add_format({'num_format': FORMATO_DATA})
+        escritor = None
+        if registrar_historico:
+            registro = historico_execucoes.RegistroExecucao(momento)
+
+        linhas = 0
+        agregados = None
+        for previsoes in blocos:
+            if escritor is None:
+                escritor = EscritorAba(workbook.add_worksheet(ABA_RESULTADOS), previsoes.columns, formato_data=formato)
+            escritor.escrever(previsoes)
+            if salvar_parquet:
+                tabela = pa.Table.from_pandas(preparar_para_parquet(previsoes.copy()), preserve_index=False,
+                                              schema=None if escritor_parquet is None else escritor_parquet.schema)
+                if escritor_parquet is None:
+                    escritor_parquet = pq.ParquetWriter(caminho_local_parquet, tabela.schema)
+                escritor_parquet.write_table(tabela)
+            if registro is not None:
+                try:
+                    registro.acrescentar(previsoes)
+                except Exception as e:
+                    # O histórico colunar não invalida a execução
+                    log_message(f"⚠️ Não foi possível registrar a execução no histórico colunar: {e}")
+                    registro.descartar()
+                    registro = None
+            if criar_matriz:
+                try:
+                    agregados = matriz_fornecedores.combinar_agregados(
+                        [agregados, matriz_fornecedores.agregar_previsoes(previsoes)])
+                except Exception as e:
+                    # A matriz é um resumo: sem ela, as previsões são salvas normalmente
+                    log_message(f"⚠️ Não foi possível criar a matriz de fornecedores: {e}")
+                    criar_matriz = False
+                    agregados = None
+            linhas += len(previsoes)
+            log_message(f"🧱 {linhas} linhas previstas e escritas")
+
+        if validacao is not None:
+            validacao.registrar_log()
+        if escritor is None:
+            log_message("❌ Nenhum pedido disponível para previsão.")
+            return None
+        matriz = None
+        if agregados is not None:
+            matriz = matriz_fornecedores.criar_matriz(agregados)
+            escrever_dataframe(workbook, matriz_fornecedores.ABA_FORNECEDORES, matriz)
+        workbook.close()
+        workbook = None
+        publicar_arquivo(caminho_local, caminho_arquivo)
+
+        if escritor_parquet is not None:
+            escritor_parquet.close()
+            escritor_parquet = None
+            caminho_parquet = os.path.join(pasta_historico, f'{nome_arquivo}.parquet')
+            publicar_arquivo(caminho_local_parquet, caminho_parquet)
+            log_message(f"💾 Cópia em Parquet salva: {caminho_parquet}")
+
+        if matriz is not None:
+            caminho_matriz = os.path.join(pasta_historico, f'{nome_arquivo} - Fornecedores.parquet')
+            caminho_local_matriz = os.path.join(pasta_local, f'{nome_arquivo} - Fornecedores.parquet')
+            matriz.to_parquet(caminho_local_matriz, index=False)
+            publicar_arquivo(caminho_local_matriz, caminho_matriz)
+            log_message(f"💾 Matriz de fornecedores salva: {caminho_matriz}")
+
+        irf.salvar_quarentena(validacao, pasta_local, pasta_historico, nome_arquivo)
+
+        log_message("✅ Arquivo salvo com sucesso!")
+
+        if matriz is not None:
+            try:
+                # Base de comparação da próxima execução, só depois de publicada
+                matriz_fornecedores.guardar_agregados(agregados)
+            except OSError as e:
+                log_message(f"⚠️ Não foi possível guardar a matriz de fornecedores em cache: {e}")
+
+        if registro is not None:
+            try:
+                registro.concluir()
+            except Exception as e:
+                log_message(f"⚠️ Não foi possível registrar a execução no histórico colunar: {e}")
+            registro = None
+
+        log_message(f"📁 Caminho do arquivo salvo: {caminho_arquivo}")
+        return linhas
+    except Exception as e:
+        log_message(f"❌ Erro ao salvar arquivo: {e}")
+        return None
+    finally:
+        if registro is not None:
+            registro.descartar()
+        if escritor_parquet is not None:
+            escritor_parquet.close()
+        if workbook is not None:
+            try:
+                workbook.close()
+            except Exception:
+                pass
+        shutil.rmtree(pasta_local, ignore_errors=True)
+
+def executar_fluxo_em_blocos(caminhos, linhas_por_bloco=irf.LINHAS_POR_BLOCO, processos=irf.PROCESSOS_PREVISAO):
+    """
+    Executa o fluxo do IRF em blocos (ver descrição do módulo).
+
+    Args:
+        caminhos (dict): Caminhos verificados por `irf.verificar_caminhos`
+        linhas_por_bloco (int): Linhas de cada bloco
+        processos (int): Processos que fazem as previsões (None: `processos_padrao()`)
+
+    Returns:
+        bool: True se os resultados foram salvos
+    """
+    processos = processos or processos_padrao()
+    log_message(f"🧱 Modo em blocos: {linhas_por_bloco} linhas por bloco, {processos} processo(s) de previsão")
+
+    with etapa('snapshot_base'):
+        try:
+            caminho_snapshot = obter_snapshot_otp(espelhar(caminhos['dados']))
+        except Exception as e:
+            log_message(f"❌ Erro ao carregar arquivo: {e}")
+            return False
+
+    # Primeira passada: agregados por fornecedor, que dependem da base inteira
+    with etapa('agregados_fornecedor') as medida:
+        referencia, df_entregue, linhas_em_aberto = montar_agregados(caminho_snapshot, linhas_por_bloco)
+        medida.linhas_saida = len(referencia)
+    log_message(f"✅ Dados carregados com sucesso! {linhas_em_aberto} registros encontrados")
+    with etapa('indice_carga', linhas_entrada=len(referencia)) as medida:
+        indice_carga = obter_indice(referencia)
+        medida.linhas_saida = len(indice_carga)
+    del referencia
+    with etapa('calcular_carga_fornecedor', linhas_entrada=len(df_entregue)):
+        df_carga = irf.calcular_carga_fornecedor(df_entregue)
+    del df_entregue
+    if df_carga is None:
+        return False
+
+    with etapa('carregar_modelo'):
+        # Os processos do pool carregam o modelo da cópia local
+        caminho_modelo = espelhar_modelo(caminhos['modelo_blend'])
+        modelo = irf.carregar_modelo(caminho_modelo)
+    if modelo is None:
+        return False
+
+    # Segunda passada: previsão e escrita bloco a bloco
+    with etapa('prever_e_salvar_em_blocos', linhas_entrada=linhas_em_aberto,
+               linhas_por_bloco=linhas_por_bloco, processos=processos) as medida:
+        validacao = validacao_dados.ResultadoValidacao() if irf.VALIDAR_DADOS else None
+        blocos = prever_blocos(caminho_snapshot, linhas_por_bloco, modelo, caminho_modelo, indice_carga, processos,
+                               validacao)
+        try:
+            linhas = salvar_resultados_em_blocos(blocos, validacao=validacao)
+        finally:
+            blocos.close()
+        medida.linhas_saida = linhas
+    if linhas is not None:
+        log_message("🎉 Processamento concluído com sucesso!")
+    else:
+        log_message("❌ Erro ao salvar resultados")
+    return linhas is not None
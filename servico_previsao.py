@@ -0,0 +1,389 @@
+"""# Serviço residente de previsões do IRF
+
+Processo de longa duração que carrega uma única vez o modelo (`MODELO_BLEND`),
+a base de pedidos em aberto e o índice da carga do fornecedor, e responde a
+lotes de pedidos por HTTP local com a mesma lógica de `processar_dados` e
+`fazer_previsoes` do `irf.py`. O modelo e a base são recarregados
+automaticamente quando os arquivos mudam na rede.
+
+Uso:
+    python servico_previsao.py
+
+Requisições (JSON):
+    POST /prever  {"pedidos": [{"EBELN": 4500000001, "EBELP": 10}, ...]}
+        Pedidos informados só pela chave são buscados na base em aberto carregada.
+        Também é possível enviar as colunas completas do pedido (Vendor, MATKL,
+        NetOrderValue, BEDAT, Due Date (incl. ex works time),
+        Delivery Tolerance (Work Days)) para pedidos que ainda não estão na base.
+    GET /carga?fornecedor=<Vendor>&data=<AAAA-MM-DD>
+        Pedidos do fornecedor em aberto na data (consulta "e se")
+    GET /status   Situação do modelo e da base carregados
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+import pandas as pd
+import irf
+from artefato_inferencia import caminhos_artefato
+from esquema_otp import aplicar_esquema
+from indice_carga import obter_indice
+
+HOST_SERVICO = '127.0.0.1'
+PORTA_SERVICO = 8765
+# Intervalo (em segundos) entre as verificações de modelo/base novos na rede
+INTERVALO_VERIFICACAO = 30
+CHAVES_PEDIDO = ['EBELN', 'EBELP']
+COLUNAS_RESPOSTA = {
+    'PO': 'EBELN',
+    'Item': 'EBELP',
+    'Previsão': 'previsao',
+    'Precisão': 'precisao',
+    'Carga do Fornecedor': 'carga_fornecedor',
+}
+
+log_message = irf.log_message
+
+def _assinatura_arquivos(caminhos):
+    """
+    Monta a assinatura (tamanho e data de modificação) de um conjunto de arquivos.
+
+    Args:
+        caminhos (list): Caminhos dos arquivos
+
+    Returns:
+        tuple: Assinatura dos arquivos (None para arquivos inexistentes)
+    """
+    assinatura = []
+    for caminho in caminhos:
+        try:
+            info = os.stat(caminho)
+            assinatura.append((info.st_size, info.st_mtime_ns))
+        except OSError:
+            assinatura.append(None)
+    return tuple(assinatura)
+
+def _valor_json(valor):
+    """
+    Converte um valor do pandas/NumPy para um tipo aceito pelo JSON.
+
+    Args:
+        valor: Valor a converter
+
+    Returns:
+        object: Valor serializável
+    """
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    if isinstance(valor, np.generic):
+        return valor.item()
+    if isinstance(valor, pd.Timestamp):
+        return valor.isoformat()
+    return valor
+
+class EstadoServico:
+    """
+    Modelo e tabelas mantidos em memória pelo serviço, com recarga a quente.
+
+    A troca do modelo ou da base é feita por completo antes de substituir a
+    referência em uso, então as requisições em andamento nunca veem um estado
+    parcialmente carregado.
+    """
+
+    def __init__(self, caminho_modelo, caminho_dados):
+        """
+        Args:
+            caminho_modelo (str): Caminho do modelo (.pkl)
+            caminho_dados (str): Caminho do arquivo Excel com a base OTP
+        """
+        self.caminho_modelo = caminho_modelo
+        self.caminho_dados = caminho_dados
+        self._trava = threading.Lock()
+        self.modelo = None
+        self.base_aberta = None
+        self.indice_carga = None
+        self.chaves_indexadas = None
+        self._assinatura_modelo = None
+        self._assinatura_dados = None
+        self.modelo_carregado_em = None
+        self.dados_carregados_em = None
+
+    def _arquivos_modelo(self):
+        """
+        Lista os arquivos que definem o modelo (pickle do PyCaret e artefato enxuto).
+
+        Returns:
+            list: Caminhos dos arquivos do modelo
+        """
+        return [self.caminho_modelo, *caminhos_artefato(self.caminho_modelo)]
+
+    def carregar_modelo(self):
+        """
+        Carrega o modelo se os arquivos mudaram desde a última carga.
+
+        Returns:
+            bool: True se o modelo foi (re)carregado
+        """
+        assinatura = _assinatura_arquivos(self._arquivos_modelo())
+        if assinatura == self._assinatura_modelo:
+            return False
+        modelo = irf.carregar_modelo(self.caminho_modelo)
+        if modelo is None:
+            # Mantém o modelo anterior em uso; nova tentativa na próxima verificação
+            return False
+        with self._trava:
+            self.modelo = modelo
+            self._assinatura_modelo = assinatura
+            self.modelo_carregado_em = datetime.now()
+        return True
+
+    def carregar_dados(self):
+        """
+        Carrega a base de pedidos em aberto e o índice da carga se o arquivo mudou.
+
+        Returns:
+            bool: True se a base foi (re)carregada
+        """
+        assinatura = _assinatura_arquivos([self.caminho_dados])
+        if assinatura == self._assinatura_dados:
+            return False
+        resultado = irf.carregar_dados({'dados': self.caminho_dados})
+        if resultado is None:
+            return False
+        df_pedidos_em_aberto, df_entregue = resultado
+        referencia = irf.montar_referencia_carga(df_pedidos_em_aberto, df_entregue)
+        indice_carga = obter_indice(referencia)
+        base_aberta = irf.processar_dados(df_pedidos_em_aberto.copy(), indice=indice_carga)
+        base_aberta = base_aberta.set_index(CHAVES_PEDIDO, drop=False)
+        with self._trava:
+            self.base_aberta = base_aberta
+            self.indice_carga = indice_carga
+            self.chaves_indexadas = pd.MultiIndex.from_frame(referencia[CHAVES_PEDIDO])
+            self._assinatura_dados = assinatura
+            self.dados_carregados_em = datetime.now()
+        return True
+
+    def atualizar(self):
+        """
+        Verifica e recarrega o modelo e a base, se necessário.
+        """
+        if self.carregar_modelo():
+            log_message(f"🔁 Modelo (re)carregado: {self.caminho_modelo}")
+        if self.carregar_dados():
+            log_message(f"🔁 Base de pedidos em aberto (re)carregada: {len(self.base_aberta)} pedidos")
+
+    def status(self):
+        """
+        Resume o estado atual do serviço.
+
+        Returns:
+            dict: Informações do modelo e da base carregados
+        """
+        return {
+            'modelo': self.caminho_modelo,
+            'tipo_modelo': type(self.modelo).__name__,
+            'modelo_carregado_em': self.modelo_carregado_em.isoformat(timespec='seconds') if self.modelo_carregado_em else None,
+            'dados': self.caminho_dados,
+            'pedidos_em_aberto': 0 if self.base_aberta is None else len(self.base_aberta),
+            'dados_carregados_em': self.dados_carregados_em.isoformat(timespec='seconds') if self.dados_carregados_em else None,
+        }
+
+    def _montar_lote(self, pedidos, base_aberta, indice_carga, chaves_indexadas):
+        """
+        Monta o DataFrame do lote, buscando na base os pedidos informados só pela chave.
+
+        Args:
+            pedidos (list): Lista de dicionários recebida na requisição
+            base_aberta (pandas.DataFrame): Base de pedidos em aberto indexada pela chave
+            indice_carga (IndiceCargaFornecedor): Índice da carga do fornecedor
+            chaves_indexadas (pandas.MultiIndex): Chaves (EBELN, EBELP) já presentes no índice
+
+        Returns:
+            tuple: (DataFrame pronto para previsão, lista de chaves não encontradas)
+        """
+        df = pd.DataFrame(pedidos)
+        if df.empty:
+            return df, []
+        so_chave = set(df.columns) <= set(CHAVES_PEDIDO)
+        if so_chave:
+            chaves = pd.MultiIndex.from_frame(df[CHAVES_PEDIDO].astype('int64'))
+            encontrados = chaves.isin(base_aberta.index)
+            nao_encontrados = [list(map(int, chave)) for chave in chaves[~encontrados]]
+            lote = base_aberta.loc[chaves[encontrados]].reset_index(drop=True)
+            return lote, nao_encontrados
+        lote = aplicar_esquema(df)
+        # Pedidos novos entram no índice para que a carga conte também o próprio lote
+        ja_conhecidos = pd.MultiIndex.from_frame(lote[CHAVES_PEDIDO]).isin(chaves_indexadas)
+        if not ja_conhecidos.all():
+            indice_carga = indice_carga.com_pedidos(lote.loc[~ja_conhecidos])
+        # Lotes avulsos não vão para o cache de variáveis em disco
+        return irf.processar_dados(lote, usar_cache=False, indice=indice_carga), []
+
+    def prever(self, pedidos):
+        """
+        Faz as previsões de um lote de pedidos com o modelo em memória.
+
+        Args:
+            pedidos (list): Lista de dicionários com os pedidos
+
+        Returns:
+            dict: Previsões e chaves não encontradas na base
+        """
+        with self._trava:
+            modelo = self.modelo
+            base_aberta = self.base_aberta
+            indice_carga = self.indice_carga
+            chaves_indexadas = self.chaves_indexadas
+        if modelo is None or base_aberta is None:
+            raise RuntimeError("Modelo ou base de pedidos ainda não carregados")
+
+        lote, nao_encontrados = self._montar_lote(pedidos, base_aberta, indice_carga, chaves_indexadas)
+        resultado = {'previsoes': [], 'nao_encontrados': nao_encontrados}
+        if lote.empty:
+            return resultado
+        # O cache de previsões é o da base inteira (execução diária): um lote avulso não pode substituí-lo
+        previsoes = irf.fazer_previsoes(modelo, lote, usar_cache=False)
+        if previsoes is None:
+            raise RuntimeError("Erro ao fazer previsões do lote")
+
+        colunas = [coluna for coluna in COLUNAS_RESPOSTA if coluna in previsoes.columns]
+        resultado['previsoes'] = [
+            {COLUNAS_RESPOSTA[coluna]: _valor_json(valor) for coluna, valor in zip(colunas, linha)}
+            for linha in previsoes[colunas].itertuples(index=False, name=None)
+        ]
+        return resultado
+
+    def consultar_carga(self, fornecedor, data):
+        """
+        Consulta quantos pedidos do fornecedor estavam (ou estarão) em aberto na data.
+
+        Args:
+            fornecedor (str): Código do fornecedor (Vendor)
+            data (str): Data da consulta (AAAA-MM-DD)
+
+        Returns:
+            dict: Fornecedor, data e pedidos em aberto
+        """
+        with self._trava:
+            indice_carga = self.indice_carga
+        if indice_carga is None:
+            raise RuntimeError("Índice da carga do fornecedor ainda não carregado")
+        data = pd.Timestamp(data)
+        return {
+            'fornecedor': fornecedor,
+            'data': data.date().isoformat(),
+            'pedidos_em_aberto': indice_carga.carga_em(fornecedor, data),
+        }
+
+def criar_manipulador(estado):
+    """
+    Cria a classe que trata as requisições HTTP usando o estado informado.
+
+    Args:
+        estado (EstadoServico): Estado compartilhado do serviço
+
+    Returns:
+        type: Subclasse de BaseHTTPRequestHandler
+    """
+    class ManipuladorPrevisao(BaseHTTPRequestHandler):
+        def _responder(self, codigo, conteudo):
+            corpo = json.dumps(conteudo, ensure_ascii=False).encode('utf-8')
+            self.send_response(codigo)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path.rstrip('/') == '/status':
+                self._responder(200, estado.status())
+            elif url.path.rstrip('/') == '/carga':
+                parametros = parse_qs(url.query)
+                try:
+                    self._responder(200, estado.consultar_carga(parametros['fornecedor'][0], parametros['data'][0]))
+                except (KeyError, ValueError) as e:
+                    self._responder(400, {'erro': f"Informe 'fornecedor' e 'data' (AAAA-MM-DD): {e}"})
+            else:
+                self._responder(404, {'erro': 'Caminho não encontrado'})
+
+        def do_POST(self):
+            if self.path.rstrip('/') != '/prever':
+                self._responder(404, {'erro': 'Caminho não encontrado'})
+                return
+            try:
+                tamanho = int(self.headers.get('Content-Length', 0))
+                conteudo = json.loads(self.rfile.read(tamanho) or b'{}')
+                pedidos = conteudo.get('pedidos') if isinstance(conteudo, dict) else conteudo
+                if not isinstance(pedidos, list):
+                    self._responder(400, {'erro': "Envie uma lista de pedidos no campo 'pedidos'"})
+                    return
+                inicio = time.perf_counter()
+                resultado = estado.prever(pedidos)
+                resultado['tempo_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+                self._responder(200, resultado)
+            except (ValueError, KeyError) as e:
+                self._responder(400, {'erro': f"Requisição inválida: {e}"})
+            except Exception as e:
+                log_message(f"❌ Erro ao atender requisição: {e}")
+                self._responder(500, {'erro': str(e)})
+
+        def log_message(self, format, *args):
+            # Usa o mesmo formato de log do restante do projeto
+            log_message(f"🌐 {self.address_string()} {format % args}")
+
+    return ManipuladorPrevisao
+
+def _verificar_periodicamente(estado, parar):
+    """
+    Laço em segundo plano que recarrega o modelo e a base quando os arquivos mudam.
+
+    Args:
+        estado (EstadoServico): Estado compartilhado do serviço
+        parar (threading.Event): Evento que encerra o laço
+    """
+    while not parar.wait(INTERVALO_VERIFICACAO):
+        try:
+            estado.atualizar()
+        except Exception as e:
+            log_message(f"❌ Erro ao verificar atualizações: {e}")
+
+def main(host=HOST_SERVICO, porta=PORTA_SERVICO):
+    """
+    Inicia o serviço de previsões e atende requisições até ser interrompido.
+
+    Args:
+        host (str): Endereço local de escuta
+        porta (int): Porta de escuta
+    """
+    log_message("🚀 IRF - Serviço de previsões")
+    log_message("=" * 60)
+    caminhos = irf.verificar_caminhos()
+    if caminhos is None:
+        return
+
+    estado = EstadoServico(caminhos['modelo_blend'], caminhos['dados'])
+    estado.atualizar()
+    if estado.modelo is None or estado.base_aberta is None:
+        log_message("❌ Não foi possível carregar o modelo ou a base de pedidos")
+        return
+
+    parar = threading.Event()
+    threading.Thread(target=_verificar_periodicamente, args=(estado, parar), daemon=True).start()
+    servidor = ThreadingHTTPServer((host, porta), criar_manipulador(estado))
+    log_message(f"✅ Serviço ouvindo em http://{host}:{porta} (POST /prever, GET /status)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        log_message("⏹️ Encerrando serviço...")
+    finally:
+        parar.set()
+        servidor.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import json
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+from artefato_inferencia import ModeloInferencia, caminhos_artefato
+
+
+def _modelo(tmp_path):
+    """Treina um booster pequeno com uma coluna numérica e uma categórica em one-hot."""
+    gerador = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'NetOrderValue': gerador.normal(100, 30, 500),
+        'MATKL': gerador.choice(['A', 'B'], 500),
+    })
+    alvo = ((df['NetOrderValue'] > 110) ^ (df['MATKL'] == 'B')).astype(int)
+    matriz = np.column_stack([df['NetOrderValue'], df['MATKL'] == 'A', df['MATKL'] == 'B']).astype(float)
+    booster = lgb.train({'objective': 'binary', 'num_leaves': 7, 'verbosity': -1, 'seed': 0},
+                        lgb.Dataset(matriz, label=alvo), num_boost_round=20)
+
+    caminho_modelo = str(tmp_path / 'modelo.pkl')
+    caminho_booster, caminho_spec = caminhos_artefato(caminho_modelo)
+    booster.save_model(caminho_booster)
+    with open(caminho_spec, 'w', encoding='utf-8') as arquivo:
+        json.dump({
+            'colunas_entrada': ['NetOrderValue', 'MATKL'],
+            'numericas': {'NetOrderValue': 100.0},
+            'categoricas': {'MATKL': {'imputacao': 'A', 'saidas': ['MATKL_A', 'MATKL_B'],
+                                      'mapa': {'A': [1.0, 0.0], 'B': [0.0, 1.0]}, 'desconhecida': [0.0, 0.0]}},
+            'ordem_features': ['NetOrderValue', 'MATKL_A', 'MATKL_B'],
+            'classes': [0, 1],
+            'casas_decimais': 4,
+        }, arquivo)
+    return ModeloInferencia(caminho_modelo), df
+
+
+def test_contribuicoes_somam_o_score_bruto(tmp_path):
+    modelo, df = _modelo(tmp_path)
+    contribuicoes = modelo.contribuicoes(df)
+
+    # Uma coluna por entrada: as duas saídas do one-hot de MATKL são somadas
+    assert contribuicoes.shape == (len(df), 2)
+    raizes = sum(arvore['tree_structure'].get('internal_value', arvore['tree_structure'].get('leaf_value', 0.0))
+                 for arvore in modelo.booster.dump_model()['tree_info'])
+    score_bruto = modelo.booster.predict(modelo.matriz_features(df), raw_score=True)
+    np.testing.assert_allclose(contribuicoes.sum(axis=1) + raizes, score_bruto, atol=1e-9)
+
+
+def test_contribuicoes_exatas_somam_o_score_bruto(tmp_path):
+    modelo, df = _modelo(tmp_path)
+    matriz = modelo.matriz_features(df)
+    valor_esperado = modelo.booster.predict(matriz[:1], pred_contrib=True)[0, -1]
+
+    contribuicoes = modelo.contribuicoes(df, exato=True)
+    score_bruto = modelo.booster.predict(matriz, raw_score=True)
+    np.testing.assert_allclose(contribuicoes.sum(axis=1) + valor_esperado, score_bruto, atol=1e-9)
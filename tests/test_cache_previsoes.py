@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from artefato_inferencia import caminhos_artefato
+from cache_previsoes import prever_rotulos_com_cache
+
+
+class _ModeloContador:
+    """Modelo de inferência mínimo que registra as linhas que passaram por ele."""
+
+    def __init__(self, caminho_modelo):
+        self.caminho_modelo = caminho_modelo
+        self.especificacao = {'colunas_entrada': ['NetOrderValue', 'carga_fornecedor']}
+        self.previstas = []
+
+    def prever_rotulos(self, df):
+        self.previstas.append(list(df['EBELN']))
+        valores = df['NetOrderValue'].to_numpy()
+        return (valores > 150).astype(np.int64), valores / 1000
+
+
+def _modelo(tmp_path, conteudo=b'booster v1'):
+    caminho_modelo = str(tmp_path / 'modelo.pkl')
+    for caminho in caminhos_artefato(caminho_modelo):
+        with open(caminho, 'wb') as arquivo:
+            arquivo.write(conteudo)
+    return _ModeloContador(caminho_modelo)
+
+
+def _pedidos():
+    return pd.DataFrame({
+        'EBELN': [1, 2, 3],
+        'EBELP': [10, 10, 10],
+        'NetOrderValue': [100.0, 200.0, 300.0],
+        'carga_fornecedor': [1, 2, 3],
+    })
+
+
+def test_reaproveita_linhas_sem_mudanca(tmp_path):
+    caminho = str(tmp_path / 'cache.parquet')
+    modelo = _modelo(tmp_path)
+    primeira = prever_rotulos_com_cache(modelo, _pedidos(), caminho)
+
+    pedidos = _pedidos()
+    pedidos.loc[1, 'carga_fornecedor'] = 5
+    pedidos = pd.concat([pedidos, pd.DataFrame({'EBELN': [4], 'EBELP': [10], 'NetOrderValue': [50.0],
+                                                'carga_fornecedor': [0]})], ignore_index=True)
+    label, score = prever_rotulos_com_cache(modelo, pedidos, caminho)
+
+    # Só a linha com variável alterada e a nova passam pelo modelo
+    assert modelo.previstas == [[1, 2, 3], [2, 4]]
+    np.testing.assert_array_equal(label[:3], primeira[0])
+    np.testing.assert_array_equal(score, [0.1, 0.2, 0.3, 0.05])
+
+
+def test_modelo_alterado_descarta_o_cache(tmp_path):
+    caminho = str(tmp_path / 'cache.parquet')
+    prever_rotulos_com_cache(_modelo(tmp_path), _pedidos(), caminho)
+
+    modelo = _modelo(tmp_path, b'booster v2')
+    prever_rotulos_com_cache(modelo, _pedidos(), caminho)
+    assert modelo.previstas == [[1, 2, 3]]
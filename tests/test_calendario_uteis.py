@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from calendario_uteis import CalendarioUteis, contar_dias_uteis, deslocar_dias_uteis, listar_feriados, pascoa
+
+
+def _datas(quantidade, semente):
+    gerador = np.random.default_rng(semente)
+    return np.datetime64('2023-01-01') + gerador.integers(0, 3 * 365, quantidade).astype('timedelta64[D]')
+
+
+def test_feriados_moveis_e_consciencia_negra():
+    assert pascoa(2026) == pd.Timestamp('2026-04-05').date()
+    feriados = set(listar_feriados(2023, 2026).astype(str))
+    assert {'2026-02-16', '2026-02-17', '2026-04-03', '2026-06-04'} <= feriados
+    assert '2024-11-20' in feriados and '2023-11-20' not in feriados
+
+
+def test_contar_igual_ao_busday_count():
+    inicio, fim = _datas(2000, 1), _datas(2000, 2)
+    feriados = listar_feriados(2022, 2026)
+
+    esperado = np.busday_count(inicio, fim, holidays=feriados)
+    np.testing.assert_array_equal(contar_dias_uteis(inicio, fim), esperado)
+
+
+def test_deslocar_igual_ao_busday_offset():
+    datas = _datas(2000, 3)
+    dias = np.random.default_rng(4).integers(-30, 60, len(datas))
+    feriados = listar_feriados(2022, 2027)
+
+    esperado = np.busday_offset(datas, dias, roll='forward', holidays=feriados)
+    np.testing.assert_array_equal(deslocar_dias_uteis(datas, dias), esperado)
+
+
+def test_datas_vazias_e_fora_do_calendario():
+    inicio = pd.Series(pd.to_datetime(['2026-01-05', None, '2026-01-05']))
+    fim = pd.Series(pd.to_datetime(['2026-01-09', '2026-01-09', None]))
+    dias = contar_dias_uteis(inicio, fim)
+    assert dias[0] == 4 and np.isnan(dias[1:]).all()
+
+    deslocadas = deslocar_dias_uteis(inicio, [1, 1, np.nan])
+    assert deslocadas[0] == np.datetime64('2026-01-06') and np.isnat(deslocadas[1:]).all()
+
+    calendario = CalendarioUteis('2026-01-01', '2026-01-31')
+    assert np.isnan(calendario.contar(['2026-01-05'], ['2026-02-10'])).all()
@@ -0,0 +1,47 @@
+import ntpath
+import os
+
+import espelho_local
+
+
+def test_caminho_em_outra_unidade_nao_esta_no_espelho(monkeypatch):
+    # Simula o Windows: base em S:\ e espelho local em C:\
+    monkeypatch.setattr(espelho_local.os, 'path', ntpath)
+    caminho_rede = r'S:\Procurement\FUP\OTP Mensal\OTP - Base.xlsx'
+    assert not espelho_local._dentro_do_espelho(caminho_rede, r'C:\irf\cache\espelho')
+    assert espelho_local._dentro_do_espelho(r'C:\irf\cache\espelho\rede\OTP - Base.xlsx', r'C:\irf\cache\espelho')
+
+
+def test_espelhar_em_outra_unidade_devolve_caminho_da_rede(monkeypatch):
+    monkeypatch.setattr(espelho_local.os, 'path', ntpath)
+    caminho_rede = r'S:\Procurement\FUP\OTP Mensal\OTP - Base.xlsx'
+    # A rede não existe aqui: a cópia falha com OSError e o caminho da rede é devolvido
+    assert espelho_local.espelhar(caminho_rede, r'C:\irf\cache\espelho', usar_espelho=True) == caminho_rede
+
+
+def test_espelhar_copia_so_quando_muda(tmp_path):
+    rede = tmp_path / 'rede'
+    rede.mkdir()
+    arquivo = rede / 'OTP - Base.xlsx'
+    arquivo.write_bytes(b'versao 1')
+    pasta = str(tmp_path / 'espelho')
+
+    caminho_local = espelho_local.espelhar(str(arquivo), pasta, usar_espelho=True)
+    assert caminho_local != str(arquivo)
+    assert open(caminho_local, 'rb').read() == b'versao 1'
+    # Uma cópia já no espelho é devolvida como está
+    assert espelho_local.espelhar(caminho_local, pasta, usar_espelho=True) == caminho_local
+
+    estado = os.stat(caminho_local)
+    assert espelho_local.espelhar(str(arquivo), pasta, usar_espelho=True) == caminho_local
+    assert os.stat(caminho_local).st_ino == estado.st_ino
+
+    arquivo.write_bytes(b'versao 2 maior')
+    espelho_local.espelhar(str(arquivo), pasta, usar_espelho=True)
+    assert open(caminho_local, 'rb').read() == b'versao 2 maior'
+
+
+def test_espelho_desligado_devolve_caminho_da_rede(tmp_path):
+    arquivo = tmp_path / 'OTP - Base.xlsx'
+    arquivo.write_bytes(b'x')
+    assert espelho_local.espelhar(str(arquivo), str(tmp_path / 'espelho'), usar_espelho=False) == str(arquivo)
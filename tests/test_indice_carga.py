@@ -0,0 +1,37 @@
+import pandas as pd
+
+import indice_carga
+from indice_carga import IndiceCargaFornecedor, obter_indice
+
+
+def _pedidos():
+    return pd.DataFrame({
+        'Vendor': ['0100124', '0100124', '0200300'],
+        'BEDAT': pd.to_datetime(['2026-01-05', '2026-01-10', '2026-01-07']),
+        'Due Date (incl. ex works time)': pd.to_datetime(['2026-01-20', '2026-02-01', None]),
+    })
+
+
+def test_obter_indice_le_do_disco_quando_os_pedidos_nao_mudam(tmp_path, monkeypatch):
+    caminho = str(tmp_path / 'indice.npz')
+    construido = obter_indice(_pedidos(), caminho)
+    assert construido.carga_em('0100124', '2026-01-15') == 2
+
+    def _nao_reconstruir(*args, **kwargs):
+        raise AssertionError("o índice gravado deveria ter sido reaproveitado")
+
+    monkeypatch.setattr(IndiceCargaFornecedor, 'construir', _nao_reconstruir)
+    lido = obter_indice(_pedidos(), caminho)
+    assert lido.digital == construido.digital
+    assert lido.carga_em('0200300', '2026-03-01') == 1
+
+
+def test_obter_indice_reconstroi_quando_os_pedidos_mudam(tmp_path):
+    caminho = str(tmp_path / 'indice.npz')
+    obter_indice(_pedidos(), caminho)
+    pedidos = _pedidos()
+    pedidos.loc[1, 'BEDAT'] = pd.Timestamp('2026-01-25')
+
+    indice = obter_indice(pedidos, caminho)
+    assert indice.carga_em('0100124', '2026-01-15') == 1
+    assert IndiceCargaFornecedor.carregar(caminho).impressao_entrada == indice_carga.impressao_pedidos(indice_carga._colunas_indice(pedidos))
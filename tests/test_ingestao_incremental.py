@@ -0,0 +1,84 @@
+import pandas as pd
+import xlsxwriter
+
+from escritor_excel import OPCOES_WORKBOOK, escrever_dataframe
+from ingestao_incremental import calcular_delta, distribuir_linhas, persistir_delta, planilha_sincronizada
+from pacote_xlsx import substituir_abas
+
+ABA = 'Base OTP'
+
+
+def _export(linhas):
+    df = pd.DataFrame(linhas, columns=['EBELN', 'EBELP', 'Vendor', 'NetOrderValue', 'GR Document Date'])
+    df['GR Document Date'] = pd.to_datetime(df['GR Document Date'])
+    return df
+
+
+def _gravar(caminho, df):
+    workbook = xlsxwriter.Workbook(caminho, OPCOES_WORKBOOK)
+    escrever_dataframe(workbook, ABA, df, colunas_data=['GR Document Date'],
+                       formato_data=workbook.add_format({'num_format': 'dd/mm/yyyy'}))
+    workbook.close()
+
+
+def _ingerir(tmp_path, destino, df):
+    """Grava o export como `atualizar_planilha.py`: só as linhas do plano, se houver um."""
+    pasta = str(tmp_path / 'ingestao')
+    delta = calcular_delta(df, pasta)
+    plano = distribuir_linhas(delta)
+    if plano is None:
+        _gravar(destino, df)
+    else:
+        abas_novas = str(tmp_path / 'abas_novas.xlsx')
+        _gravar(abas_novas, df.iloc[plano['posicoes']])
+        substituir_abas(destino, abas_novas, [], reescrever_linhas={ABA: plano})
+    persistir_delta(delta, pasta=pasta, plano=plano, caminho_planilha=destino)
+    return delta, plano
+
+
+def _ordenado(df):
+    return df.sort_values(['EBELN', 'EBELP']).reset_index(drop=True)
+
+
+def test_delta_reescreve_so_as_linhas_alteradas(tmp_path):
+    destino = str(tmp_path / 'destino.xlsx')
+    inicial = _export([[4500000000 + i, 10, f'V{i}', i + 0.5, None] for i in range(8)])
+    _ingerir(tmp_path, destino, inicial)
+
+    novo = inicial.drop(index=[1, 2]).reset_index(drop=True)
+    novo.loc[0, 'NetOrderValue'] = 99.5
+    novo.loc[3, 'GR Document Date'] = pd.Timestamp('2026-01-15')
+    novo = pd.concat([novo, _export([[4600000000, 10, 'N1', 1.5, None]])], ignore_index=True)
+    delta, plano = _ingerir(tmp_path, destino, novo)
+
+    contagens = {chave: delta[chave] for chave in ('inseridos', 'atualizados', 'encerrados', 'removidos')}
+    assert contagens == {'inseridos': 1, 'atualizados': 1, 'encerrados': 1, 'removidos': 2}
+    # A aba encolheu uma linha: a última linha da aba e a inserida ocupam as vagas das removidas
+    assert list(plano['destinos']) == [2, 3, 4, 7]
+    assert (plano['ultima_linha_anterior'], plano['ultima_linha']) == (9, 8)
+    pd.testing.assert_frame_equal(_ordenado(pd.read_excel(destino, sheet_name=ABA)), _ordenado(novo))
+
+
+def test_delta_acrescenta_linhas_no_final(tmp_path):
+    destino = str(tmp_path / 'destino.xlsx')
+    inicial = _export([[4500000000 + i, 10, f'V{i}', i + 0.5, f'2026-01-0{i + 1}'] for i in range(3)])
+    _ingerir(tmp_path, destino, inicial)
+
+    novo = pd.concat([inicial, _export([[4600000000 + i, 20, 'N', 1.5, None] for i in range(12)])], ignore_index=True)
+    delta, plano = _ingerir(tmp_path, destino, novo)
+
+    assert delta['inseridos'] == 12 and delta['total'] == 12
+    assert list(plano['destinos']) == list(range(5, 17))
+    pd.testing.assert_frame_equal(_ordenado(pd.read_excel(destino, sheet_name=ABA)), _ordenado(novo))
+
+
+def test_planilha_alterada_fora_do_script_nao_esta_sincronizada(tmp_path):
+    destino = str(tmp_path / 'destino.xlsx')
+    pasta = str(tmp_path / 'ingestao')
+    inicial = _export([[4500000000, 10, 'V0', 0.5, None]])
+    delta, _ = _ingerir(tmp_path, destino, inicial)
+    assert planilha_sincronizada(destino, delta['colunas'], pasta)
+    assert not planilha_sincronizada(destino, delta['colunas'] + ['Nova'], pasta)
+
+    _gravar(destino, inicial.iloc[:0])
+    assert not planilha_sincronizada(destino, delta['colunas'], pasta)
@@ -0,0 +1,70 @@
+import re
+import zipfile
+from datetime import datetime
+
+from openpyxl import Workbook, load_workbook
+
+from atualizar_planilha import normalizar_fornecedor
+from pacote_xlsx import substituir_abas
+
+
+def _pacote(tmp_path):
+    caminho = str(tmp_path / 'pacote.xlsx')
+    wb = Workbook()
+    wb.active.title = 'Base Fornecedores'
+    wb.active.append(['SAP-LIFNR'])
+    wb.active.append([100124])
+    wb.create_sheet('Dados').append([1])
+    wb.save(caminho)
+    return caminho
+
+
+def _abas_novas(tmp_path):
+    caminho = str(tmp_path / 'abas_novas.xlsx')
+    wb = Workbook()
+    wb.active.title = 'Dados'
+    wb.active.append([2])
+    wb.save(caminho)
+    return caminho
+
+
+def test_normalizar_fornecedor_compara_texto_e_numero():
+    # Vendor do CELONIS (texto com zeros à esquerda) x SAP-LIFNR (número, ou float pelo openpyxl)
+    assert normalizar_fornecedor('0100124') == normalizar_fornecedor(100124) == normalizar_fornecedor(100124.0)
+    assert normalizar_fornecedor(' AB12 ') == 'AB12'
+
+
+def test_linhas_acrescentadas_mantem_numeros_como_numero(tmp_path):
+    pacote = _pacote(tmp_path)
+    substituir_abas(pacote, _abas_novas(tmp_path), ['Dados'],
+                    linhas_acrescentar={'Base Fornecedores': [[200300], ['AB12']]})
+
+    aba = load_workbook(pacote)['Base Fornecedores']
+    celulas = [linha[0] for linha in aba.iter_rows(min_row=2)]
+    assert [(c.value, c.data_type) for c in celulas] == [(100124, 'n'), (200300, 'n'), ('AB12', 's')]
+
+
+def test_formato_de_data_com_num_fmts_vazio(tmp_path):
+    # styles.xml com <numFmts count="0"/> (forma vazia): o formato de data não pode se perder
+    pacote = _pacote(tmp_path)
+    with zipfile.ZipFile(pacote) as zin:
+        partes = {nome: zin.read(nome) for nome in zin.namelist()}
+    estilos = re.sub(rb'<numFmts\b.*?</numFmts>|<numFmts\b[^>]*/>', b'', partes['xl/styles.xml'], flags=re.S)
+    partes['xl/styles.xml'] = re.sub(rb'(<styleSheet\b[^>]*>)', rb'\1<numFmts count="0" />', estilos, count=1)
+    with zipfile.ZipFile(pacote, 'w') as zout:
+        for nome, conteudo in partes.items():
+            zout.writestr(nome, conteudo)
+
+    abas_novas = str(tmp_path / 'abas_datas.xlsx')
+    wb = Workbook()
+    wb.active.title = 'Dados'
+    wb.active.append([datetime(2026, 1, 15)])
+    wb.active['A1'].number_format = 'dd/mm/yyyy'
+    wb.save(abas_novas)
+    substituir_abas(pacote, abas_novas, ['Dados'])
+
+    with zipfile.ZipFile(pacote) as zin:
+        assert zin.read('xl/styles.xml').count(b'<numFmts') == 1
+    celula = load_workbook(pacote)['Dados']['A1']
+    assert celula.number_format == 'dd/mm/yyyy'
+    assert celula.value == datetime(2026, 1, 15)
@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+from validacao_dados import COLUNA_MOTIVOS, COLUNA_REMOVIDA, validar_pedidos
+
+
+def _pedidos():
+    return pd.DataFrame({
+        'EBELN': [1, 2, 3, 4, 5],
+        'EBELP': [10, 10, 10, 10, 10],
+        'Vendor': ['V1', 'V1', 'V2', 'V9', 'V1'],
+        'MATKL': ['M1', 'M1', 'M1', 'M1', 'M9'],
+        'BEDAT': pd.to_datetime(['2026-01-05', None, '2026-03-01', '2026-01-05', '2026-01-05']),
+        'Due Date (incl. ex works time)': pd.to_datetime(['2026-01-20', '2026-01-20', '2026-02-01', '2026-01-20', None]),
+        'Delivery Tolerance (Work Days)': [2, 2, None, 2, 2],
+        'NetOrderValue': [100.0, 200.0, 300.0, 400.0, 500.0],
+    })
+
+
+def _categorias():
+    return {'Vendor': pd.Index(['V1', 'V2']), 'MATKL': pd.Index(['M1'])}
+
+
+def test_motivos_por_linha_e_contagem_por_regra():
+    validos, resultado = validar_pedidos(_pedidos(), _categorias())
+
+    assert resultado.contagens == {
+        'BEDAT_INVALIDA': 1, 'DUE_DATE_INVALIDA': 1, 'BEDAT_APOS_DUE_DATE': 1, 'TOLERANCIA_VAZIA': 1,
+        'VENDOR_DESCONHECIDO': 1, 'MATKL_DESCONHECIDO': 1,
+    }
+    motivos = dict(zip(resultado.quarentena['EBELN'], resultado.quarentena[COLUNA_MOTIVOS]))
+    assert motivos == {
+        2: 'BEDAT_INVALIDA',
+        3: 'BEDAT_APOS_DUE_DATE, TOLERANCIA_VAZIA',
+        4: 'VENDOR_DESCONHECIDO',
+        5: 'DUE_DATE_INVALIDA, MATKL_DESCONHECIDO',
+    }
+    # Só as regras que bloqueiam a previsão retiram a linha; categoria desconhecida só avisa
+    removidas = dict(zip(resultado.quarentena['EBELN'], resultado.quarentena[COLUNA_REMOVIDA]))
+    assert removidas == {2: 'Sim', 3: 'Sim', 4: 'Não', 5: 'Sim'}
+    assert list(validos['EBELN']) == [1, 4]
+    assert resultado.removidas == 3 and resultado.linhas_quarentena == 4
+
+
+def test_categorias_categoricas_e_sem_modelo():
+    pedidos = _pedidos().iloc[[0, 3]].reset_index(drop=True)
+    pedidos['Vendor'] = pedidos['Vendor'].astype('category')
+
+    _, resultado = validar_pedidos(pedidos, _categorias())
+    assert resultado.contagens['VENDOR_DESCONHECIDO'] == 1
+
+    # Sem as categorias do modelo, as regras de categoria não são avaliadas
+    validos, resultado = validar_pedidos(pedidos)
+    assert 'VENDOR_DESCONHECIDO' not in resultado.contagens
+    assert validos is pedidos and resultado.quarentena is None
+
+
+def test_coluna_obrigatoria_ausente():
+    with pytest.raises(ValueError, match='NetOrderValue'):
+        validar_pedidos(_pedidos().drop(columns=['NetOrderValue']))
@@ -0,0 +1,298 @@
+"""# Treinamento incremental do modelo IRF
+
+Atualiza o modelo a partir das POs entregues desde o último treinamento, sem
+refazer tudo do zero:
+
+- A matriz de variáveis das linhas já aprendidas (EBELN/EBELP) fica em cache
+  local; só as linhas novas são transformadas em variáveis.
+- O booster LightGBM do artefato de inferência continua o boosting com as
+  linhas novas (`init_model`). Só o artefato é atualizado: o .pkl do PyCaret
+  (e os gráficos e a planilha do treinamento) fica marcado como substituído
+  e o `irf.py` não o usa no lugar do artefato.
+- Uma guarda compara, em uma amostra de validação com as entregas mais
+  recentes, o modelo incremental com um retreino completo do LightGBM sobre a
+  matriz em cache, e fica com o retreino quando o incremental piora. Cada
+  atualização custa, portanto, pelo menos um retreino nativo completo.
+
+A codificação das categorias e a imputação continuam as do último treinamento
+completo pelo PyCaret (especificação do artefato); para revisá-las, rode o
+treinamento completo.
+"""
+
+import json
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from artefato_inferencia import ModeloInferencia, caminhos_artefato, marcar_pkl_substituido
+from esquema_otp import aplicar_esquema
+from instrumentacao import log_message
+
+PASTA_TREINO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'treino')
+ARQUIVO_MATRIZ = os.path.join(PASTA_TREINO, 'matriz_treino.parquet')
+ARQUIVO_ESTADO = os.path.join(PASTA_TREINO, 'estado_treino.json')
+
+CHAVES_PO = ['EBELN', 'EBELP']
+COLUNA_ENTREGA = 'Delivery Date'
+COLUNA_ALVO = 'On Time'
+# Mínimo de linhas novas para atualizar o modelo
+MIN_LINHAS_NOVAS = 200
+# Fração das linhas novas (as entregas mais recentes) usada na validação da guarda
+FRACAO_VALIDACAO = 0.2
+RODADAS_INCREMENTAIS = 50
+# Perda de MCC tolerada para o incremental em relação ao retreino completo
+TOLERANCIA_MCC = 0.01
+
+# Parâmetros do booster reaproveitados nos novos treinamentos
+_PARAMETROS_BOOSTER = [
+    'objective', 'learning_rate', 'num_leaves', 'max_depth', 'min_data_in_leaf',
+    'min_sum_hessian_in_leaf', 'bagging_fraction', 'bagging_freq', 'feature_fraction',
+    'lambda_l1', 'lambda_l2', 'min_gain_to_split', 'max_bin', 'seed',
+]
+
+def carregar_matriz(caminho=ARQUIVO_MATRIZ):
+    """
+    Lê a matriz de variáveis das linhas já aprendidas.
+
+    Args:
+        caminho (str): Caminho da matriz em cache
+
+    Returns:
+        pandas.DataFrame: Matriz em cache ou None se não existir
+    """
+    if not os.path.exists(caminho):
+        return None
+    return aplicar_esquema(pd.read_parquet(caminho))
+
+def _gravar_parquet(df, caminho):
+    """
+    Grava um DataFrame em Parquet de forma atômica.
+
+    Args:
+        df (pandas.DataFrame): Dados a gravar
+        caminho (str): Caminho de destino
+    """
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    caminho_tmp = f"{caminho}.tmp"
+    df.to_parquet(caminho_tmp, index=False)
+    os.replace(caminho_tmp, caminho)
+
+def _gravar_estado(estado, caminho=ARQUIVO_ESTADO):
+    """
+    Grava o resumo da última atualização do modelo.
+
+    Args:
+        estado (dict): Informações da atualização
+        caminho (str): Caminho do JSON
+    """
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    caminho_tmp = f"{caminho}.tmp"
+    with open(caminho_tmp, 'w', encoding='utf-8') as arquivo:
+        json.dump(estado, arquivo, ensure_ascii=False, indent=2)
+    os.replace(caminho_tmp, caminho)
+
+def _ler_estado(caminho=ARQUIVO_ESTADO):
+    """
+    Lê o resumo da última atualização do modelo.
+
+    Args:
+        caminho (str): Caminho do JSON
+
+    Returns:
+        dict: Informações da última atualização (vazio se não houver)
+    """
+    if not os.path.exists(caminho):
+        return {}
+    try:
+        with open(caminho, 'r', encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return {}
+
+def registrar_treino_completo(df, caminho_modelo, caminho=ARQUIVO_MATRIZ):
+    """
+    Grava a matriz de variáveis usada em um treinamento completo.
+
+    Args:
+        df (pandas.DataFrame): Dados do treinamento, com chaves, variáveis e alvo
+        caminho_modelo (str): Caminho do modelo treinado (o artefato fica ao lado)
+        caminho (str): Caminho da matriz em cache
+    """
+    _gravar_parquet(df.reset_index(drop=True), caminho)
+    _gravar_estado({
+        'modo': 'completo',
+        'atualizado_em': datetime.now().isoformat(timespec='seconds'),
+        'linhas_aprendidas': len(df),
+        'rodadas_base': ModeloInferencia(caminho_modelo).booster.current_iteration(),
+    })
+    log_message(f"💾 Matriz de treinamento registrada: {len(df)} linhas em {caminho}")
+
+def selecionar_novos(df, matriz):
+    """
+    Separa as linhas entregues que ainda não foram aprendidas pelo modelo.
+
+    Args:
+        df (pandas.DataFrame): Linhas entregues da janela de treinamento
+        matriz (pandas.DataFrame): Matriz em cache das linhas já aprendidas
+
+    Returns:
+        pandas.DataFrame: Linhas novas
+    """
+    if matriz is None or matriz.empty:
+        return df.copy()
+    aprendidas = pd.MultiIndex.from_frame(matriz[CHAVES_PO])
+    novas = ~pd.MultiIndex.from_frame(df[CHAVES_PO]).isin(aprendidas)
+    return df[novas].copy()
+
+def _parametros(booster):
+    """
+    Extrai do booster os parâmetros usados para continuar ou refazer o treinamento.
+
+    Args:
+        booster (lightgbm.Booster): Booster atual
+
+    Returns:
+        dict: Parâmetros do LightGBM
+    """
+    parametros = {nome: booster.params[nome] for nome in _PARAMETROS_BOOSTER if nome in booster.params}
+    parametros['verbosity'] = -1
+    return parametros
+
+def _pesos_balanceados(y):
+    """
+    Calcula pesos que equilibram as duas classes (no lugar do balanceamento do PyCaret).
+
+    Args:
+        y (numpy.ndarray): Alvo (0/1)
+
+    Returns:
+        numpy.ndarray: Peso de cada linha
+    """
+    positivos = max(int(y.sum()), 1)
+    negativos = max(len(y) - int(y.sum()), 1)
+    return np.where(y == 1, len(y) / (2 * positivos), len(y) / (2 * negativos))
+
+def _metricas(booster, X, y):
+    """
+    Calcula as métricas de validação de um booster.
+
+    Args:
+        booster (lightgbm.Booster): Modelo avaliado
+        X (numpy.ndarray): Variáveis de validação
+        y (numpy.ndarray): Alvo de validação
+
+    Returns:
+        dict: MCC e AUC
+    """
+    from sklearn.metrics import matthews_corrcoef, roc_auc_score
+
+    probabilidade = booster.predict(X)
+    previsao = (probabilidade > 1 - probabilidade).astype(int)
+    auc = roc_auc_score(y, probabilidade) if len(np.unique(y)) > 1 else float('nan')
+    return {'mcc': float(matthews_corrcoef(y, previsao)), 'auc': float(auc)}
+
+def _treinar(parametros, X, y, rodadas, init_model=None):
+    """
+    Treina (ou continua treinando) um booster LightGBM.
+
+    Args:
+        parametros (dict): Parâmetros do LightGBM
+        X (numpy.ndarray): Variáveis
+        y (numpy.ndarray): Alvo
+        rodadas (int): Rodadas de boosting
+        init_model (lightgbm.Booster): Booster de partida (None para treinar do zero)
+
+    Returns:
+        lightgbm.Booster: Booster treinado
+    """
+    import lightgbm as lgb
+
+    dados = lgb.Dataset(X, label=y, weight=_pesos_balanceados(y), free_raw_data=False)
+    return lgb.train(parametros, dados, num_boost_round=rodadas, init_model=init_model, keep_training_booster=True)
+
+def atualizar_modelo_incremental(df_novos, chaves_janela, caminho_modelo, caminho_matriz=ARQUIVO_MATRIZ):
+    """
+    Atualiza o booster do artefato de inferência com as linhas entregues novas.
+
+    Args:
+        df_novos (pandas.DataFrame): Linhas novas com chaves, Delivery Date, variáveis e alvo
+        chaves_janela (pandas.DataFrame): EBELN/EBELP de todas as linhas da janela de treinamento
+            (linhas da matriz fora da janela são descartadas)
+        caminho_modelo (str): Caminho do modelo (o artefato fica ao lado)
+        caminho_matriz (str): Caminho da matriz em cache
+
+    Returns:
+        dict: Resumo da atualização (modo escolhido e métricas) ou None se o modelo não mudou
+    """
+    matriz = carregar_matriz(caminho_matriz)
+    if matriz is None:
+        log_message("⚠️ Matriz de treinamento não encontrada; rode o treinamento completo")
+        return None
+
+    # Janela deslizante: descarta da matriz as linhas que saíram do período de treinamento
+    na_janela = pd.MultiIndex.from_frame(matriz[CHAVES_PO]).isin(pd.MultiIndex.from_frame(chaves_janela[CHAVES_PO]))
+    matriz = matriz[na_janela]
+    df_novos = df_novos[matriz.columns]
+    log_message(f"📊 {len(matriz)} linhas já aprendidas na janela, {len(df_novos)} linhas novas")
+    if len(df_novos) < MIN_LINHAS_NOVAS:
+        log_message(f"ℹ️ Menos de {MIN_LINHAS_NOVAS} linhas novas, o modelo não será atualizado")
+        return None
+
+    modelo = ModeloInferencia(caminho_modelo)
+    parametros = _parametros(modelo.booster)
+    # Rodadas do último treino do zero (as incrementais se acumulam no booster atual)
+    estado_anterior = _ler_estado()
+    rodadas_completas = estado_anterior.get('rodadas_base') or modelo.booster.current_iteration()
+
+    # Validação da guarda: as entregas mais recentes entre as linhas novas
+    df_novos = df_novos.sort_values(COLUNA_ENTREGA, kind='stable')
+    corte = len(df_novos) - max(int(len(df_novos) * FRACAO_VALIDACAO), 1)
+    treino_novos, validacao = df_novos.iloc[:corte], df_novos.iloc[corte:]
+    X_validacao = modelo.matriz_features(validacao)
+    y_validacao = validacao[COLUNA_ALVO].to_numpy(dtype=int)
+
+    log_message(f"🔁 Continuando o boosting com {len(treino_novos)} linhas novas...")
+    incremental = _treinar(parametros, modelo.matriz_features(treino_novos),
+                           treino_novos[COLUNA_ALVO].to_numpy(dtype=int), RODADAS_INCREMENTAIS,
+                           init_model=modelo.booster)
+    base_refit = pd.concat([matriz, treino_novos], ignore_index=True)
+    log_message(f"🔧 Retreinando do zero com {len(base_refit)} linhas para comparação...")
+    refit = _treinar(parametros, modelo.matriz_features(base_refit),
+                     base_refit[COLUNA_ALVO].to_numpy(dtype=int), rodadas_completas)
+
+    metricas_incremental = _metricas(incremental, X_validacao, y_validacao)
+    metricas_refit = _metricas(refit, X_validacao, y_validacao)
+    log_message(f"📈 Validação - incremental: MCC {metricas_incremental['mcc']:.4f} / AUC {metricas_incremental['auc']:.4f}; "
+                f"retreino: MCC {metricas_refit['mcc']:.4f} / AUC {metricas_refit['auc']:.4f}")
+
+    # Modelo final: o escolhido, treinado também com as linhas de validação
+    matriz_final = pd.concat([matriz, df_novos], ignore_index=True)
+    if metricas_incremental['mcc'] >= metricas_refit['mcc'] - TOLERANCIA_MCC:
+        modo = 'incremental'
+        booster = _treinar(parametros, modelo.matriz_features(df_novos), df_novos[COLUNA_ALVO].to_numpy(dtype=int),
+                           RODADAS_INCREMENTAIS, init_model=modelo.booster)
+    else:
+        modo = 'retreino'
+        booster = _treinar(parametros, modelo.matriz_features(matriz_final),
+                           matriz_final[COLUNA_ALVO].to_numpy(dtype=int), rodadas_completas)
+    log_message(f"✅ Modelo atualizado por {modo}")
+
+    resumo = {
+        'modo': modo,
+        'atualizado_em': datetime.now().isoformat(timespec='seconds'),
+        'linhas_aprendidas': len(matriz_final),
+        'linhas_novas': len(df_novos),
+        'rodadas': booster.current_iteration(),
+        'rodadas_base': rodadas_completas,
+        'validacao_incremental': metricas_incremental,
+        'validacao_retreino': metricas_refit,
+    }
+    # O .pkl do PyCaret não é atualizado: a marca impede que ele seja usado no lugar do artefato
+    marcar_pkl_substituido(caminho_modelo, resumo)
+    caminho_booster, _ = caminhos_artefato(caminho_modelo)
+    caminho_tmp = f"{caminho_booster}.tmp"
+    booster.save_model(caminho_tmp)
+    os.replace(caminho_tmp, caminho_booster)
+    _gravar_parquet(matriz_final, caminho_matriz)
+    _gravar_estado(resumo)
+    return resumo
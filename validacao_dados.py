@@ -0,0 +1,219 @@
+"""# Validação dos pedidos em aberto (quarentena)
+
+Confere os pedidos em aberto antes das variáveis e da previsão, com todas as
+regras de `REGRAS_VALIDACAO` avaliadas em uma única passada vetorizada sobre o
+DataFrame:
+
+- Colunas obrigatórias (`COLUNAS_OBRIGATORIAS`): sem elas a execução não segue
+- Datas (BEDAT e due date) vazias ou que não puderam ser convertidas
+- BEDAT posterior ao due date ("Dias Para Entrega" negativo)
+- Tolerância de entrega vazia
+- Fornecedor (Vendor) e grupo de material (MATKL) que o modelo não conhece
+
+Cada regra marca um bit no código de motivos da linha. As linhas com algum
+motivo vão para a quarentena (com os códigos na coluna "Motivos"); as que
+falham em regras que bloqueiam a previsão são retiradas dos dados em uma única
+filtragem, e as demais seguem para a previsão só com o aviso. O resumo traz a
+quantidade de linhas que falhou em cada regra.
+"""
+
+import numpy as np
+import pandas as pd
+from features_irf import COLUNA_BEDAT, COLUNA_DUE, COLUNA_FORNECEDOR
+from instrumentacao import log_message
+
+COLUNA_TOLERANCIA = 'Delivery Tolerance (Work Days)'
+COLUNA_GRUPO_MATERIAL = 'MATKL'
+# Colunas sem as quais não é possível calcular as variáveis nem prever
+COLUNAS_OBRIGATORIAS = ['EBELN', 'EBELP', COLUNA_FORNECEDOR, COLUNA_GRUPO_MATERIAL, COLUNA_BEDAT, COLUNA_DUE,
+                        COLUNA_TOLERANCIA, 'NetOrderValue']
+# Regras, na ordem dos bits do código de motivos:
+# (código, descrição, verificação, colunas, bloqueia a previsão da linha)
+REGRAS_VALIDACAO = [
+    ('BEDAT_INVALIDA', 'BEDAT vazia ou em formato inválido', 'data', [COLUNA_BEDAT], True),
+    ('DUE_DATE_INVALIDA', 'Due date vazio ou em formato inválido', 'data', [COLUNA_DUE], True),
+    ('BEDAT_APOS_DUE_DATE', 'BEDAT posterior ao due date', 'ordem', [COLUNA_BEDAT, COLUNA_DUE], True),
+    ('TOLERANCIA_VAZIA', 'Tolerância de entrega vazia', 'preenchida', [COLUNA_TOLERANCIA], True),
+    ('VENDOR_DESCONHECIDO', 'Fornecedor que o modelo não conhece', 'categoria', [COLUNA_FORNECEDOR], False),
+    ('MATKL_DESCONHECIDO', 'Grupo de material que o modelo não conhece', 'categoria', [COLUNA_GRUPO_MATERIAL], False),
+]
+ABA_QUARENTENA = 'Quarentena'
+ABA_RESUMO = 'Resumo'
+COLUNA_MOTIVOS = 'Motivos'
+COLUNA_REMOVIDA = 'Removida da Previsão'
+
+def _datas(df, coluna):
+    """
+    Devolve a coluna como array datetime64 (valores que não são data viram NaT).
+    """
+    serie = df[coluna]
+    if not pd.api.types.is_datetime64_any_dtype(serie):
+        serie = pd.to_datetime(serie, errors='coerce')
+    return serie.to_numpy(dtype='datetime64[ns]')
+
+def _categoria_desconhecida(serie, conhecidas):
+    """
+    Marca os valores preenchidos que não estão entre as categorias conhecidas.
+
+    Segue a codificação do modelo (`ModeloInferencia.matriz_features`): os
+    valores são comparados como texto e os vazios são imputados, não desconhecidos.
+    Colunas categóricas são conferidas pelas categorias, não linha a linha.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        desconhecidas = conhecidas.get_indexer(serie.cat.categories.astype(str)) < 0
+        codigos = serie.cat.codes.to_numpy()
+        # O código -1 (vazio) indexa o False acrescentado no fim
+        return np.append(desconhecidas, False)[codigos]
+    preenchidos = serie.notna().to_numpy()
+    return preenchidos & (conhecidas.get_indexer(serie.astype(str)) < 0)
+
+def _verificar(df, verificacao, colunas, categorias):
+    """
+    Avalia uma regra para todas as linhas.
+
+    Returns:
+        numpy.ndarray: Máscara das linhas que falham (None se a regra não pode ser avaliada)
+    """
+    if verificacao == 'data':
+        return np.isnat(_datas(df, colunas[0]))
+    if verificacao == 'ordem':
+        # Comparações com NaT são falsas: datas inválidas ficam só com a regra da data
+        return _datas(df, colunas[0]) > _datas(df, colunas[1])
+    if verificacao == 'preenchida':
+        return df[colunas[0]].isna().to_numpy()
+    if verificacao == 'categoria':
+        if not categorias or colunas[0] not in categorias:
+            return None
+        return _categoria_desconhecida(df[colunas[0]], categorias[colunas[0]])
+    raise ValueError(f"Verificação desconhecida: {verificacao}")
+
+def _descrever_motivos(motivos):
+    """
+    Converte os códigos de motivos (bits) no texto com os códigos das regras.
+    """
+    distintos, posicoes = np.unique(motivos, return_inverse=True)
+    textos = np.array([', '.join(regra[0] for bit, regra in enumerate(REGRAS_VALIDACAO) if valor >> bit & 1)
+                       for valor in distintos], dtype=object)
+    return textos[posicoes.reshape(motivos.shape)]
+
+class ResultadoValidacao:
+    """
+    Quarentena e contagem por regra de uma validação (ou de várias, no modo em blocos).
+    """
+
+    def __init__(self, linhas=0, contagens=None, quarentena=None, removidas=0):
+        """
+        Args:
+            linhas (int): Linhas validadas
+            contagens (dict): Código da regra -> linhas que falharam (só as regras avaliadas)
+            quarentena (pandas.DataFrame): Linhas com algum motivo, com as colunas de motivos
+            removidas (int): Linhas retiradas da previsão
+        """
+        self.linhas = linhas
+        self.contagens = contagens or {}
+        self.quarentena = quarentena
+        self.removidas = removidas
+
+    @property
+    def linhas_quarentena(self):
+        """
+        Quantidade de linhas em quarentena.
+        """
+        return 0 if self.quarentena is None else len(self.quarentena)
+
+    def acrescentar(self, outro):
+        """
+        Soma o resultado de outra validação (ex.: de um bloco) a este.
+
+        Args:
+            outro (ResultadoValidacao): Resultado a acrescentar
+        """
+        self.linhas += outro.linhas
+        self.removidas += outro.removidas
+        for codigo, quantidade in outro.contagens.items():
+            self.contagens[codigo] = self.contagens.get(codigo, 0) + quantidade
+        if outro.linhas_quarentena:
+            partes = [parte for parte in (self.quarentena, outro.quarentena) if parte is not None and len(parte)]
+            self.quarentena = pd.concat(partes, ignore_index=True) if len(partes) > 1 else partes[0]
+
+    def resumo(self):
+        """
+        Monta o resumo por regra (uma linha por regra, inclusive as não avaliadas).
+
+        Returns:
+            pandas.DataFrame: Regra, descrição, se bloqueia a previsão e linhas que falharam
+        """
+        return pd.DataFrame({
+            'Regra': [regra[0] for regra in REGRAS_VALIDACAO],
+            'Descrição': [regra[1] for regra in REGRAS_VALIDACAO],
+            'Bloqueia a Previsão': ['Sim' if regra[4] else 'Não' for regra in REGRAS_VALIDACAO],
+            'Linhas': [self.contagens.get(regra[0]) for regra in REGRAS_VALIDACAO],
+        })
+
+    def abas(self):
+        """
+        Devolve as abas do arquivo de quarentena (para `escritor_excel.gravar_planilha`).
+
+        Returns:
+            dict: Nome da aba -> DataFrame
+        """
+        return {ABA_QUARENTENA: self.quarentena, ABA_RESUMO: self.resumo()}
+
+    def registrar_log(self):
+        """
+        Mostra no log o total em quarentena e as regras com falhas.
+        """
+        if not self.linhas_quarentena:
+            log_message(f"✅ Validação dos dados: {self.linhas} linhas sem problemas")
+            return
+        log_message(f"🧪 Validação dos dados: {self.linhas_quarentena} de {self.linhas} linhas em quarentena "
+                    f"({self.removidas} retiradas da previsão)")
+        for codigo, descricao, _, _, bloqueia in REGRAS_VALIDACAO:
+            if self.contagens.get(codigo):
+                acao = 'retiradas' if bloqueia else 'mantidas na previsão'
+                log_message(f"   - {codigo}: {self.contagens[codigo]} linhas ({descricao}; {acao})")
+
+def validar_pedidos(df, categorias=None):
+    """
+    Aplica todas as regras de validação aos pedidos em aberto.
+
+    Args:
+        df (pandas.DataFrame): Pedidos em aberto (colunas da base OTP)
+        categorias (dict): Coluna -> `pandas.Index` das categorias conhecidas pelo modelo
+            (ver `ModeloInferencia.categorias_conhecidas`); None não avalia as regras de categoria
+
+    Returns:
+        tuple: (pedidos que seguem para a previsão, `ResultadoValidacao`). Sem linhas
+            retiradas, o próprio `df` é devolvido, sem cópia
+
+    Raises:
+        ValueError: Se faltar alguma coluna obrigatória
+    """
+    ausentes = [coluna for coluna in COLUNAS_OBRIGATORIAS if coluna not in df.columns]
+    if ausentes:
+        raise ValueError(f"Colunas obrigatórias não encontradas: {ausentes}")
+
+    motivos = np.zeros(len(df), dtype=np.uint16)
+    bloqueantes = 0
+    contagens = {}
+    for bit, (codigo, _, verificacao, colunas, bloqueia) in enumerate(REGRAS_VALIDACAO):
+        falhas = _verificar(df, verificacao, colunas, categorias)
+        if falhas is None:
+            continue
+        contagens[codigo] = int(np.count_nonzero(falhas))
+        motivos |= falhas.astype(np.uint16) << np.uint16(bit)
+        if bloqueia:
+            bloqueantes |= 1 << bit
+
+    em_quarentena = motivos != 0
+    resultado = ResultadoValidacao(len(df), contagens)
+    if not em_quarentena.any():
+        return df, resultado
+
+    retiradas = (motivos & np.uint16(bloqueantes)) != 0
+    quarentena = df[em_quarentena].reset_index(drop=True)
+    quarentena.insert(0, COLUNA_MOTIVOS, _descrever_motivos(motivos[em_quarentena]))
+    quarentena.insert(1, COLUNA_REMOVIDA, np.where(retiradas[em_quarentena], 'Sim', 'Não'))
+    resultado.quarentena = quarentena
+    resultado.removidas = int(np.count_nonzero(retiradas))
+    return (df[~retiradas] if resultado.removidas else df), resultado